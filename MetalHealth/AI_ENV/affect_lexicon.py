@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Local Affect Scorer
+Weighted lexicon scoring of tone, polarity and stress/anxiety cues, used as a first
+inference tier so trivial inputs are answered locally and only ambiguous or
+concerning texts are escalated to Gemini.
+"""
+
+import re
+import math
+import hashlib
+
+# Valence weights (-3 very negative .. +3 very positive)
+VALENCE = {
+    "good": 1.5, "great": 2.5, "fine": 0.8, "ok": 0.5, "okay": 0.5, "nice": 1.5, "happy": 2.5,
+    "glad": 2.0, "calm": 1.5, "relaxed": 2.0, "relaxing": 2.0, "peaceful": 2.0, "grateful": 2.5,
+    "thankful": 2.0, "love": 2.5, "loved": 2.5, "fun": 2.0, "enjoyed": 2.0, "excited": 2.0,
+    "proud": 2.0, "productive": 1.5, "rested": 1.5, "amazing": 3.0, "awesome": 3.0,
+    "wonderful": 3.0, "beautiful": 2.5, "blessed": 2.5, "better": 1.0, "best": 2.5,
+    "content": 1.5, "hopeful": 2.0, "energized": 2.0, "motivated": 2.0, "smile": 1.5,
+    "laugh": 2.0, "friends": 0.8, "family": 0.5, "sunshine": 1.5, "vibes": 0.5,
+    "bad": -1.5, "sad": -2.0, "tired": -1.0, "exhausted": -2.0, "drained": -2.0, "awful": -2.5,
+    "terrible": -2.5, "horrible": -2.5, "angry": -2.0, "upset": -2.0, "lonely": -2.0,
+    "alone": -1.0, "cried": -2.0, "crying": -2.0, "hurt": -2.0, "miserable": -3.0,
+    "depressed": -3.0, "down": -1.0, "low": -1.0, "bored": -1.0, "boring": -1.0, "meh": -0.5,
+    "stressed": -2.0, "anxious": -2.0, "worried": -1.5, "nervous": -1.5, "scared": -2.0,
+    "afraid": -2.0, "overwhelmed": -2.5, "frustrated": -2.0, "annoyed": -1.5, "sick": -1.5,
+    "hate": -2.5, "worse": -1.5, "worst": -2.5, "fail": -2.0, "failed": -2.0, "lost": -1.0,
+    "hopeless": -3.0, "worthless": -3.0, "empty": -2.0, "numb": -2.0, "panic": -2.5,
+    "pressure": -1.0, "busy": -0.5, "insomnia": -2.0, "sleepless": -2.0,
+}
+
+# Stress and anxiety cue weights (0..3)
+STRESS_CUES = {
+    "stress": 2.0, "stressed": 2.0, "stressful": 2.0, "pressure": 1.5, "overwhelmed": 2.5,
+    "overwhelming": 2.5, "deadline": 1.0, "deadlines": 1.0, "busy": 0.5, "exhausted": 1.5,
+    "drained": 1.5, "burnout": 2.5, "burned": 1.0, "overworked": 2.0, "hectic": 1.0,
+    "tense": 1.5, "frustrated": 1.0, "exams": 1.0, "workload": 1.0,
+}
+ANXIETY_CUES = {
+    "anxious": 2.5, "anxiety": 2.5, "worried": 2.0, "worry": 2.0, "worrying": 2.0,
+    "nervous": 2.0, "panic": 3.0, "scared": 2.0, "afraid": 2.0, "fear": 2.0, "uneasy": 1.5,
+    "restless": 1.5, "overthinking": 2.0, "dread": 2.5, "edge": 1.0, "insomnia": 1.5,
+    "sleepless": 1.5,
+}
+
+# Phrases that must always reach the model, whatever the local score says
+CRISIS_PHRASES = [
+    "suicide", "suicidal", "kill myself", "killing myself", "end my life", "ending my life",
+    "take my own life", "want to die", "wanna die", "wish i was dead", "wish i were dead",
+    "self harm", "self-harm", "hurt myself", "hurting myself", "harm myself", "cutting",
+    "overdose", "no reason to live", "not worth living", "better off dead", "better off without me",
+    "end it all", "ending it all", "don't want to be here", "dont want to be here",
+    "don't want to live", "dont want to live", "don't want to wake up", "dont want to wake up",
+    "nothing matters", "goodbye everyone", "goodbye forever", "hopeless", "worthless",
+    "can't go on", "cant go on", "give up on life",
+]
+
+NEGATORS = {
+    "not", "no", "never", "nothing", "none", "nobody", "without", "hardly", "barely",
+    "don't", "dont", "didn't", "didnt", "isn't", "isnt", "wasn't", "wasnt", "aren't",
+    "can't", "cant", "couldn't", "won't", "wont", "neither", "nor",
+}
+INTENSIFIERS = {
+    "very": 1.5, "really": 1.5, "so": 1.4, "extremely": 2.0, "super": 1.6, "totally": 1.5,
+    "incredibly": 1.8, "completely": 1.6, "too": 1.3, "absolutely": 1.8, "quite": 1.2,
+    "bit": 0.6, "slightly": 0.5, "somewhat": 0.7, "kinda": 0.7, "little": 0.7,
+}
+
+NEGATION_SCALE = -0.75   # Negated valence flips and weakens ("not good" is mildly negative)
+NEGATION_WINDOW = 3      # Tokens after a negator that it applies to
+POLARITY_ALPHA = 15.0    # Normalizes summed valence into -1..1
+CUE_SATURATION = 3.0     # Summed cue weight at which stress/anxiety strength reaches 1.0
+
+TONE_THRESHOLD = 0.3     # |polarity| needed for a positive/negative tone
+SHORT_TEXT_TOKENS = 12   # Longest input the local tier answers on its own
+CUE_ESCALATION = 0.3     # Stress/anxiety strength that always escalates
+
+CLAUSE_BREAKS = set(".,;:!?")
+
+def tokenize(text):
+    """Lowercase word tokens plus clause punctuation.
+
+    Apostrophes are kept so negations like don't survive, and punctuation is
+    kept so a negation stops at the end of its clause.
+    """
+    return re.findall(r"[a-z']+|[.,;:!?]", (text or "").lower().replace("’", "'"))
+
+def _classify(polarity, positive, negative):
+    if polarity >= TONE_THRESHOLD:
+        return "positive"
+    if polarity <= -TONE_THRESHOLD:
+        return "negative"
+    if positive >= 1.0 and negative <= -1.0:
+        return "mixed"
+    return "neutral"
+
+def _result(text, token_count, hits, total, positive, negative, stress, anxiety):
+    polarity = total / math.sqrt(total * total + POLARITY_ALPHA) if total else 0.0
+    lowered = (text or "").lower().replace("’", "'")
+    return {
+        "tone": _classify(polarity, positive, negative),
+        "polarity": round(polarity, 3),
+        "stress": round(min(1.0, stress / CUE_SATURATION), 3),
+        "anxiety": round(min(1.0, anxiety / CUE_SATURATION), 3),
+        "token_count": token_count,
+        "lexicon_hits": hits,
+        "crisis": any(phrase in lowered for phrase in CRISIS_PHRASES),
+    }
+
+def score_text(text):
+    """Score a single text. Returns tone, polarity and stress/anxiety cue strength."""
+    tokens = tokenize(text)
+    hits = 0
+    total = positive = negative = stress = anxiety = 0.0
+    clause_start = 0
+
+    for i, token in enumerate(tokens):
+        if token in CLAUSE_BREAKS:
+            clause_start = i + 1
+            continue
+        valence = VALENCE.get(token, 0.0)
+        stress_cue = STRESS_CUES.get(token, 0.0)
+        anxiety_cue = ANXIETY_CUES.get(token, 0.0)
+        if not (valence or stress_cue or anxiety_cue):
+            continue
+        hits += 1
+
+        multiplier = INTENSIFIERS.get(tokens[i - 1], 1.0) if i > 0 else 1.0
+        negated = any(t in NEGATORS for t in tokens[max(clause_start, i - NEGATION_WINDOW):i])
+
+        weighted = valence * multiplier * (NEGATION_SCALE if negated else 1.0)
+        total += weighted
+        if weighted > 0:
+            positive += weighted
+        else:
+            negative += weighted
+        # A negated cue ("not stressed") is no evidence of stress
+        if not negated:
+            stress += stress_cue * multiplier
+            anxiety += anxiety_cue * multiplier
+
+    word_count = sum(1 for t in tokens if t not in CLAUSE_BREAKS)
+    return _result(text, word_count, hits, total, positive, negative, stress, anxiety)
+
+def score_batch(texts):
+    """Score many texts at once with NumPy. Gives the same results as score_text."""
+    import numpy as np
+
+    texts = list(texts)
+    token_lists = [tokenize(t) for t in texts]
+    lengths = np.array([len(t) for t in token_lists], dtype=np.int64)
+    flat = [token for tokens in token_lists for token in tokens]
+    if not flat:
+        return [score_text(t) for t in texts]
+
+    doc_ids = np.repeat(np.arange(len(texts)), lengths)
+    position = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    valence = np.fromiter((VALENCE.get(t, 0.0) for t in flat), dtype=np.float64, count=len(flat))
+    stress_cue = np.fromiter((STRESS_CUES.get(t, 0.0) for t in flat), dtype=np.float64, count=len(flat))
+    anxiety_cue = np.fromiter((ANXIETY_CUES.get(t, 0.0) for t in flat), dtype=np.float64, count=len(flat))
+    intensity = np.fromiter((INTENSIFIERS.get(t, 1.0) for t in flat), dtype=np.float64, count=len(flat))
+    negator = np.fromiter((t in NEGATORS for t in flat), dtype=bool, count=len(flat))
+    is_break = np.fromiter((t in CLAUSE_BREAKS for t in flat), dtype=bool, count=len(flat))
+    clause = np.cumsum(is_break)
+
+    # Modifiers only look back within the same document
+    multiplier = np.ones(len(flat))
+    multiplier[1:] = np.where(position[1:] > 0, intensity[:-1], 1.0)
+    negated = np.zeros(len(flat), dtype=bool)
+    for k in range(1, NEGATION_WINDOW + 1):
+        negated[k:] |= negator[:-k] & (position[k:] >= k) & (clause[k:] == clause[:-k])
+
+    weighted = valence * multiplier * np.where(negated, NEGATION_SCALE, 1.0)
+    hit = (valence != 0) | (stress_cue != 0) | (anxiety_cue != 0)
+    live_cue = np.where(negated, 0.0, multiplier)
+
+    n = len(texts)
+    word_counts = lengths - np.bincount(doc_ids, weights=is_break, minlength=n).astype(np.int64)
+    hits = np.bincount(doc_ids, weights=hit, minlength=n)
+    total = np.bincount(doc_ids, weights=weighted, minlength=n)
+    positive = np.bincount(doc_ids, weights=np.clip(weighted, 0, None), minlength=n)
+    negative = np.bincount(doc_ids, weights=np.clip(weighted, None, 0), minlength=n)
+    stress = np.bincount(doc_ids, weights=stress_cue * live_cue, minlength=n)
+    anxiety = np.bincount(doc_ids, weights=anxiety_cue * live_cue, minlength=n)
+
+    return [
+        _result(texts[i], int(word_counts[i]), int(hits[i]), float(total[i]), float(positive[i]),
+                float(negative[i]), float(stress[i]), float(anxiety[i]))
+        for i in range(n)
+    ]
+
+def affect_signature(text):
+    """Digest of the lexicon, negation and intensifier words of a text, in order.
+
+    Texts that differ only in these words ("fine" vs "awful", "nice" vs
+    "not nice") can share a SimHash fingerprint, so caches key on this too.
+    """
+    words = [t for t in tokenize(text)
+             if t in VALENCE or t in STRESS_CUES or t in ANXIETY_CUES or t in NEGATORS or t in INTENSIFIERS]
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).hexdigest()
+
+def has_concern(score):
+    """True when a scored text carries a crisis phrase, stress or anxiety cues, or a negative tone."""
+    if score["crisis"]:
+        return True
+    if score["stress"] >= CUE_ESCALATION or score["anxiety"] >= CUE_ESCALATION:
+        return True
+    return score["tone"] in ("negative", "mixed")
+
+def needs_model(score):
+    """Decide whether a scored text must be escalated to the model.
+
+    Only short texts with a clear positive or neutral tone, at least one
+    lexicon hit and no stress, anxiety or crisis cues are answered locally.
+    """
+    if has_concern(score):
+        return True
+    if score["token_count"] > SHORT_TEXT_TOKENS:
+        return True
+    # Words the lexicon knows nothing about are ambiguous, not neutral
+    if score["lexicon_hits"] == 0 and score["token_count"] > 0:
+        return True
+    return False
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Analytics Sources
+Readers that let the analytics script pull a user's assessments and daily
+summaries straight from the databases, instead of receiving them fully
+serialized on the command line. Rows are fetched a page at a time through
+server-side cursors, and only the fields the analytics use are selected:
+the answers in ANSWER_FIELDS, the analysis riskLevel and summary, and the
+creation time.
+
+Sources are named by a spec string:
+    mysql            MentalHealthAssessments in the backend's MySQL database
+                     (DB_HOST, DB_USER, DB_PASSWORD, DB_NAME); needs pymysql
+    mongo            dailysummaries in MONGODB_URI; needs pymongo
+    sqlite:PATH      both tables in a SQLite file (tests and local runs)
+
+Configuration:
+    ANALYTICS_ASSESSMENTS_SOURCE   default "mysql"
+    ANALYTICS_SUMMARIES_SOURCE     default "mongo"
+    ANALYTICS_PAGE_SIZE            rows per fetch, default 500
+"""
+
+import os
+import json
+import sqlite3
+from datetime import datetime, timezone
+import deadline
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_MONGODB_URI = "mongodb://127.0.0.1:27017/MentalHealth"
+
+# Answers read by the statistics, the prompt and the summary index
+ANSWER_FIELDS = ("mood", "moodLevel", "stressLevel", "sleepHours", "sleepQuality", "energyLevel",
+                 "anxietyFrequency", "overwhelmedFrequency", "socialConnection", "dailyFunctioning",
+                 "todaySummary", "commonFeeling")
+ANALYSIS_FIELDS = ("riskLevel", "summary")
+
+def default_page_size():
+    return max(1, int(os.getenv("ANALYTICS_PAGE_SIZE", DEFAULT_PAGE_SIZE)))
+
+def to_utc(value):
+    """Naive UTC datetime of an ISO timestamp or epoch value; None when empty."""
+    seconds = deadline.parse_deadline(value)
+    return None if seconds is None else datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+
+def iso_utc(value):
+    """ISO text with a Z suffix for a UTC datetime, as the backend serializes createdAt."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+    return value
+
+class SQLSource:
+    """Assessments (and optionally summaries) from a DB-API connection.
+
+    Subclasses set the parameter placeholder, the cursor to page through and
+    how a projected JSON field is quoted back to JSON text.
+    """
+
+    placeholder = "?"
+    # Per-dialect SQL giving a JSON path of a column as JSON text, NULL when absent
+    json_field = "json_quote(json_extract({column}, '$.{field}'))"
+
+    def __init__(self, connection, page_size=None):
+        self.connection = connection
+        self.page_size = page_size or default_page_size()
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def bound(self, value):
+        return to_utc(value)
+
+    def _paged(self, sql, params):
+        cursor = self.cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(self.page_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def _range_clause(self, column, start, end, params):
+        clause = ""
+        if start is not None:
+            clause += f" AND {column} >= {self.placeholder}"
+            params.append(self.bound(start))
+        if end is not None:
+            clause += f" AND {column} <= {self.placeholder}"
+            params.append(self.bound(end))
+        return clause
+
+    def assessments(self, user_id, start=None, end=None):
+        """Yield a user's assessments in creation order with only the analytics fields."""
+        columns = [self.json_field.format(column="answers", field=f) for f in ANSWER_FIELDS]
+        columns += [self.json_field.format(column="ai_analysis", field=f) for f in ANALYSIS_FIELDS]
+        params = [user_id]
+        sql = (f"SELECT id, created_at, {', '.join(columns)} FROM MentalHealthAssessments "
+               f"WHERE user_id = {self.placeholder}"
+               + self._range_clause("created_at", start, end, params)
+               + " ORDER BY created_at ASC, id ASC")
+        for row in self._paged(sql, params):
+            values = [None if v is None else json.loads(v) for v in row[2:]]
+            answers = {f: v for f, v in zip(ANSWER_FIELDS, values) if v is not None}
+            analysis = {f: v for f, v in zip(ANALYSIS_FIELDS, values[len(ANSWER_FIELDS):]) if v is not None}
+            yield {"id": row[0], "userId": user_id, "createdAt": iso_utc(row[1]),
+                   "answers": answers, "aiAnalysis": analysis}
+
+    def summaries(self, user_id, start_date=None, end_date=None):
+        """Yield a user's daily summaries (date, summary) between two YYYY-MM-DD dates."""
+        params = [user_id]
+        clause = ""
+        if start_date:
+            clause += f" AND date >= {self.placeholder}"
+            params.append(start_date)
+        if end_date:
+            clause += f" AND date <= {self.placeholder}"
+            params.append(end_date)
+        sql = (f"SELECT date, summary FROM DailySummaries WHERE user_id = {self.placeholder}{clause} "
+               f"ORDER BY date ASC")
+        for date, summary in self._paged(sql, params):
+            yield {"date": date, "summary": summary}
+
+    def close(self):
+        self.connection.close()
+
+class SQLiteSource(SQLSource):
+    """Both tables in one SQLite file; created_at holds ISO text, compared as text."""
+
+    def __init__(self, path, page_size=None):
+        super().__init__(sqlite3.connect(path), page_size)
+
+    def bound(self, value):
+        return iso_utc(to_utc(value))
+
+class MySQLSource(SQLSource):
+    """The backend's MySQL database, read through an unbuffered server-side cursor."""
+
+    placeholder = "%s"
+    json_field = "JSON_EXTRACT({column}, '$.{field}')"
+
+    def __init__(self, page_size=None):
+        import pymysql
+        self._cursor_class = pymysql.cursors.SSCursor
+        super().__init__(pymysql.connect(
+            host=os.getenv("DB_HOST", "localhost"), user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD", ""), database=os.getenv("DB_NAME", "MENTALHEALTH"),
+            charset="utf8mb4"), page_size)
+
+    def cursor(self):
+        return self.connection.cursor(self._cursor_class)
+
+class MongoSummarySource:
+    """Daily summaries from the backend's MongoDB, in batches of the page size."""
+
+    def __init__(self, page_size=None):
+        from pymongo import MongoClient
+        self.client = MongoClient(os.getenv("MONGODB_URI", DEFAULT_MONGODB_URI))
+        self.collection = self.client.get_default_database()["dailysummaries"]
+        self.page_size = page_size or default_page_size()
+
+    def summaries(self, user_id, start_date=None, end_date=None):
+        query = {"userId": int(user_id)}
+        dates = {}
+        if start_date:
+            dates["$gte"] = start_date
+        if end_date:
+            dates["$lte"] = end_date
+        if dates:
+            query["date"] = dates
+        cursor = (self.collection.find(query, {"_id": 0, "date": 1, "summary": 1})
+                  .sort("date", 1).batch_size(self.page_size))
+        try:
+            for document in cursor:
+                yield {"date": document.get("date"), "summary": document.get("summary", "")}
+        finally:
+            cursor.close()
+
+    def close(self):
+        self.client.close()
+
+def open_source(spec, page_size=None):
+    """A source for a spec string ("mysql", "mongo" or "sqlite:PATH")."""
+    if spec.startswith("sqlite:"):
+        return SQLiteSource(spec[len("sqlite:"):], page_size)
+    if spec == "mysql":
+        return MySQLSource(page_size)
+    if spec == "mongo":
+        return MongoSummarySource(page_size)
+    raise ValueError(f"Unknown analytics source: {spec}")
+
+class AnalyticsReader:
+    """The configured assessment and summary sources, opened once and closed together."""
+
+    def __init__(self, assessments_spec=None, summaries_spec=None, page_size=None):
+        assessments_spec = assessments_spec or os.getenv("ANALYTICS_ASSESSMENTS_SOURCE", "mysql")
+        summaries_spec = summaries_spec or os.getenv("ANALYTICS_SUMMARIES_SOURCE", "mongo")
+        self.assessment_source = open_source(assessments_spec, page_size)
+        try:
+            self.summary_source = (self.assessment_source if summaries_spec == assessments_spec
+                                   else open_source(summaries_spec, page_size))
+        except Exception:
+            self.assessment_source.close()
+            raise
+
+    def assessments(self, user_id, start=None, end=None):
+        return self.assessment_source.assessments(user_id, start, end)
+
+    def summaries(self, user_id, start=None, end=None):
+        """Summaries dated within the range, matched on the YYYY-MM-DD part of its bounds like the backend."""
+        return self.summary_source.summaries(user_id, str(start)[:10] if start else None,
+                                             str(end)[:10] if end else None)
+
+    def close(self):
+        self.assessment_source.close()
+        if self.summary_source is not self.assessment_source:
+            self.summary_source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import time
+_STARTED = time.perf_counter()
+
+import sys
+import json
+from datetime import datetime
+from gemini_client import MODEL, GeminiHTTPError, generate_content
+from profiling import stage, record_startup, pop_profile_flag, attach_timings, run_profiled
+from prompt_registry import PROMPTS
+from usage_ledger import current_user
+from model_router import route
+from affect_lexicon import score_text, needs_model
+from metrics import GEMINI_RETRIES
+from analyze_mental_health import (get_api_key, extract_text_from_response, assessment_fields, validate_analysis,
+                                   parse_analysis_response, build_partial_analysis, analyze_mental_health)
+from analyze_daily_summary import (ANALYSIS_FIELDS, summary_context_lines, is_reusable_analysis,
+                                   build_partial_summary_analysis, analyze_daily_summary)
+import deadline
+
+def call_gemini(api_key, prompt, model=MODEL, route_reason=None):
+    """Call the Gemini API and return extracted text."""
+    try:
+        resp = generate_content(api_key, prompt, model, timeout=30, endpoint="assessment_summary",
+                                route_reason=route_reason)
+    except GeminiHTTPError as e:
+        return f"[ERROR] HTTP {e.status_code}: {e.text}"
+    except Exception as e:
+        return f"[ERROR] {e}"
+
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
+
+def build_assessment_summary_prompt(answers, daily_summary, context=None, user_gender=None, version=None):
+    """Build one prompt asking for both the check-in assessment and the summary analysis."""
+    return PROMPTS.render(
+        "assessment_summary", key=current_user(), version=version,
+        context_lines=summary_context_lines(context),
+        synthetic=bool(context and context.get('is_synthetic')),
+        **assessment_fields(answers, daily_summary, user_gender)
+    )
+
+def parse_assessment_summary_response(gemini_response):
+    """Split a combined response into (assessment, summary analysis).
+
+    The summary analysis is None when its half is missing or incomplete, so the
+    caller can fall back to a separate summary call. An unparseable response
+    gives the usual assessment fallback and no summary analysis.
+    """
+    cleaned_response = gemini_response.strip()
+
+    # Remove markdown code blocks if present
+    if cleaned_response.startswith('```json'):
+        cleaned_response = cleaned_response[7:]  # Remove ```json
+    if cleaned_response.startswith('```'):
+        cleaned_response = cleaned_response[3:]  # Remove ```
+    if cleaned_response.endswith('```'):
+        cleaned_response = cleaned_response[:-3]  # Remove ```
+
+    cleaned_response = cleaned_response.strip()
+
+    try:
+        combined = json.loads(cleaned_response)
+    except json.JSONDecodeError:
+        return parse_analysis_response(cleaned_response), None
+    if not isinstance(combined, dict) or not isinstance(combined.get("assessment"), dict):
+        return parse_analysis_response(cleaned_response), None
+
+    assessment = validate_analysis(combined["assessment"])
+    summary_analysis = combined.get("summaryAnalysis")
+    if not is_reusable_analysis(summary_analysis):
+        return assessment, None
+    return assessment, {field: summary_analysis[field] for field in ANALYSIS_FIELDS}
+
+def analyze_assessment_summary(analysis_data_json):
+    """Analyze a check-in and its daily summary with a single Gemini call.
+
+    Returns {"assessment": ..., "summaryAnalysis": ...} with the same fields as
+    analyze_mental_health and analyze_daily_summary. Without a summary only the
+    assessment is made and summaryAnalysis is null. Summaries the local affect
+    scorer can answer keep their free local analysis next to an assessment-only
+    call, and a combined response whose summary half is unusable falls back to
+    a separate summary call.
+    """
+    try:
+        with stage("input_parse"):
+            analysis_data = json.loads(analysis_data_json)
+        answers = analysis_data.get('answers', {})
+        daily_summary = analysis_data.get('dailySummary', None)
+        user_gender = analysis_data.get('userGender', None)
+        context = analysis_data.get('summaryContext') or {}
+        deadline.set_deadline(analysis_data.get('deadline'))
+
+        if not daily_summary or not daily_summary.strip():
+            return json.dumps({"assessment": json.loads(analyze_mental_health(analysis_data_json)),
+                               "summaryAnalysis": None})
+
+        with stage("local_score"):
+            affect = score_text(daily_summary)
+        if not needs_model(affect):
+            return json.dumps({
+                "assessment": json.loads(analyze_mental_health(analysis_data_json)),
+                "summaryAnalysis": json.loads(analyze_daily_summary(daily_summary, context, user_gender))
+            })
+
+        # Get API key
+        api_key = get_api_key()
+        if not api_key:
+            return json.dumps({
+                "error": "API key not found",
+                "assessment": {
+                    "summary": "Unable to perform analysis",
+                    "riskLevel": "Unknown",
+                    "recommendations": "Please contact a mental health professional"
+                },
+                "summaryAnalysis": None
+            })
+
+        # Build prompt and call Gemini
+        if deadline.allows_call():
+            with stage("prompt_build"):
+                prompt = build_assessment_summary_prompt(answers, daily_summary, context, user_gender)
+            decision = route("assessment_summary", daily_summary, answers)
+            gemini_response = call_gemini(api_key, prompt, decision.model, decision.reason)
+        else:
+            gemini_response = "[ERROR] No time left for the analysis"
+
+        timestamp = datetime.now().isoformat()
+        if gemini_response.startswith('[ERROR]') and deadline.out_of_time():
+            assessment = build_partial_analysis(answers, daily_summary)
+            summary_analysis = build_partial_summary_analysis()
+        else:
+            with stage("response_parse"):
+                assessment, summary_analysis = parse_assessment_summary_response(gemini_response)
+            if summary_analysis is None:
+                summary_analysis = json.loads(analyze_daily_summary(daily_summary, context, user_gender))
+                if summary_analysis.get("analysis_mode") == "full":
+                    GEMINI_RETRIES.inc(endpoint="assessment_summary")
+            else:
+                summary_analysis["analysis_mode"] = "fused"
+                summary_analysis["timestamp"] = timestamp
+        assessment["timestamp"] = timestamp
+        summary_analysis.setdefault("timestamp", timestamp)
+
+        return json.dumps({"assessment": assessment, "summaryAnalysis": summary_analysis})
+
+    except Exception as e:
+        return json.dumps({
+            "error": str(e),
+            "assessment": {
+                "summary": "Analysis failed",
+                "riskLevel": "Unknown",
+                "recommendations": "Please try again or contact support"
+            },
+            "summaryAnalysis": None
+        })
+
+if __name__ == "__main__":
+    record_startup(_STARTED)
+    profile = pop_profile_flag(sys.argv)
+    deadline.install(sys.argv)
+    if len(sys.argv) != 2:
+        print(json.dumps({"error": "Invalid arguments"}), file=sys.stdout)
+        sys.exit(1)
+
+    analysis_json = sys.argv[1]
+    result = (run_profiled(analyze_assessment_summary, analysis_json) if profile
+              else analyze_assessment_summary(analysis_json))
+    print(attach_timings(result), file=sys.stdout)
+    sys.stdout.flush()
@@ -1,15 +1,42 @@
 #!/usr/bin/env python3
+import time
+_STARTED = time.perf_counter()
+
 import os
+import re
 import sys
 import json
-import requests
+import difflib
 from datetime import datetime
 from dotenv import load_dotenv
+from gemini_client import MODEL, GeminiHTTPError, generate_content
+from profiling import stage, record_startup, pop_profile_flag, attach_timings, run_profiled
+from near_duplicate import load_index, save_index, is_cacheable, analysis_namespace
+from affect_lexicon import score_text, score_batch, needs_model, has_concern
+from risk_signals import has_high_risk_signal
+from metrics import record_cache
+from prompt_registry import PROMPTS
+from usage_ledger import current_user
+from model_router import route
+import deadline
 
 load_dotenv()
 
-MODEL = "gemini-2.5-flash"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+# Edits at or above this token similarity reuse the previous analysis as-is
+EDIT_SKIP_SIMILARITY = 0.9
+# Edits at or above this similarity send only the changed sentences
+EDIT_INCREMENTAL_SIMILARITY = 0.5
+
+ANALYSIS_FIELDS = ["summary", "mood_indicators", "patterns", "insights", "suggestions"]
+UNPARSED_MOOD = "Analysis completed but format unclear"
+PARTIAL_SUMMARY = "A full analysis of this entry could not be completed in time."
+PARTIAL_INSIGHTS = "Save the entry again later for a full analysis."
+# Analyses that stand in for a real one; never reused, patched or cached
+PLACEHOLDER_MODES = ("partial", "unparsed", "failed")
+PLACEHOLDER_TEXTS = {
+    "Analysis failed", "Unable to perform analysis", UNPARSED_MOOD, PARTIAL_SUMMARY, PARTIAL_INSIGHTS,
+    "Unable to parse",  # dailysummary.js fallback when the script output is not JSON
+}
 
 def get_api_key(env_var_name="GOOGLE_API_KEY_1"):
     """Get API key from environment variables."""
@@ -38,48 +65,23 @@ def extract_text_from_response(resp):
     cleaned = [t.strip() for t in texts if isinstance(t, str) and t.strip()]
     return "\n".join(cleaned).strip()
 
-def call_gemini(api_key, prompt, model=MODEL):
+def call_gemini(api_key, prompt, model=MODEL, route_reason=None):
     """Call the Gemini API and return extracted text."""
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
-    
     try:
-        r = requests.post(url, json=payload, headers=headers, timeout=30)
-        if not r.ok:
-            return f"[ERROR] HTTP {r.status_code}: {r.text}"
-        resp = r.json()
+        resp = generate_content(api_key, prompt, model, timeout=30, endpoint="daily_summary",
+                                route_reason=route_reason)
+    except GeminiHTTPError as e:
+        return f"[ERROR] HTTP {e.status_code}: {e.text}"
     except Exception as e:
         return f"[ERROR] {e}"
     
-    return extract_text_from_response(resp)
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
 
-def build_summary_analysis_prompt(summary_text, context=None, user_gender=None):
-    """Build the prompt for daily summary analysis with optional context."""
-    
-    # Base instruction
-    instruction = (
-        "You are an expert clinical psychologist and mental health AI with specialized training in journal analysis and narrative therapy. "
-        "Analyze the following daily summary with clinical expertise and provide comprehensive insights about the user's emotional state, patterns, and well-being. "
-        "Go beyond simply restating what the user wrote - provide meaningful clinical interpretation and insights.\n\n"
-        
-        "ANALYSIS FRAMEWORK:\n"
-        "- Apply evidence-based psychological assessment principles and clinical judgment\n"
-        "- Use narrative therapy and journal analysis techniques\n"
-        "- Identify clinical indicators and diagnostic patterns\n"
-        "- Assess functional impairment and quality of life impact\n"
-        "- Provide clinical insights about mental health condition\n"
-        "- Look for underlying psychological processes and defense mechanisms\n"
-        "- Identify clinical themes and diagnostic indicators\n"
-        "- Provide professional assessment of mental health status\n"
-        "- Focus on clinical presentation rather than personal narrative\n"
-        "- Consider gender-specific patterns and considerations when relevant\n\n"
-    )
-    
-    # Add context if provided
+def summary_context_lines(context=None):
+    """Clinical notes about where a summary came from, for the prompt's context section."""
+    context_info = []
     if context:
-        context_info = []
-        
         if context.get('is_synthetic'):
             context_info.append("CLINICAL NOTE: This is an auto-generated summary created from structured assessment data.")
         else:
@@ -93,72 +95,190 @@ def build_summary_analysis_prompt(summary_text, context=None, user_gender=None):
             
         if context.get('has_previous_analysis'):
             context_info.append("HISTORY: This summary has been analyzed before - provide fresh insights based on any changes or evolution.")
-            
-        if context_info:
-            instruction += "CONTEXTUAL INFORMATION:\n" + "\n".join(context_info) + "\n\n"
-    
-    instruction += f"USER DEMOGRAPHICS:\n"
-    instruction += f"• Gender: {user_gender if user_gender else 'Not specified'}\n\n"
-    
-    instruction += f"DAILY SUMMARY TO ANALYZE:\n\"{summary_text}\"\n\n"
-    
-    # Adjust analysis approach based on context
-    if context and context.get('is_synthetic'):
-        instruction += (
-            "ANALYSIS FOCUS (Structured Data Summary):\n"
-            "• Quantitative patterns in mood, stress, sleep, and anxiety indicators\n"
-            "• Data-driven insights and trend analysis\n"
-            "• Objective assessment of mental health metrics\n"
-            "• Evidence-based recommendations based on numerical patterns\n"
-            "• Identification of areas requiring attention or intervention\n\n"
-        )
-    else:
-        instruction += (
-            "ANALYSIS FOCUS (Personal Narrative):\n"
-            "• Emotional tone, language patterns, and psychological themes\n"
-            "• Cognitive patterns and thought processes\n"
-            "• Behavioral indicators and coping strategies\n"
-            "• Personal growth, resilience, and self-awareness\n"
-            "• Narrative structure and storytelling elements\n"
-            "• Subjective experience and internal world\n\n"
-        )
-    
-    instruction += (
-        "CLINICAL ANALYSIS AREAS:\n"
-        "• Emotional Regulation: How well the user manages and expresses emotions\n"
-        "• Cognitive Patterns: Thought processes, beliefs, and mental frameworks\n"
-        "• Behavioral Indicators: Actions, habits, and coping strategies\n"
-        "• Social Connections: Relationships and interpersonal dynamics\n"
-        "• Stress Management: How the user handles challenges and pressure\n"
-        "• Self-Care: Attention to physical and mental well-being\n"
-        "• Growth Mindset: Learning, adaptation, and personal development\n\n"
-        
-        "REQUIRED OUTPUT FORMAT (JSON only, no markdown):\n"
-        "{\n"
-        '  "summary": "Comprehensive 2-3 sentence analysis of the user\'s emotional state, psychological patterns, and overall well-being. Be specific about what you observe.",\n'
-        '  "mood_indicators": "Detailed identification of emotional indicators, mood patterns, and affective states present in the writing. Include both positive and concerning indicators.",\n'
-        '  "patterns": "Specific patterns, themes, and recurring elements identified in the writing. Include cognitive, emotional, and behavioral patterns.",\n'
-        '  "insights": "Clinical insights about the user\'s mental well-being, personal growth, and psychological state. Focus on both strengths and areas for development.",\n'
-        '  "suggestions": "3-4 specific, actionable suggestions for reflection, growth, or positive actions. Be practical, evidence-based, and tailored to the user\'s situation."\n'
-        "}\n\n"
-        
-        "ANALYSIS GUIDELINES:\n"
-        "- Maintain clinical objectivity while being empathetic and supportive\n"
-        "- Identify both challenges and strengths/resilience factors\n"
-        "- Use evidence-based psychological principles\n"
-        "- Provide specific, actionable recommendations\n"
-        "- Consider the user's unique circumstances and context\n"
-        "- Focus on growth, healing, and positive development\n"
-        "- Be sensitive to potential mental health concerns\n\n"
-        
-        "CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure."
+    return "\n".join(context_info)
+
+def build_summary_analysis_prompt(summary_text, context=None, user_gender=None, version=None):
+    """Build the prompt for daily summary analysis with optional context."""
+    return PROMPTS.render(
+        "daily_summary", key=current_user(), version=version,
+        context_lines=summary_context_lines(context),
+        gender=user_gender if user_gender else 'Not specified',
+        summary_text=summary_text,
+        synthetic=bool(context and context.get('is_synthetic'))
     )
-    
-    return instruction
 
-def analyze_daily_summary(summary_text, context=None, user_gender=None):
-    """Main function to analyze daily summary with optional context."""
+def tokenize_summary(text):
+    """Split summary text into lowercase word tokens for diffing."""
+    return re.findall(r"[a-z0-9']+", (text or "").lower())
+
+def split_sentences(text):
+    """Split summary text into sentences."""
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text or "") if s.strip()]
+
+def compute_edit_diff(previous_text, summary_text):
+    """Compare an edited summary against its previous version at token level."""
+    previous_tokens = tokenize_summary(previous_text)
+    new_tokens = tokenize_summary(summary_text)
+    matcher = difflib.SequenceMatcher(None, previous_tokens, new_tokens, autojunk=False)
+    similarity = matcher.ratio() if (previous_tokens or new_tokens) else 1.0
+
+    previous_sentences = split_sentences(previous_text)
+    new_sentences = split_sentences(summary_text)
+    previous_keys = {" ".join(tokenize_summary(s)) for s in previous_sentences}
+    new_keys = {" ".join(tokenize_summary(s)) for s in new_sentences}
+
+    return {
+        "similarity": similarity,
+        "changed_sentences": [s for s in new_sentences if " ".join(tokenize_summary(s)) not in previous_keys],
+        "removed_sentences": [s for s in previous_sentences if " ".join(tokenize_summary(s)) not in new_keys]
+    }
+
+def edit_adds_concern(diff):
+    """True when a new or changed sentence of an edit carries a crisis, risk or negative signal."""
+    sentences = diff["changed_sentences"]
+    return any(has_concern(score) or has_high_risk_signal(text=sentence)
+               for sentence, score in zip(sentences, score_batch(sentences)))
+
+def is_reusable_analysis(analysis):
+    """Check that a stored analysis is complete enough to reuse or update."""
+    if not isinstance(analysis, dict) or analysis.get("error"):
+        return False
+    if analysis.get("analysis_mode") in PLACEHOLDER_MODES:
+        return False
+    if any(analysis.get(field) in PLACEHOLDER_TEXTS for field in ANALYSIS_FIELDS):
+        return False
+    return all(isinstance(analysis.get(field), str) and analysis[field].strip() for field in ANALYSIS_FIELDS)
+
+def build_incremental_summary_prompt(diff, previous_analysis, user_gender=None, version=None):
+    """Build a short prompt that updates a prior analysis from the edited sentences only."""
+    previous = {field: previous_analysis.get(field, "") for field in ANALYSIS_FIELDS}
+    return PROMPTS.render(
+        "daily_summary_incremental", key=current_user(), version=version,
+        gender=user_gender if user_gender else 'Not specified',
+        changed_sentences="\n".join(f'- "{s}"' for s in diff["changed_sentences"]),
+        removed_sentences="\n".join(f'- "{s}"' for s in diff["removed_sentences"]),
+        previous_analysis=json.dumps(previous, ensure_ascii=False)
+    )
+
+def parse_summary_response(gemini_response):
+    """Clean up a Gemini response and parse it into an analysis dict."""
+    cleaned_response = gemini_response.strip()
+
+    # Remove markdown code blocks if present
+    if cleaned_response.startswith('```json'):
+        cleaned_response = cleaned_response[7:]  # Remove ```json
+    if cleaned_response.endswith('```'):
+        cleaned_response = cleaned_response[:-3]  # Remove ```
+
+    cleaned_response = cleaned_response.strip()
+
+    # Try to parse the JSON response
     try:
+        return json.loads(cleaned_response)
+    except json.JSONDecodeError:
+        # If response is not valid JSON, create a structured response
+        return {
+            "summary": cleaned_response,
+            "mood_indicators": UNPARSED_MOOD,
+            "patterns": "Unable to identify specific patterns",
+            "insights": "Please consider speaking with a mental health professional for personalized advice.",
+            "suggestions": "Continue journaling to track your thoughts and feelings."
+        }
+
+def build_local_summary_analysis(affect):
+    """Build an analysis for a short, non-concerning summary from its local affect score."""
+    if affect["tone"] == "positive":
+        summary = "The entry is brief and reflects a positive, settled emotional state without signs of distress."
+        mood = "Positive affect is present; no stress, anxiety or low-mood indicators were found."
+        suggestions = ("Note what made today feel good so you can return to it; keep your current sleep and "
+                       "activity routine; try adding one or two sentences about your day to make patterns easier to spot.")
+    else:
+        summary = "The entry is brief and emotionally neutral, with no signs of distress."
+        mood = "Neutral affect; no stress, anxiety or low-mood indicators were found."
+        suggestions = ("Try writing a few sentences about how you felt and what happened today; note your sleep "
+                       "and energy levels; check in with yourself again tomorrow.")
+    return {
+        "summary": summary,
+        "mood_indicators": mood,
+        "patterns": "The entry is too short to identify recurring cognitive, emotional or behavioral patterns.",
+        "insights": "No concerns stand out in this entry. Longer reflections give a fuller picture of your well-being over time.",
+        "suggestions": suggestions
+    }
+
+def build_partial_summary_analysis(previous_analysis=None):
+    """Best analysis available without Gemini: the previous version's analysis, or a placeholder."""
+    if is_reusable_analysis(previous_analysis):
+        analysis = {field: previous_analysis[field] for field in ANALYSIS_FIELDS}
+    else:
+        analysis = {
+            "summary": PARTIAL_SUMMARY,
+            "mood_indicators": "Not available",
+            "patterns": "Not available",
+            "insights": PARTIAL_INSIGHTS,
+            "suggestions": "Continue journaling to track your thoughts and feelings."
+        }
+    analysis["analysis_mode"] = "partial"
+    return analysis
+
+def analyze_daily_summary(summary_text, context=None, user_gender=None, previous_text=None, previous_analysis=None):
+    """Main function to analyze daily summary with optional context.
+
+    When the previous text and analysis of an edited summary are given, small
+    edits reuse the previous analysis and medium edits only send the changed
+    sentences for an incremental update, unless a changed sentence carries a
+    crisis, risk or negative signal. Short, non-concerning summaries are
+    answered by the local affect scorer, and summaries that are near-identical
+    to one analyzed before reuse the stored analysis.
+    """
+    try:
+        if isinstance(context, dict):
+            deadline.set_deadline(context.get('deadline'))
+        diff = None
+        if previous_text is not None and is_reusable_analysis(previous_analysis):
+            with stage("edit_diff"):
+                diff = compute_edit_diff(previous_text, summary_text)
+                # However small, an edit that adds a crisis or negative signal gets a full analysis
+                if edit_adds_concern(diff):
+                    diff = None
+            record_cache("edit_reuse", diff is not None and diff["similarity"] >= EDIT_SKIP_SIMILARITY)
+            if diff is not None and diff["similarity"] >= EDIT_SKIP_SIMILARITY:
+                analysis = {field: previous_analysis[field] for field in ANALYSIS_FIELDS}
+                analysis["analysis_mode"] = "reused"
+                analysis["timestamp"] = datetime.now().isoformat()
+                return json.dumps(analysis)
+
+        # Short, clearly non-concerning summaries are answered by the local scorer
+        with stage("local_score"):
+            affect = score_text(summary_text)
+        record_cache("local_lexicon", not needs_model(affect))
+        if not needs_model(affect):
+            analysis = build_local_summary_analysis(affect)
+            analysis["analysis_mode"] = "local"
+            analysis["timestamp"] = datetime.now().isoformat()
+            return json.dumps(analysis)
+
+        incremental = diff is not None and diff["similarity"] >= EDIT_INCREMENTAL_SIMILARITY
+
+        # Near-identical summaries of the same user reuse an analysis that was
+        # already generated by the same prompt version
+        prompt_version = PROMPTS.select("daily_summary", current_user()).version
+        dedup_namespace = analysis_namespace("daily_summary:{}:{}:{}".format(
+            prompt_version,
+            "synthetic" if context and context.get('is_synthetic') else "personal",
+            (user_gender or "unspecified").lower()
+        ), current_user(), summary_text)
+        cacheable = is_cacheable(summary_text, affect)
+        if not incremental and cacheable:
+            with stage("dedup_lookup"):
+                dedup_index = load_index()
+                cached, _ = dedup_index.lookup(summary_text, dedup_namespace)
+            record_cache("near_duplicate", is_reusable_analysis(cached))
+            if is_reusable_analysis(cached):
+                analysis = {field: cached[field] for field in ANALYSIS_FIELDS}
+                analysis["analysis_mode"] = "near_duplicate"
+                analysis["timestamp"] = datetime.now().isoformat()
+                return json.dumps(analysis)
+
         # Get API key
         api_key = get_api_key()
         if not api_key:
@@ -172,32 +292,40 @@ def analyze_daily_summary(summary_text, context=None, user_gender=None):
             })
         
         # Build prompt and call Gemini
-        prompt = build_summary_analysis_prompt(summary_text, context, user_gender)
-        gemini_response = call_gemini(api_key, prompt)
-        
-        # Clean up the response and try to parse JSON
-        cleaned_response = gemini_response.strip()
-        
-        # Remove markdown code blocks if present
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:]  # Remove ```json
-        if cleaned_response.endswith('```'):
-            cleaned_response = cleaned_response[:-3]  # Remove ```
-        
-        cleaned_response = cleaned_response.strip()
-        
-        # Try to parse the JSON response
-        try:
-            analysis = json.loads(cleaned_response)
-        except json.JSONDecodeError:
-            # If response is not valid JSON, create a structured response
-            analysis = {
-                "summary": cleaned_response,
-                "mood_indicators": "Analysis completed but format unclear",
-                "patterns": "Unable to identify specific patterns",
-                "insights": "Please consider speaking with a mental health professional for personalized advice.",
-                "suggestions": "Continue journaling to track your thoughts and feelings."
-            }
+        if not deadline.allows_call():
+            analysis = build_partial_summary_analysis(previous_analysis)
+            analysis["timestamp"] = datetime.now().isoformat()
+            return json.dumps(analysis)
+        decision = route("daily_summary", summary_text)
+        if incremental:
+            with stage("prompt_build"):
+                prompt = build_incremental_summary_prompt(diff, previous_analysis, user_gender)
+            gemini_response = call_gemini(api_key, prompt, decision.model, decision.reason)
+            if gemini_response.startswith('[ERROR]') and deadline.out_of_time():
+                analysis = build_partial_summary_analysis(previous_analysis)
+                analysis["timestamp"] = datetime.now().isoformat()
+                return json.dumps(analysis)
+            with stage("response_parse"):
+                analysis = parse_summary_response(gemini_response)
+            # Keep the previous value for any field the update left out
+            for field in ANALYSIS_FIELDS:
+                if not analysis.get(field):
+                    analysis[field] = previous_analysis[field]
+            analysis["analysis_mode"] = "unparsed" if analysis["mood_indicators"] == UNPARSED_MOOD else "incremental"
+        else:
+            with stage("prompt_build"):
+                prompt = build_summary_analysis_prompt(summary_text, context, user_gender, prompt_version)
+            gemini_response = call_gemini(api_key, prompt, decision.model, decision.reason)
+            if gemini_response.startswith('[ERROR]') and deadline.out_of_time():
+                analysis = build_partial_summary_analysis(previous_analysis)
+                analysis["timestamp"] = datetime.now().isoformat()
+                return json.dumps(analysis)
+            with stage("response_parse"):
+                analysis = parse_summary_response(gemini_response)
+            analysis["analysis_mode"] = "unparsed" if analysis.get("mood_indicators") == UNPARSED_MOOD else "full"
+            if cacheable and is_reusable_analysis(analysis):
+                dedup_index.add(summary_text, {field: analysis[field] for field in ANALYSIS_FIELDS}, dedup_namespace)
+                save_index(dedup_index)
         
         # Add timestamp
         analysis["timestamp"] = datetime.now().isoformat()
@@ -207,6 +335,7 @@ def analyze_daily_summary(summary_text, context=None, user_gender=None):
     except Exception as e:
         return json.dumps({
             "error": str(e),
+            "analysis_mode": "failed",
             "summary": "Analysis failed",
             "mood_indicators": "Not available",
             "patterns": "Not available",
@@ -215,6 +344,9 @@ def analyze_daily_summary(summary_text, context=None, user_gender=None):
         })
 
 if __name__ == "__main__":
+    record_startup(_STARTED)
+    profile = pop_profile_flag(sys.argv)
+    deadline.install(sys.argv)
     if len(sys.argv) < 2:
         print(json.dumps({"error": "Invalid arguments"}), file=sys.stdout)
         sys.exit(1)
@@ -225,7 +357,8 @@ if __name__ == "__main__":
     context = None
     if len(sys.argv) > 2:
         try:
-            context = json.loads(sys.argv[2])
+            with stage("input_parse"):
+                context = json.loads(sys.argv[2])
         except json.JSONDecodeError:
             # If context is not valid JSON, ignore it
             pass
@@ -235,6 +368,11 @@ if __name__ == "__main__":
     if len(sys.argv) > 3:
         user_gender = sys.argv[3] if sys.argv[3] else None
     
-    result = analyze_daily_summary(summary_text, context, user_gender)
-    print(result, file=sys.stdout)
+    # Previous version of an edited summary, passed through the context
+    previous_text = context.get('previous_summary') if isinstance(context, dict) else None
+    previous_analysis = context.get('previous_analysis') if isinstance(context, dict) else None
+    
+    args = (summary_text, context, user_gender, previous_text, previous_analysis)
+    result = run_profiled(analyze_daily_summary, *args) if profile else analyze_daily_summary(*args)
+    print(attach_timings(result), file=sys.stdout)
     sys.stdout.flush()
@@ -1,16 +1,22 @@
 #!/usr/bin/env python3
+import time
+_STARTED = time.perf_counter()
+
 import os
 import sys
 import json
-import requests
 from datetime import datetime
 from dotenv import load_dotenv
+from gemini_client import MODEL, GeminiHTTPError, generate_content
+from profiling import stage, record_startup, pop_profile_flag, attach_timings, run_profiled
+from prompt_registry import PROMPTS
+from usage_ledger import current_user
+from model_router import route
+from risk_signals import has_high_risk_signal
+import deadline
 
 load_dotenv()
 
-MODEL = "gemini-2.5-flash"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-
 def get_api_key(env_var_name="GOOGLE_API_KEY_1"):
     """Get API key from environment variables."""
     key = os.getenv(env_var_name)
@@ -38,169 +44,151 @@ def extract_text_from_response(resp):
     cleaned = [t.strip() for t in texts if isinstance(t, str) and t.strip()]
     return "\n".join(cleaned).strip()
 
-def call_gemini(api_key, prompt, model=MODEL):
+def call_gemini(api_key, prompt, model=MODEL, rate_limiter=None, route_reason=None):
     """Call the Gemini API and return extracted text."""
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
-    
     try:
-        r = requests.post(url, json=payload, headers=headers, timeout=30)
-        if not r.ok:
-            return f"[ERROR] HTTP {r.status_code}: {r.text}"
-        resp = r.json()
+        resp = generate_content(api_key, prompt, model, timeout=30, rate_limiter=rate_limiter, endpoint="assessment",
+                                route_reason=route_reason)
+    except GeminiHTTPError as e:
+        return f"[ERROR] HTTP {e.status_code}: {e.text}"
     except Exception as e:
         return f"[ERROR] {e}"
     
-    return extract_text_from_response(resp)
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
 
-def build_analysis_prompt(answers, daily_summary=None, user_gender=None):
-    """Build the prompt for mental health analysis."""
-    instruction = (
-        "You are an expert clinical psychologist and mental health AI with 20+ years of experience in daily mental health assessment and crisis intervention. "
-        "Analyze the following daily mental health check-in data and provide a comprehensive, clinically-informed analysis that goes beyond simply restating the data.\n\n"
-        
-        "CLINICAL ANALYSIS FRAMEWORK:\n"
-        "- Apply evidence-based psychological assessment principles and clinical judgment\n"
-        "- Use validated mental health screening criteria (PHQ-9, GAD-7, PSS-10)\n"
-        "- Identify patterns, correlations, and clinical significance in the data\n"
-        "- Consider both immediate concerns and underlying psychological processes\n"
-        "- Provide specific, actionable recommendations based on clinical best practices\n"
-        "- Focus on protective factors, strengths, and areas for intervention\n"
-        "- Avoid simply restating the data - provide meaningful clinical insights\n"
-        "- Consider gender-specific mental health patterns and considerations when relevant\n\n"
-        
-        "DAILY MENTAL HEALTH CHECK-IN DATA:\n\n"
-        
-        "USER DEMOGRAPHICS:\n"
-        f"• Gender: {user_gender if user_gender else 'Not specified'}\n\n"
-        
-        "CORE DAILY METRICS:\n"
-        f"• Mood Today: {answers.get('mood', 'Not specified')}\n"
-        f"• Mood Level (1-10): {answers.get('moodLevel', 'Not specified')} {'(Positive mood)' if answers.get('moodLevel', 0) >= 7 else '(Neutral mood)' if answers.get('moodLevel', 0) >= 4 else '(Low mood)'}\n"
-        f"• Stress Level (1-10): {answers.get('stressLevel', 'Not specified')} {'(High stress)' if answers.get('stressLevel', 0) >= 8 else '(Moderate stress)' if answers.get('stressLevel', 0) >= 5 else '(Low stress)'}\n"
-        f"• Sleep Hours: {answers.get('sleepHours', 'Not specified')} {'(Adequate sleep)' if 7 <= answers.get('sleepHours', 0) <= 9 else '(Sleep concerns)' if answers.get('sleepHours', 0) < 6 or answers.get('sleepHours', 0) > 10 else '(Moderate sleep)'}\n"
-        f"• Sleep Quality: {answers.get('sleepQuality', 'Not specified')}\n"
-        f"• Anxiety Level: {answers.get('anxietyFrequency', 'Not specified')}\n"
-        f"• Energy Level: {answers.get('energyLevel', 'Not specified')}\n"
-        f"• Overwhelm Level: {answers.get('overwhelmedFrequency', 'Not specified')}\n"
-        f"• Social Connection: {answers.get('socialConnection', 'Not specified')}\n"
-        f"• Daily Functioning: {answers.get('dailyFunctioning', 'Not specified')}\n\n"
+def assessment_fields(answers, daily_summary=None, user_gender=None):
+    """Template fields for one check-in, shared by the single and batch prompts."""
+    mood_level = answers.get('moodLevel', 0)
+    stress_level = answers.get('stressLevel', 0)
+    sleep_hours = answers.get('sleepHours', 0)
+    return {
+        "gender": user_gender if user_gender else 'Not specified',
+        "mood": answers.get('mood', 'Not specified'),
+        "mood_level": answers.get('moodLevel', 'Not specified'),
+        "mood_label": '(Positive mood)' if mood_level >= 7 else '(Neutral mood)' if mood_level >= 4 else '(Low mood)',
+        "stress_level": answers.get('stressLevel', 'Not specified'),
+        "stress_label": '(High stress)' if stress_level >= 8 else '(Moderate stress)' if stress_level >= 5 else '(Low stress)',
+        "sleep_hours": answers.get('sleepHours', 'Not specified'),
+        "sleep_label": '(Adequate sleep)' if 7 <= sleep_hours <= 9 else '(Sleep concerns)' if sleep_hours < 6 or sleep_hours > 10 else '(Moderate sleep)',
+        "sleep_quality": answers.get('sleepQuality', 'Not specified'),
+        "anxiety": answers.get('anxietyFrequency', 'Not specified'),
+        "energy": answers.get('energyLevel', 'Not specified'),
+        "overwhelm": answers.get('overwhelmedFrequency', 'Not specified'),
+        "social": answers.get('socialConnection', 'Not specified'),
+        "functioning": answers.get('dailyFunctioning', 'Not specified'),
+        "daily_summary": daily_summary if daily_summary and daily_summary.strip() else ""
+    }
+
+def build_analysis_prompt(answers, daily_summary=None, user_gender=None, version=None):
+    """Build the prompt for mental health analysis from the registered template."""
+    return PROMPTS.render("assessment", key=current_user(), version=version,
+                          **assessment_fields(answers, daily_summary, user_gender))
+
+def build_batch_analysis_prompt(items, version=None):
+    """Build one prompt for several check-ins.
+    items: list of (item_id, answers, daily_summary, user_gender).
+    """
+    return PROMPTS.render(
+        # Keyed by the items so batches are split between versions too
+        "assessment_batch", key=",".join(str(item[0]) for item in items), version=version,
+        item_count=len(items),
+        items=[dict(assessment_fields(answers, daily_summary, user_gender), item_id=item_id)
+               for item_id, answers, daily_summary, user_gender in items]
     )
+
+def validate_analysis(analysis):
+    """Fill in safe defaults for missing or invalid assessment fields."""
+    if 'summary' not in analysis or not analysis['summary']:
+        analysis['summary'] = "Analysis completed but summary not available."
     
-    # Add daily summary if available
-    if daily_summary and daily_summary.strip():
-        instruction += (
-            "PERSONAL REFLECTION (Daily Summary):\n"
-            f'"{daily_summary}"\n\n'
-            "CLINICAL NOTE: This personal reflection provides crucial qualitative data about the user's internal state, "
-            "thoughts, emotions, and experiences. Use this to:\n"
-            "- Identify patterns and themes not captured in structured data\n"
-            "- Understand the user's subjective experience\n"
-            "- Detect subtle warning signs or positive indicators\n"
-            "- Provide more personalized and contextually relevant recommendations\n\n"
-        )
+    if 'riskLevel' not in analysis or analysis['riskLevel'] not in ['Low', 'Medium', 'High']:
+        analysis['riskLevel'] = "Medium"  # Safe default
     
-    instruction += (
-        "CLINICAL CONDITION ASSESSMENT:\n\n"
-        "Evaluate for these clinical presentations:\n"
-        "- Major Depressive Episode: Persistent low mood, anhedonia, sleep disturbances, fatigue, concentration difficulties\n"
-        "- Generalized Anxiety Disorder: Excessive worry, restlessness, fatigue, concentration problems, sleep disturbances\n"
-        "- Mixed Anxiety-Depressive Disorder: Combination of anxiety and depressive symptoms without meeting full criteria for either\n"
-        "- Adjustment Disorder: Emotional or behavioral symptoms in response to identifiable stressors\n"
-        "- Sleep Disorders: Insomnia, hypersomnia, or circadian rhythm disturbances affecting daily functioning\n"
-        "- Social Anxiety Disorder: Fear of social situations, avoidance behaviors, significant distress\n"
-        "- Acute Stress Reaction: Symptoms following exposure to traumatic or stressful events\n"
-        "- Burnout Syndrome: Emotional exhaustion, depersonalization, reduced personal accomplishment\n\n"
-        
-        "CONDITION-SPECIFIC ANALYSIS CRITERIA:\n\n"
-        "DEPRESSION & MOOD DISORDERS:\n"
-        "- Major Depression: Persistent sadness, loss of interest, fatigue, concentration issues, suicidal thoughts\n"
-        "- Bipolar Disorder: Mood swings, periods of mania/hypomania alternating with depression\n"
-        "- Seasonal Affective Disorder: Depression related to seasonal changes\n"
-        "- Gender Considerations: Women may experience more somatic symptoms, men may show more irritability and anger\n\n"
-        
-        "ANXIETY DISORDERS:\n"
-        "- Generalized Anxiety: Excessive worry, restlessness, fatigue, concentration issues\n"
-        "- Panic Disorder: Recurrent panic attacks, fear of future attacks\n"
-        "- Social Anxiety: Fear of social situations, avoidance behaviors\n"
-        "- Phobias: Specific fears causing significant distress\n"
-        "- Gender Considerations: Women are twice as likely to experience anxiety disorders; consider hormonal influences\n\n"
-        
-        "TRAUMA & STRESS DISORDERS:\n"
-        "- PTSD: Trauma exposure, flashbacks, nightmares, hypervigilance, avoidance\n"
-        "- Acute Stress Disorder: Similar to PTSD but shorter duration\n"
-        "- Adjustment Disorder: Difficulty coping with life changes\n\n"
-        
-        "EATING DISORDERS:\n"
-        "- Anorexia: Restriction, body image distortion, fear of weight gain\n"
-        "- Bulimia: Binge eating followed by compensatory behaviors\n"
-        "- Binge Eating: Recurrent episodes of overeating without compensation\n"
-        "- Gender Considerations: More common in women, but men may present differently (muscle dysmorphia)\n\n"
-        
-        "ATTENTION & NEURODEVELOPMENTAL:\n"
-        "- ADHD: Inattention, hyperactivity, impulsivity affecting daily functioning\n"
-        "- Learning Disabilities: Academic difficulties despite normal intelligence\n"
-        "- Gender Considerations: ADHD may present differently in women (more inattentive type)\n\n"
-        
-        "SUBSTANCE USE DISORDERS:\n"
-        "- Alcohol Use Disorder: Problematic alcohol consumption\n"
-        "- Drug Use Disorder: Problematic use of substances\n"
-        "- Dependence: Physical or psychological dependence on substances\n"
-        "- Gender Considerations: Men more likely to use substances, women may progress faster to dependence\n\n"
-        
-        "SLEEP DISORDERS:\n"
-        "- Insomnia: Difficulty falling or staying asleep\n"
-        "- Sleep Apnea: Breathing interruptions during sleep\n"
-        "- Circadian Rhythm Disorders: Sleep-wake cycle disruptions\n"
-        "- Gender Considerations: Women more likely to experience insomnia, men more likely to have sleep apnea\n\n"
-        
-        "RISK ASSESSMENT CRITERIA:\n"
-        "HIGH RISK: Suicidal ideation, self-harm, severe depression, psychosis, substance abuse, crisis situations, severe functional impairment\n"
-        "MEDIUM RISK: Persistent anxiety, moderate depression, sleep disturbances, social withdrawal, stress overload, moderate functional impairment\n"
-        "LOW RISK: Mild symptoms, good coping strategies, stable mood, adequate sleep, manageable stress, good functional capacity\n\n"
-        
-        "REQUIRED OUTPUT FORMAT (JSON only, no markdown):\n"
-        "{\n"
-        '  "summary": "Provide a clinical assessment of the mental health condition (3-4 sentences). Focus on the clinical presentation, diagnostic indicators, and functional impact. Do NOT reference specific scores or responses. Example: \'The clinical presentation indicates symptoms consistent with major depressive episode, characterized by persistent low mood, anhedonia, and significant functional impairment. The presence of sleep disturbances, social withdrawal, and cognitive difficulties suggests moderate to severe depression requiring professional intervention. The combination of mood symptoms with anxiety features may indicate a mixed anxiety-depressive disorder or comorbid conditions. Early intervention is recommended to prevent further deterioration and improve prognosis.\'",\n'
-        '  "riskLevel": "Low/Medium/High - Based on clinical presentation, symptom severity, functional impairment, and risk factors. Do not reference specific scores.",\n'
-        '  "recommendations": "Provide 4-6 clinical recommendations for treatment and management. Include: 1) Immediate interventions, 2) Professional treatment options, 3) Therapeutic approaches, 4) Monitoring and follow-up. Focus on evidence-based treatments and clinical best practices."\n'
-        "}\n\n"
-        
-        "ANALYSIS GUIDELINES:\n"
-        "- Provide a clinical assessment of the mental health condition, not a restatement of responses\n"
-        "- Focus on diagnostic indicators, symptom clusters, and clinical presentation\n"
-        "- Use professional clinical terminology and diagnostic criteria\n"
-        "- Assess functional impairment and quality of life impact\n"
-        "- Identify potential diagnoses or clinical conditions\n"
-        "- Consider differential diagnoses and comorbid conditions\n"
-        "- Evaluate severity and acuity of symptoms\n"
-        "- Assess risk factors and protective factors\n"
-        "- Provide evidence-based treatment recommendations\n"
-        "- DO NOT reference specific scores, numbers, or user responses\n"
-        "- DO NOT use phrases like 'your responses show' or 'based on your answers'\n"
-        "- Focus on the clinical condition and its implications\n\n"
-        
-        "CLINICAL ASSESSMENT APPROACH:\n"
-        "- Analyze symptom patterns and clusters\n"
-        "- Evaluate functional impairment across domains\n"
-        "- Assess risk level based on clinical criteria\n"
-        "- Consider differential diagnoses\n"
-        "- Provide treatment recommendations based on clinical presentation\n"
-        "- Use DSM-5 criteria and clinical best practices\n\n"
-        
-        "CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure."
-    )
-    return instruction
+    if 'recommendations' not in analysis or not analysis['recommendations']:
+        analysis['recommendations'] = "Please consider speaking with a mental health professional for personalized advice."
+    return analysis
+
+def parse_analysis_response(gemini_response):
+    """Clean up a Gemini response and parse it into a validated analysis dict."""
+    cleaned_response = gemini_response.strip()
+    
+    # Remove markdown code blocks if present
+    if cleaned_response.startswith('```json'):
+        cleaned_response = cleaned_response[7:]  # Remove ```json
+    if cleaned_response.startswith('```'):
+        cleaned_response = cleaned_response[3:]  # Remove ```
+    if cleaned_response.endswith('```'):
+        cleaned_response = cleaned_response[:-3]  # Remove ```
+    
+    cleaned_response = cleaned_response.strip()
+    
+    # Try to parse the JSON response
+    try:
+        analysis = validate_analysis(json.loads(cleaned_response))
+            
+    except json.JSONDecodeError as e:
+        # Diagnostics go to stderr so stdout stays a single JSON document
+        print(f"JSON parsing error: {e}", file=sys.stderr)
+        print(f"Response was: {cleaned_response[:200]}...", file=sys.stderr)
+        
+        # If response is not valid JSON, create a structured response
+        analysis = {
+            "summary": f"Analysis completed. Raw response: {cleaned_response[:200]}...",
+            "riskLevel": "Medium",  # Default when we can't parse
+            "recommendations": "Please consider speaking with a mental health professional for personalized advice."
+        }
+    
+    return analysis
+
+def parse_batch_analysis_response(gemini_response, item_ids):
+    """Parse a batch response into {item_id: analysis}, keeping only complete, valid entries."""
+    cleaned_response = gemini_response.strip()
+    if cleaned_response.startswith('```json'):
+        cleaned_response = cleaned_response[7:]
+    if cleaned_response.startswith('```'):
+        cleaned_response = cleaned_response[3:]
+    if cleaned_response.endswith('```'):
+        cleaned_response = cleaned_response[:-3]
+    try:
+        entries = json.loads(cleaned_response.strip())
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(entries, list):
+        return {}
+
+    wanted = set(item_ids)
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        item_id = str(entry.get('id'))
+        # Anything incomplete is re-run individually rather than patched with defaults
+        if (item_id in wanted and item_id not in results
+                and entry.get('summary') and entry.get('recommendations')
+                and entry.get('riskLevel') in ['Low', 'Medium', 'High']):
+            results[item_id] = {field: entry[field] for field in ('summary', 'riskLevel', 'recommendations')}
+    return results
+
+def build_partial_analysis(answers, daily_summary=None):
+    """Preliminary analysis from local risk signals, for when there is no time left for Gemini."""
+    return {
+        "summary": "A full analysis could not be completed in time. This preliminary result is based on your answers only.",
+        "riskLevel": "High" if has_high_risk_signal(answers, daily_summary) else "Medium",
+        "recommendations": "Please consider speaking with a mental health professional for personalized advice.",
+        "partial": True
+    }
 
 def analyze_mental_health(analysis_data_json):
     """Main function to analyze mental health data."""
     try:
         # Parse the input JSON
-        analysis_data = json.loads(analysis_data_json)
+        with stage("input_parse"):
+            analysis_data = json.loads(analysis_data_json)
         answers = analysis_data.get('answers', {})
         daily_summary = analysis_data.get('dailySummary', None)
         user_gender = analysis_data.get('userGender', None)
+        deadline.set_deadline(analysis_data.get('deadline'))
         
         # Get API key
         api_key = get_api_key()
@@ -213,46 +201,20 @@ def analyze_mental_health(analysis_data_json):
             })
         
         # Build prompt and call Gemini
-        prompt = build_analysis_prompt(answers, daily_summary, user_gender)
-        gemini_response = call_gemini(api_key, prompt)
-        
-        # Clean up the response and try to parse JSON
-        cleaned_response = gemini_response.strip()
-        
-        # Remove markdown code blocks if present
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:]  # Remove ```json
-        if cleaned_response.startswith('```'):
-            cleaned_response = cleaned_response[3:]  # Remove ```
-        if cleaned_response.endswith('```'):
-            cleaned_response = cleaned_response[:-3]  # Remove ```
-        
-        cleaned_response = cleaned_response.strip()
-        
-        # Try to parse the JSON response
-        try:
-            analysis = json.loads(cleaned_response)
-            
-            # Validate required fields and provide defaults if missing
-            if 'summary' not in analysis or not analysis['summary']:
-                analysis['summary'] = "Analysis completed but summary not available."
-            
-            if 'riskLevel' not in analysis or analysis['riskLevel'] not in ['Low', 'Medium', 'High']:
-                analysis['riskLevel'] = "Medium"  # Safe default
-            
-            if 'recommendations' not in analysis or not analysis['recommendations']:
-                analysis['recommendations'] = "Please consider speaking with a mental health professional for personalized advice."
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Response was: {cleaned_response[:200]}...")
-            
-            # If response is not valid JSON, create a structured response
-            analysis = {
-                "summary": f"Analysis completed. Raw response: {cleaned_response[:200]}...",
-                "riskLevel": "Medium",  # Default when we can't parse
-                "recommendations": "Please consider speaking with a mental health professional for personalized advice."
-            }
+        if not deadline.allows_call():
+            analysis = build_partial_analysis(answers, daily_summary)
+            analysis["timestamp"] = datetime.now().isoformat()
+            return json.dumps(analysis)
+        with stage("prompt_build"):
+            prompt = build_analysis_prompt(answers, daily_summary, user_gender)
+        decision = route("assessment", daily_summary or "", answers)
+        gemini_response = call_gemini(api_key, prompt, decision.model, route_reason=decision.reason)
+        
+        with stage("response_parse"):
+            if gemini_response.startswith('[ERROR]') and deadline.out_of_time():
+                analysis = build_partial_analysis(answers, daily_summary)
+            else:
+                analysis = parse_analysis_response(gemini_response)
         
         # Add timestamp
         analysis["timestamp"] = datetime.now().isoformat()
@@ -268,11 +230,14 @@ def analyze_mental_health(analysis_data_json):
         })
 
 if __name__ == "__main__":
+    record_startup(_STARTED)
+    profile = pop_profile_flag(sys.argv)
+    deadline.install(sys.argv)
     if len(sys.argv) != 2:
         print(json.dumps({"error": "Invalid arguments"}), file=sys.stdout)
         sys.exit(1)
     
     answers_json = sys.argv[1]
-    result = analyze_mental_health(answers_json)
-    print(result, file=sys.stdout)
+    result = run_profiled(analyze_mental_health, answers_json) if profile else analyze_mental_health(answers_json)
+    print(attach_timings(result), file=sys.stdout)
     sys.stdout.flush()
@@ -2,21 +2,40 @@
 """
 Weekly and Monthly Mental Health Analytics
 This script analyzes multiple assessments and daily summaries to provide comprehensive health insights.
+
+With period "both" the input is a month's data plus the weekly and monthly
+ranges; both periods' statistics come from one pass over it and their two
+Gemini calls run concurrently.
+
+Instead of inlined assessments and summaries, the input may name a "source"
+({"userId", "start", "end", "pageSize"}); the data is then read page by page
+from the databases through analytics_sources.py.
 """
 
+import time
+_STARTED = time.perf_counter()
+
 import os
 import sys
 import json
 import requests
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import statistics
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from gemini_client import MODEL, GeminiHTTPError, generate_content
+from profiling import TIMINGS, stage, record_startup, pop_profile_flag, attach_timings, run_profiled
+from prompt_registry import PROMPTS
+from usage_ledger import current_user
+from model_router import route
+from assessment_scales import ENERGY_MAP
+from summary_retrieval import (MAX_ANOMALIES, is_anomalous, assessment_date, assessment_note, select_summaries,
+                               load_summary_index, save_summary_index)
+from analytics_sources import AnalyticsReader
+import deadline
 
 load_dotenv()
 
-MODEL = "gemini-2.5-flash"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-
 def get_api_key(env_var_name="GOOGLE_API_KEY_1"):
     """Get API key from environment variables."""
     key = os.getenv(env_var_name)
@@ -46,15 +65,10 @@ def extract_text_from_response(resp):
 
 def call_gemini(api_key, prompt, model=MODEL):
     """Call the Gemini API and return extracted text."""
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
-    
     try:
-        r = requests.post(url, json=payload, headers=headers, timeout=60)
-        if not r.ok:
-            return f"[ERROR] HTTP {r.status_code}: {r.text}"
-        resp = r.json()
+        resp = generate_content(api_key, prompt, model, timeout=60, endpoint="analytics")
+    except GeminiHTTPError as e:
+        return f"[ERROR] HTTP {e.status_code}: {e.text}"
     except requests.exceptions.Timeout:
         return f"[ERROR] Request timeout - API took too long to respond"
     except requests.exceptions.ConnectionError:
@@ -62,227 +76,423 @@ def call_gemini(api_key, prompt, model=MODEL):
     except Exception as e:
         return f"[ERROR] {e}"
     
-    return extract_text_from_response(resp)
-
-def calculate_trends(assessments):
-    """Calculate trends from assessment data."""
-    if len(assessments) < 2:
-        return {
-            "moodTrend": "Insufficient data",
-            "stressTrend": "Insufficient data", 
-            "sleepTrend": "Insufficient data",
-            "energyTrend": "Insufficient data"
-        }
-    
-    # Extract data points
-    mood_levels = [a['answers'].get('moodLevel', 5) for a in assessments]
-    stress_levels = [a['answers'].get('stressLevel', 5) for a in assessments]
-    sleep_hours = [a['answers'].get('sleepHours', 8) for a in assessments]
-    energy_levels = [a['answers'].get('energyLevel', 'Moderate') for a in assessments]
-    
-    # Convert energy levels to numbers for trend calculation
-    energy_map = {'Very low': 1, 'Low': 2, 'Moderate': 3, 'High': 4, 'Very high': 5}
-    energy_nums = [energy_map.get(e, 3) for e in energy_levels]
-    
-    def calculate_trend(values):
-        if len(values) < 2:
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
+
+PROMPT_ASSESSMENT_LIMIT = 10  # Assessments detailed in the prompt
+PROMPT_SUMMARY_LIMIT = 5      # Daily summaries quoted in the prompt
+PROMPT_SUMMARY_TOKENS = 600   # Prompt tokens the quoted summaries may use
+PERIODS = ("weekly", "monthly")
+
+class _SeriesAccumulator:
+    """Running mean, min, max and least-squares slope of a series against its index."""
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0
+        self.weighted_total = 0  # Sum of index * value
+        self.low = None
+        self.high = None
+
+    def add(self, value):
+        self.weighted_total += self.n * value
+        self.n += 1
+        self.total += value
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+
+    def mean(self):
+        # statistics.mean returns an int for integer series with a whole mean
+        if isinstance(self.total, int) and self.total % self.n == 0:
+            return self.total // self.n
+        return self.total / self.n
+
+    def trend(self):
+        if self.n < 2:
             return "Insufficient data"
-        
-        # Simple linear trend calculation
-        n = len(values)
-        x = list(range(n))
-        y = values
-        
-        # Calculate slope
-        x_mean = sum(x) / n
-        y_mean = sum(y) / n
-        
-        numerator = sum((x[i] - x_mean) * (y[i] - y_mean) for i in range(n))
-        denominator = sum((x[i] - x_mean) ** 2 for i in range(n))
-        
+
+        # Closed-form sums over the indices 0..n-1 keep integer series exact
+        n = self.n
+        x_total = n * (n - 1) // 2
+        x_square_total = (n - 1) * n * (2 * n - 1) // 6
+        denominator = n * x_square_total - x_total ** 2
         if denominator == 0:
             return "No change"
-        
-        slope = numerator / denominator
-        
+
+        slope = (n * self.weighted_total - x_total * self.total) / denominator
         if slope > 0.1:
             return "Improving"
         elif slope < -0.1:
             return "Declining"
         else:
             return "Stable"
-    
-    return {
-        "moodTrend": calculate_trend(mood_levels),
-        "stressTrend": calculate_trend(stress_levels),
-        "sleepTrend": calculate_trend(sleep_hours),
-        "energyTrend": calculate_trend(energy_nums)
-    }
+
+class AssessmentAccumulator:
+    """Statistics, trends and prompt samples gathered in a single pass over assessments.
+
+    Memory stays constant however long the history is: only running sums, the
+    risk level counts, the first PROMPT_ASSESSMENT_LIMIT assessments and up to
+    MAX_ANOMALIES (date, note) pairs of anomalous check-ins are kept. With a
+    summary index, each assessment's notes are also added to it as they pass.
+    """
+
+    def __init__(self, index=None):
+        self.mood = _SeriesAccumulator()
+        self.stress = _SeriesAccumulator()
+        self.sleep = _SeriesAccumulator()
+        self.energy = _SeriesAccumulator()
+        self.risk_counts = {}
+        self.sample = []
+        self.anomalies = []
+        self.index = index
+
+    def add(self, assessment):
+        answers = assessment['answers']
+        self.mood.add(answers.get('moodLevel', 5))
+        self.stress.add(answers.get('stressLevel', 5))
+        self.sleep.add(answers.get('sleepHours', 8))
+        self.energy.add(ENERGY_MAP.get(answers.get('energyLevel', 'Moderate'), 3))
+
+        risk = assessment['aiAnalysis'].get('riskLevel', 'Medium')
+        self.risk_counts[risk] = self.risk_counts.get(risk, 0) + 1
+
+        if len(self.sample) < PROMPT_ASSESSMENT_LIMIT:
+            self.sample.append(assessment)
+
+        if len(self.anomalies) < MAX_ANOMALIES and is_anomalous(assessment):
+            self.anomalies.append((assessment_date(assessment), assessment_note(assessment)))
+        if self.index is not None:
+            self.index.add_note(assessment)
+
+    def consume(self, assessments):
+        for assessment in assessments:
+            self.add(assessment)
+        return self
+
+    def statistics(self):
+        if not self.mood.n:
+            return {}
+
+        return {
+            "averageMood": round(self.mood.mean(), 1),
+            "averageStress": round(self.stress.mean(), 1),
+            "averageSleep": round(self.sleep.mean(), 1),
+            "moodRange": f"{self.mood.low}-{self.mood.high}",
+            "stressRange": f"{self.stress.low}-{self.stress.high}",
+            "sleepRange": f"{self.sleep.low:.1f}-{self.sleep.high:.1f}",
+            "riskDistribution": dict(self.risk_counts),
+            "totalAssessments": self.mood.n
+        }
+
+    def trends(self):
+        if self.mood.n < 2:
+            return {
+                "moodTrend": "Insufficient data",
+                "stressTrend": "Insufficient data",
+                "sleepTrend": "Insufficient data",
+                "energyTrend": "Insufficient data"
+            }
+
+        return {
+            "moodTrend": self.mood.trend(),
+            "stressTrend": self.stress.trend(),
+            "sleepTrend": self.sleep.trend(),
+            "energyTrend": self.energy.trend()
+        }
+
+def summarize_assessments(assessments):
+    """Consume an iterable of assessments once. Returns (stats, trends, prompt sample)."""
+    accumulator = AssessmentAccumulator().consume(assessments)
+    return accumulator.statistics(), accumulator.trends(), accumulator.sample
+
+def iter_assessments_file(path):
+    """Yield assessments from a JSONL file one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def calculate_trends(assessments):
+    """Calculate trends from assessment data."""
+    return AssessmentAccumulator().consume(assessments).trends()
 
 def calculate_statistics(assessments):
     """Calculate basic statistics from assessments."""
-    if not assessments:
-        return {}
-    
-    mood_levels = [a['answers'].get('moodLevel', 5) for a in assessments]
-    stress_levels = [a['answers'].get('stressLevel', 5) for a in assessments]
-    sleep_hours = [a['answers'].get('sleepHours', 8) for a in assessments]
-    
-    # Risk level distribution
-    risk_levels = [a['aiAnalysis'].get('riskLevel', 'Medium') for a in assessments]
-    risk_counts = {}
-    for risk in risk_levels:
-        risk_counts[risk] = risk_counts.get(risk, 0) + 1
-    
+    return AssessmentAccumulator().consume(assessments).statistics()
+
+def period_bounds(bounds):
+    """((start, end) Unix seconds, (start, end) dates) of a {"start", "end"} range; missing sides are open.
+
+    Dates are the YYYY-MM-DD prefixes daily summaries are matched on, as in the
+    backend's queries. A date-only end covers the whole day.
+    """
+    bounds = bounds or {}
+    start, end = bounds.get('start'), bounds.get('end')
+    start_seconds = deadline.parse_deadline(start)
+    end_seconds = deadline.parse_deadline(end)
+    if isinstance(end, str) and len(end) == 10:
+        end_seconds += 86400 - 0.001
+    return ((start_seconds, end_seconds),
+            (str(start)[:10] if start else None, str(end)[:10] if end else None))
+
+def in_bounds(value, bounds):
+    start, end = bounds
+    return (start is None or value >= start) and (end is None or value <= end)
+
+def current_week_range(now=None):
+    """Monday to Sunday of the current week, the default weekly range."""
+    now = now or datetime.now()
+    monday = (now - timedelta(days=now.weekday())).date()
+    return {"start": monday.isoformat(), "end": (monday + timedelta(days=6)).isoformat()}
+
+def split_periods(assessments, summaries, ranges, index=None):
+    """Per-period accumulators and summaries from one pass over the data.
+
+    An assessment feeds every period whose range holds its createdAt, and its
+    notes go to the summary index once. Returns ({period: accumulator},
+    {period: summaries}).
+    """
+    ranges = ranges or {}
+    bounds = {period: period_bounds(ranges.get(period) or (current_week_range() if period == "weekly" else None))
+              for period in PERIODS}
+    accumulators = {period: AssessmentAccumulator() for period in PERIODS}
+    for assessment in assessments:
+        try:
+            created = deadline.parse_deadline(assessment.get('createdAt'))
+        except (TypeError, ValueError):
+            created = None
+        for period in PERIODS:
+            if created is not None and in_bounds(created, bounds[period][0]):
+                accumulators[period].add(assessment)
+        if index is not None:
+            index.add_note(assessment)
+    period_summaries = {period: [s for s in summaries or [] if in_bounds(str(s.get('date', '')), bounds[period][1])]
+                        for period in PERIODS}
+    return accumulators, period_summaries
+
+def build_analytics_prompt(assessments, summaries, period, stats, trends, user_gender=None, version=None,
+                           anomalies=None, summary_index=None):
+    """Build the prompt for weekly/monthly analysis from the registered template.
+
+    The quoted daily summaries are the ones most relevant to risk terms and
+    the period's `anomalies` that fit PROMPT_SUMMARY_TOKENS, ranked with the
+    user's `summary_index` when given.
+    """
+    days = []
+    for i, assessment in enumerate(islice(assessments, PROMPT_ASSESSMENT_LIMIT)):  # Limit for prompt length
+        answers = assessment.get('answers', {})
+        days.append({
+            "index": i + 1,
+            "date": assessment.get('createdAt', 'Unknown date').split('T')[0],
+            "mood": answers.get('mood', 'N/A'),
+            "mood_level": answers.get('moodLevel', 'N/A'),
+            "stress_level": answers.get('stressLevel', 'N/A'),
+            "sleep_hours": answers.get('sleepHours', 'N/A'),
+            "sleep_quality": answers.get('sleepQuality', 'N/A'),
+            "energy": answers.get('energyLevel', 'N/A'),
+            "anxiety": answers.get('anxietyFrequency', 'N/A'),
+            "overwhelm": answers.get('overwhelmedFrequency', 'N/A'),
+            "social": answers.get('socialConnection', 'N/A'),
+            "functioning": answers.get('dailyFunctioning', 'N/A'),
+            "risk_level": assessment.get('aiAnalysis', {}).get('riskLevel', 'Unknown')
+        })
+
+    return PROMPTS.render(
+        "analytics", key=current_user(), version=version,
+        period=period,
+        period_upper=period.upper(),
+        gender=user_gender if user_gender else 'Not specified',
+        total_assessments=stats.get('totalAssessments', 0),
+        average_mood=stats.get('averageMood', 'N/A'),
+        average_stress=stats.get('averageStress', 'N/A'),
+        average_sleep=stats.get('averageSleep', 'N/A'),
+        mood_range=stats.get('moodRange', 'N/A'),
+        stress_range=stats.get('stressRange', 'N/A'),
+        sleep_range=stats.get('sleepRange', 'N/A'),
+        risk_distribution=stats.get('riskDistribution', {}),
+        mood_trend=trends.get('moodTrend', 'Unknown'),
+        stress_trend=trends.get('stressTrend', 'Unknown'),
+        sleep_trend=trends.get('sleepTrend', 'Unknown'),
+        energy_trend=trends.get('energyTrend', 'Unknown'),
+        days=days,
+        summary_count=len(summaries) if summaries else 0,
+        summaries=[{"summary_date": summary.get('date', 'Unknown date'),
+                    "summary_text": summary.get('summary', 'No summary')}
+                   for summary in select_summaries(summaries or [], anomalies, summary_index,
+                                                   PROMPT_SUMMARY_LIMIT, PROMPT_SUMMARY_TOKENS)]
+    )
+
+def build_statistical_analysis(period, trends):
+    """Analysis from the local statistics alone, used when Gemini is unavailable."""
     return {
-        "averageMood": round(statistics.mean(mood_levels), 1),
-        "averageStress": round(statistics.mean(stress_levels), 1),
-        "averageSleep": round(statistics.mean(sleep_hours), 1),
-        "moodRange": f"{min(mood_levels)}-{max(mood_levels)}",
-        "stressRange": f"{min(stress_levels)}-{max(stress_levels)}",
-        "sleepRange": f"{min(sleep_hours):.1f}-{max(sleep_hours):.1f}",
-        "riskDistribution": risk_counts,
-        "totalAssessments": len(assessments)
+        "summary": f"{period.title()} analysis completed with limited functionality",
+        "trends": f"Basic trend analysis: Mood {trends.get('moodTrend', 'Unknown')}, Stress {trends.get('stressTrend', 'Unknown')}",
+        "insights": "AI analysis unavailable - using basic statistical analysis",
+        "recommendations": "Continue taking daily assessments and consider consulting a mental health professional",
+        "riskLevel": "Medium",  # Safe default
+        "moodTrend": trends.get('moodTrend', 'Unknown'),
+        "stressTrend": trends.get('stressTrend', 'Unknown'),
+        "sleepTrend": trends.get('sleepTrend', 'Unknown'),
+        "energyTrend": trends.get('energyTrend', 'Unknown')
     }
 
-def build_analytics_prompt(assessments, summaries, period, stats, trends, user_gender=None):
-    """Build the prompt for weekly/monthly analysis."""
+def build_empty_analysis(period):
+    """Analysis of a period without assessments, matching the backend's own placeholder."""
+    unit = "week" if period == "weekly" else "month"
+    return {
+        "summary": f"No assessments available for this {unit}.",
+        "trends": "No data to analyze.",
+        "insights": f"Start taking daily assessments to see your {period} health trends.",
+        "recommendations": "Consider taking daily mental health assessments to track your progress.",
+        "riskLevel": "Unknown",
+        "moodTrend": "No data",
+        "stressTrend": "No data",
+        "sleepTrend": "No data",
+        "energyTrend": "No data"
+    }
+
+def parse_analytics_response(gemini_response, period, trends):
+    """Clean up a Gemini response and parse it into an analytics dict, filling missing fields."""
+    cleaned_response = gemini_response.strip()
     
-    period_name = "week" if period == "weekly" else "month"
-    period_plural = "weeks" if period == "weekly" else "months"
+    # Remove markdown code blocks if present
+    if cleaned_response.startswith('```json'):
+        cleaned_response = cleaned_response[7:]  # Remove ```json
+    if cleaned_response.startswith('```'):
+        cleaned_response = cleaned_response[3:]  # Remove ```
+    if cleaned_response.endswith('```'):
+        cleaned_response = cleaned_response[:-3]  # Remove ```
     
-    instruction = f"""You are an expert clinical psychologist and mental health AI with 20+ years of experience in longitudinal mental health assessment and trend analysis. Analyze the following {period} mental health data and provide comprehensive insights about patterns, trends, and recommendations.
-
-CLINICAL ANALYSIS FRAMEWORK:
-- Apply evidence-based psychological assessment principles for longitudinal analysis
-- Identify patterns, trends, and correlations across the {period}
-- Consider both individual daily variations and overall {period}ly patterns
-- Provide specific, actionable recommendations based on observed trends
-- Focus on protective factors, areas of concern, and intervention opportunities
-- Use clinical judgment to assess overall mental health trajectory
-- Consider gender-specific mental health patterns and considerations when relevant
-
-{period.upper()} MENTAL HEALTH DATA:
-
-USER DEMOGRAPHICS:
-• Gender: {user_gender if user_gender else 'Not specified'}
-
-
-ASSESSMENT STATISTICS:
-• Total Assessments: {stats.get('totalAssessments', 0)}
-• Average Mood Level: {stats.get('averageMood', 'N/A')}/10
-• Average Stress Level: {stats.get('averageStress', 'N/A')}/10
-• Average Sleep Hours: {stats.get('averageSleep', 'N/A')} hours
-• Mood Range: {stats.get('moodRange', 'N/A')}
-• Stress Range: {stats.get('stressRange', 'N/A')}
-• Sleep Range: {stats.get('sleepRange', 'N/A')} hours
-• Risk Level Distribution: {stats.get('riskDistribution', {})}
-
-TREND ANALYSIS:
-• Mood Trend: {trends.get('moodTrend', 'Unknown')}
-• Stress Trend: {trends.get('stressTrend', 'Unknown')}
-• Sleep Trend: {trends.get('sleepTrend', 'Unknown')}
-• Energy Trend: {trends.get('energyTrend', 'Unknown')}
-
-DAILY ASSESSMENT DETAILS:
-"""
-
-    # Add assessment details
-    for i, assessment in enumerate(assessments[:10]):  # Limit to first 10 for prompt length
-        date = assessment.get('createdAt', 'Unknown date')
-        answers = assessment.get('answers', {})
-        ai_analysis = assessment.get('aiAnalysis', {})
+    cleaned_response = cleaned_response.strip()
+    
+    # Try to parse the JSON response
+    try:
+        analysis = json.loads(cleaned_response)
         
-        instruction += f"""
-Day {i+1} ({date.split('T')[0]}):
-• Mood: {answers.get('mood', 'N/A')} (Level: {answers.get('moodLevel', 'N/A')}/10)
-• Stress: {answers.get('stressLevel', 'N/A')}/10
-• Sleep: {answers.get('sleepHours', 'N/A')} hours ({answers.get('sleepQuality', 'N/A')})
-• Energy: {answers.get('energyLevel', 'N/A')}
-• Anxiety: {answers.get('anxietyFrequency', 'N/A')}
-• Overwhelm: {answers.get('overwhelmedFrequency', 'N/A')}
-• Social Connection: {answers.get('socialConnection', 'N/A')}
-• Daily Functioning: {answers.get('dailyFunctioning', 'N/A')}
-• Risk Level: {ai_analysis.get('riskLevel', 'Unknown')}
-"""
+        # Validate required fields and provide defaults if missing
+        required_fields = ['summary', 'trends', 'insights', 'recommendations', 'riskLevel']
+        for field in required_fields:
+            if field not in analysis or not analysis[field]:
+                if field == 'summary':
+                    analysis[field] = f"Analysis completed for the {period}."
+                elif field == 'trends':
+                    analysis[field] = "Trend analysis completed."
+                elif field == 'insights':
+                    analysis[field] = "Please continue monitoring your mental health."
+                elif field == 'recommendations':
+                    analysis[field] = "Continue taking daily assessments."
+                elif field == 'riskLevel':
+                    analysis[field] = "Medium"
+        
+        # Ensure trend fields are present
+        trend_fields = ['moodTrend', 'stressTrend', 'sleepTrend', 'energyTrend']
+        for field in trend_fields:
+            if field not in analysis:
+                analysis[field] = trends.get(field, 'Unknown')
+            
+    except json.JSONDecodeError as e:
+        # Diagnostics go to stderr so stdout stays a single JSON document
+        print(f"JSON parsing error: {e}", file=sys.stderr)
+        print(f"Response was: {cleaned_response[:200]}...", file=sys.stderr)
+        
+        # If response is not valid JSON, create a structured response
+        analysis = {
+            "summary": f"Analysis completed for the {period}. Raw response: {cleaned_response[:200]}...",
+            "trends": "Trend analysis completed.",
+            "insights": "Please continue monitoring your mental health.",
+            "recommendations": "Continue taking daily assessments.",
+            "riskLevel": "Medium",
+            "moodTrend": trends.get('moodTrend', 'Unknown'),
+            "stressTrend": trends.get('stressTrend', 'Unknown'),
+            "sleepTrend": trends.get('sleepTrend', 'Unknown'),
+            "energyTrend": trends.get('energyTrend', 'Unknown')
+        }
 
-    # Add daily summaries if available
-    if summaries:
-        instruction += f"\nDAILY SUMMARIES ({len(summaries)} entries):\n"
-        for summary in summaries[:5]:  # Limit to first 5 summaries
-            date = summary.get('date', 'Unknown date')
-            summary_text = summary.get('summary', 'No summary')
-            instruction += f"\n{date}: {summary_text}\n"
-
-    instruction += f"""
-
-CLINICAL TREND ANALYSIS CRITERIA:
-
-MOOD PATTERNS:
-- Improving: Consistent upward trend in mood levels
-- Declining: Consistent downward trend in mood levels  
-- Stable: Minimal variation in mood levels
-- Volatile: High variability with no clear trend
-
-STRESS PATTERNS:
-- Improving: Decreasing stress levels over time
-- Declining: Increasing stress levels over time
-- Stable: Consistent stress levels
-- Volatile: High variability in stress levels
-
-SLEEP PATTERNS:
-- Improving: Increasing sleep hours and quality
-- Declining: Decreasing sleep hours and quality
-- Stable: Consistent sleep patterns
-- Volatile: High variability in sleep duration
-
-ENERGY PATTERNS:
-- Improving: Increasing energy levels
-- Declining: Decreasing energy levels
-- Stable: Consistent energy levels
-- Volatile: High variability in energy
-
-RISK ASSESSMENT:
-- Low Risk: Predominantly low risk assessments, stable or improving trends
-- Medium Risk: Mixed risk levels, some concerning patterns
-- High Risk: Predominantly high risk assessments, declining trends
-
-REQUIRED OUTPUT FORMAT (JSON only, no markdown):
-{{
-  "summary": "Provide a comprehensive {period}ly mental health summary (4-5 sentences). Focus on overall patterns, key trends, and clinical significance. Example: 'Over the past {period}, your mental health shows [trend description]. Key patterns include [specific patterns]. The data suggests [clinical insights]. Overall, [assessment of progress/concerns].'",
-  "trends": "Detailed analysis of specific trends observed (3-4 sentences). Focus on mood, stress, sleep, and energy patterns. Identify any concerning or positive patterns.",
-  "insights": "Clinical insights and observations (3-4 sentences). Focus on what the data reveals about mental health patterns, triggers, and protective factors.",
-  "recommendations": "Specific, actionable recommendations for the next {period} (4-6 items). Include both immediate actions and longer-term strategies.",
-  "riskLevel": "Low/Medium/High - Overall risk assessment based on {period}ly patterns and trends",
-  "moodTrend": "{trends.get('moodTrend', 'Unknown')}",
-  "stressTrend": "{trends.get('stressTrend', 'Unknown')}",
-  "sleepTrend": "{trends.get('sleepTrend', 'Unknown')}",
-  "energyTrend": "{trends.get('energyTrend', 'Unknown')}"
-}}
-
-ANALYSIS GUIDELINES:
-- Focus on patterns and trends rather than individual daily scores
-- Identify both positive and concerning patterns
-- Provide specific, actionable recommendations
-- Consider the relationship between different metrics (mood, stress, sleep, energy)
-- Use clinical terminology appropriately
-- Focus on the overall trajectory and patterns
-- Consider both individual daily variations and overall {period}ly trends
-
-CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure.
-"""
-    
-    return instruction
+    return analysis
+
+def source_range(source, ranges=None):
+    """(start, end) to read from a source: its own bounds, else the span of the period ranges."""
+    start, end = source.get('start'), source.get('end')
+    bounds = [r for r in (ranges or {}).values() if r]
+    if start is None and bounds and all(r.get('start') for r in bounds):
+        start = min((r['start'] for r in bounds), key=deadline.parse_deadline)
+    if end is None and bounds and all(r.get('end') for r in bounds):
+        end = max((r['end'] for r in bounds), key=deadline.parse_deadline)
+    return start, end
+
+def finish_analysis(gemini_response, period, trends):
+    """Analysis for a period from a Gemini response, or the statistical one when the call failed."""
+    # Check if Gemini returned an error
+    if gemini_response.startswith('[ERROR]'):
+        if deadline.out_of_time():
+            return dict(build_statistical_analysis(period, trends), partial=True)
+        return dict(build_statistical_analysis(period, trends), error="AI analysis failed")
+
+    response_parse_started = time.perf_counter()
+    analysis = parse_analytics_response(gemini_response, period, trends)
+    TIMINGS.add("response_parse", time.perf_counter() - response_parse_started)
+
+    # Add timestamp
+    analysis["timestamp"] = datetime.now().isoformat()
+    return analysis
+
+def analyze_periods(api_key, assessments, summaries, ranges, user_gender=None):
+    """Weekly and monthly analyses of a month's data with both Gemini calls in flight together.
+
+    Returns {"weekly": analysis, "monthly": analysis, "assessmentCounts":
+    {period: count}}. A period without assessments gets the empty analysis
+    and no call.
+    """
+    summary_index = load_summary_index(current_user())
+    with stage("stats"):
+        accumulators, period_summaries = split_periods(assessments, summaries, ranges, summary_index)
+        trends = {period: accumulators[period].trends() for period in PERIODS}
+
+    results, prompts = {}, {}
+    for period in PERIODS:
+        accumulator = accumulators[period]
+        if not accumulator.mood.n:
+            results[period] = build_empty_analysis(period)
+        elif not deadline.allows_call():
+            results[period] = dict(build_statistical_analysis(period, trends[period]), partial=True)
+        else:
+            with stage("prompt_build"):
+                prompts[period] = build_analytics_prompt(accumulator.sample, period_summaries[period], period,
+                                                         accumulator.statistics(), trends[period], user_gender,
+                                                         anomalies=accumulator.anomalies, summary_index=summary_index)
+    save_summary_index(summary_index, current_user())
+
+    if prompts:
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            futures = {period: pool.submit(call_gemini, api_key, prompt, route("analytics").model)
+                       for period, prompt in prompts.items()}
+        for period, future in futures.items():
+            results[period] = finish_analysis(future.result(), period, trends[period])
+
+    return {
+        "weekly": results["weekly"],
+        "monthly": results["monthly"],
+        "assessmentCounts": {period: accumulators[period].mood.n for period in PERIODS}
+    }
 
 def analyze_weekly_monthly(analysis_data_json):
     """Main function to analyze weekly/monthly mental health data."""
+    reader = None
     try:
         # Parse the input JSON
-        analysis_data = json.loads(analysis_data_json)
-        assessments = analysis_data.get('assessments', [])
+        with stage("input_parse"):
+            analysis_data = json.loads(analysis_data_json)
+        # Long histories can be streamed from a JSONL file instead of inlined
+        if analysis_data.get('assessmentsFile'):
+            assessments = iter_assessments_file(analysis_data['assessmentsFile'])
+        else:
+            assessments = analysis_data.get('assessments', [])
         summaries = analysis_data.get('summaries', [])
         period = analysis_data.get('period', 'weekly')
         user_gender = analysis_data.get('userGender', None)
+        deadline.set_deadline(analysis_data.get('deadline'))
         
         # Get API key
         api_key = get_api_key()
@@ -300,88 +510,37 @@ def analyze_weekly_monthly(analysis_data_json):
                 "energyTrend": "Unknown"
             })
         
-        # Calculate statistics and trends
-        stats = calculate_statistics(assessments)
-        trends = calculate_trends(assessments)
-        
-        # Build prompt and call Gemini
-        prompt = build_analytics_prompt(assessments, summaries, period, stats, trends, user_gender)
-        gemini_response = call_gemini(api_key, prompt)
+        # Read straight from the databases when the caller names a source
+        source = analysis_data.get('source')
+        if source:
+            reader = AnalyticsReader(page_size=source.get('pageSize'))
+            start, end = source_range(source, analysis_data.get('ranges'))
+            with stage("input_read"):
+                summaries = list(reader.summaries(source['userId'], start, end))
+            # Assessments stream into the statistics pass below
+            assessments = reader.assessments(source['userId'], start, end)
         
-        # Check if Gemini returned an error
-        if gemini_response.startswith('[ERROR]'):
-            return json.dumps({
-                "error": "AI analysis failed",
-                "summary": f"{period.title()} analysis completed with limited functionality",
-                "trends": f"Basic trend analysis: Mood {trends.get('moodTrend', 'Unknown')}, Stress {trends.get('stressTrend', 'Unknown')}",
-                "insights": "AI analysis unavailable - using basic statistical analysis",
-                "recommendations": "Continue taking daily assessments and consider consulting a mental health professional",
-                "riskLevel": "Medium",  # Safe default
-                "moodTrend": trends.get('moodTrend', 'Unknown'),
-                "stressTrend": trends.get('stressTrend', 'Unknown'),
-                "sleepTrend": trends.get('sleepTrend', 'Unknown'),
-                "energyTrend": trends.get('energyTrend', 'Unknown')
-            })
+        if period == 'both':
+            return json.dumps(analyze_periods(api_key, assessments, summaries, analysis_data.get('ranges'),
+                                              user_gender))
         
-        # Clean up the response and try to parse JSON
-        cleaned_response = gemini_response.strip()
+        # Statistics, trends, the prompt sample and anomalies come from a single pass
+        summary_index = load_summary_index(current_user())
+        with stage("stats"):
+            accumulator = AssessmentAccumulator(summary_index).consume(assessments)
+            stats, trends, sample = accumulator.statistics(), accumulator.trends(), accumulator.sample
         
-        # Remove markdown code blocks if present
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:]  # Remove ```json
-        if cleaned_response.startswith('```'):
-            cleaned_response = cleaned_response[3:]  # Remove ```
-        if cleaned_response.endswith('```'):
-            cleaned_response = cleaned_response[:-3]  # Remove ```
+        # Local statistics are the best answer when there is no time left for Gemini
+        if not deadline.allows_call():
+            return json.dumps(dict(build_statistical_analysis(period, trends), partial=True))
         
-        cleaned_response = cleaned_response.strip()
-        
-        # Try to parse the JSON response
-        try:
-            analysis = json.loads(cleaned_response)
-            
-            # Validate required fields and provide defaults if missing
-            required_fields = ['summary', 'trends', 'insights', 'recommendations', 'riskLevel']
-            for field in required_fields:
-                if field not in analysis or not analysis[field]:
-                    if field == 'summary':
-                        analysis[field] = f"Analysis completed for the {period}."
-                    elif field == 'trends':
-                        analysis[field] = "Trend analysis completed."
-                    elif field == 'insights':
-                        analysis[field] = "Please continue monitoring your mental health."
-                    elif field == 'recommendations':
-                        analysis[field] = "Continue taking daily assessments."
-                    elif field == 'riskLevel':
-                        analysis[field] = "Medium"
-            
-            # Ensure trend fields are present
-            trend_fields = ['moodTrend', 'stressTrend', 'sleepTrend', 'energyTrend']
-            for field in trend_fields:
-                if field not in analysis:
-                    analysis[field] = trends.get(field, 'Unknown')
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            print(f"Response was: {cleaned_response[:200]}...")
-            
-            # If response is not valid JSON, create a structured response
-            analysis = {
-                "summary": f"Analysis completed for the {period}. Raw response: {cleaned_response[:200]}...",
-                "trends": "Trend analysis completed.",
-                "insights": "Please continue monitoring your mental health.",
-                "recommendations": "Continue taking daily assessments.",
-                "riskLevel": "Medium",
-                "moodTrend": trends.get('moodTrend', 'Unknown'),
-                "stressTrend": trends.get('stressTrend', 'Unknown'),
-                "sleepTrend": trends.get('sleepTrend', 'Unknown'),
-                "energyTrend": trends.get('energyTrend', 'Unknown')
-            }
-        
-        # Add timestamp
-        analysis["timestamp"] = datetime.now().isoformat()
-        
-        return json.dumps(analysis)
+        # Build prompt and call Gemini
+        with stage("prompt_build"):
+            prompt = build_analytics_prompt(sample, summaries, period, stats, trends, user_gender,
+                                            anomalies=accumulator.anomalies, summary_index=summary_index)
+        save_summary_index(summary_index, current_user())
+        gemini_response = call_gemini(api_key, prompt, route("analytics").model)
+        return json.dumps(finish_analysis(gemini_response, period, trends))
         
     except Exception as e:
         return json.dumps({
@@ -396,13 +555,19 @@ def analyze_weekly_monthly(analysis_data_json):
             "sleepTrend": "Unknown", 
             "energyTrend": "Unknown"
         })
+    finally:
+        if reader is not None:
+            reader.close()
 
 if __name__ == "__main__":
+    record_startup(_STARTED)
+    profile = pop_profile_flag(sys.argv)
+    deadline.install(sys.argv)
     if len(sys.argv) != 2:
         print(json.dumps({"error": "Invalid arguments"}), file=sys.stdout)
         sys.exit(1)
     
     analysis_data_json = sys.argv[1]
-    result = analyze_weekly_monthly(analysis_data_json)
-    print(result, file=sys.stdout)
+    result = run_profiled(analyze_weekly_monthly, analysis_data_json) if profile else analyze_weekly_monthly(analysis_data_json)
+    print(attach_timings(result), file=sys.stdout)
     sys.stdout.flush()
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""
+Assessment Scales
+Numeric values of the categorical assessment answers. Kept free of the Gemini
+stack so the cohort analytics can import it without loading a client.
+"""
+
+ENERGY_MAP = {'Very low': 1, 'Low': 2, 'Moderate': 3, 'High': 4, 'Very high': 5}
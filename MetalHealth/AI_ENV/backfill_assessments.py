@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Assessment Analysis Backfill
+Re-runs analyze_mental_health over historical assessments exported as JSONL, for
+example after build_analysis_prompt changes.
+
+The output JSONL doubles as the checkpoint: every result is flushed and fsynced
+before it counts as done, so a crashed or interrupted run resumes where it
+stopped when started again with the same output file.
+
+With --batch-size N, assessments queued within --batch-window seconds are packed
+into one request of up to N items; items whose part of the batch response does
+not validate are re-run individually.
+
+A --deadline (see deadline.py) or SIGTERM stops the run cleanly: assessments
+cut off are left out of the output, so the next run picks them up.
+
+Usage:
+    python backfill_assessments.py assessments.jsonl results.jsonl --concurrency 4 --rate 2
+    python backfill_assessments.py assessments.jsonl results.jsonl --concurrency 16 --batch-size 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from gemini_client import RateLimiter, rate_arg
+from job_scheduler import JobScheduler
+from metrics import QUEUE_DEPTH
+from usage_ledger import attribute, RISK_ROUTE_REASON
+from model_router import route
+from micro_batcher import MicroBatcher, BATCH_WINDOW
+import deadline
+from analyze_mental_health import (get_api_key, build_analysis_prompt, build_batch_analysis_prompt, call_gemini,
+                                   parse_analysis_response, parse_batch_analysis_response)
+
+load_dotenv()
+
+PROGRESS_INTERVAL = 1.0  # Seconds between progress lines on stderr
+
+def assessment_id(record, line_number):
+    """Stable id of an exported assessment, falling back to its line number."""
+    for key in ("id", "assessment_id", "_id"):
+        if record.get(key) is not None:
+            return str(record[key])
+    return f"line-{line_number}"
+
+def iter_assessments(path):
+    """Stream (id, record) pairs from a JSONL export, skipping blank or corrupt lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            if not isinstance(record, dict):
+                print(f"Skipping corrupt input line {line_number}", file=sys.stderr)
+                continue
+            yield assessment_id(record, line_number), record
+
+def count_assessments(path):
+    """Count non-blank input lines for progress and ETA reporting."""
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+def load_checkpoint(output_path, retry_failed=False):
+    """Return the ids already present in the output file.
+
+    A torn final line left by a crash is truncated away so appends stay valid JSONL.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for raw in f:
+            try:
+                result = json.loads(raw)
+            except ValueError:
+                break
+            if not raw.endswith(b"\n"):
+                break
+            valid_bytes += len(raw)
+            if not isinstance(result, dict):
+                continue  # Valid JSON but not a result record
+            if result.get("status") == "failed" and retry_failed:
+                done.discard(result.get("id"))
+            else:
+                done.add(result.get("id"))
+
+    if valid_bytes < os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+def record_inputs(record):
+    """(answers, daily summary, gender) of an exported assessment."""
+    answers = record.get("answers", {})
+    if isinstance(answers, str):
+        answers = json.loads(answers)
+    daily_summary = record.get("dailySummary") or record.get("daily_summary")
+    user_gender = record.get("userGender") or record.get("user_gender")
+    return answers, daily_summary, user_gender
+
+def analyze_record(api_key, record, rate_limiter):
+    """Run one exported assessment through the current analysis prompt."""
+    answers, daily_summary, user_gender = record_inputs(record)
+
+    prompt = build_analysis_prompt(answers, daily_summary, user_gender)
+    decision = route("assessment", daily_summary or "", answers)
+    gemini_response = call_gemini(api_key, prompt, decision.model, rate_limiter=rate_limiter, route_reason=decision.reason)
+    if gemini_response.startswith("[ERROR]"):
+        raise RuntimeError(gemini_response)
+
+    analysis = parse_analysis_response(gemini_response)
+    analysis["timestamp"] = datetime.now().isoformat()
+    return analysis
+
+def analyze_batch(api_key, batch, rate_limiter):
+    """Analyze several exported assessments in one request.
+    batch: list of (item_id, record). Returns {item_id: analysis} for the entries that validated.
+    """
+    items = [(item_id,) + record_inputs(record) for item_id, record in batch]
+    # The batch runs on the strongest model any of its items was routed to
+    decisions = [route("assessment", daily_summary or "", answers) for _, answers, daily_summary, _ in items]
+    model = next((d.model for d in decisions if d.tier == "flash"), decisions[0].model)
+    # One high-risk item keeps the whole batch out of the budget modes
+    reason = next((d.reason for d in decisions if d.reason == RISK_ROUTE_REASON), decisions[0].reason)
+
+    gemini_response = call_gemini(api_key, build_batch_analysis_prompt(items), model, rate_limiter=rate_limiter,
+                                  route_reason=reason)
+    if gemini_response.startswith("[ERROR]"):
+        raise RuntimeError(gemini_response)
+
+    results = parse_batch_analysis_response(gemini_response, [item[0] for item in items])
+    timestamp = datetime.now().isoformat()
+    for analysis in results.values():
+        analysis["timestamp"] = timestamp
+    return results
+
+class ResultWriter:
+    """Appends results durably and reports throughput and ETA."""
+
+    def __init__(self, output_path, total, stream=sys.stderr):
+        self._file = open(output_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._stream = stream
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self._started = time.monotonic()
+        self._last_report = 0.0
+
+    def write(self, result):
+        with self._lock:
+            self._file.write(json.dumps(result) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.completed += 1
+            if result["status"] == "failed":
+                self.failed += 1
+            self.report()
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        rate = self.completed / elapsed
+        remaining = max(self.total - self.completed, 0)
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "unknown"
+        print(f"[backfill] {self.completed}/{self.total} done, {self.failed} failed, "
+              f"{rate:.2f}/s, ETA {eta}", file=self._stream)
+
+    def close(self):
+        self.report(force=True)
+        self._file.close()
+
+def run_backfill(input_path, output_path, concurrency=4, rate=1.0, retry_failed=False, api_key=None,
+                 batch_size=1, batch_window=BATCH_WINDOW):
+    """Analyze every assessment in input_path not yet in output_path. Returns the writer stats.
+
+    With batch_size > 1, assessments arriving within batch_window seconds share one request.
+    """
+    api_key = api_key or get_api_key()
+    if not api_key:
+        raise RuntimeError("API key not found")
+
+    done = load_checkpoint(output_path, retry_failed)
+    total = count_assessments(input_path) - len(done)
+    rate_limiter = RateLimiter(rate, burst=concurrency)
+    writer = ResultWriter(output_path, max(total, 0))
+    # Bounds in-flight work so the input is streamed, not loaded
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    batcher = None
+    if batch_size > 1:
+        # Batched calls mix users, so their usage is not attributed per user
+        batcher = MicroBatcher(lambda batch: analyze_batch(api_key, batch, rate_limiter),
+                               lambda record: analyze_record(api_key, record, rate_limiter),
+                               window=batch_window, max_items=batch_size, workers=concurrency, name="backfill")
+
+    def finish(record_id, analysis=None, error=None):
+        if error is None:
+            result = {"id": record_id, "status": "ok", "analysis": analysis}
+        else:
+            result = {"id": record_id, "status": "failed", "error": str(error)}
+        try:
+            # Work cut off by the deadline or a cancel is not a failure; the next run redoes it
+            if error is None or not deadline.out_of_time():
+                writer.write(result)
+        finally:
+            QUEUE_DEPTH.dec(queue="backfill")
+            slots.release()
+
+    def finish_batched(record_id, future):
+        error = future.exception()
+        finish(record_id, None if error else future.result(), error)
+
+    def process(record_id, record):
+        if batcher is not None:
+            batcher.submit(record).add_done_callback(lambda future: finish_batched(record_id, future))
+            return
+        try:
+            with attribute(user=record.get("userId", record.get("user_id"))):
+                analysis = analyze_record(api_key, record, rate_limiter)
+        except Exception as e:
+            finish(record_id, error=e)
+            return
+        finish(record_id, analysis)
+
+    try:
+        # High-risk assessments jump the queue and users share the workers fairly
+        with JobScheduler(workers=concurrency, queue_name="backfill") as scheduler:
+            for record_id, record in iter_assessments(input_path):
+                if deadline.out_of_time():
+                    break
+                if record_id in done:
+                    continue
+                done.add(record_id)
+                slots.acquire()
+                QUEUE_DEPTH.inc(queue="backfill")
+                answers = record.get("answers")
+                scheduler.submit(process, record_id, record, priority="backfill",
+                                 user=record.get("userId", record.get("user_id")),
+                                 answers=answers if isinstance(answers, dict) else None,
+                                 text=record.get("dailySummary") or record.get("daily_summary"))
+    finally:
+        if batcher is not None:
+            batcher.close()
+        writer.close()
+    return {"completed": writer.completed, "failed": writer.failed}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run assessment analysis over a JSONL export.")
+    parser.add_argument("input", help="JSONL export of assessments (id, answers, dailySummary, userGender)")
+    parser.add_argument("output", help="JSONL results file, also used to resume an interrupted run")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel requests (default 4)")
+    parser.add_argument("--rate", type=rate_arg, default=os.getenv("GEMINI_RATE_LIMIT", "1.0"),
+                        help="max requests per second (default 1.0 or GEMINI_RATE_LIMIT)")
+    parser.add_argument("--retry-failed", action="store_true", help="re-run assessments that failed before")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="assessments packed into one request (default 1, no batching)")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW,
+                        help=f"seconds to collect a batch (default {BATCH_WINDOW})")
+    parser.add_argument("--api-base", help="override the Gemini API base URL, e.g. a mock server")
+    parser.add_argument("--deadline", help="stop by this time (Unix seconds or ms, or ISO) and leave the rest for a rerun")
+    args = parser.parse_args(argv)
+
+    if args.api_base:
+        os.environ["GEMINI_API_BASE"] = args.api_base
+    deadline.install()
+    deadline.set_deadline(args.deadline)
+
+    try:
+        stats = run_backfill(args.input, args.output, args.concurrency, args.rate, args.retry_failed,
+                             batch_size=args.batch_size, batch_window=args.batch_window)
+    except KeyboardInterrupt:
+        print("\nInterrupted - rerun the same command to resume.", file=sys.stderr)
+        return 130
+    except RuntimeError as e:
+        print(json.dumps({"error": str(e)}))
+        return 1
+
+    print(json.dumps(stats))
+    if deadline.out_of_time():
+        print("Stopped before finishing - rerun the same command to resume.", file=sys.stderr)
+        return 130
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the non-network work of the analysis scripts
+Times prompt building for every template, then runs each recorded response in
+the cassette corpus through the same steps a live call takes: JSON decoding
+of the body, text extraction, fence stripping, parsing and fallback handling.
+No request leaves the machine.
+
+Inputs are fixed and every measurement runs a fixed number of calls, so runs
+are comparable; the best of the repeats is reported per call. Each cassette
+also gets an outcome (parsed, fallback, partial batch, HTTP or decode error),
+and the script exits non-zero if any parser raises on the corpus.
+
+Usage:
+    python bench_decoding.py [--number N] [--repeat R] [--dir cassettes/]
+"""
+
+import os
+import sys
+import timeit
+import argparse
+from contextlib import redirect_stderr
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cassette import iter_cassettes, to_response, cassette_dir
+from analyze_mental_health import (extract_text_from_response, build_analysis_prompt,
+                                   build_batch_analysis_prompt, parse_analysis_response,
+                                   parse_batch_analysis_response)
+from analyze_daily_summary import build_summary_analysis_prompt, parse_summary_response
+from analyze_weekly_monthly import build_analytics_prompt, parse_analytics_response, summarize_assessments
+from analyze_assessment_summary import build_assessment_summary_prompt
+from bench_streaming import generate_assessments
+
+SAMPLE_ANSWERS = {
+    "mood": "Anxious", "moodLevel": 3, "stressLevel": 8, "sleepHours": 5, "sleepQuality": "Poor",
+    "energyLevel": "Low", "anxietyFrequency": "Often", "overwhelmedFrequency": "Often",
+    "socialConnection": "Low", "dailyFunctioning": "Fair"
+}
+SAMPLE_SUMMARY = ("Long day at work, the deadline moved again and I snapped at a colleague. "
+                  "A walk after dinner helped but I still feel wound up and doubt I will sleep well.")
+
+def prompt_cases():
+    """(name, callable) pairs building each prompt from fixed inputs."""
+    stats, trends, sample = summarize_assessments(generate_assessments(30, seed=7))
+    summaries = [{"date": f"2024-01-{day:02d}", "summary": SAMPLE_SUMMARY} for day in range(1, 6)]
+    batch = [(str(i), SAMPLE_ANSWERS, SAMPLE_SUMMARY, "Female") for i in range(8)]
+    return [
+        ("assessment", lambda: build_analysis_prompt(SAMPLE_ANSWERS, SAMPLE_SUMMARY, "Female")),
+        ("assessment_batch x8", lambda: build_batch_analysis_prompt(batch)),
+        ("daily_summary", lambda: build_summary_analysis_prompt(SAMPLE_SUMMARY, None, "Female")),
+        ("assessment_summary", lambda: build_assessment_summary_prompt(SAMPLE_ANSWERS, SAMPLE_SUMMARY, None, "Female")),
+        ("analytics", lambda: build_analytics_prompt(sample, summaries, "monthly", stats, trends, "Female"))
+    ]
+
+def batch_item_ids(prompt):
+    return [line[len("=== ITEM "):-len(" ===")] for line in prompt.splitlines()
+            if line.startswith("=== ITEM ") and line.endswith(" ===")]
+
+def parser_for(cassette):
+    """(kind, parse(text), outcome(parsed)) for the endpoint a cassette was recorded from."""
+    request = cassette["request"]
+    if (request.get("promptVersion") or "").startswith("assessment_batch"):
+        item_ids = batch_item_ids(request["payload"]["contents"][0]["parts"][0]["text"])
+        return ("batch", lambda text: parse_batch_analysis_response(text, item_ids),
+                lambda parsed: "parsed" if len(parsed) == len(item_ids) else f"partial {len(parsed)}/{len(item_ids)}")
+    if request["endpoint"] == "daily_summary":
+        return ("summary", parse_summary_response,
+                lambda parsed: "fallback" if parsed.get("mood_indicators") == "Analysis completed but format unclear"
+                else "parsed")
+    if request["endpoint"] == "analytics":
+        return ("analytics", lambda text: parse_analytics_response(text, "weekly", {}),
+                lambda parsed: "fallback" if "Raw response:" in parsed["summary"] else "parsed")
+    return ("assessment", parse_analysis_response,
+            lambda parsed: "fallback" if parsed["summary"].startswith("Analysis completed. Raw response") else "parsed")
+
+def best_per_call(func, number, repeat):
+    return min(timeit.Timer(func).repeat(repeat=repeat, number=number)) / number
+
+def bench_cassette(path, cassette, number, repeat):
+    """Return (name, kind, outcome, {step: seconds per call}) for one cassette."""
+    name = os.path.basename(path)[:12]
+    kind, parse, outcome_of = parser_for(cassette)
+    timings = {}
+    response = to_response(cassette)
+    if not response.ok:
+        return name, kind, f"http {response.status_code}", timings
+
+    try:
+        resp = response.json()
+    except ValueError:
+        return name, kind, "undecodable", timings
+    timings["decode"] = best_per_call(lambda: to_response(cassette).json(), number, repeat)
+    timings["extract"] = best_per_call(lambda: extract_text_from_response(resp), number, repeat)
+    text = extract_text_from_response(resp)
+    if not text:
+        return name, kind, "empty", timings
+    timings["parse"] = best_per_call(lambda: parse(text), number, repeat)
+    return name, kind, outcome_of(parse(text)), timings
+
+def format_us(seconds):
+    return f"{seconds * 1e6:9.1f}" if seconds is not None else f"{'-':>9}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark prompt building and response parsing offline.")
+    parser.add_argument("--number", type=int, default=200, help="calls per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per step; the best is reported")
+    parser.add_argument("--dir", default=None, help="cassette directory (default GEMINI_CASSETTE_DIR or cassettes/)")
+    args = parser.parse_args(argv)
+
+    print(f"{'prompt':<22} {'us/call':>9} {'chars':>7}")
+    for name, build in prompt_cases():
+        print(f"{name:<22} {format_us(best_per_call(build, args.number, args.repeat))} {len(build()):>7}")
+
+    print(f"\n{'cassette':<12} {'kind':<10} {'decode us':>9} {'extract':>9} {'parse':>9}  outcome")
+    failures = 0
+    # Fallback paths print diagnostics on every call
+    with open(os.devnull, "w") as devnull, redirect_stderr(devnull):
+        results = []
+        for path, cassette in iter_cassettes(args.dir or cassette_dir()):
+            try:
+                results.append(bench_cassette(path, cassette, args.number, args.repeat))
+            except Exception as e:
+                failures += 1
+                results.append((os.path.basename(path)[:12], "?", f"raised {type(e).__name__}: {e}", {}))
+    for name, kind, outcome, timings in results:
+        print(f"{name:<12} {kind:<10} {format_us(timings.get('decode'))} {format_us(timings.get('extract'))} "
+              f"{format_us(timings.get('parse'))}  {outcome}")
+
+    outcomes = {}
+    for _, _, outcome, _ in results:
+        outcomes[outcome.split()[0]] = outcomes.get(outcome.split()[0], 0) + 1
+    print(f"\n{len(results)} cassettes: " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
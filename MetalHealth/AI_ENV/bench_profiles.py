@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark for generation profiles
+Sends each endpoint's prompt from fixed inputs under several generation
+profiles and records latency and output size per call: wall time, output and
+thinking tokens, answer length, finish reason and whether the answer parsed.
+Comparing the variants shows what a tighter output cap or thinking budget
+saves in latency and what it costs in truncated or unparseable answers.
+
+The variants are "default" (no generationConfig), "profile" (the configured
+profile) and any named in a --variants JSON file of {name: {field: value}},
+whose fields are merged over each endpoint's profile. Calls go to the live
+API, or to GEMINI_API_BASE; the usage ledger is switched off so budget modes
+cannot rewrite the profiles under test. Every call is appended as a JSON line
+to the output file, and a per-variant summary is printed.
+
+Usage:
+    python bench_profiles.py [--endpoint NAME ...] [--variants FILE] [--repeat N]
+                             [--model MODEL] [--output bench_profiles.jsonl]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime
+from contextlib import redirect_stderr
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from gemini_client import MODEL, GeminiHTTPError, generate_content, usage_from_response
+from generation_profiles import profile_for
+from analyze_mental_health import extract_text_from_response
+from analyze_assessment_summary import parse_assessment_summary_response
+from summary import build_summary_prompt
+from main import build_prompt_from_qas
+from bench_decoding import SAMPLE_SUMMARY, prompt_cases, parser_for
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_profiles.jsonl")
+CHECKIN_QAS = [
+    ("How have you been feeling in the past week?", "Anxious"),
+    ("How would you rate your overall stress level today?", "8"),
+    ("How would you rate your overall mood today?", "4"),
+    ("How many hours of sleep do you usually get per night?", "5"),
+    ("Have you felt anxious, worried, or on edge most days recently?", "Yes"),
+    ("Do you often feel overwhelmed by work, school, or daily tasks?", "Sometimes")
+]
+TEXT_ENDPOINTS = ("checkin", "summary")
+
+def bench_cases():
+    """(endpoint, prompt) pairs; the batch prompt is benchmarked under its own profile."""
+    prompts = {name.split()[0]: build for name, build in prompt_cases()}
+    return [
+        ("checkin", build_prompt_from_qas(CHECKIN_QAS)),
+        ("summary", build_summary_prompt(SAMPLE_SUMMARY)),
+        ("daily_summary", prompts["daily_summary"]()),
+        ("assessment", prompts["assessment"]()),
+        ("assessment", prompts["assessment_batch"]()),
+        ("assessment_summary", prompts["assessment_summary"]()),
+        ("analytics", prompts["analytics"]())
+    ]
+
+def outcome_of(endpoint, prompt, text):
+    """Whether an answer is usable: "parsed", "fallback", "partial ..." or "text" for prose endpoints."""
+    if not text:
+        return "empty"
+    if endpoint in TEXT_ENDPOINTS:
+        return "text"
+    # Fallback paths print diagnostics on every call
+    with open(os.devnull, "w") as devnull, redirect_stderr(devnull):
+        if endpoint == "assessment_summary":
+            assessment, summary_analysis = parse_assessment_summary_response(text)
+            if assessment["summary"].startswith("Analysis completed. Raw response"):
+                return "fallback"
+            return "parsed" if summary_analysis is not None else "partial"
+        request = {"endpoint": endpoint, "promptVersion": getattr(prompt, "version", None),
+                   "payload": {"contents": [{"parts": [{"text": str(prompt)}]}]}}
+        _, parse, outcome = parser_for({"request": request})
+        return outcome(parse(text))
+
+def load_variants(path):
+    variants = {"default": None, "profile": {}}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            variants.update(json.load(f))
+    return variants
+
+def run_call(api_key, endpoint, prompt, model, variant, overrides):
+    """One call under a variant. Returns its record."""
+    base = profile_for(endpoint, getattr(prompt, "version", None))
+    profile = {} if overrides is None else dict(base, **overrides)
+    record = {"timestamp": datetime.now().isoformat(), "variant": variant, "endpoint": endpoint,
+              "prompt": getattr(prompt, "version", None) or endpoint, "model": model, "profile": profile}
+    started = time.perf_counter()
+    try:
+        resp = generate_content(api_key, prompt, model, timeout=120, endpoint=endpoint, profile=profile)
+    except (GeminiHTTPError, OSError, ValueError) as e:
+        record.update(seconds=round(time.perf_counter() - started, 3), outcome=f"error {type(e).__name__}")
+        return record
+    text = extract_text_from_response(resp)
+    usage = usage_from_response(resp)
+    candidates = resp.get("candidates") or [{}]
+    record.update(seconds=round(time.perf_counter() - started, 3), outputTokens=usage.get("output", 0),
+                  thinkingTokens=usage.get("thinking", 0), chars=len(text),
+                  finishReason=candidates[0].get("finishReason"), outcome=outcome_of(endpoint, prompt, text))
+    return record
+
+def summarize(records):
+    """Print median latency and mean output size per prompt and variant."""
+    groups = {}
+    for record in records:
+        groups.setdefault((record["prompt"], record["variant"]), []).append(record)
+    print(f"\n{'prompt':<22} {'variant':<12} {'p50 s':>7} {'out tok':>8} {'think':>7} {'chars':>7} "
+          f"{'cut':>4}  outcomes")
+    for (prompt, variant), group in sorted(groups.items()):
+        done = [r for r in group if "chars" in r]
+        outcomes = {}
+        for r in group:
+            outcomes[r["outcome"].split()[0]] = outcomes.get(r["outcome"].split()[0], 0) + 1
+        def mean(field):
+            return statistics.mean(r[field] for r in done) if done else 0
+        truncated = sum(1 for r in done if r["finishReason"] == "MAX_TOKENS")
+        print(f"{prompt:<22} {variant:<12} {statistics.median(r['seconds'] for r in group):7.2f} "
+              f"{mean('outputTokens'):8.0f} {mean('thinkingTokens'):7.0f} {mean('chars'):7.0f} {truncated:>4}  "
+              + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())))
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark latency and output size per generation profile.")
+    parser.add_argument("--endpoint", action="append", help="endpoints or prompt templates to run (default all)")
+    parser.add_argument("--variants", help="JSON file of {name: {field: value}} profile variants")
+    parser.add_argument("--repeat", type=int, default=3, help="calls per prompt and variant")
+    parser.add_argument("--model", default=MODEL, help=f"model for every call (default {MODEL})")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSONL file the call records are appended to")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("GOOGLE_API_KEY_1")
+    if not api_key:
+        print("GOOGLE_API_KEY_1 not set", file=sys.stderr)
+        return 1
+    os.environ["USAGE_LEDGER_DB"] = "off"
+    variants = load_variants(args.variants)
+    cases = [(endpoint, prompt) for endpoint, prompt in bench_cases()
+             if not args.endpoint or {endpoint, (getattr(prompt, "version", None) or "").split("@")[0]} & set(args.endpoint)]
+
+    records = []
+    with open(args.output, "a", encoding="utf-8") as out:
+        for endpoint, prompt in cases:
+            for _ in range(args.repeat):
+                # Variants interleave so drift in API latency hits them alike
+                for variant, overrides in variants.items():
+                    record = run_call(api_key, endpoint, prompt, args.model, variant, overrides)
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    records.append(record)
+                    print(f"{record['prompt']:<22} {variant:<12} {record['seconds']:6.2f}s  {record['outcome']}")
+    summarize(records)
+    print(f"\n{len(records)} calls appended to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark for single-pass assessment summarization
+Measures time and tracemalloc peak memory of summarize_assessments over
+generated histories, streamed from a generator and materialized as a list.
+
+Streaming peak memory must stay flat as the history grows; the script exits
+non-zero if the largest history needs more than PEAK_GROWTH_LIMIT times the
+peak of the smallest.
+
+Usage:
+    python bench_streaming.py [sizes...]     (default: 1000 10000 100000)
+"""
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from analyze_weekly_monthly import summarize_assessments
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+PEAK_GROWTH_LIMIT = 2.0
+ENERGY_LEVELS = ['Very low', 'Low', 'Moderate', 'High', 'Very high']
+RISK_LEVELS = ['Low', 'Medium', 'High']
+
+def generate_assessments(count, seed=42):
+    """Yield synthetic assessments shaped like the ones the Node routes send."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "createdAt": f"2024-01-01T00:00:{i % 60:02d}.000Z",
+            "answers": {
+                "mood": "Neutral",
+                "moodLevel": rng.randint(1, 10),
+                "stressLevel": rng.randint(1, 10),
+                "sleepHours": round(rng.uniform(3, 10), 1),
+                "sleepQuality": "Fair",
+                "energyLevel": rng.choice(ENERGY_LEVELS),
+                "anxietyFrequency": "Sometimes",
+                "overwhelmedFrequency": "Rarely",
+                "socialConnection": "Moderate",
+                "dailyFunctioning": "Good"
+            },
+            "aiAnalysis": {"riskLevel": rng.choice(RISK_LEVELS)}
+        }
+
+def measure(make_input):
+    """Return (seconds, peak bytes) for summarizing the input built by make_input."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    summarize_assessments(make_input())
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or list(DEFAULT_SIZES)
+
+    print(f"{'assessments':>12} {'stream ms':>10} {'stream peak KiB':>16} {'list ms':>10} {'list peak KiB':>14}")
+    stream_peaks = []
+    for size in sizes:
+        stream_time, stream_peak = measure(lambda: generate_assessments(size))
+        list_time, list_peak = measure(lambda: list(generate_assessments(size)))
+        stream_peaks.append(stream_peak)
+        print(f"{size:>12} {stream_time * 1000:>10.1f} {stream_peak / 1024:>16.1f} "
+              f"{list_time * 1000:>10.1f} {list_peak / 1024:>14.1f}")
+
+    growth = stream_peaks[-1] / stream_peaks[0]
+    print(f"\nStreaming peak growth {sizes[0]} -> {sizes[-1]}: {growth:.2f}x (limit {PEAK_GROWTH_LIMIT}x)")
+    return 0 if growth <= PEAK_GROWTH_LIMIT else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
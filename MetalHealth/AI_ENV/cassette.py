@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Gemini Cassettes
+Record/replay of generateContent calls. In record mode every live response is
+saved next to its request in cassettes/<hash>.json; in replay mode the shared
+client answers from those files and never touches the network, so prompt
+building, decoding and parsing can be tested and benchmarked on real payloads.
+
+The hash covers the model and the request payload as the caller built them
+(before any budget mode change) and never the API key. A replayed call with
+no matching cassette raises CassetteMiss rather than going to the network.
+
+Configuration:
+    GEMINI_CASSETTE_MODE   "off" (default), "record" or "replay"
+    GEMINI_CASSETTE_DIR    cassette directory, default cassettes/
+
+Usage:
+    python cassette.py list
+"""
+
+import os
+import sys
+import json
+import hashlib
+import requests
+from datetime import datetime
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+MODES = ("off", "record", "replay")
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no cassette matches the request."""
+
+    def __init__(self, key, model):
+        super().__init__(f"No cassette for {model} request {key[:12]}")
+        self.key = key
+        self.model = model
+
+def cassette_mode():
+    mode = os.getenv("GEMINI_CASSETTE_MODE", "off").lower()
+    if mode not in MODES:
+        raise ValueError(f"GEMINI_CASSETTE_MODE must be one of {', '.join(MODES)}")
+    return mode
+
+def cassette_dir():
+    return os.getenv("GEMINI_CASSETTE_DIR", DEFAULT_DIR)
+
+def request_key(model, payload):
+    """Stable hash of a request: canonical JSON of the model and payload."""
+    canonical = json.dumps({"model": model, "payload": payload}, sort_keys=True,
+                           separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def cassette_path(key, directory=None):
+    return os.path.join(directory or cassette_dir(), f"{key}.json")
+
+def record(model, payload, endpoint, response, elapsed, prompt_version=None, directory=None):
+    """Save a live response (any status, body kept verbatim) for its request."""
+    key = request_key(model, payload)
+    path = cassette_path(key, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cassette = {
+        "request": {"model": model, "endpoint": endpoint, "promptVersion": prompt_version, "payload": payload},
+        "response": {"status": response.status_code, "body": response.text},
+        "elapsed": round(elapsed, 4),
+        "recordedAt": datetime.now().isoformat()
+    }
+    # Written aside and renamed so a concurrent replay never reads half a file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cassette, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return path
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def to_response(cassette):
+    """Rebuild a requests.Response so replay decodes exactly like a live call."""
+    response = requests.models.Response()
+    response.status_code = cassette["response"]["status"]
+    response._content = cassette["response"]["body"].encode("utf-8")
+    response.encoding = "utf-8"
+    return response
+
+def replay(model, payload, directory=None):
+    """Return the recorded requests.Response for a request, or raise CassetteMiss."""
+    key = request_key(model, payload)
+    path = cassette_path(key, directory)
+    if not os.path.exists(path):
+        raise CassetteMiss(key, model)
+    return to_response(load(path))
+
+def iter_cassettes(directory=None):
+    """Yield (path, cassette) for every cassette in a directory, in name order."""
+    directory = directory or cassette_dir()
+    if not os.path.isdir(directory):
+        return
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            path = os.path.join(directory, filename)
+            yield path, load(path)
+
+def main(argv):
+    command = argv[0] if argv else "list"
+    if command != "list":
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 1
+    for path, cassette in iter_cassettes():
+        request = cassette["request"]
+        print(f"{os.path.basename(path)[:12]}  {request['endpoint']:14} {request['model']:22} "
+              f"HTTP {cassette['response']['status']}  {len(cassette['response']['body'])} bytes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
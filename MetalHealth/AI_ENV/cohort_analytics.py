@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Cohort Analytics
+Population views over a bulk assessment export: weekly and monthly aggregates
+across all users, each user's average stress percentile within the cohort, and
+per-user trend classes, computed with grouped NumPy reductions. Daily summaries
+sent with the assessments are scored by the local affect lexicon in one batch
+per ingest, and their mean tone is reported per period.
+
+State is kept as mergeable sums and fixed-bin quantile sketches, so exports can
+be ingested incrementally (batches must be in time order per user) and engines
+built on separate shards can be merged.
+
+Usage:
+    python cohort_analytics.py export.jsonl [--period weekly|monthly] [--state cohort_state.json] [--user ID]
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from assessment_scales import ENERGY_MAP
+from affect_lexicon import score_batch
+
+METRICS = ("mood", "stress", "sleep", "energy")
+DEFAULTS = {"mood": 5, "stress": 5, "sleep": 8, "energy": 3}
+ANSWER_KEYS = {"mood": "moodLevel", "stress": "stressLevel", "sleep": "sleepHours", "energy": "energyLevel"}
+TREND_FIELDS = {"mood": "moodTrend", "stress": "stressTrend", "sleep": "sleepTrend", "energy": "energyTrend"}
+PERIODS = ("weekly", "monthly")
+TREND_THRESHOLD = 0.1  # Same slope cut-off as analyze_weekly_monthly
+
+# Value ranges of the quantile sketches: (low, high, bins)
+SKETCH_RANGES = {"mood": (0, 10, 100), "stress": (0, 10, 100), "sleep": (0, 24, 240)}
+SKETCH_QUANTILES = (0.5, 0.9)
+
+# Layout of a trend-sum row: count, then per-metric value sums, then per-metric index*value sums
+_SUM_WIDTH = 1 + 2 * len(METRICS)
+
+# Layout of a summary affect row: scored summaries, then polarity, stress and anxiety sums
+AFFECT_FIELDS = ("polarity", "stress", "anxiety")
+
+class QuantileSketch:
+    """Fixed-bin histogram over a bounded range. Mergeable by adding counts."""
+
+    def __init__(self, low, high, bins):
+        self.low = float(low)
+        self.high = float(high)
+        self.counts = np.zeros(int(bins), dtype=np.int64)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def update(self, values):
+        values = np.clip(np.asarray(values, dtype=np.float64), self.low, self.high)
+        width = (self.high - self.low) / len(self.counts)
+        index = np.minimum(((values - self.low) / width).astype(np.int64), len(self.counts) - 1)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q):
+        """Lower edge of the bin holding the q-quantile (exact for bin-aligned values), or None when empty."""
+        total = self.total
+        if not total:
+            return None
+        index = int(np.searchsorted(np.cumsum(self.counts), q * total, side="left"))
+        width = (self.high - self.low) / len(self.counts)
+        return round(self.low + index * width, 2)
+
+    def to_dict(self):
+        return {"low": self.low, "high": self.high, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["low"], data["high"], len(data["counts"]))
+        sketch.counts = np.asarray(data["counts"], dtype=np.int64)
+        return sketch
+
+class _PeriodState:
+    """Aggregates for one week or month."""
+
+    def __init__(self):
+        self.risk_counts = {}
+        self.sketches = {metric: QuantileSketch(*SKETCH_RANGES[metric]) for metric in SKETCH_RANGES}
+        self.user_sums = {}  # user code -> trend-sum row within the period
+        self.affect_sums = np.zeros(1 + len(AFFECT_FIELDS))
+
+    def merge(self, other, user_codes):
+        for risk, count in other.risk_counts.items():
+            self.risk_counts[risk] = self.risk_counts.get(risk, 0) + count
+        for metric, sketch in other.sketches.items():
+            self.sketches[metric].merge(sketch)
+        for code, row in other.user_sums.items():
+            _merge_sums(self.user_sums, user_codes[code], row)
+        self.affect_sums = self.affect_sums + other.affect_sums
+
+def _merge_sums(table, key, row):
+    """Add a trend-sum row whose index sums start at 0 onto the stored row for key."""
+    previous = table.get(key)
+    if previous is None:
+        table[key] = row.copy()
+        return
+    # The new rows continue the series after the previous count
+    shifted = row.copy()
+    shifted[1 + len(METRICS):] += previous[0] * row[1:1 + len(METRICS)]
+    table[key] = previous + shifted
+
+def _number(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float(default)
+
+def _json_field(record, *keys):
+    for key in keys:
+        value = record.get(key)
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                continue
+        if isinstance(value, dict):
+            return value
+    return {}
+
+def _group_sums(group, order_key, values):
+    """Trend-sum rows per group id, in one vectorized pass over the rows.
+
+    Rows are ranked by order_key within each group, starting at index 0.
+    Returns (unique group ids, rows).
+    """
+    order = np.lexsort((order_key, group))
+    group = group[order]
+    values = values[order]
+    unique, start, inverse = np.unique(group, return_index=True, return_inverse=True)
+    x = np.arange(len(group)) - start[inverse]
+
+    rows = np.zeros((len(unique), _SUM_WIDTH))
+    rows[:, 0] = np.bincount(inverse, minlength=len(unique))
+    for i in range(len(METRICS)):
+        rows[:, 1 + i] = np.bincount(inverse, weights=values[:, i], minlength=len(unique))
+        rows[:, 1 + len(METRICS) + i] = np.bincount(inverse, weights=x * values[:, i], minlength=len(unique))
+    return unique, rows
+
+def classify_trends(rows):
+    """Trend class per metric for an array of trend-sum rows (matches analyze_weekly_monthly)."""
+    rows = np.atleast_2d(rows)
+    n = rows[:, 0]
+    x_total = n * (n - 1) / 2
+    x_square_total = (n - 1) * n * (2 * n - 1) / 6
+    denominator = n * x_square_total - x_total ** 2
+    safe = np.where(denominator > 0, denominator, 1)
+
+    classes = {}
+    for i, metric in enumerate(METRICS):
+        slope = (n * rows[:, 1 + len(METRICS) + i] - x_total * rows[:, 1 + i]) / safe
+        labels = np.where(slope > TREND_THRESHOLD, "Improving",
+                          np.where(slope < -TREND_THRESHOLD, "Declining", "Stable")).astype(object)
+        labels[n < 2] = "Insufficient data"
+        classes[metric] = labels
+    return classes
+
+class CohortEngine:
+    """Incremental cohort aggregates over assessments from many users."""
+
+    def __init__(self):
+        self.user_ids = []
+        self._user_codes = {}
+        self.user_sums = {}                                  # user code -> trend-sum row
+        self.periods = {period: {} for period in PERIODS}    # period -> key -> _PeriodState
+
+    def _user_code(self, user_id):
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return code
+
+    def ingest(self, records):
+        """Add a batch of exported assessments. Returns the number ingested."""
+        users, stamps, risks, values, summaries = [], [], [], [], []
+        for record in records:
+            user_id = record.get("userId", record.get("user_id"))
+            created = record.get("createdAt", record.get("created_at"))
+            if user_id is None or not created:
+                continue
+            answers = _json_field(record, "answers")
+            analysis = _json_field(record, "aiAnalysis", "ai_analysis")
+            energy = answers.get(ANSWER_KEYS["energy"], "Moderate")
+            users.append(self._user_code(str(user_id)))
+            stamps.append(str(created)[:19])
+            risks.append(analysis.get("riskLevel", "Medium"))
+            values.append((
+                _number(answers.get(ANSWER_KEYS["mood"]), DEFAULTS["mood"]),
+                _number(answers.get(ANSWER_KEYS["stress"]), DEFAULTS["stress"]),
+                _number(answers.get(ANSWER_KEYS["sleep"]), DEFAULTS["sleep"]),
+                ENERGY_MAP.get(energy, DEFAULTS["energy"])
+            ))
+            summary = record.get("dailySummary", record.get("daily_summary"))
+            summaries.append(summary.strip() if isinstance(summary, str) else "")
+        if not users:
+            return 0
+
+        users = np.asarray(users, dtype=np.int64)
+        stamps = np.asarray(stamps, dtype="datetime64[s]")
+        values = np.asarray(values, dtype=np.float64)
+        risk_levels, risk_index = np.unique(np.asarray(risks, dtype=str), return_inverse=True)
+
+        # Affect rows of the assessments sent with a daily summary, scored in one pass
+        has_summary = np.asarray([bool(s) for s in summaries])
+        affect = np.zeros((len(users), 1 + len(AFFECT_FIELDS)))
+        if has_summary.any():
+            scores = score_batch(s for s in summaries if s)
+            affect[has_summary] = [[1.0] + [score[field] for field in AFFECT_FIELDS] for score in scores]
+
+        # Per-user series across the whole history
+        for code, row in zip(*_group_sums(users, stamps, values)):
+            _merge_sums(self.user_sums, int(code), row)
+
+        days = stamps.astype("datetime64[D]")
+        period_keys = {
+            # 1970-01-01 was a Thursday, so +3 aligns weeks to Monday
+            "weekly": days - ((days.astype(np.int64) + 3) % 7),
+            "monthly": days.astype("datetime64[M]")
+        }
+        for period, keys in period_keys.items():
+            self._ingest_period(self.periods[period], keys, users, stamps, risk_levels, risk_index, values, affect)
+        return len(users)
+
+    def _ingest_period(self, states, keys, users, stamps, risk_levels, risk_index, values, affect):
+        period_values, period_index = np.unique(keys, return_inverse=True)
+        period_states = [states.setdefault(str(key), _PeriodState()) for key in period_values]
+
+        risk_counts = np.bincount(period_index * len(risk_levels) + risk_index,
+                                  minlength=len(period_values) * len(risk_levels)).reshape(len(period_values), -1)
+        for state, counts in zip(period_states, risk_counts):
+            for level, count in zip(risk_levels, counts):
+                if count:
+                    state.risk_counts[str(level)] = state.risk_counts.get(str(level), 0) + int(count)
+
+        affect_sums = np.stack([np.bincount(period_index, weights=affect[:, i], minlength=len(period_values))
+                                for i in range(affect.shape[1])], axis=1)
+        for state, sums in zip(period_states, affect_sums):
+            state.affect_sums = state.affect_sums + sums
+
+        # Rows grouped by period for the sketches
+        order = np.argsort(period_index, kind="stable")
+        bounds = np.searchsorted(period_index[order], np.arange(len(period_values) + 1))
+        for p, state in enumerate(period_states):
+            rows = order[bounds[p]:bounds[p + 1]]
+            for i, metric in enumerate(METRICS):
+                if metric in state.sketches:
+                    state.sketches[metric].update(values[rows, i])
+
+        # Per-user series within each period
+        user_count = len(self.user_ids)
+        unique, rows = _group_sums(period_index * user_count + users, stamps, values)
+        for group, row in zip(unique, rows):
+            _merge_sums(period_states[group // user_count].user_sums, int(group % user_count), row)
+
+    def merge(self, other):
+        """Fold another engine (e.g. built from a different export shard) into this one.
+
+        The other engine's history must come after this one's for shared users.
+        """
+        codes = {code: self._user_code(user_id) for code, user_id in enumerate(other.user_ids)}
+        for code, row in other.user_sums.items():
+            _merge_sums(self.user_sums, codes[code], row)
+        for period in PERIODS:
+            for key, state in other.periods[period].items():
+                self.periods[period].setdefault(key, _PeriodState()).merge(state, codes)
+        return self
+
+    def user_report(self):
+        """Average stress with cohort percentile rank, and trend classes, per user."""
+        if not self.user_sums:
+            return {}
+        codes = np.asarray(sorted(self.user_sums))
+        rows = np.asarray([self.user_sums[c] for c in codes])
+        means = rows[:, 1:1 + len(METRICS)] / rows[:, :1]
+        stress = means[:, METRICS.index("stress")]
+
+        # Percent of users whose average stress is at or below this user's
+        ranked = np.sort(stress)
+        percentile = np.searchsorted(ranked, stress, side="right") / len(ranked) * 100
+        trends = classify_trends(rows)
+
+        report = {}
+        for i, code in enumerate(codes):
+            entry = {
+                "assessments": int(rows[i, 0]),
+                "averageMood": round(float(means[i, 0]), 1),
+                "averageStress": round(float(means[i, 1]), 1),
+                "averageSleep": round(float(means[i, 2]), 1),
+                "stressPercentile": round(float(percentile[i]), 1)
+            }
+            for metric in METRICS:
+                entry[TREND_FIELDS[metric]] = trends[metric][i]
+            report[self.user_ids[code]] = entry
+        return report
+
+    def period_report(self, period="weekly"):
+        """Grouped aggregates per week or month, oldest first."""
+        report = []
+        for key in sorted(self.periods[period]):
+            state = self.periods[period][key]
+            rows = np.asarray(list(state.user_sums.values()))
+            totals = rows.sum(axis=0)
+            trends = classify_trends(rows)
+            with_trend = trends["sleep"] != "Insufficient data"
+
+            entry = {
+                "period": key,
+                "assessments": int(totals[0]),
+                "users": len(rows),
+                "averageMood": round(float(totals[1] / totals[0]), 1),
+                "averageStress": round(float(totals[2] / totals[0]), 1),
+                "averageSleep": round(float(totals[3] / totals[0]), 1),
+                "riskDistribution": dict(sorted(state.risk_counts.items())),
+                # Share of users with at least two assessments whose sleep declined
+                "decliningSleepShare": round(float(np.mean(trends["sleep"][with_trend] == "Declining")), 3)
+                                       if with_trend.any() else None
+            }
+            for metric, sketch in state.sketches.items():
+                for q in SKETCH_QUANTILES:
+                    entry[f"{metric}P{int(q * 100)}"] = sketch.quantile(q)
+            # Mean local affect score of the daily summaries sent in the period
+            scored = state.affect_sums[0]
+            entry["summaryAffect"] = None
+            if scored:
+                entry["summaryAffect"] = {"summaries": int(scored)}
+                for i, field in enumerate(AFFECT_FIELDS):
+                    entry["summaryAffect"][field] = round(float(state.affect_sums[1 + i] / scored), 3)
+            report.append(entry)
+        return report
+
+    def to_dict(self):
+        return {
+            "user_ids": self.user_ids,
+            "user_sums": [[code, row.tolist()] for code, row in self.user_sums.items()],
+            "periods": {
+                period: {
+                    key: {
+                        "risk_counts": state.risk_counts,
+                        "sketches": {metric: sketch.to_dict() for metric, sketch in state.sketches.items()},
+                        "user_sums": [[code, row.tolist()] for code, row in state.user_sums.items()],
+                        "affect_sums": state.affect_sums.tolist()
+                    }
+                    for key, state in states.items()
+                }
+                for period, states in self.periods.items()
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        engine = cls()
+        for user_id in data.get("user_ids", []):
+            engine._user_code(user_id)
+        engine.user_sums = {code: np.asarray(row) for code, row in data.get("user_sums", [])}
+        for period, states in data.get("periods", {}).items():
+            for key, saved in states.items():
+                state = _PeriodState()
+                state.risk_counts = dict(saved["risk_counts"])
+                state.sketches = {metric: QuantileSketch.from_dict(s) for metric, s in saved["sketches"].items()}
+                state.user_sums = {code: np.asarray(row) for code, row in saved["user_sums"]}
+                # State saved before summaries were scored has no affect sums
+                if "affect_sums" in saved:
+                    state.affect_sums = np.asarray(saved["affect_sums"], dtype=np.float64)
+                engine.periods[period][key] = state
+        return engine
+
+    def save(self, path):
+        """Write the engine state to disk atomically."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load saved state, or start empty when the file is missing or corrupt."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+def iter_export(path):
+    """Stream records from a JSONL export, skipping blank or corrupt lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping corrupt input line {line_number}", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cohort-level aggregates over an assessment export.")
+    parser.add_argument("export", help="JSONL export of assessments (userId, createdAt, answers, aiAnalysis, dailySummary)")
+    parser.add_argument("--period", choices=PERIODS, default="weekly")
+    parser.add_argument("--state", help="state file to resume from and update; later runs should only pass new records")
+    parser.add_argument("--user", help="only report this user")
+    args = parser.parse_args(argv)
+
+    engine = CohortEngine.load(args.state) if args.state else CohortEngine()
+    engine.ingest(iter_export(args.export))
+    if args.state:
+        engine.save(args.state)
+
+    users = engine.user_report()
+    if args.user:
+        users = {args.user: users.get(args.user)}
+    print(json.dumps({"period": args.period, "periods": engine.period_report(args.period), "users": users}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
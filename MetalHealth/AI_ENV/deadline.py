@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Deadlines and Cancellation
+An absolute deadline for an entry point's whole run, so every Gemini call,
+rate-limiter wait and fallback retry fits inside the time the caller is still
+waiting, plus cooperative cancellation on SIGTERM.
+
+The deadline is Unix time in seconds or milliseconds (Date.now()), or an ISO
+timestamp, from any of:
+    --deadline=<time>     argument of the entry point
+    "deadline" field      of the job's JSON input
+    AI_ENV_DEADLINE       environment variable
+The earliest one wins. Without any, calls keep their own timeouts.
+
+Cancelling (SIGTERM, or a "cancel" line on stdin when AI_ENV_CANCEL_STDIN=1)
+runs the registered callbacks, which shut down the sockets of in-flight Gemini
+requests, and makes every later call fail before it is sent. Entry points then
+finish with their partial result instead of dying mid-write.
+"""
+
+import os
+import sys
+import time
+import signal
+import threading
+from datetime import datetime
+
+DEADLINE_FLAG = "--deadline"
+MIN_CALL_SECONDS = 3.0  # With less time left a Gemini call is not worth starting
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work would start or continue past the deadline."""
+
+class Cancelled(Exception):
+    """Raised for work started or interrupted after the run was cancelled."""
+
+CANCELLED = threading.Event()
+_deadline = None  # Unix seconds
+_callbacks = []
+_lock = threading.Lock()
+
+def parse_deadline(value):
+    """Unix seconds for a deadline given as seconds, milliseconds or ISO text; None if empty."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    value = float(value)
+    # Millisecond timestamps from JavaScript are 1000x larger than any plausible seconds value
+    return value / 1000.0 if value > 1e11 else value
+
+def set_deadline(value):
+    """Tighten the process deadline; a later value than the current one is ignored."""
+    global _deadline
+    at = parse_deadline(value)
+    with _lock:
+        if at is not None and (_deadline is None or at < _deadline):
+            _deadline = at
+        return _deadline
+
+def clear():
+    """Drop the deadline and cancellation state (tests and long-lived workers)."""
+    global _deadline
+    with _lock:
+        _deadline = None
+    CANCELLED.clear()
+
+def remaining():
+    """Seconds left before the deadline, or None without one."""
+    if _deadline is None:
+        return None
+    return _deadline - time.time()
+
+def cancelled():
+    return CANCELLED.is_set()
+
+def out_of_time():
+    """True once the run was cancelled or its deadline has passed."""
+    left = remaining()
+    return cancelled() or (left is not None and left <= 0)
+
+def allows_call(seconds=None):
+    """Whether there is time left to start a Gemini call."""
+    left = remaining()
+    return not cancelled() and (left is None or left >= (MIN_CALL_SECONDS if seconds is None else seconds))
+
+def check():
+    """Raise Cancelled or DeadlineExceeded when no more work should start."""
+    if cancelled():
+        raise Cancelled("Run was cancelled")
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline passed {-left:.1f}s ago")
+
+def bound(timeout):
+    """A per-call timeout cut to the time left before the deadline."""
+    check()
+    left = remaining()
+    return timeout if left is None else min(timeout, left)
+
+def wait(seconds):
+    """Sleep up to `seconds`, waking at once on cancellation; raises if time ran out."""
+    left = remaining()
+    CANCELLED.wait(seconds if left is None else max(0.0, min(seconds, left)))
+    check()
+
+def on_cancel(callback):
+    """Register a callback run (once per cancel) when the run is cancelled."""
+    with _lock:
+        _callbacks.append(callback)
+
+def cancel(reason="cancelled"):
+    if CANCELLED.is_set():
+        return
+    CANCELLED.set()
+    print(f"Cancelling run: {reason}", file=sys.stderr)
+    for callback in list(_callbacks):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Cancel callback failed: {e}", file=sys.stderr)
+
+def pop_deadline_flag(argv):
+    """Remove --deadline=<time> or --deadline <time> from argv (in place). Returns the value or None."""
+    value = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg.startswith(DEADLINE_FLAG + "="):
+            value = arg.split("=", 1)[1]
+            del argv[i]
+        elif arg == DEADLINE_FLAG and i + 1 < len(argv):
+            value = argv[i + 1]
+            del argv[i:i + 2]
+        else:
+            i += 1
+    return value
+
+def _watch_stdin():
+    for line in sys.stdin:
+        if line.strip().lower() == "cancel":
+            cancel("cancel message")
+            return
+
+def install(argv=None):
+    """Set up the deadline and cancellation for an entry point. Call from __main__."""
+    set_deadline(os.getenv("AI_ENV_DEADLINE"))
+    if argv is not None:
+        set_deadline(pop_deadline_flag(argv))
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: cancel("SIGTERM"))
+    if os.getenv("AI_ENV_CANCEL_STDIN") == "1":
+        threading.Thread(target=_watch_stdin, daemon=True).start()
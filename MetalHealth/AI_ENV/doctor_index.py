@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Doctor Index
+In-memory index of a Doctors table snapshot, keyed by speciality and symptom
+tags, so risk recommendations can name concrete doctors without a database
+round trip. The snapshot is the SQL seed file (INSERT INTO Doctors ... VALUES)
+or a JSON export of the table rows (a list, or {"doctors": [...]}).
+
+The index is rebuilt when the snapshot file's modification time or size
+changes; between changes a lookup is a dictionary access and a small sort.
+
+Configuration:
+    DOCTORS_SNAPSHOT   snapshot path, default ../update_doctors.sql ("off" disables)
+
+Usage:
+    python doctor_index.py "analysis text" [--speciality NAME]
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import threading
+
+DEFAULT_SNAPSHOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "update_doctors.sql")
+
+# Symptom tags and the words that signal them, in doctor details and in analyses alike
+TAG_KEYWORDS = {
+    "crisis": ["suicide", "suicidal", "crisis", "emergency", "urgent", "self-harm", "acute"],
+    "depression": ["depression", "depressive", "mood", "sadness", "bipolar"],
+    "anxiety": ["anxiety", "panic", "stress", "phobia", "worry"],
+    "trauma": ["trauma", "ptsd", "flashback", "dissociative", "emdr"],
+    "addiction": ["addiction", "substance", "alcohol", "drug", "recovery"],
+    "eating": ["eating", "anorexia", "bulimia", "binge", "body image", "weight"],
+    "relationships": ["family", "relationship", "couple", "marriage", "communication"],
+    "youth": ["child", "adolescent", "adhd", "autism", "school", "young people"],
+    "older_adults": ["geriatric", "older adults", "late-life", "aging"],
+    "cognitive": ["cognitive", "brain", "dementia", "memory", "neuropsych"],
+    "sleep": ["sleep", "insomnia"],
+    "medication": ["medication", "psychiatrist", "medical evaluation"],
+}
+
+# Keywords match at the start of a word, so "eating" is not found in "treating"
+TAG_PATTERNS = {tag: re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + ")")
+                for tag, keywords in TAG_KEYWORDS.items()}
+INSERT_STATEMENT = re.compile(r"INSERT\s+INTO\s+`?Doctors`?\s*\(([^)]*)\)\s*VALUES\s*", re.IGNORECASE)
+
+def tags_for(text):
+    """Symptom tags whose keywords occur in a text."""
+    lowered = (text or "").lower()
+    return frozenset(tag for tag, pattern in TAG_PATTERNS.items() if pattern.search(lowered))
+
+def _parse_value(token):
+    if token.upper() == "NULL":
+        return None
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return token
+
+def _parse_tuples(sql, pos):
+    """Parse comma-separated (value, ...) tuples starting at `pos`. Returns (rows, end)."""
+    rows = []
+    n = len(sql)
+    while pos < n:
+        while pos < n and sql[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= n or sql[pos] != "(":
+            break
+        pos += 1
+        row, value = [], None
+        while pos < n:
+            char = sql[pos]
+            if char == "'":
+                # Quoted string with '' or \' escapes
+                pos += 1
+                chars = []
+                while pos < n:
+                    if sql[pos] == "\\" and pos + 1 < n:
+                        chars.append(sql[pos + 1])
+                        pos += 2
+                    elif sql[pos] == "'" and sql[pos + 1:pos + 2] == "'":
+                        chars.append("'")
+                        pos += 2
+                    elif sql[pos] == "'":
+                        pos += 1
+                        break
+                    else:
+                        chars.append(sql[pos])
+                        pos += 1
+                value = "".join(chars)
+            elif char in ",)":
+                row.append(value)
+                value = None
+                pos += 1
+                if char == ")":
+                    break
+            elif char.isspace():
+                pos += 1
+            else:
+                end = pos
+                while end < n and sql[end] not in ",)" and not sql[end].isspace():
+                    end += 1
+                value = _parse_value(sql[pos:end])
+                pos = end
+        rows.append(row)
+    return rows, pos
+
+def parse_sql_snapshot(sql):
+    """Rows of every INSERT INTO Doctors statement in a SQL script, as dicts."""
+    doctors = []
+    for match in INSERT_STATEMENT.finditer(sql):
+        columns = [c.strip().strip("`") for c in match.group(1).split(",")]
+        rows, _ = _parse_tuples(sql, match.end())
+        doctors.extend(dict(zip(columns, row)) for row in rows)
+    return doctors
+
+def load_snapshot(path):
+    """Doctor rows from a .sql seed file or a JSON export."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        data = json.loads(text)
+        return data.get("doctors", []) if isinstance(data, dict) else data
+    return parse_sql_snapshot(text)
+
+class DoctorIndex:
+    """Doctors by lowercased speciality and by symptom tag."""
+
+    def __init__(self, doctors):
+        self.doctors = []
+        self.by_speciality = {}
+        self.by_tag = {}
+        for row in doctors:
+            if not row.get("name") or not row.get("speciality"):
+                continue
+            doctor = {
+                "doctor_id": row.get("doctor_id"),
+                "name": row["name"],
+                "speciality": row["speciality"],
+                "phoneno": row.get("phoneno"),
+                "details": row.get("details") or ""
+            }
+            position = len(self.doctors)
+            self.doctors.append((doctor, tags_for(f"{doctor['speciality']} {doctor['details']}")))
+            self.by_speciality.setdefault(doctor["speciality"].lower(), []).append(position)
+            for tag in self.doctors[position][1]:
+                self.by_tag.setdefault(tag, []).append(position)
+
+    def __len__(self):
+        return len(self.doctors)
+
+    def _ranked(self, positions, tags, exclude):
+        # Cosine similarity of the tag sets, so specialists beat generalists
+        # sharing the same tags; ties keep snapshot order
+        def similarity(p):
+            doctor_tags = self.doctors[p][1]
+            return len(doctor_tags & tags) / math.sqrt(len(doctor_tags)) if doctor_tags else 0.0
+        candidates = [p for p in positions if p not in exclude]
+        candidates.sort(key=lambda p: (-similarity(p), p))
+        return candidates
+
+    def for_speciality(self, speciality, tags=frozenset(), limit=2):
+        """Doctors of a speciality, best tag match first."""
+        positions = self._ranked(self.by_speciality.get(speciality.lower(), []), tags, set())
+        return [self.doctors[p][0] for p in positions[:limit]]
+
+    def rank(self, text, specialities=(), limit=3):
+        """Doctors for an analysis: requested specialities in order, then other doctors sharing its tags."""
+        tags = tags_for(text)
+        chosen = []
+        for speciality in specialities:
+            chosen.extend(p for p in self._ranked(self.by_speciality.get(speciality.lower(), []), tags, set(chosen)))
+        tagged = sorted({p for tag in tags for p in self.by_tag.get(tag, [])})
+        chosen.extend(self._ranked(tagged, tags, set(chosen)))
+        return [self.doctors[p][0] for p in chosen[:limit]]
+
+_cache = {"key": None, "index": None}
+_cache_lock = threading.Lock()
+
+def snapshot_path():
+    return os.getenv("DOCTORS_SNAPSHOT", DEFAULT_SNAPSHOT)
+
+def get_index(path=None):
+    """The index for the snapshot file, rebuilt when the file changes; None if unavailable."""
+    path = path or snapshot_path()
+    if path == "off":
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        if _cache["key"] != key:
+            try:
+                _cache["index"] = DoctorIndex(load_snapshot(path))
+            except (OSError, ValueError) as e:
+                print(f"Could not load doctors snapshot {path}: {e}", file=sys.stderr)
+                # Keep serving the previous snapshot rather than none
+                if _cache["index"] is None:
+                    return None
+            _cache["key"] = key
+        return _cache["index"]
+
+def main(argv):
+    specialities = []
+    if "--speciality" in argv:
+        i = argv.index("--speciality")
+        specialities = argv[i + 1:i + 2]
+        del argv[i:i + 2]
+    text = " ".join(argv)
+    started = time.perf_counter()
+    index = get_index()
+    loaded = time.perf_counter()
+    if index is None:
+        print(f"No doctors snapshot at {snapshot_path()}")
+        return 1
+    doctors = index.rank(text, specialities)
+    ranked = time.perf_counter()
+    print(f"{len(index)} doctors loaded in {(loaded - started) * 1e3:.2f} ms, ranked in {(ranked - loaded) * 1e6:.1f} us")
+    print(f"tags: {', '.join(sorted(tags_for(text))) or '-'}")
+    for doctor in doctors:
+        print(f"  {doctor['name']:<22} {doctor['speciality']:<30} {doctor['phoneno']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Shared Gemini Client
+HTTP access to the Gemini generateContent endpoint shared by the analysis scripts.
+The API base URL can be pointed at a mock server through GEMINI_API_BASE.
+Connect, time-to-first-byte and total request time plus usageMetadata token
+counts are recorded in the process-wide stage timings, and per-endpoint latency,
+token and error metrics are exported through metrics.py. Token usage is also
+added to the usage ledger, whose daily budgets can switch a call to a cheaper
+mode before it is sent. GEMINI_CASSETTE_MODE records responses to, or replays
+them from, cassette files (see cassette.py); replayed calls skip the rate
+limiter, the ledger and the HTTP metrics. Every call is bounded by the run's
+deadline (see deadline.py), and cancelling the run shuts down the sockets of
+calls in flight. Each request carries the generationConfig of its endpoint's
+profile (see generation_profiles.py).
+"""
+
+import os
+import sys
+import time
+import argparse
+import socket
+import sqlite3
+import hashlib
+import threading
+import weakref
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from profiling import TIMINGS
+from usage_ledger import get_ledger, apply_mode, current_user, is_budget_exempt
+import cassette
+import deadline
+from generation_profiles import build_payload
+from metrics import (GEMINI_LATENCY, GEMINI_PROMPT_TOKENS, GEMINI_OUTPUT_TOKENS, GEMINI_ERRORS, GEMINI_THROTTLED,
+                     start_exporters)
+
+MODEL = "gemini-2.5-flash"
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com"
+API_PATH_TEMPLATE = "/v1beta/models/{model}:generateContent?key={api_key}"
+
+class GeminiHTTPError(Exception):
+    """Raised when the API answers with a non-2xx status."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"HTTP {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+class RateLimiter:
+    """Token bucket limiting requests per second across threads."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        if not self.rate > 0:
+            raise ValueError(f"Rate must be a positive number of requests per second, got {rate}")
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            deadline.wait(wait)
+
+def rate_arg(value):
+    """argparse type for a --rate option: a positive number of requests per second."""
+    try:
+        rate = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate: {value!r}")
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f"rate must be greater than 0, got {value}")
+    return rate
+
+# Open connections, so cancelling the run can shut their sockets down
+_connections = weakref.WeakSet()
+
+class _TimedHTTPConnection(urllib3.connection.HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            TIMINGS.add("http_connect", time.perf_counter() - started)
+        _connections.add(self)
+
+class _TimedHTTPSConnection(urllib3.connection.HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            TIMINGS.add("http_connect", time.perf_counter() - started)
+        _connections.add(self)
+
+def _abort_connections():
+    """Shut down every open socket; blocked reads in any thread return at once."""
+    for conn in list(_connections):
+        sock = getattr(conn, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+deadline.on_cancel(_abort_connections)
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class _TimedAdapter(HTTPAdapter):
+    """Adapter whose connection pools time TCP/TLS connection setup."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+# One session per process so repeated calls reuse the connection
+_session = requests.Session()
+_session.mount("http://", _TimedAdapter())
+_session.mount("https://", _TimedAdapter())
+
+USAGE_FIELDS = {
+    "promptTokenCount": "prompt",
+    "candidatesTokenCount": "output",
+    "thoughtsTokenCount": "thinking",
+    "cachedContentTokenCount": "cached",
+    "totalTokenCount": "total"
+}
+
+def usage_from_response(resp):
+    """Token counts from a response's usageMetadata, keyed by short names."""
+    usage = resp.get("usageMetadata") if isinstance(resp, dict) else None
+    if not isinstance(usage, dict):
+        return {}
+    return {short: int(usage[field]) for field, short in USAGE_FIELDS.items() if isinstance(usage.get(field), int)}
+
+def get_api_url(api_key, model=MODEL):
+    """Build the generateContent URL, honouring GEMINI_API_BASE."""
+    base = os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE).rstrip("/")
+    return base + API_PATH_TEMPLATE.format(model=model, api_key=api_key)
+
+def key_label(api_key):
+    """Short non-reversible label for an API key, so per-key quota use shows up in metrics."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+
+def _post(api_key, model, payload, timeout, endpoint):
+    """Send one request and return (response, seconds), recording HTTP timings and failures."""
+    headers = {"Content-Type": "application/json"}
+    started = time.perf_counter()
+    try:
+        # stream=True returns as soon as the headers arrive, which gives time to first byte
+        r = _session.post(get_api_url(api_key, model), json=payload, headers=headers, timeout=timeout, stream=True)
+        TIMINGS.add("http_ttfb", time.perf_counter() - started)
+        r.content  # Read the full body
+    except requests.exceptions.RequestException as e:
+        if deadline.cancelled():
+            GEMINI_ERRORS.inc(endpoint=endpoint, reason="cancelled")
+            raise deadline.Cancelled("Request aborted by cancellation") from e
+        if deadline.out_of_time():
+            GEMINI_ERRORS.inc(endpoint=endpoint, reason="deadline")
+            raise deadline.DeadlineExceeded("Request cut off by the deadline") from e
+        GEMINI_ERRORS.inc(endpoint=endpoint, reason="timeout" if isinstance(e, requests.exceptions.Timeout)
+                          else "connection")
+        raise
+    elapsed = time.perf_counter() - started
+    TIMINGS.add("http_total", elapsed)
+    GEMINI_LATENCY.observe(elapsed, endpoint=endpoint, model=model, key=key_label(api_key))
+    return r, elapsed
+
+def generate_content(api_key, prompt, model=MODEL, timeout=30, rate_limiter=None, endpoint="unknown", profile=None,
+                     route_reason=None):
+    """POST a prompt to Gemini and return the decoded JSON response.
+
+    Raises GeminiHTTPError for non-2xx answers and requests exceptions for
+    network failures, leaving the error format to each caller. In replay mode a
+    request without a cassette raises cassette.CassetteMiss. `endpoint` names
+    the calling script in the exported metrics and the usage ledger.
+
+    `timeout` is cut to the time left before the run's deadline. Calls made
+    after the deadline or a cancellation raise deadline.DeadlineExceeded or
+    deadline.Cancelled without being sent.
+
+    `profile` replaces the endpoint's generation profile for this call; an
+    empty dict sends no generationConfig.
+
+    `route_reason` is the model router's reason for `model`; calls routed for
+    a risk signal are never moved to a cheaper budget mode.
+    """
+    start_exporters()
+    deadline.check()
+    payload = build_payload(prompt, endpoint, model, profile)
+    cassettes = cassette.cassette_mode()
+    if cassettes == "replay":
+        r = cassette.replay(model, payload)
+        ledger = None
+    else:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        # Cassettes are keyed on the request as the caller built it, before any budget mode
+        requested_model, requested_payload = model, payload
+        ledger = get_ledger()
+        mode = "normal"
+        if ledger is not None and not is_budget_exempt(endpoint, route_reason):
+            try:
+                mode = ledger.budget_mode(current_user())
+            except sqlite3.Error as e:
+                print(f"Usage ledger unavailable: {e}", file=sys.stderr)
+            model, payload = apply_mode(mode, model, payload)
+        r, elapsed = _post(api_key, model, payload, deadline.bound(timeout), endpoint)
+        if cassettes == "record":
+            cassette.record(requested_model, requested_payload, endpoint, r, elapsed,
+                            prompt_version=getattr(prompt, "version", None))
+    if not r.ok:
+        GEMINI_ERRORS.inc(endpoint=endpoint, reason=str(r.status_code))
+        if r.status_code == 429:
+            # Quota saturation is per key, so it is tracked per key
+            GEMINI_THROTTLED.inc(endpoint=endpoint, key=key_label(api_key))
+        raise GeminiHTTPError(r.status_code, r.text)
+
+    with TIMINGS.stage("response_decode"):
+        resp = r.json()
+    usage = usage_from_response(resp)
+    TIMINGS.add_tokens(usage)
+    if "prompt" in usage:
+        GEMINI_PROMPT_TOKENS.observe(usage["prompt"], endpoint=endpoint, model=model)
+    if "output" in usage or "thinking" in usage:
+        GEMINI_OUTPUT_TOKENS.observe(usage.get("output", 0) + usage.get("thinking", 0), endpoint=endpoint, model=model)
+    if ledger is not None:
+        try:
+            # Prompts rendered from the registry carry their template version
+            ledger.record(endpoint, model, usage, elapsed, prompt_version=getattr(prompt, "version", None), mode=mode)
+        except sqlite3.Error as e:
+            print(f"Usage ledger unavailable: {e}", file=sys.stderr)
+    return resp
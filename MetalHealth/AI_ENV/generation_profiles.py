@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Generation Profiles
+Declarative generationConfig per endpoint: the output cap, the thinking
+budget, the temperature and stop sequences sent with every Gemini call.
+Without them gemini-2.5-flash thinks by default and may write unbounded
+output even where the answer is a few sentences or a three-field JSON object.
+
+A profile is looked up by the prompt template the call renders (so the batch
+prompt gets its own cap) and then by the endpoint. maxOutputTokens is the
+budget for the visible answer; thinking tokens count against the same limit
+in the API, so the thinking budget is added to it when the request is built.
+A thinkingBudget of None leaves thinking to the model.
+
+Configuration:
+    GENERATION_PROFILES_FILE   JSON of {endpoint: {field: value}} merged over
+                               the defaults per field ("off" sends no
+                               generationConfig at all)
+
+Usage:
+    python generation_profiles.py
+"""
+
+import os
+import sys
+import json
+
+DEFAULT_PROFILES = {
+    "checkin": {"maxOutputTokens": 320, "thinkingBudget": 0, "temperature": 0.4},         # 4-6 short sentences
+    "instagram": {"maxOutputTokens": 512, "thinkingBudget": 0, "temperature": 0.5},
+    "summary": {"maxOutputTokens": 1024, "thinkingBudget": 0, "temperature": 0.7},
+    "daily_summary": {"maxOutputTokens": 384, "thinkingBudget": 0, "temperature": 0.3},   # Three-field JSON
+    "assessment": {"maxOutputTokens": 768, "thinkingBudget": 0, "temperature": 0.3},
+    "assessment_batch": {"maxOutputTokens": 4096, "thinkingBudget": 0, "temperature": 0.3},  # Up to 8 items
+    "assessment_summary": {"maxOutputTokens": 1152, "thinkingBudget": 0, "temperature": 0.3},
+    "analytics": {"maxOutputTokens": 1536, "thinkingBudget": 1024, "temperature": 0.4},
+    "risk": {"maxOutputTokens": 2048, "thinkingBudget": 1024, "temperature": 0.2}
+}
+
+# Lite models reject thinking budgets between 1 and this value
+LITE_MIN_THINKING_BUDGET = 512
+
+def load_profiles():
+    """Default profiles with the GENERATION_PROFILES_FILE overrides; None when disabled."""
+    path = os.getenv("GENERATION_PROFILES_FILE")
+    if path == "off":
+        return None
+    profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for name, overrides in json.load(f).items():
+                profiles.setdefault(name, {}).update(overrides)
+    return profiles
+
+PROFILES = load_profiles()
+
+def profile_for(endpoint, prompt_version=None, profiles=None):
+    """The profile of a call's prompt template, else of its endpoint, else an empty one."""
+    profiles = PROFILES if profiles is None else profiles
+    if not profiles:
+        return {}
+    template = (prompt_version or "").split("@")[0]
+    return profiles.get(template) or profiles.get(endpoint) or {}
+
+def generation_config(profile, model=""):
+    """The API generationConfig for a profile and model; empty when the profile sets nothing."""
+    config = {key: value for key, value in profile.items()
+              if key not in ("maxOutputTokens", "thinkingBudget") and value is not None}
+    budget = profile.get("thinkingBudget")
+    if budget is not None:
+        if "lite" in model and 0 < budget < LITE_MIN_THINKING_BUDGET:
+            budget = LITE_MIN_THINKING_BUDGET
+        config["thinkingConfig"] = {"thinkingBudget": budget}
+    if profile.get("maxOutputTokens") is not None:
+        config["maxOutputTokens"] = profile["maxOutputTokens"] + max(budget or 0, 0)
+    return config
+
+def build_payload(prompt, endpoint, model="", profile=None):
+    """generateContent request body for a prompt, with the endpoint's profile unless one is given."""
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if profile is None:
+        profile = profile_for(endpoint, getattr(prompt, "version", None))
+    config = generation_config(profile, model)
+    if config:
+        payload["generationConfig"] = config
+    return payload
+
+def main():
+    if PROFILES is None:
+        print("Generation profiles are off")
+        return 0
+    print(f"{'profile':<20} {'maxOutput':>9} {'thinking':>8} {'temp':>5}  stop")
+    for name, profile in sorted(PROFILES.items()):
+        budget = profile.get("thinkingBudget")
+        print(f"{name:<20} {profile.get('maxOutputTokens', '-'):>9} {'model' if budget is None else budget:>8} "
+              f"{profile.get('temperature', '-'):>5}  {', '.join(map(repr, profile.get('stopSequences', []))) or '-'}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
-import os, sys, requests
+import time
+_STARTED = time.perf_counter()
+
+import os, sys, json, hashlib, argparse, threading
+from collections import Counter, OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from gemini_client import MODEL, RateLimiter, generate_content, rate_arg
+from profiling import stage, record_startup, pop_profile_flag, report_timings, run_profiled
+from near_duplicate import load_index, save_index, normalize_text, is_cacheable, analysis_namespace
+from affect_lexicon import score_text, score_batch, needs_model
+from metrics import record_cache
+from result_store import get_store, default_session
+from model_router import route
+from usage_ledger import current_user
+import deadline
 
 load_dotenv()
 
-MODEL = "gemini-2.5-flash"
-OUTPUT_FILE = "output.txt"
+DEDUP_NAMESPACE = "instagram_post"
 API_KEY_ENV = "GOOGLE_API_KEY_2"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+TREND_BUCKETS = ("day", "week", "month")
+TREND_THRESHOLD = 0.05  # Change in mean polarity per bucket that counts as a trend
+SCORE_CHUNK = 64        # Feed captions scored together by the local lexicon
+CAPTION_CACHE_SIZE = 1024  # Recent captions whose in-flight or finished analysis batch mode reuses
 
 def get_api_key(env_var_name=API_KEY_ENV):
     key = os.getenv(env_var_name)
@@ -28,24 +46,33 @@ def extract_text_from_response(resp):
                     texts.append(p["text"])
     return "\n".join(texts).strip()
 
-def call_gemini(api_key, prompt, model=MODEL):
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
-    r = requests.post(url, json=payload, headers=headers, timeout=30)
-    r.raise_for_status()
-    return extract_text_from_response(r.json())
+def call_gemini(api_key, prompt, model=MODEL, rate_limiter=None, route_reason=None):
+    resp = generate_content(api_key, prompt, model, timeout=30, rate_limiter=rate_limiter, endpoint="instagram",
+                            route_reason=route_reason)
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
 
-def main():
-    api_key = get_api_key()
+def build_local_post_analysis(affect):
+    """Describe a short, non-concerning post from its local affect score."""
+    if affect["tone"] == "positive":
+        return ("The post has a positive emotional tone. There are no signs of stress, anxiety or other "
+                "mental health concerns in the text. Sharing moments like this can reinforce positive "
+                "experiences - keep making time for the people and activities behind them.")
+    return ("The post has a neutral emotional tone. There are no signs of stress, anxiety or other "
+            "mental health concerns in the text. Adding a few words about how you felt can make your "
+            "posts a more useful record of your well-being.")
 
-    post_text = input("\nPaste the text/caption of your Instagram post (or a small summary of it): ").strip()
-    if not post_text:
-        print("No Instagram text provided. Writing 'no'.")
-        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-            f.write("Output 3\nno\n\n")
-        return
+def analyze_post(api_key, post_text):
+    """Analyze one caption and return the text for the log."""
+    return analyze_post_result(api_key, post_text)[0]
 
+def analyze_post_result(api_key, post_text, rate_limiter=None, dedup_index=None, affect=None):
+    """Analyze one caption. Returns (text, source), source being "local", "near_duplicate" or "model".
+
+    A shared dedup_index is used as is and left for the caller to save;
+    without one the on-disk index is loaded and saved around the call.
+    An affect score the caller already has is used instead of scoring again.
+    """
     prompt = f"""
 You are an emotional tone detection AI. 
 Analyze the following Instagram post text and give a short, clear paragraph about:
@@ -56,15 +83,236 @@ Analyze the following Instagram post text and give a short, clear paragraph abou
 Instagram Post: {post_text}
 """
 
-    gemini_out = call_gemini(api_key, prompt)
+    # Short, clearly non-concerning captions are answered by the local scorer,
+    # and near-identical captions of the same user reuse an analysis that was
+    # already generated
+    if affect is None:
+        with stage("local_score"):
+            affect = score_text(post_text)
+    record_cache("local_lexicon", not needs_model(affect))
+    if not needs_model(affect):
+        return build_local_post_analysis(affect), "local"
+    cacheable = is_cacheable(post_text, affect)
+    namespace = analysis_namespace(DEDUP_NAMESPACE, current_user(), post_text)
+    owns_index = dedup_index is None
+    if cacheable:
+        with stage("dedup_lookup"):
+            if owns_index:
+                dedup_index = load_index()
+            gemini_out, _ = dedup_index.lookup(post_text, namespace)
+        record_cache("near_duplicate", bool(gemini_out))
+        if gemini_out:
+            return gemini_out, "near_duplicate"
+    decision = route("instagram", post_text)
+    gemini_out = call_gemini(api_key, prompt, decision.model, rate_limiter, decision.reason)
     if not gemini_out:
-        gemini_out = "Could not analyze Instagram post."
+        return "Could not analyze Instagram post.", "model"
+    if cacheable:
+        dedup_index.add(post_text, gemini_out, namespace)
+        if owns_index:
+            save_index(dedup_index)
+    return gemini_out, "model"
+
+def post_time(value):
+    """UTC datetime of a post timestamp (ISO text, or Unix seconds or milliseconds); None if unusable."""
+    try:
+        seconds = deadline.parse_deadline(value)
+    except (TypeError, ValueError):
+        return None
+    return None if seconds is None else datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+def bucket_key(when, bucket):
+    """Trend bucket of a datetime: its day, the Monday of its week, or its month."""
+    if bucket == "month":
+        return when.strftime("%Y-%m")
+    if bucket == "week":
+        return (when - timedelta(days=when.weekday())).strftime("%Y-%m-%d")
+    return when.strftime("%Y-%m-%d")
+
+class ToneTrend:
+    """Running tone statistics per time bucket, with a least-squares direction over the buckets."""
+
+    def __init__(self, bucket="week"):
+        self.bucket = bucket
+        self.buckets = {}  # key -> [posts, polarity sum, stress sum, anxiety sum, Counter of tones]
+
+    def add(self, timestamp, affect):
+        when = post_time(timestamp)
+        key = bucket_key(when, self.bucket) if when else "unknown"
+        entry = self.buckets.setdefault(key, [0, 0.0, 0.0, 0.0, Counter()])
+        entry[0] += 1
+        entry[1] += affect["polarity"]
+        entry[2] += affect["stress"]
+        entry[3] += affect["anxiety"]
+        entry[4][affect["tone"]] += 1
+
+    def rows(self):
+        return [{"bucket": key, "posts": n, "polarity": round(polarity / n, 3), "stress": round(stress / n, 3),
+                 "anxiety": round(anxiety / n, 3), "tones": dict(tones)}
+                for key, (n, polarity, stress, anxiety, tones) in sorted(self.buckets.items())]
+
+    def direction(self):
+        means = [row["polarity"] for row in self.rows() if row["bucket"] != "unknown"]
+        n = len(means)
+        if n < 2:
+            return "Insufficient data"
+        x_mean = (n - 1) / 2
+        y_mean = sum(means) / n
+        slope = (sum((i - x_mean) * (y - y_mean) for i, y in enumerate(means))
+                 / sum((i - x_mean) ** 2 for i in range(n)))
+        if slope > TREND_THRESHOLD:
+            return "Improving"
+        if slope < -TREND_THRESHOLD:
+            return "Declining"
+        return "Stable"
+
+    def as_dict(self):
+        return {"bucket": self.bucket, "direction": self.direction(), "buckets": self.rows()}
+
+def iter_posts(path):
+    """Stream (id, post) pairs from a JSONL feed export, skipping blank or corrupt lines."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                post = json.loads(line)
+            except json.JSONDecodeError:
+                post = None
+            if not isinstance(post, dict):
+                print(f"Skipping corrupt feed line {line_number}", file=sys.stderr)
+                continue
+            post_id = post.get("id")
+            yield (str(post_id) if post_id is not None else f"line-{line_number}"), post
+
+def iter_scored_posts(path, chunk_size=SCORE_CHUNK):
+    """Stream (id, post, caption, affect) from a feed export, scoring captions a chunk at a time."""
+    posts = iter_posts(path)
+    for chunk in iter(lambda: list(islice(posts, chunk_size)), []):
+        captions = [(post.get("caption") or "").strip() for _, post in chunk]
+        for (post_id, post), caption, affect in zip(chunk, captions, score_batch(captions)):
+            yield post_id, post, caption, affect
+
+def run_batch(feed_path, output_path, api_key, concurrency=4, rate=1.0, bucket="week",
+              caption_cache=CAPTION_CACHE_SIZE):
+    """Analyze every post of a feed export. Returns the run stats and the tone trend.
+
+    Reposts (an id seen before) are skipped. Posts whose normalized caption
+    is among the last caption_cache distinct captions reuse the first post's
+    analysis instead of being sent again; older repeats are answered from the
+    shared near-duplicate index. Per-post results are appended to output_path
+    as JSONL.
+    """
+    rate_limiter = RateLimiter(rate, burst=concurrency)
+    dedup_index = load_index()
+    trend = ToneTrend(bucket)
+    stats = Counter()
+    seen_ids = set()
+    first_by_caption = OrderedDict()  # caption digest -> (post id, future), least recent first
+    # Bounds in-flight work so the feed is streamed, not loaded
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    lock = threading.Lock()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(concurrency) as pool:
+        def emit(result, affect=None):
+            with lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                stats[result.get("source") or result["status"]] += 1
+                if affect is not None:
+                    trend.add(result.get("timestamp"), affect)
+
+        def finish(post_id, post, affect, duplicate_of, future):
+            error = future.exception()
+            if error is not None:
+                # Work cut off by the deadline or a cancel is not a failure
+                if not deadline.out_of_time():
+                    emit({"id": post_id, "status": "failed", "error": str(error)})
+                return
+            text, source = future.result()
+            emit({
+                "id": post_id, "timestamp": post.get("timestamp"), "status": "ok",
+                "source": "duplicate" if duplicate_of else source, "duplicateOf": duplicate_of,
+                "tone": affect["tone"], "polarity": affect["polarity"], "stress": affect["stress"],
+                "anxiety": affect["anxiety"], "crisis": affect["crisis"], "analysis": text
+            }, affect)
+
+        for post_id, post, caption, affect in iter_scored_posts(feed_path):
+            if deadline.out_of_time():
+                break
+            if post_id in seen_ids:
+                stats["repost"] += 1
+                continue
+            seen_ids.add(post_id)
+            if not caption:
+                emit({"id": post_id, "timestamp": post.get("timestamp"), "status": "empty"})
+                continue
+            digest = hashlib.blake2b(normalize_text(caption).encode("utf-8"), digest_size=16).digest()
+            duplicate_of = None
+            if digest in first_by_caption:
+                first_by_caption.move_to_end(digest)
+                duplicate_of, future = first_by_caption[digest]
+            else:
+                slots.acquire()
+                future = pool.submit(analyze_post_result, api_key, caption, rate_limiter, dedup_index, affect)
+                future.add_done_callback(lambda _: slots.release())
+                first_by_caption[digest] = (post_id, future)
+                if len(first_by_caption) > caption_cache:
+                    first_by_caption.popitem(last=False)
+            future.add_done_callback(lambda f, args=(post_id, post, affect, duplicate_of): finish(*args, f))
+
+    save_index(dedup_index)
+    return {"stats": dict(stats), "trend": trend.as_dict()}
+
+def batch_main(argv):
+    parser = argparse.ArgumentParser(
+        description="Analyze a JSONL Instagram feed export (id, timestamp, caption) without prompts.")
+    parser.add_argument("--batch", metavar="FEED", required=True, help="JSONL feed export")
+    parser.add_argument("output", help="JSONL file the per-post results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel requests (default 4)")
+    parser.add_argument("--rate", type=rate_arg, default=os.getenv("GEMINI_RATE_LIMIT", "1.0"),
+                        help="max requests per second (default 1.0 or GEMINI_RATE_LIMIT)")
+    parser.add_argument("--bucket", choices=TREND_BUCKETS, default="week", help="tone trend bucket (default week)")
+    parser.add_argument("--caption-cache", type=int, default=CAPTION_CACHE_SIZE,
+                        help=f"recent distinct captions kept for exact-repeat reuse (default {CAPTION_CACHE_SIZE})")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv(API_KEY_ENV)
+    if not api_key:
+        print(json.dumps({"error": f"{API_KEY_ENV} not set"}))
+        return 1
+    result = run_batch(args.batch, args.output, api_key.strip().strip('"').strip("'"),
+                       args.concurrency, args.rate, args.bucket, args.caption_cache)
+    print(json.dumps(result))
+    return 130 if deadline.out_of_time() else 0
+
+def main():
+    api_key = get_api_key()
+
+    post_text = input("\nPaste the text/caption of your Instagram post (or a small summary of it): ").strip()
+    if not post_text:
+        print("No Instagram text provided. Writing 'no'.")
+        get_store().append(default_session(), "Output 3", "no")
+        return
+
+    gemini_out = analyze_post(api_key, post_text)
 
-    with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-        f.write(f"Output 3\n{gemini_out}\n\n")
+    get_store().append(default_session(), "Output 3", gemini_out)
 
     print("\nInstagram Post Analysis:\n")
     print(gemini_out)
 
 if __name__ == "__main__":
-    main()
+    record_startup(_STARTED)
+    profile = pop_profile_flag(sys.argv)
+    deadline.install(sys.argv)
+    if any(arg == "--batch" or arg.startswith("--batch=") for arg in sys.argv[1:]):
+        code = run_profiled(batch_main, sys.argv[1:]) if profile else batch_main(sys.argv[1:])
+        report_timings()
+        sys.exit(code)
+    if profile:
+        run_profiled(main)
+    else:
+        main()
+    report_timings()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Analysis Job Scheduler
+Priority and fair-share scheduling for work that ends in a Gemini call.
+
+Jobs run in priority-class order (crisis, assessment, summary, analytics,
+backfill). Inputs with high-risk signals are promoted to the crisis class.
+Within a class, users share the workers by weighted fair queuing: each job gets
+a virtual finish time, max(class virtual time, user's last finish) + cost / weight,
+and the smallest finish time runs first. One heavy user therefore cannot starve
+the others.
+
+Time spent queued is exported per class through metrics.py.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from metrics import REGISTRY, QUEUE_DEPTH, LATENCY_BUCKETS
+from risk_signals import has_high_risk_signal
+
+PRIORITY_CLASSES = ("crisis", "assessment", "summary", "analytics", "backfill")
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "analysis_queue_wait_seconds", "Time analysis jobs spent queued before a worker picked them up.",
+    ("priority",), LATENCY_BUCKETS)
+
+class _Job:
+    __slots__ = ("func", "args", "kwargs", "future", "priority", "enqueued")
+
+    def __init__(self, func, args, kwargs, priority):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+
+class JobScheduler:
+    """Worker pool that runs submitted jobs in priority, then fair-share order."""
+
+    def __init__(self, workers=4, user_weights=None, queue_name="analysis"):
+        self.user_weights = dict(user_weights or {})
+        self.queue_name = queue_name
+        self._heap = []
+        self._sequence = itertools.count()           # FIFO tie-break
+        self._virtual_time = {name: 0.0 for name in PRIORITY_CLASSES}
+        self._last_finish = {}                        # (class, user) -> finish tag
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, *args, priority="analytics", user=None, cost=1.0,
+               answers=None, text=None, **kwargs):
+        """Queue func(*args, **kwargs) and return a Future for its result.
+
+        `answers`/`text` are only inspected for high-risk signals, which promote
+        the job to the crisis class.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        if has_high_risk_signal(answers, text):
+            priority = "crisis"
+
+        job = _Job(func, args, kwargs, priority)
+        weight = self.user_weights.get(user, 1.0)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            start = max(self._virtual_time[priority], self._last_finish.get((priority, user), 0.0))
+            finish = start + cost / weight
+            self._last_finish[(priority, user)] = finish
+            heapq.heappush(self._heap, (PRIORITY_CLASSES.index(priority), finish, next(self._sequence), job))
+            QUEUE_DEPTH.inc(queue=f"{self.queue_name}:{priority}")
+            self._condition.notify()
+        return job.future
+
+    def _next_job(self):
+        with self._condition:
+            while not self._heap and not self._shutdown:
+                self._condition.wait()
+            if not self._heap:
+                return None
+            _, finish, _, job = heapq.heappop(self._heap)
+            self._virtual_time[job.priority] = max(self._virtual_time[job.priority], finish)
+            QUEUE_DEPTH.dec(queue=f"{self.queue_name}:{job.priority}")
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            QUEUE_WAIT.observe(time.perf_counter() - job.enqueued, priority=job.priority)
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.func(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
+
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs; workers finish what is queued, then exit."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown(wait=True)
+        return False
@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
+import time
+_STARTED = time.perf_counter()
+
 import os
 import sys
 import json
-import requests
-from datetime import datetime
-import subprocess
 from dotenv import load_dotenv
+from gemini_client import MODEL, GeminiHTTPError, generate_content
+from profiling import stage, record_startup, pop_profile_flag, report_timings, run_profiled
+from pipeline import Pipeline
+from result_store import get_store, default_session
+from summary import analyze_summary
+from insta_analyze import analyze_post
+from risk_analysis import run_risk_analysis
+from model_router import route
+import deadline
 
 load_dotenv()  # load .env automatically
 
-MODEL = "gemini-2.5-flash"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-
 def get_api_key(env_var_name: str) -> str:
     """
     Get API key from environment or prompt the user once.
@@ -99,23 +105,19 @@ def call_gemini(api_key: str, prompt: str, model: str = MODEL) -> str:
     Call the Gemini-like REST endpoint and return extracted text.
     On failure, returns a string that starts with [ERROR_CALLING_GEMINI].
     """
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
     try:
-        r = requests.post(url, json=payload, headers=headers, timeout=30)
+        resp = generate_content(api_key, prompt, model, timeout=30, endpoint="checkin")
+    except GeminiHTTPError as e:
         # If non-2xx, try to give back server message
-        if not r.ok:
-            try:
-                err_json = r.json()
-                err_text = extract_text_from_response(err_json) or r.text
-            except Exception:
-                err_text = r.text
-            return f"[ERROR_CALLING_GEMINI] HTTP {r.status_code}: {err_text}"
-        resp = r.json()
+        try:
+            err_text = extract_text_from_response(json.loads(e.text)) or e.text
+        except Exception:
+            err_text = e.text
+        return f"[ERROR_CALLING_GEMINI] HTTP {e.status_code}: {err_text}"
     except Exception as e:
         return f"[ERROR_CALLING_GEMINI] {e}"
-    return extract_text_from_response(resp)
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
 
 def build_prompt_from_qas(qas):
     """
@@ -163,39 +165,61 @@ def build_prompt_from_qas(qas):
         pairs_text += f"Q{i}: {q}\nA{i}: {a_str}\n\n"
     return instruction + "\n\n" + pairs_text
 
-def append_to_output_file(filename: str, entries):
+def append_to_output_file(session: str, entries, final_output=None):
     """
-    Appends one or more text entries to a file with timestamps.
-    entries: iterable of strings.
-    Creates file if missing and writes header.
+    Records one or more outputs in the session's result shard.
+    entries: iterable of strings, stored as Output 1, Output 2, ...
+    final_output: optional risk analysis stored after the entries.
+    Everything is committed as one unit so concurrent sessions never interleave.
     """
-    is_new = not os.path.exists(filename)
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(filename, "a", encoding="utf-8") as f:
-        if is_new:
-            f.write(f"=== Session started: {now} ===\n\n")
-        else:
-            f.write(f"\n=== Entry appended: {now} ===\n\n")
-        for i, e in enumerate(entries, start=1):
-            f.write(f"Output {i}\n{e}\n\n")
+    records = [(f"Output {i}", e) for i, e in enumerate(entries, start=1)]
+    if final_output is not None:
+        records.append(("Final Output", final_output))
+    get_store().append_many(session, records)
 
-def append_output_labelled(filename: str, label: str, content: str):
-    """
-    Convenience: append a single labelled output to file.
-    """
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(filename, "a", encoding="utf-8") as f:
-        f.write(f"{label} ({now})\n{content}\n\n")
+def _branch(label, func, *args):
+    """Run one analysis branch; failures become log text so the risk stage still runs."""
+    try:
+        return func(*args)
+    except Exception as e:
+        return f"[ERROR] {label} analysis failed: {e}"
 
-def call_subprocess(script_name: str):
+def run_checkin_session(qas, summary_text, post_text, api_keys):
     """
-    Run another script with the same Python executable. Doesn't raise on failure.
+    Run the check-in (Output 1), summary (Output 2) and Instagram (Output 3)
+    analyses concurrently, then the risk analysis on their results in memory.
+    api_keys: (check-in/summary key, Instagram key, risk key).
+    Returns (outputs, final_output).
     """
-    cmd = [sys.executable, script_name]
-    try:
-        subprocess.run(cmd, check=False)
-    except Exception as e:
-        print(f"Failed to run {script_name}: {e}")
+    checkin_key, instagram_key, risk_key = api_keys
+
+    def checkin():
+        with stage("prompt_build"):
+            prompt = build_prompt_from_qas(qas)
+        # Q2 is the stress level and Q3 the mood level
+        levels = {"stressLevel": sanitize_numeric_answer(qas[1][1]) if len(qas) > 1 else None,
+                  "moodLevel": sanitize_numeric_answer(qas[2][1]) if len(qas) > 2 else None}
+        model = route("checkin", " ".join(str(a) for _, a in qas), levels).model
+        return call_gemini(checkin_key, prompt, model)
+
+    def summary():
+        # Same placeholders the standalone scripts write for skipped inputs
+        return _branch("Summary", analyze_summary, checkin_key, summary_text) if summary_text else "exhausted"
+
+    def instagram():
+        return _branch("Instagram", analyze_post, instagram_key, post_text) if post_text else "no"
+
+    def risk(Output1, Output2, Output3):
+        outs = {"Output1": Output1, "Output2": Output2, "Output3": Output3, "Output4": ""}
+        return _branch("Risk", run_risk_analysis, risk_key, outs)
+
+    results = (Pipeline()
+               .add("Output1", checkin)
+               .add("Output2", summary)
+               .add("Output3", instagram)
+               .add("risk_analysis", risk, depends_on=("Output1", "Output2", "Output3"))
+               .run())
+    return [results["Output1"], results["Output2"], results["Output3"]], results["risk_analysis"]
 
 def sanitize_numeric_answer(ans):
     """
@@ -221,7 +245,7 @@ def sanitize_numeric_answer(ans):
 def main():
     print("=== Daily Mental Health Check-in ===\n")
     print("This script processes the core 6 daily questions for mental health assessment.")
-    print("Daily summaries are now handled separately through the web interface.\n")
+    print("You can also add today's summary and an Instagram caption; all are analyzed together.\n")
     
     questions = [
         "How have you been feeling in the past week? (Happy / Sad / Anxious / Stressed / Neutral)",
@@ -241,24 +265,37 @@ def main():
         print("\nInput interrupted. Exiting.")
         sys.exit(1)
 
-    # Get API key
-    api_key_1 = get_api_key("GOOGLE_API_KEY_1")
+    # Optional inputs for the summary and Instagram branches
+    try:
+        summary_text = input("\nToday's summary (optional, press Enter to skip):\n").strip()
+        post_text = input("\nInstagram post caption (optional, press Enter to skip):\n").strip()
+    except (EOFError, KeyboardInterrupt):
+        summary_text, post_text = "", ""
+
+    # Get API keys up front, the branches run without a terminal
+    api_keys = (get_api_key("GOOGLE_API_KEY_1"),
+                get_api_key("GOOGLE_API_KEY_2") if post_text else "",
+                get_api_key("GOOGLE_API_KEY_3"))
 
-    prompt = build_prompt_from_qas(qas)
-    print("\nSending your responses to Gemini (API_KEY_1)...")
-    gemini_out = call_gemini(api_key_1, prompt)
+    print("\nAnalyzing your check-in, summary and post, then computing risk via Gemini...")
+    outputs, final_output = run_checkin_session(qas, summary_text, post_text, api_keys)
 
-    output_file = "output.txt"
-    append_to_output_file(output_file, [gemini_out])
+    session = default_session()
+    append_to_output_file(session, outputs, final_output)
     print("\nDaily Check-in Analysis (Output 1):\n")
-    print(gemini_out)
+    print(outputs[0])
 
     print("\n=== Daily Check-in Complete ===")
     print("Your daily mental health questions have been analyzed.")
-    print("To write a daily summary, use the web interface at the home page.")
-    print("\nCalling risk_analysis.py to compute risk via Gemini...")
-    call_subprocess("risk_analysis.py")
-    print("\nDaily check-in completed. Review output.txt for the full record.")
+    print("\nRisk Analysis Final Output:\n")
+    print(final_output)
+    print(f"\nDaily check-in completed. Review the full record with: python result_store.py show {session}")
 
 if __name__ == "__main__":
-    main()
+    record_startup(_STARTED)
+    deadline.install(sys.argv)
+    if pop_profile_flag(sys.argv):
+        run_profiled(main)
+    else:
+        main()
+    report_timings()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Latency and Throughput Metrics
+Counters, gauges and histograms exported in the Prometheus text format.
+
+Observations go to a per-thread shard without taking a lock; shards are only
+merged when the metrics are exported. Export targets are chosen by environment:
+
+    METRICS_PORT=9464            serve /metrics over HTTP from a daemon thread
+    METRICS_TEXTFILE=path.prom   write the file on exit (and every
+                                 METRICS_TEXTFILE_INTERVAL seconds if set)
+
+Every write merges the counts observed since this process's previous write into
+`path.prom.state.json` under a file lock, then rewrites the text file from the
+merged state. Counts therefore accumulate across short-lived processes, and the
+periodic and exit writes of one process never count the same observation twice.
+"""
+
+import os
+import json
+import atexit
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from file_lock import locked
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _ShardedMetric:
+    """Base for metrics aggregated in per-thread shards."""
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._merged = {}   # Series loaded from other processes
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _combine(self, a, b):
+        raise NotImplementedError
+
+    def collect(self):
+        """Merged {label key: value} across all thread shards."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        series = {}
+        for source in [self._merged] + shards:
+            for key, value in list(source.items()):
+                series[key] = self._combine(series[key], value) if key in series else self._copy(value)
+        return series
+
+    def _copy(self, value):
+        return value
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = _label_key(self.labelnames, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _combine(self, a, b):
+        return a + b
+
+    def _subtract(self, a, b):
+        return a - b
+
+    def exposition(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.collect().items())]
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = _label_key(self.labelnames, labels)
+        state = shard.get(key)
+        if state is None:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            state = shard[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def _combine(self, a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def _subtract(self, a, b):
+        return [[x - y for x, y in zip(a[0], b[0])], a[1] - b[1], a[2] - b[2]]
+
+    def exposition(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Gauge:
+    """Point-in-time value; plain assignments are atomic so no sharding is needed."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self):
+        return dict(self._values)
+
+    def exposition(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.collect().items())]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._flushed = {}   # State already merged into the on-disk totals
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def exposition(self):
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.exposition())
+        return "\n".join(lines) + "\n"
+
+    def dump_state(self):
+        """JSON-serializable snapshot of counters and histograms, for merging across processes."""
+        return {
+            name: [[list(key), value] for key, value in metric.collect().items()]
+            for name, metric in self._metrics.items() if isinstance(metric, _ShardedMetric)
+        }
+
+    def _unflushed_state(self, current):
+        """The part of `current` not yet merged into the on-disk totals."""
+        delta = {}
+        for name, series in current.items():
+            metric = self._metrics[name]
+            flushed = {tuple(key): value for key, value in self._flushed.get(name, [])}
+            delta[name] = [[key, metric._subtract(value, flushed[tuple(key)]) if tuple(key) in flushed else value]
+                           for key, value in series]
+        return delta
+
+    def merge_state(self, state):
+        for name, series in state.items():
+            metric = self._metrics.get(name)
+            if not isinstance(metric, _ShardedMetric):
+                continue
+            for key, value in series:
+                key = tuple(key)
+                metric._merged[key] = metric._combine(metric._merged[key], value) if key in metric._merged else value
+
+    def write_textfile(self, path, merge=True):
+        """Write the exposition atomically; with merge, accumulate into the on-disk state first.
+
+        Only what was observed since this registry's previous merged write is
+        added, so the file can be rewritten any number of times.
+        """
+        with locked(path):
+            text = self.exposition()
+            if merge:
+                current = self.dump_state()
+                state_path = path + ".state.json"
+                try:
+                    with open(state_path, "r", encoding="utf-8") as f:
+                        previous = json.load(f)
+                except (OSError, ValueError):
+                    previous = {}
+                combined = MetricsRegistry()
+                for metric in self._metrics.values():
+                    if isinstance(metric, Histogram):
+                        combined.histogram(metric.name, metric.documentation, metric.labelnames, metric.buckets)
+                    elif isinstance(metric, Counter):
+                        combined.counter(metric.name, metric.documentation, metric.labelnames)
+                    else:
+                        combined.register(metric)
+                combined.merge_state(previous)
+                combined.merge_state(self._unflushed_state(current))
+                text = combined.exposition()
+                _atomic_write(state_path, json.dumps(combined.dump_state()))
+                self._flushed = current
+            _atomic_write(path, text)
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+REGISTRY = MetricsRegistry()
+
+GEMINI_LATENCY = REGISTRY.histogram(
+    "gemini_request_duration_seconds", "Gemini generateContent call latency.", ("endpoint", "model", "key"))
+GEMINI_PROMPT_TOKENS = REGISTRY.histogram(
+    "gemini_prompt_tokens", "Prompt tokens per Gemini call.", ("endpoint", "model"), TOKEN_BUCKETS)
+GEMINI_OUTPUT_TOKENS = REGISTRY.histogram(
+    "gemini_output_tokens", "Output (candidate plus thinking) tokens per Gemini call.", ("endpoint", "model"), TOKEN_BUCKETS)
+GEMINI_ERRORS = REGISTRY.counter(
+    "gemini_errors_total", "Failed Gemini calls by reason (http status, timeout, connection).", ("endpoint", "reason"))
+GEMINI_RETRIES = REGISTRY.counter(
+    "gemini_retries_total", "Gemini calls re-sent after a failed or incomplete answer.", ("endpoint",))
+GEMINI_THROTTLED = REGISTRY.counter(
+    "gemini_throttled_total", "Gemini calls rejected with HTTP 429 (quota saturation), by API key.",
+    ("endpoint", "key"))
+CACHE_REQUESTS = REGISTRY.counter(
+    "analysis_cache_requests_total", "Analysis cache lookups by cache and result (hit/miss).", ("cache", "result"))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "analysis_queue_depth", "Analysis jobs waiting or in flight.", ("queue",))
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = REGISTRY.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics from a daemon thread. Returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_textfile_writer(path, interval):
+    """Rewrite the text file every `interval` seconds from a daemon thread."""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            REGISTRY.write_textfile(path)
+
+    threading.Thread(target=run, daemon=True).start()
+    return stop
+
+_exporters_started = False
+
+def start_exporters():
+    """Start the exporters configured through the environment. Safe to call repeatedly."""
+    global _exporters_started
+    if _exporters_started:
+        return
+    _exporters_started = True
+
+    port = os.getenv("METRICS_PORT")
+    if port:
+        try:
+            start_http_server(int(port))
+        except OSError:
+            pass  # Another process already serves this port
+
+    path = os.getenv("METRICS_TEXTFILE")
+    if path:
+        interval = os.getenv("METRICS_TEXTFILE_INTERVAL")
+        if interval:
+            start_textfile_writer(path, float(interval))
+        atexit.register(REGISTRY.write_textfile, path)
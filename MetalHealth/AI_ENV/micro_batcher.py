@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Micro-Batcher
+Collects analysis requests for a short window (or until a size cap) and sends
+them as one model request, so many items share the instruction block and the
+round trip. Each caller gets a Future for its own item.
+
+`run_batch` receives [(item_id, payload), ...] and returns {item_id: result}
+for the items whose part of the response validated. Items it leaves out, or all
+items when it raises, fall back to `run_single(payload)`. A window that
+collects only one item goes straight to `run_single`.
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from metrics import REGISTRY, GEMINI_RETRIES
+
+BATCH_WINDOW = 0.05  # Seconds to wait for more items after the first
+MAX_BATCH_ITEMS = 8
+
+BATCH_ITEMS = REGISTRY.counter(
+    "micro_batch_items_total", "Items sent through the micro-batcher by how they were answered.",
+    ("batcher", "outcome"))
+
+class MicroBatcher:
+    def __init__(self, run_batch, run_single, window=BATCH_WINDOW, max_items=MAX_BATCH_ITEMS,
+                 workers=4, name="batch"):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.window = window
+        self.max_items = max_items
+        self.name = name
+        self._ids = itertools.count(1)
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def submit(self, payload):
+        """Queue one item and return a Future for its result."""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Micro-batcher is closed")
+            self._pending.append((str(next(self._ids)), payload, future))
+            self._condition.notify()
+        return future
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_items and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+            return batch
+
+    def _collect(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if len(batch) == 1:
+                _, payload, future = batch[0]
+                self._pool.submit(self._single, payload, future, "single")
+            else:
+                self._pool.submit(self._dispatch, batch)
+
+    def _single(self, payload, future, outcome):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self.run_single(payload))
+            BATCH_ITEMS.inc(batcher=self.name, outcome=outcome)
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _dispatch(self, batch):
+        try:
+            results = self.run_batch([(item_id, payload) for item_id, payload, _ in batch])
+        except Exception:
+            results = {}
+        fallbacks = []
+        for item_id, payload, future in batch:
+            if item_id not in results:
+                fallbacks.append((payload, future))
+            elif future.set_running_or_notify_cancel():
+                future.set_result(results[item_id])
+                BATCH_ITEMS.inc(batcher=self.name, outcome="batched")
+        # Answered in this worker so close() never races a late submit to the pool
+        for payload, future in fallbacks:
+            GEMINI_RETRIES.inc(endpoint=self.name)
+            self._single(payload, future, "fallback")
+
+    def close(self):
+        """Send what is queued, wait for every item to finish, then stop."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._collector.join()
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Mock Gemini Server
+Shared by the test scripts: a local generateContent endpoint that records every
+request, plus environment save/restore. GEMINI_API_BASE points the real client
+at the mock, so tests exercise the HTTP path without network access, and the
+usage ledger, routing log and cassettes stay out of the way.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEST_ENV = {
+    "GEMINI_CASSETTE_MODE": "off",
+    "USAGE_LEDGER_DB": "off",
+    "MODEL_ROUTING_LOG": "off",
+    "GOOGLE_API_KEY_1": "test",
+    "GOOGLE_API_KEY_2": "test",
+    "GOOGLE_API_KEY_3": "test",
+}
+
+def response_body(text, usage=None, finish_reason=None):
+    """A generateContent response carrying `text` as its only part."""
+    candidate = {"content": {"parts": [{"text": text}]}}
+    if finish_reason:
+        candidate["finishReason"] = finish_reason
+    body = {"candidates": [candidate]}
+    if usage:
+        body["usageMetadata"] = usage
+    return body
+
+@contextmanager
+def patched_env(**values):
+    """Set environment variables for the block and restore the previous values after it."""
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+class MockGemini:
+    """Context manager running a mock generateContent server.
+
+    respond(prompt, payload) returns the answer text, a full response body,
+    or a (status, body) pair where a None body sends no content. Extra
+    keyword arguments are set in the environment next to TEST_ENV while the
+    server runs.
+    """
+
+    def __init__(self, respond, **env):
+        self.respond = respond
+        self.env = dict(TEST_ENV, **env)
+        self.payloads = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.base = None
+        self._env = None
+
+    @property
+    def prompts(self):
+        with self.lock:
+            return [payload["contents"][0]["parts"][0]["text"] for payload in self.payloads]
+
+    @property
+    def requests_seen(self):
+        with self.lock:
+            return len(self.payloads)
+
+    def reset(self):
+        with self.lock:
+            self.payloads.clear()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with mock.lock:
+                    mock.payloads.append(payload)
+                answer = mock.respond(payload["contents"][0]["parts"][0]["text"], payload)
+                status, body = answer if isinstance(answer, tuple) else (200, answer)
+                if isinstance(body, str):
+                    body = response_body(body)
+                try:
+                    self.send_response(status)
+                    if body is not None:
+                        self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    if body is not None:
+                        self.wfile.write(json.dumps(body).encode("utf-8"))
+                except OSError:
+                    pass  # The client already gave up on the call
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._env = patched_env(GEMINI_API_BASE=self.base, **self.env)
+        self._env.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.server.shutdown()
+            self.server.server_close()
+        finally:
+            self._env.__exit__(*exc_info)
+        return False
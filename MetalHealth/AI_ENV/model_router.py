@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Model Router
+Picks the model tier for each Gemini call from the endpoint, the length of the
+user's free text and local risk signals. Short, low-signal free text goes to
+the lite model; long inputs, assessments and anything with a high-risk signal
+keep full flash.
+
+Rules per endpoint are either a fixed tier or the longest free text (in
+characters) still routed to lite. They can be overridden with a JSON file of
+the same shape named by MODEL_ROUTES_FILE. The risk analysis always runs on
+the full model and is not routed.
+
+Every decision is counted in the model_route_decisions_total metric and
+appended to the MODEL_ROUTING_LOG JSONL file ("off" disables the log).
+"""
+
+import os
+import json
+import threading
+from collections import namedtuple
+from datetime import datetime
+from gemini_client import MODEL
+from usage_ledger import CHEAP_MODEL, RISK_ROUTE_REASON
+from risk_signals import has_high_risk_signal
+from metrics import REGISTRY
+
+MODEL_TIERS = {"lite": CHEAP_MODEL, "flash": MODEL}
+DEFAULT_ROUTING_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_routing.jsonl")
+
+DEFAULT_RULES = {
+    "checkin": {"tier": "lite"},               # Fixed phrase mapping of six answers
+    "instagram": {"lite_max_chars": 280},
+    "summary": {"lite_max_chars": 400},
+    "daily_summary": {"lite_max_chars": 400},
+    "assessment": {"tier": "flash"},           # The structured answers are the signal, not text length
+    "assessment_summary": {"tier": "flash"},   # Always carries a written summary
+    "analytics": {"tier": "flash"}
+}
+
+MODEL_ROUTES = REGISTRY.counter(
+    "model_route_decisions_total", "Gemini calls by endpoint, chosen model tier and routing reason.",
+    ("endpoint", "tier", "reason"))
+
+RouteDecision = namedtuple("RouteDecision", "endpoint tier model reason chars")
+
+_log_lock = threading.Lock()
+
+def load_rules():
+    rules = {endpoint: dict(rule) for endpoint, rule in DEFAULT_RULES.items()}
+    path = os.getenv("MODEL_ROUTES_FILE")
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            rules.update(json.load(f))
+    return rules
+
+RULES = load_rules()
+
+def _log(decision):
+    path = os.getenv("MODEL_ROUTING_LOG", DEFAULT_ROUTING_LOG)
+    if path == "off":
+        return
+    line = json.dumps(dict(decision._asdict(), timestamp=datetime.now().isoformat())) + "\n"
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        pass
+
+def decide(endpoint, text="", answers=None, rules=None):
+    """Return (tier, reason) for a call without logging it."""
+    rule = (rules or RULES).get(endpoint, {"tier": "flash"})
+    if has_high_risk_signal(answers, text):
+        return "flash", RISK_ROUTE_REASON
+    if rule.get("tier"):
+        return rule["tier"], "endpoint"
+    if len((text or "").strip()) <= rule.get("lite_max_chars", 0):
+        return "lite", "short_input"
+    return "flash", "long_input"
+
+def route(endpoint, text="", answers=None):
+    """Pick and log the model for a call. Returns a RouteDecision."""
+    tier, reason = decide(endpoint, text, answers)
+    decision = RouteDecision(endpoint, tier, MODEL_TIERS[tier], reason, len(text or ""))
+    MODEL_ROUTES.inc(endpoint=endpoint, tier=tier, reason=reason)
+    _log(decision)
+    return decision
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Analysis Index
+SimHash fingerprints over normalized text, looked up through bit bands, so that
+near-identical summaries and captions can reuse an analysis that was already paid for.
+Cached analyses are kept per user and per affect wording, and crisis or high-risk
+texts bypass the cache entirely.
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from affect_lexicon import affect_signature
+from risk_signals import has_high_risk_signal
+
+FINGERPRINT_BITS = 64
+DEFAULT_MAX_DISTANCE = 2      # Max differing fingerprint bits to count as a near duplicate
+DEFAULT_MAX_ENTRIES = 2048    # Oldest entries are evicted past this size
+DEFAULT_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "near_duplicate_index.json")
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.findall(r"[a-z0-9']+", (text or "").lower()))
+
+def _features(normalized):
+    """Word unigrams and bigrams used as SimHash features."""
+    words = normalized.split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def simhash(text):
+    """Compute the 64-bit SimHash fingerprint of a text."""
+    hashes = [format(int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+              for f in _features(normalize_text(text))]
+    if not hashes:
+        return 0
+
+    # Column-wise majority vote over the feature hashes, most significant bit first
+    threshold = len(hashes) / 2
+    bits = "".join("1" if column.count("1") > threshold else "0" for column in zip(*hashes))
+    return int(bits, 2)
+
+def is_cacheable(text, affect):
+    """Crisis and high-risk texts always get a fresh analysis and are never stored for reuse."""
+    return not (affect["crisis"] or has_high_risk_signal(text=text))
+
+def analysis_namespace(base, user, text):
+    """Namespace of a cached analysis: one per user and per wording of the text's affect cues."""
+    return f"{base}:{user}:{affect_signature(text)}"
+
+class NearDuplicateIndex:
+    """Bounded LRU index of analyses keyed by SimHash fingerprint.
+
+    The fingerprint is split into max_distance + 1 bands, so any fingerprint
+    within max_distance bits shares at least one band exactly and is found
+    with a handful of dict lookups instead of a scan.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.band_count = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.band_count
+        self._entries = OrderedDict()   # (namespace, fingerprint) -> analysis
+        self._bands = {}                # (namespace, band, value) -> set of fingerprints
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _band_keys(self, namespace, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(namespace, b, (fingerprint >> (b * self.band_bits)) & mask) for b in range(self.band_count)]
+
+    def lookup(self, text, namespace="default"):
+        """Return (analysis, distance) of the closest stored entry, or (None, None)."""
+        if not normalize_text(text):
+            return None, None
+        fingerprint = simhash(text)
+
+        with self._lock:
+            best, best_distance = None, None
+            for key in self._band_keys(namespace, fingerprint):
+                for candidate in self._bands.get(key, ()):
+                    distance = (candidate ^ fingerprint).bit_count()
+                    if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                        best, best_distance = candidate, distance
+            if best is None:
+                return None, None
+            self._entries.move_to_end((namespace, best))
+            return self._entries[(namespace, best)], best_distance
+
+    def add(self, text, analysis, namespace="default"):
+        """Store an analysis for a text, evicting the least recently used entry if full."""
+        if not normalize_text(text):
+            return
+        with self._lock:
+            self._insert(namespace, simhash(text), analysis)
+
+    def _insert(self, namespace, fingerprint, analysis):
+        key = (namespace, fingerprint)
+        if key not in self._entries:
+            for band_key in self._band_keys(namespace, fingerprint):
+                self._bands.setdefault(band_key, set()).add(fingerprint)
+        self._entries[key] = analysis
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            (old_namespace, old_fingerprint), _ = self._entries.popitem(last=False)
+            for band_key in self._band_keys(old_namespace, old_fingerprint):
+                members = self._bands.get(band_key)
+                if members is not None:
+                    members.discard(old_fingerprint)
+                    if not members:
+                        del self._bands[band_key]
+
+    def save(self, path):
+        """Write the index to disk atomically, oldest entries first."""
+        with self._lock:
+            entries = [[namespace, format(fingerprint, "016x"), analysis]
+                       for (namespace, fingerprint), analysis in self._entries.items()]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"max_distance": self.max_distance, "entries": entries}, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Merge entries from a saved index. Missing or corrupt files are ignored."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for namespace, fingerprint_hex, analysis in data.get("entries", []):
+                self._insert(namespace, int(fingerprint_hex, 16), analysis)
+
+def load_index(path=None):
+    """Load the shared on-disk index, configured through environment variables."""
+    index = NearDuplicateIndex(
+        max_distance=int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", DEFAULT_MAX_DISTANCE)),
+        max_entries=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    )
+    index.load(path or os.getenv("NEAR_DUPLICATE_INDEX_FILE", DEFAULT_INDEX_FILE))
+    return index
+
+def save_index(index, path=None):
+    """Persist the shared index. Failures only cost future cache hits."""
+    try:
+        index.save(path or os.getenv("NEAR_DUPLICATE_INDEX_FILE", DEFAULT_INDEX_FILE))
+    except OSError as e:
+        print(f"Could not save near-duplicate index: {e}", file=sys.stderr)
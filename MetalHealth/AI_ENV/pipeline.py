@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Concurrent Stage Pipeline
+A small DAG runner: every stage starts as soon as the stages it depends on have
+finished, independent stages run concurrently on a thread pool, and results are
+handed to dependants in memory. Each stage's wall time is recorded in the
+process-wide stage timings.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from profiling import stage
+
+class Pipeline:
+    def __init__(self):
+        self._stages = {}  # name -> (func, dependencies)
+
+    def add(self, name, func, depends_on=()):
+        """Add a stage. func receives the results of depends_on as keyword arguments."""
+        if name in self._stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self._stages[name] = (func, tuple(depends_on))
+        return self
+
+    def _run_stage(self, name, func, inputs):
+        with stage(name):
+            return func(**inputs)
+
+    def run(self, max_workers=None):
+        """Run every stage and return {stage name: result}. Re-raises the first stage error."""
+        for name, (_, dependencies) in self._stages.items():
+            missing = [d for d in dependencies if d not in self._stages]
+            if missing:
+                raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+
+        results = {}
+        pending = dict(self._stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers or max(1, len(self._stages))) as pool:
+            while pending or running:
+                ready = [name for name, (_, dependencies) in pending.items()
+                         if all(d in results for d in dependencies)]
+                for name in ready:
+                    func, dependencies = pending.pop(name)
+                    inputs = {d: results[d] for d in dependencies}
+                    running[pool.submit(self._run_stage, name, func, inputs)] = name
+                if not running:
+                    raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Stage Timing and Profiling
+Monotonic per-stage timings and token counts for the AI_ENV entry points, plus a
+--profile mode that dumps cProfile and tracemalloc summaries to stderr.
+
+Timings are reported when AI_ENV_TIMINGS=1 is set or --profile is passed: JSON
+entry points add a "_timings" field to their result, interactive scripts print
+them to stderr.
+"""
+
+import os
+import sys
+import time
+import json
+import threading
+from contextlib import contextmanager
+
+PROFILE_FLAG = "--profile"
+PROFILE_TOP_N = 25        # Functions listed in the cProfile summary
+TRACEMALLOC_TOP_N = 10    # Allocation sites listed in the tracemalloc summary
+
+class StageTimings:
+    """Accumulates wall-clock milliseconds per stage and token counts."""
+
+    def __init__(self):
+        self.stages = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds * 1000.0
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add_tokens(self, counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.tokens[name] = self.tokens.get(name, 0) + value
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "stages_ms": {name: round(ms, 2) for name, ms in self.stages.items()},
+                "tokens": dict(self.tokens),
+                "total_ms": round((time.perf_counter() - self.origin) * 1000.0, 2)
+            }
+
+# Process-wide timings shared by the entry point and gemini_client
+TIMINGS = StageTimings()
+stage = TIMINGS.stage
+
+_enabled = os.getenv("AI_ENV_TIMINGS", "").strip().lower() in ("1", "true", "yes")
+
+def timings_enabled():
+    return _enabled
+
+def record_startup(started):
+    """Record time spent on imports and module setup since `started`."""
+    TIMINGS.origin = started
+    TIMINGS.add("startup", time.perf_counter() - started)
+
+def pop_profile_flag(argv):
+    """Remove --profile from argv (in place). Returns True if it was present."""
+    global _enabled
+    if PROFILE_FLAG not in argv:
+        return False
+    while PROFILE_FLAG in argv:
+        argv.remove(PROFILE_FLAG)
+    _enabled = True
+    return True
+
+def attach_timings(result_json):
+    """Add the _timings field to a JSON result string when timings are enabled."""
+    if not _enabled:
+        return result_json
+    try:
+        result = json.loads(result_json)
+    except (TypeError, ValueError):
+        return result_json
+    if isinstance(result, dict):
+        result["_timings"] = TIMINGS.as_dict()
+        return json.dumps(result)
+    return result_json
+
+def report_timings(stream=sys.stderr):
+    """Print the timings to stderr when enabled (for the interactive scripts)."""
+    if _enabled:
+        print(f"[timings] {json.dumps(TIMINGS.as_dict())}", file=stream)
+
+def run_profiled(func, *args, **kwargs):
+    """Run func under cProfile and tracemalloc, printing both summaries to stderr."""
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print("=== cProfile (cumulative) ===", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        print(f"=== tracemalloc (current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB) ===", file=sys.stderr)
+        for statistic in snapshot.statistics("lineno")[:TRACEMALLOC_TOP_N]:
+            print(statistic, file=sys.stderr)
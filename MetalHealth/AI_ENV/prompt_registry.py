@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Prompt Registry
+Named, versioned prompt templates loaded from prompts/<name>.<version>.txt and
+compiled once at import. Templates are minified (trailing whitespace and
+repeated blank lines removed) before compiling, and rendering fills the
+compiled segments in one pass with a single join.
+
+Template syntax:
+    {{field}}                 value of a field
+    {{#field}}...{{/field}}   block shown when the field is truthy, repeated for
+                              each item when it is a list of dicts
+    {{^field}}...{{/field}}   block shown when the field is falsy
+
+Rendered prompts carry their version id ("assessment@v1"), which the Gemini
+client records in the usage ledger and callers put into cache keys.
+
+A/B traffic splits come from prompts/versions.json, overridden by
+PROMPT_VERSIONS, e.g. "assessment=v1:0.9,v2:0.1;risk=v1". Templates without a
+split serve their first version, so a new version only gets traffic through an
+explicit split and the usage ledger can compare it against the control arm.
+Selection is stable per key (usually the user); calls without a key get the
+version with the largest share.
+
+Released versions are frozen so their results stay comparable; lint checks the
+newest version of each prompt unless given --all.
+
+Usage:
+    python prompt_registry.py stats
+    python prompt_registry.py lint [--all] [name]
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+from collections import namedtuple
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+TEMPLATE_FILE = re.compile(r"^(\w+)\.(v\d+)\.txt$")
+TAG = re.compile(r"\{\{([#^/]?)(\w+)\}\}")
+CHARS_PER_TOKEN = 4        # Rough Gemini average for English text
+NEAR_DUPLICATE_RATIO = 0.6  # Word overlap at which two instruction lines count as redundant
+MIN_LINT_WORDS = 5          # Shorter lines (list items, data rows) are too generic to compare
+
+LintIssue = namedtuple("LintIssue", "template line kind message")
+
+def minify(text):
+    """Drop trailing whitespace, repeated blank lines and surrounding blank lines."""
+    lines = []
+    for line in text.strip().splitlines():
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines)
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _version_number(version):
+    return int(version[1:])
+
+class Prompt(str):
+    """Rendered prompt text tagged with the template version it came from."""
+
+    def __new__(cls, text, version):
+        prompt = super().__new__(cls, text)
+        prompt.version = version
+        return prompt
+
+def _compile(text, template_id):
+    """Parse template text into literal strings, ("field", name) and ("section", name, inverted, children)."""
+    root = []
+    stack = [(None, root)]
+    position = 0
+    for match in TAG.finditer(text):
+        if match.start() > position:
+            stack[-1][1].append(text[position:match.start()])
+        kind, name = match.groups()
+        if kind in ("#", "^"):
+            children = []
+            stack[-1][1].append(("section", name, kind == "^", children))
+            stack.append((name, children))
+        elif kind == "/":
+            if stack[-1][0] != name:
+                raise ValueError(f"{template_id}: unexpected {{{{/{name}}}}}")
+            stack.pop()
+        else:
+            stack[-1][1].append(("field", name))
+        position = match.end()
+    if len(stack) > 1:
+        raise ValueError(f"{template_id}: unclosed section {stack[-1][0]}")
+    if position < len(text):
+        root.append(text[position:])
+    return root
+
+def _lookup(scopes, name, template_id):
+    for scope in reversed(scopes):
+        if name in scope:
+            return scope[name]
+    raise KeyError(f"{template_id} needs a value for {name}")
+
+class PromptTemplate:
+    def __init__(self, name, version, source):
+        self.name = name
+        self.version = version
+        self.id = f"{name}@{version}"
+        self.source = source
+        self.text = minify(source)
+        self.nodes = _compile(self.text, self.id)
+        literals, fields = [], set()
+        self._collect(self.nodes, literals, fields)
+        self.fields = sorted(fields)
+        # Instruction text only; field values add to this at render time
+        self.footprint = estimate_tokens("".join(literals))
+
+    def _collect(self, nodes, literals, fields):
+        for node in nodes:
+            if isinstance(node, str):
+                literals.append(node)
+            else:
+                fields.add(node[1])
+                if node[0] == "section":
+                    self._collect(node[3], literals, fields)
+
+    def _render(self, nodes, scopes, parts):
+        for node in nodes:
+            if isinstance(node, str):
+                parts.append(node)
+            elif node[0] == "field":
+                parts.append(str(_lookup(scopes, node[1], self.id)))
+            else:
+                _, name, inverted, children = node
+                value = _lookup(scopes, name, self.id)
+                if inverted:
+                    if not value:
+                        self._render(children, scopes, parts)
+                elif isinstance(value, (list, tuple)):
+                    for item in value:
+                        self._render(children, scopes + [item], parts)
+                elif value:
+                    self._render(children, scopes + [value] if isinstance(value, dict) else scopes, parts)
+
+    def render(self, **values):
+        parts = []
+        self._render(self.nodes, [values], parts)
+        return Prompt("".join(parts), self.id)
+
+def _normalize_line(line):
+    line = TAG.sub(" ", line).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", line))
+
+def lint(template):
+    """Flag instruction lines that repeat, or nearly repeat, an earlier line."""
+    issues = []
+    seen = []  # (line number, normalized text, word set)
+    for number, line in enumerate(template.text.splitlines(), start=1):
+        normalized = _normalize_line(line)
+        words = set(normalized.split())
+        if len(words) < MIN_LINT_WORDS:
+            continue
+        for earlier, earlier_text, earlier_words in seen:
+            if normalized == earlier_text:
+                issues.append(LintIssue(template.id, number, "duplicate", f"repeats line {earlier}"))
+                break
+            overlap = len(words & earlier_words) / len(words | earlier_words)
+            if overlap >= NEAR_DUPLICATE_RATIO:
+                issues.append(LintIssue(template.id, number, "redundant",
+                                        f"{overlap:.0%} word overlap with line {earlier}"))
+                break
+        seen.append((number, normalized, words))
+    return issues
+
+def parse_splits(spec):
+    """Parse "name=v1:0.5,v2:0.5;other=v2" into {name: {version: weight}}."""
+    splits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        name, _, versions = entry.partition("=")
+        weights = {}
+        for item in versions.split(","):
+            version, _, weight = item.strip().partition(":")
+            weights[version] = float(weight) if weight else 1.0
+        splits[name.strip()] = weights
+    return splits
+
+class PromptRegistry:
+    def __init__(self):
+        self._templates = {}  # name -> {version: PromptTemplate}
+        self.splits = {}
+
+    def register(self, template):
+        self._templates.setdefault(template.name, {})[template.version] = template
+        return template
+
+    def load_dir(self, path):
+        for filename in sorted(os.listdir(path)):
+            match = TEMPLATE_FILE.match(filename)
+            if match:
+                with open(os.path.join(path, filename), "r", encoding="utf-8") as f:
+                    self.register(PromptTemplate(match.group(1), match.group(2), f.read()))
+        splits_path = os.path.join(path, "versions.json")
+        if os.path.exists(splits_path):
+            with open(splits_path, "r", encoding="utf-8") as f:
+                self.splits.update(json.load(f))
+        self.splits.update(parse_splits(os.getenv("PROMPT_VERSIONS", "")))
+        return self
+
+    def names(self):
+        return sorted(self._templates)
+
+    def templates(self, name):
+        versions = self._templates[name]
+        return [versions[v] for v in sorted(versions, key=_version_number)]
+
+    def get(self, name, version=None):
+        if name not in self._templates:
+            raise KeyError(f"Unknown prompt: {name}")
+        if version is None:
+            return self.templates(name)[-1]
+        return self._templates[name][version]
+
+    def weights(self, name):
+        """Traffic share per version; the first version when no split is configured."""
+        split = {v: w for v, w in self.splits.get(name, {}).items() if w > 0 and v in self._templates[name]}
+        return split or {self.templates(name)[0].version: 1.0}
+
+    def select(self, name, key=None):
+        """Pick a template for an A/B split, stable for the same key."""
+        weights = self.weights(name)
+        if len(weights) == 1:
+            return self._templates[name][next(iter(weights))]
+        if key is None:
+            # Unattributed calls stay on the control arm
+            control = max(sorted(weights, key=_version_number), key=lambda version: weights[version])
+            return self._templates[name][control]
+        digest = hashlib.sha256(f"{name}:{key}".encode("utf-8")).hexdigest()
+        point = int(digest[:8], 16) / 0x100000000
+        point *= sum(weights.values())
+        for version in sorted(weights, key=_version_number):
+            point -= weights[version]
+            if point < 0:
+                return self._templates[name][version]
+        return self._templates[name][max(weights, key=_version_number)]
+
+    def render(self, name, key=None, version=None, **values):
+        template = self.get(name, version) if version else self.select(name, key)
+        return template.render(**values)
+
+PROMPTS = PromptRegistry().load_dir(PROMPTS_DIR)
+
+def _measured_usage():
+    """Average prompt tokens and latency per prompt version from the usage ledger."""
+    try:
+        from usage_ledger import get_ledger
+        ledger = get_ledger()
+        if ledger is None or not os.path.exists(ledger.path):
+            return {}
+        return {row["prompt_version"]: row for row in ledger.report(by=("prompt_version",))}
+    except Exception:
+        return {}
+
+def main(argv):
+    command = argv[0] if argv else "stats"
+    if command == "stats":
+        measured = _measured_usage()
+        for name in PROMPTS.names():
+            weights = PROMPTS.weights(name)
+            for template in PROMPTS.templates(name):
+                line = (f"{template.id:24} share {weights.get(template.version, 0):4.0%}  "
+                        f"~{template.footprint} tokens  {len(template.source) - len(template.text)} chars minified")
+                row = measured.get(template.id)
+                if row and row["calls"]:
+                    line += (f"  measured {row['prompt'] / row['calls']:.0f} prompt tokens, "
+                             f"{row['latency'] / row['calls']:.2f}s over {row['calls']} calls")
+                print(line)
+        return 0
+    if command == "lint":
+        include_all = "--all" in argv[1:]
+        names = [arg for arg in argv[1:] if arg != "--all"] or PROMPTS.names()
+        issues = [issue for name in names
+                  for template in PROMPTS.templates(name)[0 if include_all else -1:] for issue in lint(template)]
+        for issue in issues:
+            print(f"{issue.template}:{issue.line}: {issue.kind}: {issue.message}")
+        return 1 if issues else 0
+    print(__doc__.strip().splitlines()[-2].strip())
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
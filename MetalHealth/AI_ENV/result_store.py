@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Sharded Result Store
+Analysis outputs (Output 1-4, Final Output) kept in one log file per user or
+session instead of a single shared output.txt, so concurrent sessions never
+interleave or read each other's results.
+
+Each record is framed as magic + payload length + CRC32 + JSON payload. Readers
+skip torn or corrupt frames and resynchronize on the next magic marker. Writers
+hand records to a per-shard group-commit thread that appends everything queued
+within a short window in one locked write and one fsync.
+
+The session comes from AI_ENV_SESSION, which the Node server sets per user,
+then AI_ENV_USER, and only then the OS user name; the store directory from
+RESULT_STORE_DIR.
+
+Usage:
+    python result_store.py show [session]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import atexit
+import struct
+import getpass
+import threading
+from datetime import datetime
+from file_lock import locked
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+COMMIT_INTERVAL = 0.005   # Seconds a commit waits to gather more records
+MAX_BATCH = 256           # Records per write/fsync at most
+OUTPUT_LABELS = ("Output1", "Output2", "Output3", "Output4")
+
+MAGIC = b"RS"
+HEADER = struct.Struct(">2sII")  # magic, payload length, crc32 of payload
+
+def encode_record(record):
+    payload = json.dumps(record, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+def decode_records(data):
+    """Yield the intact records in a shard's bytes, skipping damaged frames."""
+    position = 0
+    while position + HEADER.size <= len(data):
+        magic, length, checksum = HEADER.unpack_from(data, position)
+        start = position + HEADER.size
+        payload = data[start:start + length]
+        if magic == MAGIC and len(payload) == length and zlib.crc32(payload) == checksum:
+            try:
+                yield json.loads(payload.decode("utf-8"))
+                position = start + length
+                continue
+            except ValueError:
+                pass
+        # Torn or corrupt frame: resynchronize on the next marker
+        next_magic = data.find(MAGIC, position + 1)
+        if next_magic < 0:
+            return
+        position = next_magic
+
+def default_session():
+    # Scripts run by the server all share one OS user, so that is the last resort
+    session = os.getenv("AI_ENV_SESSION") or os.getenv("AI_ENV_USER")
+    if not session:
+        try:
+            session = getpass.getuser()
+        except Exception:
+            session = "default"
+    return session
+
+class _Ticket:
+    __slots__ = ("event", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+
+class _ShardWriter:
+    """Group-commit appender for one shard file."""
+
+    def __init__(self, path, commit_interval, max_batch):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.commits = 0
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, frames):
+        ticket = _Ticket()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Result store is closed")
+            self._pending.append((frames, ticket))
+            self._condition.notify()
+        return ticket
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            # Give concurrent writers a moment to join this commit
+            deadline = time.monotonic() + self.commit_interval
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            error = None
+            try:
+                data = b"".join(frame for frames, _ in batch for frame in frames)
+                with locked(self.path):
+                    with open(self.path, "ab") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                self.commits += 1
+            except OSError as e:
+                error = e
+            for _, ticket in batch:
+                ticket.error = error
+                ticket.event.set()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+class ResultStore:
+    def __init__(self, root=None, commit_interval=COMMIT_INTERVAL, max_batch=MAX_BATCH):
+        self.root = root or os.getenv("RESULT_STORE_DIR", DEFAULT_ROOT)
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._writers = {}
+        self._lock = threading.Lock()
+
+    def shard_path(self, session):
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", str(session)) or "default"
+        return os.path.join(self.root, f"{safe}.log")
+
+    def _writer(self, session):
+        path = self.shard_path(session)
+        with self._lock:
+            writer = self._writers.get(path)
+            if writer is None:
+                os.makedirs(self.root, exist_ok=True)
+                writer = self._writers[path] = _ShardWriter(path, self.commit_interval, self.max_batch)
+            return writer
+
+    def append_many(self, session, entries, wait=True):
+        """Append (label, text) pairs as one unit. Blocks until durable unless wait=False."""
+        now = datetime.now().isoformat()
+        frames = [encode_record({"label": label, "text": text, "timestamp": now}) for label, text in entries]
+        ticket = self._writer(session).submit(frames)
+        if wait:
+            ticket.wait()
+        return ticket
+
+    def append(self, session, label, text, wait=True):
+        return self.append_many(session, [(label, text)], wait)
+
+    def records(self, session):
+        try:
+            with open(self.shard_path(session), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return list(decode_records(data))
+
+    def latest_outputs(self, session):
+        """Most recent text per label Output1-Output4 for this session only."""
+        outputs = {label: "" for label in OUTPUT_LABELS}
+        for record in self.records(session):
+            label = record.get("label", "").replace(" ", "")
+            if label in outputs:
+                outputs[label] = record.get("text", "")
+        return outputs
+
+    def render(self, session):
+        """The session's records in the old output.txt layout."""
+        lines = []
+        for record in self.records(session):
+            if record.get("label") == "Final Output":
+                lines.append(f"Final Output: {record.get('text', '')}\n" + "-" * 40 + "\n")
+            else:
+                lines.append(f"{record.get('label')} ({record.get('timestamp', '')[:19]})\n{record.get('text', '')}\n\n")
+        return "".join(lines)
+
+    def close(self):
+        with self._lock:
+            writers, self._writers = list(self._writers.values()), {}
+        for writer in writers:
+            writer.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Process-wide store, closed (and flushed) at exit."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+            atexit.register(_store.close)
+        return _store
+
+def main(argv):
+    if not argv or argv[0] != "show":
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 1
+    session = argv[1] if len(argv) > 1 else default_session()
+    print(get_store().render(session), end="")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
-import os, sys, requests, re
+import time
+_STARTED = time.perf_counter()
+
+import os, sys
 from dotenv import load_dotenv
-from datetime import datetime
+from gemini_client import MODEL, generate_content
+from profiling import stage, record_startup, pop_profile_flag, report_timings, run_profiled
+from result_store import get_store, default_session
+from prompt_registry import PROMPTS
+from usage_ledger import current_user
+from doctor_index import get_index, tags_for
+from risk_signals import HIGH_RISK_KEYWORDS
+import deadline
 
 load_dotenv()
 
-MODEL = "gemini-2.5-flash"
-OUTPUT_FILE = "output.txt"
 API_KEY_ENV = "GOOGLE_API_KEY_3"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+
+MEDIUM_RISK_KEYWORDS = [
+    'moderate', 'concerning', 'worrying', 'persistent', 'chronic',
+    'anxiety', 'panic', 'stress', 'mood swings', 'irritability',
+    'sleep problems', 'appetite changes', 'social withdrawal'
+]
 
 def get_api_key(env_var_name=API_KEY_ENV):
     key = os.getenv(env_var_name)
@@ -30,46 +43,16 @@ def extract_text_from_response(resp):
     return "\n".join(texts).strip()
 
 def call_gemini(api_key, prompt, model=MODEL):
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
-    r = requests.post(url, json=payload, headers=headers, timeout=30)
-    r.raise_for_status()
-    return extract_text_from_response(r.json())
-
-def get_last_four_outputs(filename):
-    """Read the last block of Output1–4 from output.txt"""
-    outputs = {"Output1":"", "Output2":"", "Output3":"", "Output4":""}
-    with open(filename,"r",encoding="utf-8") as f:
-        text = f.read()
-    matches = list(re.finditer(r"(Output\s*\d+)\n(.*?)\n\n", text, flags=re.S))
-    # get last 4 outputs:
-    if matches:
-        # pick last 4 outputs
-        last4 = matches[-4:]
-        for m in last4:
-            outputs[m.group(1).replace(" ","")] = m.group(2).strip()
-    return outputs
+    resp = generate_content(api_key, prompt, model, timeout=30, endpoint="risk")
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
 
 def analyze_risk_level(analysis_text):
     """Analyze the risk level from the AI analysis text"""
-    high_risk_keywords = [
-        'suicide', 'self-harm', 'severe depression', 'crisis', 'emergency',
-        'immediate help', 'urgent', 'dangerous', 'harmful', 'extreme',
-        'psychotic', 'delusional', 'hallucination', 'manic episode',
-        'substance abuse', 'addiction', 'overdose', 'withdrawal'
-    ]
-    
-    medium_risk_keywords = [
-        'moderate', 'concerning', 'worrying', 'persistent', 'chronic',
-        'anxiety', 'panic', 'stress', 'mood swings', 'irritability',
-        'sleep problems', 'appetite changes', 'social withdrawal'
-    ]
-    
     analysis_lower = analysis_text.lower()
     
-    high_risk_count = sum(1 for keyword in high_risk_keywords if keyword in analysis_lower)
-    medium_risk_count = sum(1 for keyword in medium_risk_keywords if keyword in analysis_lower)
+    high_risk_count = sum(1 for keyword in HIGH_RISK_KEYWORDS if keyword in analysis_lower)
+    medium_risk_count = sum(1 for keyword in MEDIUM_RISK_KEYWORDS if keyword in analysis_lower)
     
     if high_risk_count >= 2:
         return "HIGH"
@@ -78,8 +61,10 @@ def analyze_risk_level(analysis_text):
     else:
         return "LOW"
 
-def get_recommended_doctors(risk_level, analysis_text):
-    """Get recommended doctors based on risk level and analysis"""
+DOCTORS_PER_SPECIALITY = 2
+
+def recommended_specialities(risk_level, analysis_text):
+    """Get recommended specialities based on risk level and analysis"""
     analysis_lower = analysis_text.lower()
     
     if risk_level == "HIGH":
@@ -125,80 +110,30 @@ def get_recommended_doctors(risk_level, analysis_text):
             {"speciality": "General Medicine", "reason": "General health checkup and lifestyle guidance"}
         ]
 
-def main():
-    if not os.path.exists(OUTPUT_FILE):
-        print("output.txt not found.")
-        return
-    outs = get_last_four_outputs(OUTPUT_FILE)
-    api_key = get_api_key()
-
-    prompt = f"""
-You are an expert clinical psychologist and mental health AI with 20+ years of experience in risk assessment and crisis intervention. 
-Using the following comprehensive data from one individual, provide a detailed clinical analysis and risk assessment that goes beyond simply restating the data.
-
-CLINICAL ANALYSIS FRAMEWORK:
-- Apply evidence-based risk assessment protocols and clinical judgment
-- Use validated mental health screening criteria (PHQ-9, GAD-7, PSS-10, C-SSRS)
-- Consider both immediate and long-term risk factors and protective factors
-- Provide specific, actionable recommendations based on clinical best practices
-- Maintain clinical objectivity while being empathetic and supportive
-- Identify patterns, correlations, and clinical significance in the data
-- Focus on meaningful insights rather than data restatement
-
-DATA TO ANALYZE:
-Output 1 (Daily Check-in): {outs.get('Output1')}
-Output 2 (Assessment Analysis): {outs.get('Output2')}
-Output 3 (Summary Analysis): {outs.get('Output3')}
-Output 4 (Additional Context): {outs.get('Output4')}
-
-REQUIRED ANALYSIS COMPONENTS:
-
-1. COMPREHENSIVE MENTAL HEALTH ASSESSMENT:
-   - Current psychological state and functioning
-   - Emotional regulation and coping strategies
-   - Cognitive patterns and thought processes
-   - Behavioral indicators and daily functioning
-   - Social and interpersonal functioning
-
-2. RISK FACTOR IDENTIFICATION:
-   - Immediate risk factors (suicidal ideation, self-harm, psychosis)
-   - Moderate risk factors (severe depression, anxiety, substance use)
-   - Protective factors (support systems, coping skills, treatment engagement)
-   - Environmental and situational stressors
-
-3. RISK LEVEL DETERMINATION:
-   - HIGH RISK: Immediate danger, crisis situation, requires urgent intervention
-   - MEDIUM RISK: Significant concerns, professional help recommended within days
-   - LOW RISK: Mild symptoms, self-care and monitoring sufficient
-
-4. EVIDENCE-BASED RECOMMENDATIONS:
-   - Immediate actions (crisis intervention, safety planning)
-   - Short-term interventions (therapy, medication evaluation)
-   - Long-term strategies (lifestyle changes, ongoing treatment)
-   - Specific resources and support systems
-
-5. CLINICAL INSIGHTS:
-   - Clinical presentation and diagnostic indicators
-   - Functional impairment assessment
-   - Risk factors and protective factors
-   - Treatment recommendations and prognosis
-   - Differential diagnosis considerations
-
-ANALYSIS GUIDELINES:
-- Be thorough, specific, and clinically accurate
-- Use evidence-based assessment criteria
-- Provide actionable, personalized recommendations
-- Consider the individual's unique circumstances
-- Balance concern with hope and empowerment
-- Emphasize professional help when appropriate
-
-CRITICAL: If you identify HIGH RISK indicators, immediately emphasize the need for crisis intervention and professional help.
-"""
-
-    gemini_out = call_gemini(api_key, prompt)
-    if not gemini_out:
-        gemini_out = "Could not analyze."
-
+def get_recommended_doctors(risk_level, analysis_text):
+    """Get recommended specialities with concrete doctors from the doctors snapshot.
+
+    Each recommendation gets a "doctors" list, best symptom-tag match first.
+    It is empty when the snapshot has no doctor of that speciality or is
+    unavailable.
+    """
+    recommendations = recommended_specialities(risk_level, analysis_text)
+    index = get_index()
+    tags = tags_for(analysis_text)
+    for rec in recommendations:
+        rec["doctors"] = index.for_speciality(rec["speciality"], tags, DOCTORS_PER_SPECIALITY) if index else []
+    return recommendations
+
+def build_risk_prompt(outs, version=None):
+    """Build the risk assessment prompt from the Output1-4 texts."""
+    return PROMPTS.render(
+        "risk", key=current_user(), version=version,
+        output1=outs.get('Output1'), output2=outs.get('Output2'),
+        output3=outs.get('Output3'), output4=outs.get('Output4')
+    )
+
+def format_risk_output(gemini_out):
+    """Append the risk level, doctor recommendations and guidance to the analysis."""
     # Analyze risk level
     risk_level = analyze_risk_level(gemini_out)
     
@@ -223,6 +158,8 @@ RECOMMENDED DOCTORS:
 {i}. {rec['speciality']}
    Reason: {rec['reason']}
 """
+        for doctor in rec.get('doctors', []):
+            final_output += f"   - {doctor['name']} ({doctor['phoneno']})\n"
     
     if risk_level == "HIGH":
         final_output += f"""
@@ -246,13 +183,35 @@ Consider scheduling an appointment with a mental health professional within the
 ✅ LOW RISK: Preventive care recommended
 Regular check-ins with mental health professionals can help maintain wellness.
 """
+    return final_output
 
-    with open(OUTPUT_FILE,"a",encoding="utf-8") as f:
-        f.write(f"Final Output: {final_output}\n")
-        f.write("-"*40 + "\n")
+def run_risk_analysis(api_key, outs):
+    """Run the risk stage on Output1-4 texts passed in memory. Returns the final output."""
+    gemini_out = call_gemini(api_key, build_risk_prompt(outs))
+    if not gemini_out:
+        gemini_out = "Could not analyze."
+    return format_risk_output(gemini_out)
+
+def main():
+    session = default_session()
+    with stage("input_parse"):
+        outs = get_store().latest_outputs(session)
+    if not any(outs.values()):
+        print(f"No outputs recorded for session {session}.")
+        return
+    api_key = get_api_key()
+    final_output = run_risk_analysis(api_key, outs)
+
+    get_store().append(session, "Final Output", final_output)
 
     print("\nRisk Analysis Final Output:\n")
     print(final_output)
 
 if __name__ == "__main__":
-    main()
+    record_startup(_STARTED)
+    deadline.install(sys.argv)
+    if pop_profile_flag(sys.argv):
+        run_profiled(main)
+    else:
+        main()
+    report_timings()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Risk Signals
+Local high-risk checks on assessment answers and free text. Kept free of the
+Gemini stack so the scheduler, the model router and the caches can import it
+cheaply.
+"""
+
+from affect_lexicon import CRISIS_PHRASES
+
+HIGH_RISK_KEYWORDS = [
+    'suicide', 'self-harm', 'severe depression', 'crisis', 'emergency',
+    'immediate help', 'urgent', 'dangerous', 'harmful', 'extreme',
+    'psychotic', 'delusional', 'hallucination', 'manic episode',
+    'substance abuse', 'addiction', 'overdose', 'withdrawal'
+]
+
+EXTREME_STRESS_LEVEL = 9   # stressLevel at or above this is a high-risk signal
+EXTREME_MOOD_LEVEL = 2     # moodLevel at or below this is a high-risk signal
+
+def _level(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def has_high_risk_signal(answers=None, text=None):
+    """True for extreme stress/mood answers or text containing high-risk keywords."""
+    if isinstance(answers, dict):
+        stress = _level(answers.get("stressLevel"))
+        mood = _level(answers.get("moodLevel"))
+        if stress is not None and stress >= EXTREME_STRESS_LEVEL:
+            return True
+        if mood is not None and mood <= EXTREME_MOOD_LEVEL:
+            return True
+    if text:
+        lowered = text.lower().replace("’", "'")
+        if any(keyword in lowered for keyword in HIGH_RISK_KEYWORDS):
+            return True
+        if any(phrase in lowered for phrase in CRISIS_PHRASES):
+            return True
+    return False
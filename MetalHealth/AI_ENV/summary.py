@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
-import os, sys, requests
+import time
+_STARTED = time.perf_counter()
+
+import os, sys
 from dotenv import load_dotenv
-from datetime import datetime
+from gemini_client import MODEL, generate_content
+from profiling import stage, record_startup, pop_profile_flag, report_timings, run_profiled
+from result_store import get_store, default_session
+from model_router import route
+import deadline
 
 load_dotenv()
 
-MODEL = "gemini-2.5-flash"
-OUTPUT_FILE = "output.txt"
 API_KEY_ENV = "GOOGLE_API_KEY_1"
-API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
 
 def get_api_key(env_var_name=API_KEY_ENV):
     key = os.getenv(env_var_name)
@@ -30,27 +34,12 @@ def extract_text_from_response(resp):
     return "\n".join(texts).strip()
 
 def call_gemini(api_key, prompt, model=MODEL):
-    url = API_URL_TEMPLATE.format(model=model, api_key=api_key)
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    headers = {"Content-Type": "application/json"}
-    r = requests.post(url, json=payload, headers=headers, timeout=30)
-    r.raise_for_status()
-    return extract_text_from_response(r.json())
+    resp = generate_content(api_key, prompt, model, timeout=30, endpoint="summary")
+    with stage("response_parse"):
+        return extract_text_from_response(resp)
 
-def main():
-    print("=== Daily Summary Analysis ===")
-    print("This script analyzes daily summaries written by users.")
-    print("Note: Daily summaries are now primarily handled through the web interface.\n")
-    
-    user_summary = input("Please enter today's summary: ").strip()
-    if not user_summary:
-        print("No summary provided. Writing 'exhausted'.")
-        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-            f.write(f"Daily Summary Analysis\nexhausted\n\n")
-        return
-
-    api_key = get_api_key()
-    prompt = f"""
+def build_summary_prompt(user_summary):
+    return f"""
 You are a mental health expert AI specializing in journal analysis. Analyze the following daily summary and provide insights about the user's emotional state, patterns, and well-being.
 
 Daily Summary: {user_summary}
@@ -64,15 +53,37 @@ Please provide a comprehensive analysis including:
 
 Be empathetic, supportive, and focus on positive insights while acknowledging any challenges mentioned.
 """
-    gemini_out = call_gemini(api_key, prompt)
-    if not gemini_out:
-        gemini_out = "Unable to analyze summary at this time."
 
-    with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-        f.write(f"Daily Summary Analysis\n{gemini_out}\n\n")
+def analyze_summary(api_key, user_summary):
+    """Analyze a daily summary and return the text for the log."""
+    model = route("summary", user_summary).model
+    gemini_out = call_gemini(api_key, build_summary_prompt(user_summary), model)
+    return gemini_out or "Unable to analyze summary at this time."
+
+def main():
+    print("=== Daily Summary Analysis ===")
+    print("This script analyzes daily summaries written by users.")
+    print("Note: Daily summaries are now primarily handled through the web interface.\n")
+    
+    user_summary = input("Please enter today's summary: ").strip()
+    if not user_summary:
+        print("No summary provided. Writing 'exhausted'.")
+        get_store().append(default_session(), "Output 2", "exhausted")
+        return
+
+    api_key = get_api_key()
+    gemini_out = analyze_summary(api_key, user_summary)
+
+    get_store().append(default_session(), "Output 2", gemini_out)
 
     print("\nDaily Summary Analysis:\n")
     print(gemini_out)
 
 if __name__ == "__main__":
-    main()
+    record_startup(_STARTED)
+    deadline.install(sys.argv)
+    if pop_profile_flag(sys.argv):
+        run_profiled(main)
+    else:
+        main()
+    report_timings()
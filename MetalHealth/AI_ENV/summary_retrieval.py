@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Summary Retrieval
+Per-user TF-IDF index over past daily summaries and assessment notes, used to
+choose which of a period's summaries the analytics prompt quotes. Summaries are
+ranked by similarity to a query built from risk terms and the notes of the
+period's anomalous check-ins (high risk, very low mood, very high stress, very
+short sleep), and taken best first until the prompt's token budget is spent.
+
+Documents are stored sparsely as NumPy arrays of term ids and counts next to a
+document-frequency array, so adding or replacing a document costs time in its
+own length only. Unchanged documents are recognized by a content hash and
+skipped.
+
+Configuration:
+    SUMMARY_INDEX_DIR     directory of the per-user index files, default
+                          summary_index/ ("off" keeps the index in memory)
+"""
+
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+from affect_lexicon import VALENCE, STRESS_CUES, ANXIETY_CUES, CRISIS_PHRASES, tokenize
+from prompt_registry import estimate_tokens
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "summary_index")
+DEFAULT_TOP_K = 5             # Summaries quoted in a prompt
+DEFAULT_TOKEN_BUDGET = 600    # Prompt tokens the quoted summaries may use
+ANOMALY_NOTE_WEIGHT = 0.5     # Query weight of a term from an anomalous check-in's notes
+ANOMALY_DATE_BONUS = 0.25     # Score added to a summary written on an anomalous day
+MAX_ANOMALIES = 31            # Anomalous check-ins kept per period
+
+STOPWORDS = {
+    "the", "and", "for", "that", "this", "with", "was", "were", "are", "but", "have", "had", "has",
+    "not", "you", "your", "all", "from", "they", "them", "then", "than", "there", "what", "when",
+    "which", "who", "about", "into", "out", "just", "been", "some", "its", "it's", "i'm", "also",
+    "very", "really", "today", "day", "after", "before", "would", "could", "did", "got", "get",
+}
+
+# Words that make a summary worth quoting in any period
+RISK_TERMS = sorted(
+    set(STRESS_CUES) | set(ANXIETY_CUES)
+    | {word for word, weight in VALENCE.items() if weight <= -2.0}
+    | {word for phrase in CRISIS_PHRASES for word in tokenize(phrase) if len(word) > 3}
+)
+
+def terms(text):
+    """Index terms of a text: lowercase words of three or more letters, without stopwords."""
+    return [t for t in tokenize(text) if len(t) > 2 and t[0].isalpha() and t not in STOPWORDS]
+
+def is_anomalous(assessment):
+    """Whether a check-in stands out enough for its day's summary to be worth quoting."""
+    answers = assessment.get('answers', {})
+    analysis = assessment.get('aiAnalysis') or {}
+    try:
+        return (analysis.get('riskLevel') == 'High'
+                or float(answers.get('moodLevel', 5)) <= 3
+                or float(answers.get('stressLevel', 5)) >= 8
+                or float(answers.get('sleepHours', 8)) < 5)
+    except (TypeError, ValueError):
+        return analysis.get('riskLevel') == 'High'
+
+def assessment_date(assessment):
+    return str(assessment.get('createdAt') or '').split('T')[0]
+
+def assessment_note(assessment):
+    """Free text attached to a check-in: its analysis summary and any legacy notes."""
+    answers = assessment.get('answers', {})
+    analysis = assessment.get('aiAnalysis') or {}
+    parts = [analysis.get('summary'), answers.get('todaySummary'), answers.get('commonFeeling')]
+    return " ".join(p for p in parts if isinstance(p, str) and p.strip())
+
+def summary_id(summary):
+    return "summary:" + str(summary.get('_id') or summary.get('id') or summary.get('date', ''))
+
+class SummaryIndex:
+    """Incremental TF-IDF statistics over one user's documents."""
+
+    def __init__(self):
+        self.vocab = {}                          # term -> id
+        self.df = np.zeros(64, dtype=np.int32)   # document frequency per term id, grown by doubling
+        self.docs = {}                           # doc id -> (content hash, term ids, counts)
+
+    def _term_ids(self, words, grow=True):
+        ids = []
+        for word in words:
+            term_id = self.vocab.get(word)
+            if term_id is None:
+                if not grow:
+                    continue
+                term_id = self.vocab[word] = len(self.vocab)
+            ids.append(term_id)
+        if len(self.vocab) > len(self.df):
+            grown = np.zeros(max(2 * len(self.df), len(self.vocab)), dtype=np.int32)
+            grown[:len(self.df)] = self.df
+            self.df = grown
+        return np.asarray(ids, dtype=np.int32)
+
+    def add(self, doc_id, text):
+        """Add or replace a document. Returns False when it was already indexed unchanged."""
+        digest = hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).hexdigest()
+        previous = self.docs.get(doc_id)
+        if previous is not None:
+            if previous[0] == digest:
+                return False
+            self.df[previous[1]] -= 1
+        ids, counts = np.unique(self._term_ids(terms(text)), return_counts=True)
+        self.df[ids] += 1
+        self.docs[doc_id] = (digest, ids.astype(np.int32), counts.astype(np.float32))
+        return True
+
+    def add_summary(self, summary):
+        return self.add(summary_id(summary), summary.get('summary', ''))
+
+    def add_note(self, assessment):
+        note = assessment_note(assessment)
+        if not note:
+            return False
+        return self.add("note:" + str(assessment.get('id') or assessment.get('createdAt', '')), note)
+
+    def idf(self):
+        n = len(self.docs)
+        return (np.log((1.0 + n) / (1.0 + self.df[:len(self.vocab)])) + 1.0).astype(np.float32)
+
+    def query_vector(self, anomaly_notes=()):
+        """Dense query weights over the vocabulary: risk terms plus terms of anomalous days' notes."""
+        query = np.zeros(len(self.vocab), dtype=np.float32)
+        query[self._term_ids(RISK_TERMS, grow=False)] = 1.0
+        for note in anomaly_notes:
+            ids = self._term_ids(terms(note), grow=False)
+            np.add.at(query, ids, ANOMALY_NOTE_WEIGHT)
+        return query * self.idf()
+
+    def score(self, doc_id, query, idf):
+        """Cosine similarity of a document's log-scaled TF-IDF vector with the query."""
+        _, ids, counts = self.docs[doc_id]
+        if not len(ids):
+            return 0.0
+        weights = (1.0 + np.log(counts)) * idf[ids]
+        norm = float(np.sqrt(np.dot(weights, weights)) * np.sqrt(np.dot(query, query)))
+        return float(np.dot(weights, query[ids])) / norm if norm else 0.0
+
+    def to_dict(self):
+        return {
+            "vocab": sorted(self.vocab, key=self.vocab.get),
+            "df": self.df[:len(self.vocab)].tolist(),
+            "docs": {doc_id: [digest, ids.tolist(), counts.astype(int).tolist()]
+                     for doc_id, (digest, ids, counts) in self.docs.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls()
+        index.vocab = {term: i for i, term in enumerate(data.get("vocab", []))}
+        index.df = np.zeros(max(64, len(index.vocab)), dtype=np.int32)
+        index.df[:len(index.vocab)] = data.get("df", [])
+        index.docs = {doc_id: (digest, np.asarray(ids, dtype=np.int32), np.asarray(counts, dtype=np.float32))
+                      for doc_id, (digest, ids, counts) in data.get("docs", {}).items()}
+        return index
+
+def select_summaries(summaries, anomalies=None, index=None, top_k=DEFAULT_TOP_K, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Pick the summaries most relevant to a period's risk terms and anomalies.
+
+    `anomalies` are (date, note) pairs of the period's anomalous check-ins.
+    Summaries are added to `index` (a fresh one when None) and ranked by
+    similarity, with ties going to the most recent; the best ones that fit the
+    token budget are returned in date order.
+    """
+    if not summaries:
+        return []
+    index = index if index is not None else SummaryIndex()
+    anomalies = anomalies or []
+    for summary in summaries:
+        index.add_summary(summary)
+    idf = index.idf()
+    query = index.query_vector(note for _, note in anomalies)
+    anomaly_dates = {date for date, _ in anomalies}
+
+    ranked = []
+    for position, summary in enumerate(summaries):
+        score = index.score(summary_id(summary), query, idf)
+        if summary.get('date') in anomaly_dates:
+            score += ANOMALY_DATE_BONUS
+        ranked.append((score, str(summary.get('date', '')), position))
+    # Most recent first, then (stable) best score first
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    ranked.sort(key=lambda item: item[0], reverse=True)
+
+    chosen = []
+    spent = 0
+    for _, _, position in ranked:
+        cost = estimate_tokens(summaries[position].get('summary', ''))
+        if spent + cost > token_budget:
+            continue
+        chosen.append(position)
+        spent += cost
+        if len(chosen) == top_k:
+            break
+    return [summaries[position] for position in sorted(chosen, key=lambda p: (str(summaries[p].get('date', '')), p))]
+
+def index_path(user, directory=None):
+    safe_user = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(user))
+    return os.path.join(directory or os.getenv("SUMMARY_INDEX_DIR", DEFAULT_INDEX_DIR), f"{safe_user}.json")
+
+def load_summary_index(user):
+    """The user's stored index, or an empty one. Missing or corrupt files start afresh."""
+    if os.getenv("SUMMARY_INDEX_DIR") == "off" or user in (None, "", "anonymous"):
+        return SummaryIndex()
+    try:
+        with open(index_path(user), "r", encoding="utf-8") as f:
+            return SummaryIndex.from_dict(json.load(f))
+    except (OSError, ValueError, TypeError):
+        return SummaryIndex()
+
+def save_summary_index(index, user):
+    """Persist the user's index atomically. Failures only cost future IDF history."""
+    if os.getenv("SUMMARY_INDEX_DIR") == "off" or user in (None, "", "anonymous"):
+        return
+    path = index_path(user)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not save summary index: {e}", file=sys.stderr)
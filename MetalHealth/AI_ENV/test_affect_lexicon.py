@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test script for the local affect scorer and its escalation rules
+"""
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from affect_lexicon import score_text, score_batch, needs_model
+
+def test_scoring():
+    """Tone, negation, intensifiers and stress/anxiety cues are scored from the lexicon"""
+    happy = score_text("Had a great day with friends!")
+    assert happy["tone"] == "positive" and happy["polarity"] > 0
+    assert happy["lexicon_hits"] == 2 and happy["token_count"] == 6
+
+    assert score_text("I am not happy.")["tone"] == "negative"
+    assert score_text("really sad")["polarity"] < score_text("sad")["polarity"] < 0
+
+    stressed = score_text("So stressed and anxious about exams")
+    assert stressed["stress"] > 0.5 and stressed["anxiety"] > 0.5
+    # A negated cue is no evidence of stress, and a clause break ends the negation
+    assert score_text("I'm not stressed at all")["stress"] == 0.0
+    assert score_text("Not today. Stressed though")["stress"] > 0
+
+    assert score_text("")["token_count"] == 0 and score_text("")["tone"] == "neutral"
+
+def test_escalation():
+    """Only short, clearly non-concerning texts the lexicon recognizes stay local"""
+    for text in ("Had a great day with friends!", "Feeling calm and rested", ""):
+        assert not needs_model(score_text(text)), text
+
+    for text in ("I'm so stressed", "Awful, terrible day", "Happy but so anxious about tomorrow",
+                 "good " * 13):
+        assert needs_model(score_text(text)), text
+
+def test_unrecognized_text_escalates():
+    """Any non-empty text without lexicon hits reaches the model, however short"""
+    for text in ("ending it all", "goodbye everyone", "I'm done", "nothing matters", "hm"):
+        score = score_text(text)
+        assert score["lexicon_hits"] == 0 or score["crisis"], text
+        assert needs_model(score), text
+
+def test_crisis_phrases():
+    """Crisis phrasings are flagged and always escalate, even next to positive words"""
+    for text in ("I keep thinking about killing myself.", "I just want to end it all",
+                 "I don't want to be here anymore", "Great day, but honestly I don’t want to be here",
+                 "ending it all tonight", "goodbye everyone", "nothing matters"):
+        score = score_text(text)
+        assert score["crisis"], text
+        assert needs_model(score), text
+    assert not score_text("Had a great day with friends!")["crisis"]
+
+def test_batch_matches_single():
+    """score_batch gives exactly the score_text result of every text, modifiers never crossing texts"""
+    texts = ["Had a great day with friends!", "I am not happy.", "", "really sad", "not", "good",
+             "Not today. Stressed though", "So stressed and anxious about exams", None, "very",
+             "happy", "I don't feel calm, really worried", "hm", "bit tired, but not bad at all!"]
+    assert score_batch(texts) == [score_text(text) for text in texts]
+    assert score_batch([]) == []
+    assert score_batch(["", ". !"]) == [score_text(""), score_text(". !")]
+
+if __name__ == "__main__":
+    test_scoring()
+    test_escalation()
+    test_unrecognized_text_escalates()
+    test_crisis_phrases()
+    test_batch_matches_single()
+    print("Affect lexicon tests passed")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the combined weekly and monthly analytics run
+"""
+import json
+import sys
+import os
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from analyze_weekly_monthly import analyze_weekly_monthly, calculate_statistics, split_periods
+from mock_gemini import MockGemini
+RANGES = {
+    "weekly": {"start": "2024-03-25T00:00:00.000Z", "end": "2024-03-31T23:59:59.999Z"},
+    "monthly": {"start": "2024-03-01T00:00:00.000Z", "end": "2024-03-31T23:59:59.999Z"}
+}
+
+def assessment(day, mood, month=3):
+    return {"id": day, "createdAt": f"2024-{month:02d}-{day:02d}T09:00:00.000Z",
+            "answers": {"moodLevel": mood, "stressLevel": 10 - mood, "sleepHours": 7, "energyLevel": "Moderate"},
+            "aiAnalysis": {"riskLevel": "Low", "summary": f"Check-in on day {day}."}}
+
+ASSESSMENTS = [assessment(28, 2, month=2), assessment(5, 7), assessment(12, 6), assessment(26, 4), assessment(28, 3)]
+SUMMARIES = [{"date": "2024-03-05", "summary": "Calm week, long walks."},
+             {"date": "2024-03-27", "summary": "Overwhelmed by the deadline and anxious at night."}]
+
+# Both calls must be in flight together to pass the barrier
+BARRIER = threading.Barrier(2, timeout=5)
+
+def respond(prompt, payload):
+    BARRIER.wait()
+    period = "weekly" if "WEEKLY MENTAL HEALTH DATA" in prompt else "monthly"
+    return json.dumps({"summary": f"{period} summary", "trends": "t", "insights": "i", "recommendations": "r",
+                       "riskLevel": "Low"})
+
+def test_split_shares_one_pass():
+    """Each period gets the assessments and summaries inside its range, as separate runs would"""
+    accumulators, summaries = split_periods(ASSESSMENTS, SUMMARIES, RANGES)
+    assert accumulators["weekly"].statistics() == calculate_statistics(ASSESSMENTS[3:])
+    assert accumulators["monthly"].statistics() == calculate_statistics(ASSESSMENTS[1:])
+    assert summaries["weekly"] == SUMMARIES[1:] and summaries["monthly"] == SUMMARIES
+
+    # Date-only ranges cover their whole last day
+    accumulators, _ = split_periods(ASSESSMENTS, [], {"weekly": {"start": "2024-03-26", "end": "2024-03-26"}})
+    assert accumulators["weekly"].mood.n == 1 and accumulators["monthly"].mood.n == len(ASSESSMENTS)
+
+def test_both_periods_in_one_run():
+    with MockGemini(respond, SUMMARY_INDEX_DIR="off") as gemini:
+        result = json.loads(analyze_weekly_monthly(json.dumps({
+            "period": "both", "assessments": ASSESSMENTS, "summaries": SUMMARIES, "ranges": RANGES})))
+        # A period without assessments needs no call
+        empty = json.loads(analyze_weekly_monthly(json.dumps({
+            "period": "both", "assessments": ASSESSMENTS[:1], "summaries": [], "ranges": RANGES})))
+
+    assert len(gemini.prompts) == 2
+    assert result["weekly"]["summary"] == "weekly summary" and result["monthly"]["summary"] == "monthly summary"
+    assert result["assessmentCounts"] == {"weekly": 2, "monthly": 4}
+    # The weekly prompt only quotes the week's summary
+    weekly_prompt = next(p for p in gemini.prompts if "WEEKLY MENTAL HEALTH DATA" in p)
+    assert "Calm week" not in weekly_prompt and "Overwhelmed by the deadline" in weekly_prompt
+    assert empty["weekly"]["summary"] == "No assessments available for this week."
+    assert empty["monthly"]["summary"] == "No assessments available for this month."
+
+if __name__ == "__main__":
+    test_split_shares_one_pass()
+    test_both_periods_in_one_run()
+    print("Analytics period tests passed")
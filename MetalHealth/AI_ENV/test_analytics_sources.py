@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for the paged analytics data sources, against SQLite
+"""
+import json
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from analytics_sources import AnalyticsReader, SQLiteSource
+from analyze_weekly_monthly import analyze_weekly_monthly, calculate_statistics, calculate_trends
+import deadline
+
+TEST_ENV = ("GOOGLE_API_KEY_1", "USAGE_LEDGER_DB", "MODEL_ROUTING_LOG", "SUMMARY_INDEX_DIR",
+            "ANALYTICS_ASSESSMENTS_SOURCE", "ANALYTICS_SUMMARIES_SOURCE")
+ENERGY = ["Very low", "Low", "Moderate", "High", "Very high"]
+
+def make_database(path):
+    """A month of assessments for user 7, a few for user 8, and the month's summaries."""
+    assessments = []
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE MentalHealthAssessments (id INTEGER PRIMARY KEY, user_id INTEGER, answers TEXT,
+                                              ai_analysis TEXT, created_at TEXT, updated_at TEXT);
+        CREATE TABLE DailySummaries (user_id INTEGER, date TEXT, summary TEXT);
+    """)
+    for day in range(1, 31):
+        answers = {"mood": "Calm", "moodLevel": 3 + day % 6, "stressLevel": 8 - day % 5, "sleepHours": 5 + day % 4,
+                   "energyLevel": ENERGY[day % 5], "sleepQuality": "Fair", "freeText": "x" * 2000}
+        if day == 4:
+            del answers["stressLevel"]
+        analysis = {"riskLevel": ["Low", "Medium", "High"][day % 3], "summary": f"Day {day}.",
+                    "recommendations": "y" * 2000}
+        created = f"2024-04-{day:02d}T08:30:00.000Z"
+        conn.execute("INSERT INTO MentalHealthAssessments VALUES (?, 7, ?, ?, ?, ?)",
+                     (day, json.dumps(answers), json.dumps(analysis), created, created))
+        assessments.append({"id": day, "createdAt": created, "answers": answers, "aiAnalysis": analysis})
+        conn.execute("INSERT INTO DailySummaries VALUES (7, ?, ?)", (f"2024-04-{day:02d}", f"Summary {day}."))
+    conn.execute("INSERT INTO MentalHealthAssessments VALUES (99, 8, '{\"moodLevel\": 1}', '{}', "
+                 "'2024-04-10T08:00:00.000Z', NULL)")
+    conn.commit()
+    conn.close()
+    return assessments
+
+class CountingSource(SQLiteSource):
+    fetches = 0
+
+    def cursor(self):
+        cursor = super().cursor()
+        source = self
+
+        class Counting:
+            def execute(self, *args):
+                return cursor.execute(*args)
+
+            def fetchmany(self, size):
+                source.fetches += 1
+                return cursor.fetchmany(size)
+
+            def close(self):
+                cursor.close()
+        return Counting()
+
+def test_pages_and_projects():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "analytics.db")
+        expected = make_database(path)
+        source = CountingSource(path, page_size=8)
+        try:
+            rows = list(source.assessments(7, "2024-04-01T00:00:00.000Z", "2024-04-30T23:59:59.999Z"))
+            # 30 rows in pages of 8, plus the empty fetch that ends the cursor
+            assert len(rows) == 30 and source.fetches == 5
+            # Only the fields the analytics use are read
+            assert "freeText" not in rows[0]["answers"] and rows[0]["aiAnalysis"] == {"riskLevel": "Medium",
+                                                                                       "summary": "Day 1."}
+            assert rows[0]["answers"]["energyLevel"] == "Low" and rows[0]["answers"]["moodLevel"] == 4
+            assert "stressLevel" not in rows[3]["answers"]
+            assert calculate_statistics(rows) == calculate_statistics(expected)
+            assert calculate_trends(rows) == calculate_trends(expected)
+
+            week = list(source.assessments(7, "2024-04-08T00:00:00.000Z", "2024-04-14T23:59:59.999Z"))
+            assert [r["id"] for r in week] == list(range(8, 15))
+            summaries = list(source.summaries(7, "2024-04-08", "2024-04-14"))
+            assert [s["date"] for s in summaries] == [f"2024-04-{d:02d}" for d in range(8, 15)]
+        finally:
+            source.close()
+
+def test_analytics_reads_from_source():
+    """The analytics entry point gives the same statistics from a source as from inlined data"""
+    saved = {name: os.environ.get(name) for name in TEST_ENV}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "analytics.db")
+        expected = make_database(path)
+        os.environ.update(GOOGLE_API_KEY_1="test", USAGE_LEDGER_DB="off", MODEL_ROUTING_LOG="off",
+                          SUMMARY_INDEX_DIR="off", ANALYTICS_ASSESSMENTS_SOURCE=f"sqlite:{path}",
+                          ANALYTICS_SUMMARIES_SOURCE=f"sqlite:{path}")
+        try:
+            with AnalyticsReader() as reader:
+                assert reader.summary_source is reader.assessment_source
+            # An expired deadline answers from the local statistics without calling Gemini
+            request = {"period": "monthly", "deadline": 1,
+                       "source": {"userId": 7, "start": "2024-04-01T00:00:00.000Z",
+                                  "end": "2024-04-30T23:59:59.999Z", "pageSize": 4}}
+            from_source = json.loads(analyze_weekly_monthly(json.dumps(request)))
+            inlined = json.loads(analyze_weekly_monthly(json.dumps(
+                {"period": "monthly", "deadline": 1, "assessments": expected})))
+        finally:
+            deadline.clear()
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    assert from_source["partial"] and "error" not in from_source
+    assert from_source == inlined
+
+if __name__ == "__main__":
+    test_pages_and_projects()
+    test_analytics_reads_from_source()
+    print("Analytics source tests passed")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the fused assessment plus daily summary analysis against a mock Gemini server
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from analyze_assessment_summary import analyze_assessment_summary
+from mock_gemini import MockGemini
+
+ASSESSMENT = {"summary": "Moderate anxiety with sleep disruption.", "riskLevel": "Medium",
+              "recommendations": "Consider speaking with a counsellor."}
+SUMMARY_ANALYSIS = {"summary": "The entry describes sustained worry.", "mood_indicators": "Anxious, tired",
+                    "patterns": "Rumination before sleep", "insights": "Work stress dominates the day",
+                    "suggestions": "Wind down before bed; note what helps."}
+SUMMARY = ("I felt anxious and overwhelmed all day, could not stop worrying about work "
+           "and only slept four hours last night.")
+ANSWERS = {"mood": "Anxious", "moodLevel": 3, "stressLevel": 8, "sleepHours": 4}
+
+def with_server(test, combined):
+    """Answers combined prompts with `combined`, any other prompt with the summary analysis."""
+    def respond(prompt, payload):
+        return json.dumps(combined if '"summaryAnalysis"' in prompt else SUMMARY_ANALYSIS)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockGemini(respond, NEAR_DUPLICATE_INDEX_FILE=os.path.join(tmp, "index.json")) as gemini:
+        test(gemini)
+
+def run_fused():
+    return json.loads(analyze_assessment_summary(json.dumps(
+        {"answers": ANSWERS, "dailySummary": SUMMARY, "userGender": "Female"})))
+
+def test_fused_call_returns_both_analyses():
+    """One combined request yields the assessment and the summary analysis"""
+    def check(gemini):
+        result = run_fused()
+        assert len(gemini.prompts) == 1
+        assert SUMMARY in gemini.prompts[0]
+        assert {k: result["assessment"][k] for k in ASSESSMENT} == ASSESSMENT
+        assert {k: result["summaryAnalysis"][k] for k in SUMMARY_ANALYSIS} == SUMMARY_ANALYSIS
+        assert result["summaryAnalysis"]["analysis_mode"] == "fused"
+        assert result["assessment"]["timestamp"] == result["summaryAnalysis"]["timestamp"]
+
+    with_server(check, {"assessment": ASSESSMENT, "summaryAnalysis": SUMMARY_ANALYSIS})
+
+def test_incomplete_summary_half_falls_back():
+    """A combined response without a usable summary half costs one extra summary call"""
+    def check(gemini):
+        result = run_fused()
+        assert len(gemini.prompts) == 2
+        assert '"summaryAnalysis"' not in gemini.prompts[1]
+        assert result["assessment"]["riskLevel"] == "Medium"
+        assert result["summaryAnalysis"]["patterns"] == SUMMARY_ANALYSIS["patterns"]
+        assert result["summaryAnalysis"]["analysis_mode"] == "full"
+
+    with_server(check, {"assessment": {"summary": ASSESSMENT["summary"]}, "summaryAnalysis": {"summary": "cut"}})
+
+def test_without_summary_only_assesses():
+    def check(gemini):
+        result = json.loads(analyze_assessment_summary(json.dumps({"answers": ANSWERS})))
+        assert result["summaryAnalysis"] is None
+        assert len(gemini.prompts) == 1
+        assert '"summaryAnalysis"' not in gemini.prompts[0]
+
+    with_server(check, {"assessment": ASSESSMENT, "summaryAnalysis": SUMMARY_ANALYSIS})
+
+if __name__ == "__main__":
+    test_fused_call_returns_both_analyses()
+    test_incomplete_summary_half_falls_back()
+    test_without_summary_only_assesses()
+    print("Fused analysis tests passed")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the assessment backfill against a local mock Gemini server
+"""
+import re
+import json
+import sys
+import os
+import tempfile
+from contextlib import redirect_stderr
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from backfill_assessments import run_backfill, load_checkpoint, main
+from gemini_client import RateLimiter
+from mock_gemini import MockGemini
+
+MOCK_ANALYSIS = {"summary": "Mock clinical summary.", "riskLevel": "Low", "recommendations": "Mock recommendations."}
+
+def respond(prompt, payload):
+    item_ids = re.findall(r"=== ITEM (\S+) ===", prompt)
+    if item_ids:
+        # Batch prompt: answer every item but the last, which must then be re-run alone
+        return json.dumps([dict(MOCK_ANALYSIS, id=item_id) for item_id in item_ids[:-1]])
+    return json.dumps(MOCK_ANALYSIS)
+
+def batch_items(gemini):
+    return sum(len(re.findall(r"=== ITEM (\S+) ===", prompt)) for prompt in gemini.prompts)
+
+def write_export(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": i, "answers": {"mood": "Neutral", "moodLevel": 5, "stressLevel": 5}}) + "\n")
+
+def read_ids(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["id"] for line in f]
+
+def test_backfill_resumes_after_crash():
+    """A run interrupted mid-write resumes without redoing finished assessments"""
+    with tempfile.TemporaryDirectory() as tmp, MockGemini(respond) as gemini:
+        input_path = os.path.join(tmp, "assessments.jsonl")
+        output_path = os.path.join(tmp, "results.jsonl")
+        write_export(input_path, 20)
+
+        stats = run_backfill(input_path, output_path, concurrency=4, rate=200, api_key="test")
+        assert stats == {"completed": 20, "failed": 0}
+        assert sorted(read_ids(output_path), key=int) == [str(i) for i in range(20)]
+
+        # Simulate a crash: keep 5 results plus a torn partial line
+        with open(output_path, "r", encoding="utf-8") as f:
+            kept = f.readlines()[:5]
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+            f.write('{"id": "torn')
+
+        gemini.reset()
+        stats = run_backfill(input_path, output_path, concurrency=4, rate=200, api_key="test")
+        assert stats["completed"] == 15
+        assert gemini.requests_seen == 15
+        ids = read_ids(output_path)
+        assert len(ids) == len(set(ids)) == 20
+
+def test_backfill_batches_requests():
+    """Micro-batched runs share requests and re-run items missing from a batch answer"""
+    with tempfile.TemporaryDirectory() as tmp, MockGemini(respond) as gemini:
+        input_path = os.path.join(tmp, "assessments.jsonl")
+        output_path = os.path.join(tmp, "results.jsonl")
+        write_export(input_path, 24)
+
+        stats = run_backfill(input_path, output_path, concurrency=8, rate=200, api_key="test",
+                             batch_size=8, batch_window=0.2)
+        assert stats == {"completed": 24, "failed": 0}
+        ids = read_ids(output_path)
+        assert len(ids) == len(set(ids)) == 24
+        assert batch_items(gemini) > 0
+        assert gemini.requests_seen < 24
+
+def test_checkpoint_skips_non_object_lines():
+    """Valid JSON lines that are not result objects are ignored, not fatal"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "results.jsonl")
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write('{"id": "1", "status": "ok"}\n[1, 2]\n"text"\nnull\n{"id": "2", "status": "failed"}\n')
+        assert load_checkpoint(output_path) == {"1", "2"}
+        assert load_checkpoint(output_path, retry_failed=True) == {"1"}
+
+def test_rate_must_be_positive():
+    """A zero or negative --rate is rejected before any work starts"""
+    with open(os.devnull, "w") as devnull, redirect_stderr(devnull):
+        for rate in ("0", "-1", "fast"):
+            try:
+                main(["in.jsonl", "out.jsonl", "--rate", rate])
+                assert False, f"--rate {rate} accepted"
+            except SystemExit as e:
+                assert e.code == 2
+    try:
+        RateLimiter(0)
+        assert False, "zero rate accepted"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    test_backfill_resumes_after_crash()
+    test_backfill_batches_requests()
+    test_checkpoint_skips_non_object_lines()
+    test_rate_must_be_positive()
+    print("Backfill tests passed")
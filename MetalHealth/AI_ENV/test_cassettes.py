@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for Gemini cassette record/replay
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cassette import iter_cassettes
+from gemini_client import GeminiHTTPError, generate_content
+from prompt_registry import Prompt
+from analyze_mental_health import analyze_mental_health, extract_text_from_response
+from bench_decoding import parser_for
+from mock_gemini import MockGemini, patched_env, response_body
+
+MOCK_ANALYSIS = {"summary": "Recorded clinical summary.", "riskLevel": "Low", "recommendations": "Recorded recommendations."}
+
+def respond(prompt, payload):
+    return response_body(json.dumps(MOCK_ANALYSIS), usage={"promptTokenCount": 1500, "candidatesTokenCount": 60})
+
+def without_timestamp(result):
+    analysis = json.loads(result)
+    analysis.pop("timestamp", None)
+    return analysis
+
+def test_record_then_replay():
+    """A recorded call replays offline to the same analysis, and an unrecorded one misses"""
+    request = json.dumps({"answers": {"mood": "Calm", "moodLevel": 7, "stressLevel": 3}, "userGender": "Male"})
+    with tempfile.TemporaryDirectory() as tmp:
+        def record():
+            recorded = analyze_mental_health(request)
+            assert without_timestamp(recorded) == MOCK_ANALYSIS
+            cassettes = list(iter_cassettes(tmp))
+            assert len(cassettes) == 1
+            path, cassette = cassettes[0]
+            assert cassette["request"]["endpoint"] == "assessment"
+            assert cassette["response"]["status"] == 200
+            # The API key must never be written to disk
+            with open(path, "r", encoding="utf-8") as f:
+                assert "secret-test-key" not in f.read()
+
+        def replay():
+            assert without_timestamp(analyze_mental_health(request)) == MOCK_ANALYSIS
+            # A miss surfaces through the caller's usual error handling, never the network
+            missed = json.loads(analyze_mental_health(json.dumps({"answers": {"mood": "Sad", "moodLevel": 2}})))
+            assert "No cassette" in missed["summary"]
+
+        with MockGemini(respond, GEMINI_CASSETTE_MODE="record", GEMINI_CASSETTE_DIR=tmp,
+                        GOOGLE_API_KEY_1="secret-test-key"):
+            record()
+        # The server is gone: replay must not touch the network
+        with patched_env(GEMINI_API_BASE="http://127.0.0.1:9", GEMINI_CASSETTE_MODE="replay",
+                         GEMINI_CASSETTE_DIR=tmp, GOOGLE_API_KEY_1="unused", USAGE_LEDGER_DB="off",
+                         MODEL_ROUTING_LOG="off"):
+            replay()
+
+def test_corpus_replays_through_parsers():
+    """Every cassette in the corpus replays by hash, and no parser raises on its response"""
+    def replay_corpus():
+        cassettes = list(iter_cassettes())
+        assert cassettes
+        outcomes = set()
+        for _, cassette in cassettes:
+            request = cassette["request"]
+            # The template version picks the generation profile, as in the live call
+            prompt = Prompt(request["payload"]["contents"][0]["parts"][0]["text"], request["promptVersion"])
+            try:
+                resp = generate_content("unused", prompt, request["model"], endpoint=request["endpoint"])
+            except GeminiHTTPError as e:
+                assert e.status_code == cassette["response"]["status"]
+                outcomes.add("http_error")
+                continue
+            except ValueError:
+                outcomes.add("undecodable")
+                continue
+            _, parse, outcome_of = parser_for(cassette)
+            text = extract_text_from_response(resp)
+            outcomes.add(outcome_of(parse(text)).split()[0] if text else "empty")
+        # The corpus keeps covering the malformed cases, not just clean responses
+        assert {"parsed", "fallback", "partial", "empty", "http_error", "undecodable"} <= outcomes
+
+    with patched_env(GEMINI_CASSETTE_MODE="replay", USAGE_LEDGER_DB="off", MODEL_ROUTING_LOG="off"):
+        replay_corpus()
+
+if __name__ == "__main__":
+    test_record_then_replay()
+    test_corpus_replays_through_parsers()
+    print("Cassette tests passed")
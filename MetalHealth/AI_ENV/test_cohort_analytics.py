@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for the cohort aggregates, their quantile sketches and incremental state
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cohort_analytics import CohortEngine, QuantileSketch
+from affect_lexicon import score_text
+
+def assessment(user, day, mood, stress, sleep, energy="Moderate", risk="Low", summary=None):
+    record = {"userId": user, "createdAt": f"2024-01-{day:02d}T09:00:00",
+              "answers": json.dumps({"moodLevel": mood, "stressLevel": stress, "sleepHours": sleep, "energyLevel": energy}),
+              "aiAnalysis": {"riskLevel": risk}}
+    if summary is not None:
+        record["dailySummary"] = summary
+    return record
+
+CALM = "Great day, felt calm and rested"
+STRESSED = "So stressed and anxious about exams"
+
+# Monday 2024-01-01 to Sunday 2024-01-14: two weeks, one month
+RECORDS = [
+    assessment("a", 1, 7, 2, 8, summary=CALM), assessment("a", 2, 6, 3, 7, summary="  "),
+    assessment("a", 3, 5, 4, 6, "Low"), assessment("b", 1, 4, 8, 5, risk="High", summary=STRESSED), assessment("b", 9, 5, 6, 7, "High", risk="Medium"),
+    assessment("c", 10, 8, 1, 9, "Very high"), assessment("c", 14, 8, 1, 9),
+    {"userId": "d", "answers": "{}"},   # No timestamp
+]
+
+def test_ingest_reports():
+    """Averages, stress percentiles and trends per user, and grouped weekly aggregates"""
+    engine = CohortEngine()
+    assert engine.ingest(RECORDS) == 7
+
+    users = engine.user_report()
+    assert sorted(users) == ["a", "b", "c"]
+    assert users["a"]["assessments"] == 3 and users["a"]["averageStress"] == 3.0
+    assert users["a"]["sleepTrend"] == "Declining" and users["a"]["stressTrend"] == "Improving"
+    assert users["c"]["moodTrend"] == "Stable"
+    # Percent of users at or below each user's average stress
+    assert [users[u]["stressPercentile"] for u in "cab"] == [33.3, 66.7, 100.0]
+
+    weeks = engine.period_report("weekly")
+    assert [w["period"] for w in weeks] == ["2024-01-01", "2024-01-08"]
+    assert weeks[0]["assessments"] == 4 and weeks[0]["users"] == 2
+    assert weeks[0]["riskDistribution"] == {"High": 1, "Low": 3}
+    assert weeks[0]["decliningSleepShare"] == 1.0
+    assert weeks[1]["decliningSleepShare"] == 0.0
+    months = engine.period_report("monthly")
+    assert len(months) == 1 and months[0]["assessments"] == 7 and months[0]["averageSleep"] == 7.3
+
+def test_summary_affect():
+    """Daily summaries are scored by the local lexicon and averaged per period; blank ones are skipped"""
+    engine = CohortEngine()
+    engine.ingest(RECORDS)
+    weeks = engine.period_report("weekly")
+    calm, stressed = score_text(CALM), score_text(STRESSED)
+    assert weeks[0]["summaryAffect"] == {
+        "summaries": 2,
+        "polarity": round((calm["polarity"] + stressed["polarity"]) / 2, 3),
+        "stress": round((calm["stress"] + stressed["stress"]) / 2, 3),
+        "anxiety": round((calm["anxiety"] + stressed["anxiety"]) / 2, 3),
+    }
+    assert weeks[1]["summaryAffect"] is None
+
+def test_sketch_quantiles():
+    sketch = QuantileSketch(0, 10, 100)
+    assert sketch.quantile(0.5) is None
+    sketch.update([1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+    assert sketch.quantile(0.5) == 5.0 and sketch.quantile(0.9) == 9.0
+    # Out-of-range values land in the edge bins
+    other = QuantileSketch(0, 10, 100)
+    other.update([-3, 42])
+    assert sketch.merge(other).total == 12 and sketch.quantile(1.0) == 9.9
+
+    week = CohortEngine()
+    week.ingest(RECORDS)
+    first = week.period_report("weekly")[0]
+    assert first["stressP50"] == 3.0 and first["stressP90"] == 8.0 and first["sleepP50"] == 6.0
+
+def test_shard_merge_matches_single_pass():
+    """Engines built on time-ordered shards merge into the same state as one ingest"""
+    whole = CohortEngine()
+    whole.ingest(RECORDS)
+
+    early, late = CohortEngine(), CohortEngine()
+    early.ingest([r for r in RECORDS if r.get("createdAt", "") < "2024-01-03"])
+    late.ingest([r for r in RECORDS if r.get("createdAt", "") >= "2024-01-03"])
+    merged = early.merge(late)
+    assert merged.user_report() == whole.user_report()
+    assert merged.period_report("weekly") == whole.period_report("weekly")
+
+    # Incremental batches into one engine give the same result too
+    incremental = CohortEngine()
+    for record in RECORDS:
+        incremental.ingest([record])
+    assert incremental.user_report() == whole.user_report()
+    assert incremental.period_report("monthly") == whole.period_report("monthly")
+
+def test_save_load_round_trip():
+    engine = CohortEngine()
+    engine.ingest(RECORDS[:4])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cohort_state.json")
+        engine.save(path)
+        resumed = CohortEngine.load(path)
+        resumed.ingest(RECORDS[4:])
+
+        whole = CohortEngine()
+        whole.ingest(RECORDS)
+        assert resumed.user_report() == whole.user_report()
+        assert resumed.period_report("weekly") == whole.period_report("weekly")
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        assert CohortEngine.load(path).user_report() == {}
+        assert CohortEngine.load(os.path.join(tmp, "missing.json")).user_report() == {}
+
+if __name__ == "__main__":
+    test_ingest_reports()
+    test_summary_affect()
+    test_sketch_quantiles()
+    test_shard_merge_matches_single_pass()
+    test_save_load_round_trip()
+    print("Cohort analytics tests passed")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for reused, incremental and full re-analysis of edited daily summaries
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from analyze_daily_summary import (analyze_daily_summary, compute_edit_diff, build_partial_summary_analysis,
+                                   parse_summary_response)
+from mock_gemini import MockGemini
+
+PREVIOUS_TEXT = ("Today was fine. Went for a long walk in the park this morning. Lunch with my sister was nice. "
+                 "Spent the afternoon reading a novel on the balcony. Cooked pasta for dinner and watched a film.")
+PREVIOUS_ANALYSIS = {"summary": "A settled, pleasant day.", "mood_indicators": "Content, relaxed",
+                     "patterns": "Outdoor activity and social contact", "insights": "Routine supports mood",
+                     "suggestions": "Keep the walks going."}
+MEDIUM_EDIT = PREVIOUS_TEXT.replace("Cooked pasta for dinner and watched a film.",
+                                   "Ordered a pizza later and called an old friend from school.")
+
+UPDATED_ANALYSIS = {"summary": "Updated summary.", "mood_indicators": "Updated mood",
+                    "patterns": "Updated patterns", "insights": "Updated insights", "suggestions": "Updated suggestions"}
+
+def analyze_edit(summary_text, previous_analysis=PREVIOUS_ANALYSIS, answer=json.dumps(UPDATED_ANALYSIS)):
+    """Analyze an edit of PREVIOUS_TEXT against a mock server. Returns (analysis, prompts sent)."""
+    context = {"is_edit": True, "has_previous_analysis": True}
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockGemini(lambda prompt, payload: answer, SUMMARY_INDEX_DIR="off",
+                       NEAR_DUPLICATE_INDEX_FILE=os.path.join(tmp, "index.json")) as gemini:
+        analysis = json.loads(analyze_daily_summary(summary_text, context, "Female", PREVIOUS_TEXT, previous_analysis))
+    return analysis, gemini.prompts
+
+def test_small_edit_reuses_analysis():
+    """A typo-sized, neutral edit reuses the previous analysis without a call"""
+    analysis, prompts = analyze_edit(PREVIOUS_TEXT.replace("watched a film", "watched a movie"))
+    assert analysis["analysis_mode"] == "reused" and not prompts
+    assert {k: analysis[k] for k in PREVIOUS_ANALYSIS} == PREVIOUS_ANALYSIS
+
+def test_medium_edit_is_incremental():
+    """A medium, neutral edit sends only the changed sentences"""
+    edited = MEDIUM_EDIT
+    assert 0.5 <= compute_edit_diff(PREVIOUS_TEXT, edited)["similarity"] < 0.9
+    analysis, prompts = analyze_edit(edited)
+    assert analysis["analysis_mode"] == "incremental" and len(prompts) == 1
+    assert "NEW OR CHANGED SENTENCES" in prompts[0] and "called an old friend" in prompts[0]
+    assert "Went for a long walk" not in prompts[0]
+    assert analysis["summary"] == UPDATED_ANALYSIS["summary"]
+
+def test_concerning_edits_get_full_analysis():
+    """Small edits that add a crisis or negative signal are never reused or updated incrementally"""
+    edits = [
+        PREVIOUS_TEXT + " I keep thinking about killing myself.",
+        PREVIOUS_TEXT.replace("Today was fine.", "Today was hopeless."),
+        PREVIOUS_TEXT.replace("Lunch with my sister was nice.", "Lunch with my sister was awful and I cried."),
+    ]
+    for edited in edits:
+        assert compute_edit_diff(PREVIOUS_TEXT, edited)["similarity"] >= 0.5
+        analysis, prompts = analyze_edit(edited)
+        assert analysis["analysis_mode"] == "full", edited
+        assert len(prompts) == 1 and "NEW OR CHANGED SENTENCES" not in prompts[0]
+        assert edited in prompts[0]
+
+def test_large_edit_is_full():
+    """A rewrite shares too little with the previous version to update it"""
+    analysis, prompts = analyze_edit("Stayed home all day with a cold. Slept most of the afternoon and "
+                                     "drank a lot of tea while catching up on emails.")
+    assert analysis["analysis_mode"] == "full" and len(prompts) == 1
+
+def assert_placeholder_not_reused(previous_analysis):
+    """Re-saving the same text, or editing it, runs a full analysis instead of keeping the placeholder"""
+    for edited in (PREVIOUS_TEXT, MEDIUM_EDIT):
+        analysis, prompts = analyze_edit(edited, previous_analysis)
+        assert analysis["analysis_mode"] == "full", (previous_analysis, edited)
+        assert analysis["summary"] == UPDATED_ANALYSIS["summary"]
+        assert len(prompts) == 1 and "NEW OR CHANGED SENTENCES" not in prompts[0]
+
+def test_deadline_placeholder_is_not_reused():
+    placeholder = build_partial_summary_analysis()
+    assert_placeholder_not_reused(placeholder)
+    # Documents saved before the mode was stored keep only the five text fields
+    assert_placeholder_not_reused({k: v for k, v in placeholder.items() if k != "analysis_mode"})
+
+def test_partial_analysis_is_not_reused():
+    """A partial result carried over from an earlier version is re-analyzed on the next save"""
+    assert_placeholder_not_reused(build_partial_summary_analysis(PREVIOUS_ANALYSIS))
+
+def test_unparsed_analysis_is_not_reused():
+    unparsed = parse_summary_response("Sorry, here is some prose instead of JSON.")
+    assert_placeholder_not_reused(unparsed)
+    assert_placeholder_not_reused(dict(unparsed, analysis_mode="unparsed"))
+    # The fallback dailysummary.js stores when the script output is not JSON
+    assert_placeholder_not_reused({"summary": "Analysis completed but format unclear", "analysis_mode": "unparsed",
+                                   "mood_indicators": "Unable to parse", "patterns": "Unable to parse",
+                                   "insights": "Please try again later", "suggestions": "Continue journaling"})
+
+def test_failed_analysis_is_not_reused():
+    assert_placeholder_not_reused({"summary": "Analysis failed", "mood_indicators": "Not available",
+                                   "patterns": "Not available", "insights": "Please try again later",
+                                   "suggestions": "Continue journaling", "analysis_mode": "failed"})
+
+def test_unparsed_response_is_marked():
+    analysis, _ = analyze_edit("Stayed home all day with a cold. Slept most of the afternoon and drank a lot "
+                               "of tea while catching up on emails.", answer="Not JSON at all.")
+    assert analysis["analysis_mode"] == "unparsed"
+
+if __name__ == "__main__":
+    test_small_edit_reuses_analysis()
+    test_medium_edit_is_incremental()
+    test_concerning_edits_get_full_analysis()
+    test_large_edit_is_full()
+    test_deadline_placeholder_is_not_reused()
+    test_partial_analysis_is_not_reused()
+    test_unparsed_analysis_is_not_reused()
+    test_failed_analysis_is_not_reused()
+    test_unparsed_response_is_marked()
+    print("Daily summary edit tests passed")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for deadline propagation and cancellation against a stalled mock Gemini server
+"""
+import json
+import sys
+import os
+import time
+import signal
+import subprocess
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import deadline
+from gemini_client import generate_content
+from analyze_mental_health import analyze_mental_health
+from analyze_weekly_monthly import analyze_weekly_monthly
+from mock_gemini import MockGemini
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ANSWERS = {"mood": "Low", "moodLevel": 3, "stressLevel": 7}
+
+class Stall:
+    """Accepts requests but never answers until released."""
+
+    def __init__(self):
+        self.received = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, prompt, payload):
+        self.received.set()
+        self.release.wait(30)
+        return 503, None
+
+def with_server(test):
+    stall = Stall()
+    try:
+        with MockGemini(stall) as gemini:
+            try:
+                test(gemini, stall)
+            finally:
+                stall.release.set()
+    finally:
+        deadline.clear()
+
+def test_cancel_aborts_in_flight_call():
+    """Cancelling shuts down a call blocked on the server, and later calls are never sent"""
+    def run(gemini, stall):
+        errors = []
+        def call():
+            try:
+                generate_content("test", "hello", timeout=30, endpoint="test")
+            except Exception as e:
+                errors.append(e)
+        worker = threading.Thread(target=call)
+        worker.start()
+        assert stall.received.wait(5)
+        started = time.monotonic()
+        deadline.cancel("test")
+        worker.join(5)
+        assert not worker.is_alive() and time.monotonic() - started < 2
+        assert isinstance(errors[0], deadline.Cancelled)
+        try:
+            generate_content("test", "hello", endpoint="test")
+            assert False, "call after cancel was sent"
+        except deadline.Cancelled:
+            pass
+        assert gemini.requests_seen == 1
+    with_server(run)
+
+def test_deadline_returns_partial_results():
+    """A deadline cuts a stalled call short, and too little time left skips the call entirely"""
+    def run(gemini, stall):
+        saved_min = deadline.MIN_CALL_SECONDS
+        deadline.MIN_CALL_SECONDS = 0.1
+        try:
+            started = time.monotonic()
+            analysis = json.loads(analyze_mental_health(json.dumps(
+                {"answers": ANSWERS, "deadline": (time.time() + 1.0) * 1000})))
+            assert time.monotonic() - started < 3
+            assert analysis["partial"] is True and analysis["riskLevel"] in ("Medium", "High")
+        finally:
+            deadline.MIN_CALL_SECONDS = saved_min
+        assert gemini.requests_seen == 1
+
+        deadline.clear()
+        weekly = json.loads(analyze_weekly_monthly(json.dumps({
+            "period": "weekly", "deadline": time.time() + 1,
+            "assessments": [{"createdAt": "2024-01-01T00:00:00Z", "answers": ANSWERS,
+                             "aiAnalysis": {"riskLevel": "Medium"}}]})))
+        assert weekly["partial"] is True and "error" not in weekly
+        assert gemini.requests_seen == 1
+    with_server(run)
+
+def test_sigterm_finishes_with_partial_result():
+    """SIGTERM during a stalled call ends the script promptly with a partial result on stdout"""
+    def run(gemini, stall):
+        process = subprocess.Popen([sys.executable, os.path.join(HERE, "analyze_mental_health.py"),
+                                    json.dumps({"answers": ANSWERS})],
+                                   cwd=HERE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            assert stall.received.wait(30)
+            process.send_signal(signal.SIGTERM)
+            stdout, _ = process.communicate(timeout=5)
+        finally:
+            if process.poll() is None:
+                process.kill()
+        assert process.returncode == 0
+        assert json.loads(stdout)["partial"] is True
+    with_server(run)
+
+if __name__ == "__main__":
+    test_cancel_aborts_in_flight_call()
+    test_deadline_returns_partial_results()
+    test_sigterm_finishes_with_partial_result()
+    print("Deadline tests passed")
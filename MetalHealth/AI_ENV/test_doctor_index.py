@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for the doctors snapshot index
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from doctor_index import DEFAULT_SNAPSHOT, get_index, load_snapshot, parse_sql_snapshot, tags_for
+from risk_analysis import get_recommended_doctors
+
+def test_parses_repo_snapshot():
+    doctors = load_snapshot(DEFAULT_SNAPSHOT)
+    assert len(doctors) == 10
+    assert doctors[8]["name"] == "Dr. Maria Garcia" and doctors[8]["speciality"] == "Crisis Intervention"
+
+    rows = parse_sql_snapshot("INSERT INTO Doctors (doctor_id, name, speciality, phoneno, details) VALUES "
+                              "(7, 'Dr. Aoife O''Brien', 'Psychiatry', '555', NULL), "
+                              "(8, 'Dr. B, Jr.', 'Sleep (Medicine)', '556', 'Treats insomnia\\'s causes');")
+    assert rows[0] == {"doctor_id": 7, "name": "Dr. Aoife O'Brien", "speciality": "Psychiatry",
+                       "phoneno": "555", "details": None}
+    assert rows[1]["name"] == "Dr. B, Jr." and rows[1]["speciality"] == "Sleep (Medicine)"
+    assert rows[1]["details"] == "Treats insomnia's causes"
+
+def test_ranks_specialists_and_hot_reloads():
+    """Specialists matching the analysis rank first, and a changed snapshot is picked up"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "doctors.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"doctors": [
+                {"doctor_id": 1, "name": "Dr. General", "speciality": "Psychiatry",
+                 "phoneno": "1", "details": "Depression, anxiety, PTSD, medication management."},
+                {"doctor_id": 2, "name": "Dr. Mood", "speciality": "Psychiatry",
+                 "phoneno": "2", "details": "Depression and bipolar disorder."}
+            ]}, f)
+        index = get_index(path)
+        assert [d["name"] for d in index.for_speciality("psychiatry", tags_for("low mood and sadness"))] == \
+            ["Dr. Mood", "Dr. General"]
+        assert get_index(path) is index  # Unchanged file, no rebuild
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([{"doctor_id": 3, "name": "Dr. Sleep", "speciality": "Sleep Medicine",
+                        "phoneno": "3", "details": "Insomnia and sleep disorders."}], f)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        reloaded = get_index(path)
+        assert reloaded is not index and len(reloaded) == 1
+        assert [d["name"] for d in reloaded.rank("cannot sleep, insomnia most nights")] == ["Dr. Sleep"]
+
+def test_recommendations_name_doctors():
+    saved = os.environ.get("DOCTORS_SNAPSHOT")
+    os.environ["DOCTORS_SNAPSHOT"] = DEFAULT_SNAPSHOT
+    try:
+        recommendations = get_recommended_doctors("HIGH", "Expressed suicidal thoughts; crisis support needed.")
+        assert [r["speciality"] for r in recommendations] == ["Crisis Intervention", "Psychiatry"]
+        assert recommendations[0]["doctors"][0]["name"] == "Dr. Maria Garcia"
+        # Specialities the snapshot lacks keep their recommendation without doctors
+        low = get_recommended_doctors("LOW", "Doing well overall.")
+        assert low[1]["speciality"] == "General Medicine" and low[1]["doctors"] == []
+
+        os.environ["DOCTORS_SNAPSHOT"] = "off"
+        assert all(r["doctors"] == [] for r in get_recommended_doctors("HIGH", "crisis"))
+    finally:
+        if saved is None:
+            os.environ.pop("DOCTORS_SNAPSHOT", None)
+        else:
+            os.environ["DOCTORS_SNAPSHOT"] = saved
+
+if __name__ == "__main__":
+    test_parses_repo_snapshot()
+    test_ranks_specialists_and_hot_reloads()
+    test_recommendations_name_doctors()
+    print("Doctor index tests passed")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for per-endpoint generation profiles and their benchmark
+"""
+import json
+import sys
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from generation_profiles import generation_config, load_profiles, profile_for
+from prompt_registry import Prompt
+from mock_gemini import MockGemini, patched_env, response_body
+import bench_profiles
+
+MOCK_SUMMARY = {"emotional_state": "Tense", "mood_indicators": "Irritability", "insights": "Work stress."}
+
+def respond(prompt, payload):
+    return response_body(json.dumps(MOCK_SUMMARY), finish_reason="STOP",
+                         usage={"promptTokenCount": 800, "candidatesTokenCount": 40})
+
+def test_profiles_and_overrides():
+    # The batch template has its own cap; thinking tokens are added to the output cap
+    assert profile_for("assessment", "assessment_batch@v1")["maxOutputTokens"] > \
+        profile_for("assessment", "assessment@v2")["maxOutputTokens"]
+    config = generation_config({"maxOutputTokens": 500, "thinkingBudget": 200, "temperature": 0.2}, "gemini-2.5-flash")
+    assert config == {"temperature": 0.2, "thinkingConfig": {"thinkingBudget": 200}, "maxOutputTokens": 700}
+    assert generation_config({"thinkingBudget": 200}, "gemini-2.5-flash-lite")["thinkingConfig"]["thinkingBudget"] == 512
+    assert generation_config({"thinkingBudget": None}) == {}
+    assert profile_for("unknown") == {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "profiles.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"checkin": {"temperature": 0.9}, "risk": {"stopSequences": ["END"]}}, f)
+        with patched_env(GENERATION_PROFILES_FILE=path):
+            profiles = load_profiles()
+        # Overrides merge per field over the defaults
+        assert profiles["checkin"]["temperature"] == 0.9 and profiles["checkin"]["thinkingBudget"] == 0
+        assert profiles["risk"]["stopSequences"] == ["END"]
+        with patched_env(GENERATION_PROFILES_FILE="off"):
+            assert load_profiles() is None and profile_for("checkin", profiles={}) == {}
+
+def test_benchmark_records_each_variant():
+    """Each variant is sent with its own generationConfig and recorded per call"""
+    with tempfile.TemporaryDirectory() as tmp:
+        variants_path = os.path.join(tmp, "variants.json")
+        output_path = os.path.join(tmp, "bench.jsonl")
+        with open(variants_path, "w", encoding="utf-8") as f:
+            json.dump({"thinking": {"thinkingBudget": 1024}}, f)
+        with MockGemini(respond) as gemini, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            assert bench_profiles.main(["--endpoint", "daily_summary", "--variants", variants_path,
+                                        "--repeat", "2", "--output", output_path]) == 0
+
+        with open(output_path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+
+    assert [r["variant"] for r in records] == ["default", "profile", "thinking"] * 2
+    assert all(r["outcome"] == "parsed" and r["outputTokens"] == 40 and r["prompt"] == "daily_summary@v1"
+               for r in records)
+    configs = [p.get("generationConfig") for p in gemini.payloads]
+    profile = profile_for("daily_summary", "daily_summary@v1")
+    assert configs[0] is None
+    assert configs[1] == generation_config(profile, "gemini-2.5-flash")
+    assert configs[2]["thinkingConfig"] == {"thinkingBudget": 1024}
+    assert configs[2]["maxOutputTokens"] == profile["maxOutputTokens"] + 1024
+
+def test_outcome_detects_fallback():
+    prompt = Prompt("irrelevant", "daily_summary@v1")
+    assert bench_profiles.outcome_of("daily_summary", prompt, "not json at all") == "fallback"
+    assert bench_profiles.outcome_of("checkin", "prompt", "") == "empty"
+
+if __name__ == "__main__":
+    test_profiles_and_overrides()
+    test_benchmark_records_each_variant()
+    test_outcome_detects_fallback()
+    print("Generation profile tests passed")
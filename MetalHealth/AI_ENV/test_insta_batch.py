@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the Instagram feed batch mode against a mock Gemini server
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import insta_analyze
+from insta_analyze import ToneTrend, batch_main, run_batch
+from mock_gemini import MockGemini
+
+FEED = [
+    {"id": "p1", "timestamp": "2024-03-04T09:00:00Z",
+     "caption": "Exhausted and anxious again, deadlines everywhere and I cannot switch off at night."},
+    {"id": "p2", "timestamp": "2024-03-05T20:00:00Z", "caption": "Great day with friends!"},
+    {"id": "p1", "timestamp": "2024-03-04T09:00:00Z",
+     "caption": "Exhausted and anxious again, deadlines everywhere and I cannot switch off at night."},
+    {"id": "p3", "timestamp": 1710403200000,  # 2024-03-14, milliseconds
+     "caption": "exhausted and ANXIOUS again - deadlines everywhere and I cannot switch off at night"},
+    {"id": "p4", "timestamp": "2024-03-12T08:30:00Z",
+     "caption": "Feeling lonely and overwhelmed since the move, hard to talk to anyone about it."},
+    {"id": "p5", "timestamp": "2024-03-13T08:30:00Z", "caption": "   "},
+]
+
+def write_feed(path, posts):
+    with open(path, "w", encoding="utf-8") as f:
+        for post in posts:
+            f.write(json.dumps(post) + "\n")
+        f.write("{not json\n")
+
+def read_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return {r["id"]: r for r in map(json.loads, f)}
+
+def test_batch_dedups_posts():
+    """Reposts are skipped and identical captions are sent once"""
+    with tempfile.TemporaryDirectory() as tmp:
+        feed_path = os.path.join(tmp, "feed.jsonl")
+        output_path = os.path.join(tmp, "results.jsonl")
+        write_feed(feed_path, FEED)
+        with MockGemini(lambda prompt, payload: "Negative tone with stress indicators.",
+                        NEAR_DUPLICATE_INDEX_FILE=os.path.join(tmp, "index.json")) as gemini:
+            assert batch_main(["--batch", feed_path, output_path, "--concurrency", "3", "--rate", "50"]) == 0
+        results = read_results(output_path)
+
+    assert gemini.requests_seen == 2
+    assert set(results) == {"p1", "p2", "p3", "p4", "p5"}
+    assert results["p1"]["source"] == "model" and results["p2"]["source"] == "local"
+    assert results["p3"]["source"] == "duplicate" and results["p3"]["duplicateOf"] == "p1"
+    assert results["p3"]["analysis"] == results["p1"]["analysis"]
+    assert results["p5"]["status"] == "empty"
+    assert results["p1"]["tone"] == "negative" and results["p2"]["tone"] == "positive"
+
+def test_evicted_captions_reuse_the_index():
+    """Repeats of captions that left the bounded caption map come from the near-duplicate index,
+    and every caption is scored once, by the batch scorer"""
+    single_scores = []
+    score_text = insta_analyze.score_text
+    insta_analyze.score_text = lambda text: single_scores.append(text) or score_text(text)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            feed_path = os.path.join(tmp, "feed.jsonl")
+            output_path = os.path.join(tmp, "results.jsonl")
+            write_feed(feed_path, [FEED[0], FEED[4], FEED[3]])
+            with MockGemini(lambda prompt, payload: "Negative tone with stress indicators.",
+                            NEAR_DUPLICATE_INDEX_FILE=os.path.join(tmp, "index.json")) as gemini:
+                # One worker finishes p1 before p3 is submitted; the map only remembers p4 by then
+                run_batch(feed_path, output_path, "test", concurrency=1, rate=50, caption_cache=1)
+            results = read_results(output_path)
+    finally:
+        insta_analyze.score_text = score_text
+
+    assert gemini.requests_seen == 2
+    assert results["p3"]["source"] == "near_duplicate" and results["p3"]["duplicateOf"] is None
+    assert results["p3"]["analysis"] == results["p1"]["analysis"]
+    assert single_scores == []
+
+def test_trend_buckets():
+    trend = ToneTrend("week")
+    for timestamp, polarity in [("2024-03-04T09:00:00Z", 0.6), ("2024-03-06T09:00:00Z", 0.4),
+                                ("2024-03-12T09:00:00Z", -0.2), ("2024-03-19T09:00:00Z", -0.6), (None, 0.9)]:
+        trend.add(timestamp, {"tone": "negative" if polarity < 0 else "positive", "polarity": polarity,
+                              "stress": 0.0, "anxiety": 0.0})
+    result = trend.as_dict()
+    assert [row["bucket"] for row in result["buckets"]] == ["2024-03-04", "2024-03-11", "2024-03-18", "unknown"]
+    assert result["buckets"][0]["posts"] == 2 and result["buckets"][0]["polarity"] == 0.5
+    assert result["direction"] == "Declining"
+
+if __name__ == "__main__":
+    test_batch_dedups_posts()
+    test_evicted_captions_reuse_the_index()
+    test_trend_buckets()
+    print("Instagram batch tests passed")
@@ -38,8 +38,21 @@ def test_analysis():
     # Convert to JSON string
     test_data_json = json.dumps(test_data)
     
-    # Run analysis
-    result = analyze_mental_health(test_data_json)
+    # Run analysis against the recorded response unless a mode is set explicitly,
+    # e.g. GEMINI_CASSETTE_MODE=off with a real key for a live check
+    saved = {name: os.environ.get(name) for name in ("GEMINI_CASSETTE_MODE", "GOOGLE_API_KEY_1", "MODEL_ROUTING_LOG")}
+    replaying = os.environ.setdefault("GEMINI_CASSETTE_MODE", "replay") == "replay"
+    if replaying:
+        os.environ.setdefault("GOOGLE_API_KEY_1", "replay")
+        os.environ.setdefault("MODEL_ROUTING_LOG", "off")
+    try:
+        result = analyze_mental_health(test_data_json)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
     
     # Parse and display result
     try:
@@ -52,6 +65,9 @@ def test_analysis():
         
         if 'error' in analysis:
             print(f"Error: {analysis['error']}")
+        if replaying:
+            assert 'error' not in analysis
+            assert analysis['riskLevel'] == "Medium"
             
     except json.JSONDecodeError as e:
         print(f"Failed to parse result as JSON: {e}")
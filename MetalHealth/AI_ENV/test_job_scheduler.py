@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test script for the priority and fair-share analysis job scheduler
+"""
+import os
+import sys
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from job_scheduler import JobScheduler
+from risk_signals import has_high_risk_signal
+
+def run_in_order(submissions, user_weights=None):
+    """Queue jobs behind a blocked single worker, release it and return the order they ran in."""
+    order = []
+    started, release = threading.Event(), threading.Event()
+    def gate():
+        started.set()
+        release.wait(10)
+    with JobScheduler(workers=1, user_weights=user_weights) as scheduler:
+        scheduler.submit(gate)
+        assert started.wait(10)
+        futures = [scheduler.submit(order.append, name, **options) for name, options in submissions]
+        assert scheduler.pending() == len(submissions)
+        release.set()
+    for future in futures:
+        future.result(0)
+    return order
+
+def test_priority_classes():
+    """Jobs run in priority-class order whatever order they were queued in"""
+    order = run_in_order([("backfill", {"priority": "backfill"}), ("analytics", {"priority": "analytics"}),
+                          ("summary", {"priority": "summary"}), ("assessment", {"priority": "assessment"}),
+                          ("crisis", {"priority": "crisis"})])
+    assert order == ["crisis", "assessment", "summary", "analytics", "backfill"]
+
+    with JobScheduler(workers=1) as scheduler:
+        try:
+            scheduler.submit(print, priority="urgent")
+            assert False, "unknown priority class accepted"
+        except ValueError:
+            pass
+
+def test_fair_share_ordering():
+    """Within a class users alternate by virtual finish time, scaled by their weight"""
+    submissions = [(f"{user}{n}", {"user": user}) for user in ("a", "b") for n in (1, 2, 3)]
+    assert run_in_order(submissions[:5]) == ["a1", "b1", "a2", "b2", "a3"]
+    # Twice the weight halves b's cost, so b gets two turns for each of a's
+    assert run_in_order(submissions, {"b": 2}) == ["b1", "a1", "b2", "b3", "a2", "a3"]
+    # A costlier job pushes its user's later jobs back
+    assert run_in_order([("a1", {"user": "a", "cost": 3}), ("a2", {"user": "a"}),
+                         ("b1", {"user": "b"}), ("b2", {"user": "b"})]) == ["b1", "b2", "a1", "a2"]
+
+def test_crisis_promotion():
+    """High-risk answers or text promote a job to the crisis class"""
+    assert has_high_risk_signal({"stressLevel": 9})
+    assert has_high_risk_signal({"moodLevel": "2"})
+    assert has_high_risk_signal(text="I just want to end it all")
+    assert not has_high_risk_signal({"stressLevel": 5, "moodLevel": 6}, "A calm day")
+
+    order = run_in_order([("assessment", {"priority": "assessment"}),
+                          ("stress", {"priority": "backfill", "answers": {"stressLevel": 10}}),
+                          ("text", {"priority": "analytics", "text": "I keep thinking about suicide"}),
+                          ("calm", {"priority": "backfill", "text": "A calm day"})])
+    assert order == ["stress", "text", "assessment", "calm"]
+
+if __name__ == "__main__":
+    test_priority_classes()
+    test_fair_share_ordering()
+    test_crisis_promotion()
+    print("Job scheduler tests passed")
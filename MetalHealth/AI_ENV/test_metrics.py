@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus exposition and the merged text file exporter
+"""
+import json
+import sys
+import os
+import tempfile
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import MetricsRegistry, REGISTRY, GEMINI_RETRIES, GEMINI_THROTTLED
+from micro_batcher import MicroBatcher
+from gemini_client import GeminiHTTPError, generate_content, key_label
+from mock_gemini import MockGemini
+
+def sample_registry():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls by endpoint.", ("endpoint",))
+    latency = registry.histogram("latency_seconds", "Call latency.", ("endpoint",), (0.1, 1))
+    depth = registry.gauge("queue_depth", "Queued jobs.", ("queue",))
+    return registry, calls, latency, depth
+
+def parse_samples(text):
+    """{sample name with labels: value} of an exposition, skipping comments."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def test_exposition_format():
+    """HELP/TYPE headers, escaped labels, cumulative buckets with +Inf, and sum/count"""
+    registry, calls, latency, depth = sample_registry()
+    calls.inc(endpoint="checkin")
+    threads = [threading.Thread(target=calls.inc, kwargs={"amount": 2, "endpoint": 'say "hi"\n'}) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, endpoint="checkin")
+    depth.set(4, queue="backfill")
+
+    text = registry.exposition()
+    lines = text.splitlines()
+    assert lines[:2] == ["# HELP calls_total Calls by endpoint.", "# TYPE calls_total counter"]
+    assert "# TYPE latency_seconds histogram" in lines and "# TYPE queue_depth gauge" in lines
+    assert 'calls_total{endpoint="checkin"} 1' in lines
+    # Per-thread shards are summed, and label values are escaped
+    assert 'calls_total{endpoint="say \\"hi\\"\\n"} 6' in lines
+    assert lines[lines.index("# TYPE latency_seconds histogram") + 1:][:5] == [
+        'latency_seconds_bucket{endpoint="checkin",le="0.1"} 1',
+        'latency_seconds_bucket{endpoint="checkin",le="1.0"} 2',
+        'latency_seconds_bucket{endpoint="checkin",le="+Inf"} 3',
+        'latency_seconds_sum{endpoint="checkin"} 5.55',
+        'latency_seconds_count{endpoint="checkin"} 3',
+    ]
+    assert 'queue_depth{queue="backfill"} 4' in lines
+    assert text.endswith("\n")
+
+def test_textfile_never_counts_twice():
+    """Repeated writes from one process add only new observations; other processes accumulate"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metrics.prom")
+        registry, calls, latency, _ = sample_registry()
+        calls.inc(endpoint="checkin")
+        latency.observe(0.5, endpoint="checkin")
+        registry.write_textfile(path)
+        # A periodic write followed by the exit write of the same process
+        calls.inc(endpoint="checkin")
+        registry.write_textfile(path)
+        registry.write_textfile(path)
+
+        other, other_calls, _, _ = sample_registry()
+        other_calls.inc(3, endpoint="checkin")
+        other.write_textfile(path)
+
+        with open(path, "r", encoding="utf-8") as f:
+            samples = parse_samples(f.read())
+        assert samples['calls_total{endpoint="checkin"}'] == 5
+        assert samples['latency_seconds_count{endpoint="checkin"}'] == 1
+        with open(path + ".state.json", "r", encoding="utf-8") as f:
+            assert json.load(f)["calls_total"] == [[["checkin"], 5]]
+
+def counter_value(counter, **labels):
+    return counter.collect().get(tuple(str(labels[name]) for name in counter.labelnames), 0)
+
+def test_retries_and_throttling_are_counted_where_they_happen():
+    """Micro-batch fallbacks count as retries, and 429 answers are counted per key"""
+    before = counter_value(GEMINI_RETRIES, endpoint="metrics-test")
+    with MicroBatcher(lambda batch: {batch[0][0]: "batched"}, lambda payload: "single", window=0.2,
+                      name="metrics-test") as batcher:
+        futures = [batcher.submit(n) for n in range(3)]
+    assert sorted(f.result() for f in futures) == ["batched", "single", "single"]
+    assert counter_value(GEMINI_RETRIES, endpoint="metrics-test") - before == 2
+
+    before = counter_value(GEMINI_THROTTLED, endpoint="metrics-test", key=key_label("test"))
+    with MockGemini(lambda prompt, payload: (429, {"error": {"status": "RESOURCE_EXHAUSTED"}})):
+        try:
+            generate_content("test", "hello", endpoint="metrics-test")
+            assert False, "429 not raised"
+        except GeminiHTTPError as e:
+            assert e.status_code == 429
+    assert counter_value(GEMINI_THROTTLED, endpoint="metrics-test", key=key_label("test")) - before == 1
+    assert "gemini_throttled_total" in REGISTRY.exposition()
+
+if __name__ == "__main__":
+    test_exposition_format()
+    test_textfile_never_counts_twice()
+    test_retries_and_throttling_are_counted_where_they_happen()
+    print("Metrics tests passed")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for the model router's tier rules
+"""
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from model_router import decide, route, MODEL_TIERS, DEFAULT_RULES
+from mock_gemini import patched_env
+
+CALM = {"mood": "Good", "moodLevel": 7, "stressLevel": 3}
+
+def test_routing_rules():
+    """Check-ins go lite, assessments always go flash, free text goes lite or flash by length"""
+    assert decide("checkin", "", CALM) == ("lite", "endpoint")
+    assert decide("assessment", "", CALM) == ("flash", "endpoint")
+    assert decide("assessment", "Work was busy today.", CALM) == ("flash", "endpoint")
+    assert decide("assessment_summary", "ok", CALM) == ("flash", "endpoint")
+    assert decide("daily_summary", "A quiet, pleasant day.") == ("lite", "short_input")
+    assert decide("daily_summary", "word " * 100) == ("flash", "long_input")
+    # Unknown endpoints keep the full model
+    assert decide("something_new", "") == ("flash", "endpoint")
+
+def test_risk_signal_routes_to_flash():
+    """Any high-risk answer or phrase keeps the full model, even on lite-only endpoints"""
+    assert decide("checkin", "", {"moodLevel": 1}) == ("flash", "risk_signal")
+    assert decide("assessment", "", {"stressLevel": 10}) == ("flash", "risk_signal")
+    assert decide("instagram", "I want to end it all") == ("flash", "risk_signal")
+    assert decide("daily_summary", "Thinking about suicide") == ("flash", "risk_signal")
+
+def test_concerning_assessment_without_summary_keeps_flash():
+    """Answers the app flags as concerning (mood <= 3, stress >= 8) but below the risk thresholds stay on flash"""
+    concerning = {"mood": "Low", "moodLevel": 3, "stressLevel": 8, "sleepHours": 5}
+    assert decide("assessment", "", concerning) == ("flash", "endpoint")
+    with patched_env(MODEL_ROUTING_LOG="off"):
+        assert route("assessment", "", concerning).model == MODEL_TIERS["flash"]
+
+def test_rule_overrides_and_route():
+    """Custom rules replace the defaults, and route() returns the tier's model"""
+    rules = dict(DEFAULT_RULES, checkin={"tier": "flash"}, instagram={"lite_max_chars": 5})
+    assert decide("checkin", "", CALM, rules) == ("flash", "endpoint")
+    assert decide("instagram", "hello there", rules=rules) == ("flash", "long_input")
+
+    saved = os.environ.get("MODEL_ROUTING_LOG")
+    os.environ["MODEL_ROUTING_LOG"] = "off"
+    try:
+        decision = route("checkin", "", CALM)
+    finally:
+        if saved is None:
+            os.environ.pop("MODEL_ROUTING_LOG", None)
+        else:
+            os.environ["MODEL_ROUTING_LOG"] = saved
+    assert decision.tier == "lite" and decision.model == MODEL_TIERS["lite"]
+    assert decision.endpoint == "checkin" and decision.chars == 0
+
+if __name__ == "__main__":
+    test_routing_rules()
+    test_risk_signal_routes_to_flash()
+    test_concerning_assessment_without_summary_keeps_flash()
+    test_rule_overrides_and_route()
+    print("Model router tests passed")
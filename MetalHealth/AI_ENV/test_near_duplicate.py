@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the near-duplicate analysis cache and its crisis and per-user guards
+"""
+import json
+import sys
+import os
+import tempfile
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from near_duplicate import NearDuplicateIndex, analysis_namespace, simhash
+from analyze_daily_summary import analyze_daily_summary
+from insta_analyze import analyze_post_result
+from mock_gemini import MockGemini, patched_env
+
+SUMMARY = ("Today was fine. Went for a long walk in the park this morning. Lunch with my sister was nice. "
+           "Spent the afternoon reading a novel on the balcony. Cooked pasta for dinner and watched a film.")
+ANALYSIS = {"summary": "A settled, pleasant day.", "mood_indicators": "Content, relaxed",
+            "patterns": "Outdoor activity and social contact", "insights": "Routine supports mood",
+            "suggestions": "Keep the walks going."}
+
+def test_index_lookup():
+    """Near-identical texts match within their namespace only, and survive a save/load"""
+    index = NearDuplicateIndex()
+    index.add(SUMMARY, ANALYSIS, "a")
+    assert index.lookup(SUMMARY.replace("Went", "went"), "a") == (ANALYSIS, 0)
+    assert index.lookup(SUMMARY, "b") == (None, None)
+    assert index.lookup("Something else entirely happened at work today.", "a") == (None, None)
+    assert index.lookup("", "a") == (None, None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.json")
+        index.save(path)
+        loaded = NearDuplicateIndex()
+        loaded.load(path)
+        assert len(loaded) == 1 and loaded.lookup(SUMMARY, "a")[0] == ANALYSIS
+
+def test_namespace_separates_users_and_affect_wording():
+    """The same fingerprint never crosses users or a change in affect words"""
+    assert analysis_namespace("ns", "u1", SUMMARY) != analysis_namespace("ns", "u2", SUMMARY)
+    for edited in (SUMMARY.replace("fine", "awful"), SUMMARY.replace("was nice", "was not nice")):
+        assert analysis_namespace("ns", "u1", SUMMARY) != analysis_namespace("ns", "u1", edited)
+    # Wording outside the lexicon keeps the namespace
+    assert analysis_namespace("ns", "u1", SUMMARY) == analysis_namespace("ns", "u1", SUMMARY.replace("film", "movie"))
+
+def run_summaries(texts, users, **env):
+    """Analyze each text as its user against one index file. Returns the analysis modes and calls made."""
+    modes = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockGemini(lambda prompt, payload: json.dumps(ANALYSIS), SUMMARY_INDEX_DIR="off",
+                       NEAR_DUPLICATE_INDEX_FILE=os.path.join(tmp, "index.json"), **env) as gemini:
+        for text, user in zip(texts, users):
+            with patched_env(AI_ENV_USER=user):
+                modes.append(json.loads(analyze_daily_summary(text, {}, "Female"))["analysis_mode"])
+    return modes, gemini.requests_seen
+
+def test_summary_cache_is_per_user():
+    assert run_summaries([SUMMARY, SUMMARY.replace("Went", "went")], ["u1", "u1"]) == (["full", "near_duplicate"], 1)
+    assert run_summaries([SUMMARY, SUMMARY], ["u1", "u2"]) == (["full", "full"], 2)
+
+def test_crisis_append_bypasses_cache():
+    """A crisis sentence appended to a cached summary is analyzed afresh, and never cached itself"""
+    crisis = SUMMARY + " I keep thinking about killing myself."
+    # A loose distance makes the two fingerprints match, so only the crisis check keeps them apart
+    loose = str((simhash(SUMMARY) ^ simhash(crisis)).bit_count())
+    assert run_summaries([SUMMARY, crisis, crisis], ["u1"] * 3, NEAR_DUPLICATE_MAX_DISTANCE=loose) == \
+        (["full", "full", "full"], 3)
+    assert run_summaries([SUMMARY, SUMMARY.replace("fine", "hopeless")], ["u1"] * 2) == (["full", "full"], 2)
+
+def test_post_cache_guards():
+    """Captions follow the same rules: per-user entries, and no cache for crisis posts"""
+    caption = "Long week of exams and deadlines, stressed and barely sleeping but trying to keep going."
+    index = NearDuplicateIndex()
+    with MockGemini(lambda prompt, payload: "Stress indicators present.") as gemini:
+        sources = []
+        for text, user in [(caption, "u1"), (caption, "u1"), (caption, "u2"),
+                           ("I want to end it all", "u1"), ("I want to end it all", "u1")]:
+            with patched_env(AI_ENV_USER=user):
+                sources.append(analyze_post_result("test", text, dedup_index=index)[1])
+    assert sources == ["model", "near_duplicate", "model", "model", "model"]
+    assert gemini.requests_seen == 4 and len(index) == 2
+
+if __name__ == "__main__":
+    test_index_lookup()
+    test_namespace_separates_users_and_affect_wording()
+    test_summary_cache_is_per_user()
+    test_crisis_append_bypasses_cache()
+    test_post_cache_guards()
+    print("Near-duplicate tests passed")
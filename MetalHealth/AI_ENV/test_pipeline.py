@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for the concurrent stage pipeline
+"""
+import sys
+import os
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline import Pipeline
+
+def test_topological_order():
+    """Stages start only after their dependencies and receive their results"""
+    order = []
+    lock = threading.Lock()
+
+    def step(name, value):
+        def run(**inputs):
+            with lock:
+                order.append(name)
+            return value + sum(inputs.values())
+        return run
+
+    # Added out of order on purpose
+    pipeline = (Pipeline()
+                .add("report", step("report", 100), depends_on=("stats", "prompt"))
+                .add("prompt", step("prompt", 10), depends_on=("load",))
+                .add("stats", step("stats", 20), depends_on=("load",))
+                .add("load", step("load", 1)))
+    results = pipeline.run()
+    assert results == {"load": 1, "prompt": 11, "stats": 21, "report": 132}
+    assert order[0] == "load" and order[-1] == "report"
+
+def test_independent_stages_run_concurrently():
+    """Two stages that wait for each other can only finish when run side by side"""
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet():
+        barrier.wait()
+        return threading.current_thread().name
+
+    results = Pipeline().add("a", meet).add("b", meet).add("join", lambda a, b: {a, b}, ("a", "b")).run()
+    assert len(results["join"]) == 2
+
+def test_error_propagates_and_skips_dependents():
+    """A failing stage re-raises from run(); its dependents never start, other stages still finish"""
+    started = []
+
+    def fail():
+        raise RuntimeError("load failed")
+
+    pipeline = (Pipeline()
+                .add("load", fail)
+                .add("stats", lambda load: started.append("stats"), ("load",))
+                .add("audit", lambda: started.append("audit")))
+    try:
+        pipeline.run()
+        assert False, "stage error not raised"
+    except RuntimeError as e:
+        assert str(e) == "load failed"
+    assert started == ["audit"]
+
+def test_invalid_graphs():
+    for pipeline, message in [
+        (Pipeline().add("a", lambda b: b, ("b",)).add("b", lambda a: a, ("a",)), "cycle"),
+        (Pipeline().add("a", lambda missing: missing, ("missing",)), "unknown"),
+    ]:
+        try:
+            pipeline.run()
+            assert False, "invalid graph accepted"
+        except ValueError as e:
+            assert message in str(e)
+    try:
+        Pipeline().add("a", lambda: 1).add("a", lambda: 2)
+        assert False, "duplicate stage accepted"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    test_topological_order()
+    test_independent_stages_run_concurrently()
+    test_error_propagates_and_skips_dependents()
+    test_invalid_graphs()
+    print("Pipeline tests passed")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script for the stage timings and the --profile mode of the entry points
+"""
+import json
+import sys
+import os
+import time
+import tempfile
+import subprocess
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import profiling
+from profiling import StageTimings, pop_profile_flag, attach_timings
+from mock_gemini import MockGemini
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def test_stage_timings_accumulate():
+    """Repeated stages add up, and token counts are summed per kind"""
+    timings = StageTimings()
+    for _ in range(2):
+        with timings.stage("prompt_build"):
+            time.sleep(0.01)
+    try:
+        with timings.stage("gemini_call"):
+            raise RuntimeError("call failed")
+    except RuntimeError:
+        pass
+    timings.add_tokens({"prompt": 120, "output": 30})
+    timings.add_tokens({"prompt": 80})
+
+    result = timings.as_dict()
+    assert set(result["stages_ms"]) == {"prompt_build", "gemini_call"}
+    assert result["stages_ms"]["prompt_build"] >= 20
+    assert result["tokens"] == {"prompt": 200, "output": 30}
+    assert result["total_ms"] >= result["stages_ms"]["prompt_build"]
+
+def test_profile_flag_is_stripped():
+    """--profile is removed from argv wherever it appears and turns the timings on"""
+    enabled = profiling._enabled
+    try:
+        profiling._enabled = False
+        argv = ["analyze.py", "--profile", '{"answers": {}}', "--profile"]
+        assert pop_profile_flag(argv) is True
+        assert argv == ["analyze.py", '{"answers": {}}']
+        assert pop_profile_flag(argv) is False
+        assert "_timings" in json.loads(attach_timings(json.dumps({"summary": "ok"})))
+        # Results that are not JSON objects are passed through untouched
+        assert attach_timings("[1, 2]") == "[1, 2]" and attach_timings("not json") == "not json"
+    finally:
+        profiling._enabled = enabled
+
+def test_profile_report_goes_to_stderr():
+    """With --profile the summaries go to stderr and stdout stays the single JSON result Node parses"""
+    with tempfile.TemporaryDirectory() as tmp, MockGemini(lambda prompt, payload: "{}",
+                                                          NEAR_DUPLICATE_INDEX_FILE=os.path.join(tmp, "index.json"),
+                                                          SUMMARY_INDEX_DIR="off") as gemini:
+        process = subprocess.run([sys.executable, os.path.join(HERE, "analyze_daily_summary.py"),
+                                  "--profile", "Had a great day with friends!"],
+                                 cwd=HERE, capture_output=True, text=True, timeout=60)
+
+    assert process.returncode == 0, process.stderr
+    result = json.loads(process.stdout)
+    assert result["summary"] and "local_score" in result["_timings"]["stages_ms"]
+    assert "startup" in result["_timings"]["stages_ms"]
+    assert "=== cProfile (cumulative) ===" in process.stderr and "=== tracemalloc" in process.stderr
+    assert "cProfile" not in process.stdout
+    # Answered by the local scorer, so Gemini was never called
+    assert gemini.requests_seen == 0
+
+if __name__ == "__main__":
+    test_stage_timings_accumulate()
+    test_profile_flag_is_stripped()
+    test_profile_report_goes_to_stderr()
+    print("Profiling tests passed")
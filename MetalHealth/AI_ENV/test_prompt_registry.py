@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Test script for the prompt registry: v1 render parity with the f-string
+builders it replaced, lint, and A/B version selection
+"""
+import json
+import sys
+import os
+from itertools import islice
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from prompt_registry import PROMPTS, PromptRegistry, PromptTemplate, lint, minify, parse_splits
+from analyze_mental_health import build_analysis_prompt
+from analyze_daily_summary import build_summary_analysis_prompt, build_incremental_summary_prompt, ANALYSIS_FIELDS
+from analyze_weekly_monthly import build_analytics_prompt, PROMPT_ASSESSMENT_LIMIT, PROMPT_SUMMARY_LIMIT
+from risk_analysis import build_risk_prompt
+from mock_gemini import patched_env
+
+# The builders below are copied verbatim from before the prompts moved to prompts/*.v1.txt
+
+def legacy_assessment_prompt(answers, daily_summary=None, user_gender=None):
+    """The assessment prompt as built before the registry."""
+    instruction = (
+        "You are an expert clinical psychologist and mental health AI with 20+ years of experience in daily mental health assessment and crisis intervention. "
+        "Analyze the following daily mental health check-in data and provide a comprehensive, clinically-informed analysis that goes beyond simply restating the data.\n\n"
+
+        "CLINICAL ANALYSIS FRAMEWORK:\n"
+        "- Apply evidence-based psychological assessment principles and clinical judgment\n"
+        "- Use validated mental health screening criteria (PHQ-9, GAD-7, PSS-10)\n"
+        "- Identify patterns, correlations, and clinical significance in the data\n"
+        "- Consider both immediate concerns and underlying psychological processes\n"
+        "- Provide specific, actionable recommendations based on clinical best practices\n"
+        "- Focus on protective factors, strengths, and areas for intervention\n"
+        "- Avoid simply restating the data - provide meaningful clinical insights\n"
+        "- Consider gender-specific mental health patterns and considerations when relevant\n\n"
+
+        "DAILY MENTAL HEALTH CHECK-IN DATA:\n\n"
+
+        "USER DEMOGRAPHICS:\n"
+        f"• Gender: {user_gender if user_gender else 'Not specified'}\n\n"
+
+        "CORE DAILY METRICS:\n"
+        f"• Mood Today: {answers.get('mood', 'Not specified')}\n"
+        f"• Mood Level (1-10): {answers.get('moodLevel', 'Not specified')} {'(Positive mood)' if answers.get('moodLevel', 0) >= 7 else '(Neutral mood)' if answers.get('moodLevel', 0) >= 4 else '(Low mood)'}\n"
+        f"• Stress Level (1-10): {answers.get('stressLevel', 'Not specified')} {'(High stress)' if answers.get('stressLevel', 0) >= 8 else '(Moderate stress)' if answers.get('stressLevel', 0) >= 5 else '(Low stress)'}\n"
+        f"• Sleep Hours: {answers.get('sleepHours', 'Not specified')} {'(Adequate sleep)' if 7 <= answers.get('sleepHours', 0) <= 9 else '(Sleep concerns)' if answers.get('sleepHours', 0) < 6 or answers.get('sleepHours', 0) > 10 else '(Moderate sleep)'}\n"
+        f"• Sleep Quality: {answers.get('sleepQuality', 'Not specified')}\n"
+        f"• Anxiety Level: {answers.get('anxietyFrequency', 'Not specified')}\n"
+        f"• Energy Level: {answers.get('energyLevel', 'Not specified')}\n"
+        f"• Overwhelm Level: {answers.get('overwhelmedFrequency', 'Not specified')}\n"
+        f"• Social Connection: {answers.get('socialConnection', 'Not specified')}\n"
+        f"• Daily Functioning: {answers.get('dailyFunctioning', 'Not specified')}\n\n"
+    )
+
+    # Add daily summary if available
+    if daily_summary and daily_summary.strip():
+        instruction += (
+            "PERSONAL REFLECTION (Daily Summary):\n"
+            f'"{daily_summary}"\n\n'
+            "CLINICAL NOTE: This personal reflection provides crucial qualitative data about the user's internal state, "
+            "thoughts, emotions, and experiences. Use this to:\n"
+            "- Identify patterns and themes not captured in structured data\n"
+            "- Understand the user's subjective experience\n"
+            "- Detect subtle warning signs or positive indicators\n"
+            "- Provide more personalized and contextually relevant recommendations\n\n"
+        )
+
+    instruction += (
+        "CLINICAL CONDITION ASSESSMENT:\n\n"
+        "Evaluate for these clinical presentations:\n"
+        "- Major Depressive Episode: Persistent low mood, anhedonia, sleep disturbances, fatigue, concentration difficulties\n"
+        "- Generalized Anxiety Disorder: Excessive worry, restlessness, fatigue, concentration problems, sleep disturbances\n"
+        "- Mixed Anxiety-Depressive Disorder: Combination of anxiety and depressive symptoms without meeting full criteria for either\n"
+        "- Adjustment Disorder: Emotional or behavioral symptoms in response to identifiable stressors\n"
+        "- Sleep Disorders: Insomnia, hypersomnia, or circadian rhythm disturbances affecting daily functioning\n"
+        "- Social Anxiety Disorder: Fear of social situations, avoidance behaviors, significant distress\n"
+        "- Acute Stress Reaction: Symptoms following exposure to traumatic or stressful events\n"
+        "- Burnout Syndrome: Emotional exhaustion, depersonalization, reduced personal accomplishment\n\n"
+
+        "CONDITION-SPECIFIC ANALYSIS CRITERIA:\n\n"
+        "DEPRESSION & MOOD DISORDERS:\n"
+        "- Major Depression: Persistent sadness, loss of interest, fatigue, concentration issues, suicidal thoughts\n"
+        "- Bipolar Disorder: Mood swings, periods of mania/hypomania alternating with depression\n"
+        "- Seasonal Affective Disorder: Depression related to seasonal changes\n"
+        "- Gender Considerations: Women may experience more somatic symptoms, men may show more irritability and anger\n\n"
+
+        "ANXIETY DISORDERS:\n"
+        "- Generalized Anxiety: Excessive worry, restlessness, fatigue, concentration issues\n"
+        "- Panic Disorder: Recurrent panic attacks, fear of future attacks\n"
+        "- Social Anxiety: Fear of social situations, avoidance behaviors\n"
+        "- Phobias: Specific fears causing significant distress\n"
+        "- Gender Considerations: Women are twice as likely to experience anxiety disorders; consider hormonal influences\n\n"
+
+        "TRAUMA & STRESS DISORDERS:\n"
+        "- PTSD: Trauma exposure, flashbacks, nightmares, hypervigilance, avoidance\n"
+        "- Acute Stress Disorder: Similar to PTSD but shorter duration\n"
+        "- Adjustment Disorder: Difficulty coping with life changes\n\n"
+
+        "EATING DISORDERS:\n"
+        "- Anorexia: Restriction, body image distortion, fear of weight gain\n"
+        "- Bulimia: Binge eating followed by compensatory behaviors\n"
+        "- Binge Eating: Recurrent episodes of overeating without compensation\n"
+        "- Gender Considerations: More common in women, but men may present differently (muscle dysmorphia)\n\n"
+
+        "ATTENTION & NEURODEVELOPMENTAL:\n"
+        "- ADHD: Inattention, hyperactivity, impulsivity affecting daily functioning\n"
+        "- Learning Disabilities: Academic difficulties despite normal intelligence\n"
+        "- Gender Considerations: ADHD may present differently in women (more inattentive type)\n\n"
+
+        "SUBSTANCE USE DISORDERS:\n"
+        "- Alcohol Use Disorder: Problematic alcohol consumption\n"
+        "- Drug Use Disorder: Problematic use of substances\n"
+        "- Dependence: Physical or psychological dependence on substances\n"
+        "- Gender Considerations: Men more likely to use substances, women may progress faster to dependence\n\n"
+
+        "SLEEP DISORDERS:\n"
+        "- Insomnia: Difficulty falling or staying asleep\n"
+        "- Sleep Apnea: Breathing interruptions during sleep\n"
+        "- Circadian Rhythm Disorders: Sleep-wake cycle disruptions\n"
+        "- Gender Considerations: Women more likely to experience insomnia, men more likely to have sleep apnea\n\n"
+
+        "RISK ASSESSMENT CRITERIA:\n"
+        "HIGH RISK: Suicidal ideation, self-harm, severe depression, psychosis, substance abuse, crisis situations, severe functional impairment\n"
+        "MEDIUM RISK: Persistent anxiety, moderate depression, sleep disturbances, social withdrawal, stress overload, moderate functional impairment\n"
+        "LOW RISK: Mild symptoms, good coping strategies, stable mood, adequate sleep, manageable stress, good functional capacity\n\n"
+
+        "REQUIRED OUTPUT FORMAT (JSON only, no markdown):\n"
+        "{\n"
+        '  "summary": "Provide a clinical assessment of the mental health condition (3-4 sentences). Focus on the clinical presentation, diagnostic indicators, and functional impact. Do NOT reference specific scores or responses. Example: \'The clinical presentation indicates symptoms consistent with major depressive episode, characterized by persistent low mood, anhedonia, and significant functional impairment. The presence of sleep disturbances, social withdrawal, and cognitive difficulties suggests moderate to severe depression requiring professional intervention. The combination of mood symptoms with anxiety features may indicate a mixed anxiety-depressive disorder or comorbid conditions. Early intervention is recommended to prevent further deterioration and improve prognosis.\'",\n'
+        '  "riskLevel": "Low/Medium/High - Based on clinical presentation, symptom severity, functional impairment, and risk factors. Do not reference specific scores.",\n'
+        '  "recommendations": "Provide 4-6 clinical recommendations for treatment and management. Include: 1) Immediate interventions, 2) Professional treatment options, 3) Therapeutic approaches, 4) Monitoring and follow-up. Focus on evidence-based treatments and clinical best practices."\n'
+        "}\n\n"
+
+        "ANALYSIS GUIDELINES:\n"
+        "- Provide a clinical assessment of the mental health condition, not a restatement of responses\n"
+        "- Focus on diagnostic indicators, symptom clusters, and clinical presentation\n"
+        "- Use professional clinical terminology and diagnostic criteria\n"
+        "- Assess functional impairment and quality of life impact\n"
+        "- Identify potential diagnoses or clinical conditions\n"
+        "- Consider differential diagnoses and comorbid conditions\n"
+        "- Evaluate severity and acuity of symptoms\n"
+        "- Assess risk factors and protective factors\n"
+        "- Provide evidence-based treatment recommendations\n"
+        "- DO NOT reference specific scores, numbers, or user responses\n"
+        "- DO NOT use phrases like 'your responses show' or 'based on your answers'\n"
+        "- Focus on the clinical condition and its implications\n\n"
+
+        "CLINICAL ASSESSMENT APPROACH:\n"
+        "- Analyze symptom patterns and clusters\n"
+        "- Evaluate functional impairment across domains\n"
+        "- Assess risk level based on clinical criteria\n"
+        "- Consider differential diagnoses\n"
+        "- Provide treatment recommendations based on clinical presentation\n"
+        "- Use DSM-5 criteria and clinical best practices\n\n"
+
+        "CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure."
+    )
+    return instruction
+
+def legacy_summary_prompt(summary_text, context=None, user_gender=None):
+    """The daily summary prompt as built before the registry."""
+
+    # Base instruction
+    instruction = (
+        "You are an expert clinical psychologist and mental health AI with specialized training in journal analysis and narrative therapy. "
+        "Analyze the following daily summary with clinical expertise and provide comprehensive insights about the user's emotional state, patterns, and well-being. "
+        "Go beyond simply restating what the user wrote - provide meaningful clinical interpretation and insights.\n\n"
+
+        "ANALYSIS FRAMEWORK:\n"
+        "- Apply evidence-based psychological assessment principles and clinical judgment\n"
+        "- Use narrative therapy and journal analysis techniques\n"
+        "- Identify clinical indicators and diagnostic patterns\n"
+        "- Assess functional impairment and quality of life impact\n"
+        "- Provide clinical insights about mental health condition\n"
+        "- Look for underlying psychological processes and defense mechanisms\n"
+        "- Identify clinical themes and diagnostic indicators\n"
+        "- Provide professional assessment of mental health status\n"
+        "- Focus on clinical presentation rather than personal narrative\n"
+        "- Consider gender-specific patterns and considerations when relevant\n\n"
+    )
+
+    # Add context if provided
+    if context:
+        context_info = []
+
+        if context.get('is_synthetic'):
+            context_info.append("CLINICAL NOTE: This is an auto-generated summary created from structured assessment data.")
+        else:
+            context_info.append("CLINICAL NOTE: This is a personal summary written by the user - rich qualitative data.")
+
+        if context.get('is_edit'):
+            context_info.append("NOTE: This summary has been edited/updated by the user - consider changes in perspective.")
+
+        if context.get('time_of_day'):
+            context_info.append(f"TIMING: Summary written at {context['time_of_day']} - consider circadian and daily rhythm factors.")
+
+        if context.get('has_previous_analysis'):
+            context_info.append("HISTORY: This summary has been analyzed before - provide fresh insights based on any changes or evolution.")
+
+        if context_info:
+            instruction += "CONTEXTUAL INFORMATION:\n" + "\n".join(context_info) + "\n\n"
+
+    instruction += f"USER DEMOGRAPHICS:\n"
+    instruction += f"• Gender: {user_gender if user_gender else 'Not specified'}\n\n"
+
+    instruction += f"DAILY SUMMARY TO ANALYZE:\n\"{summary_text}\"\n\n"
+
+    # Adjust analysis approach based on context
+    if context and context.get('is_synthetic'):
+        instruction += (
+            "ANALYSIS FOCUS (Structured Data Summary):\n"
+            "• Quantitative patterns in mood, stress, sleep, and anxiety indicators\n"
+            "• Data-driven insights and trend analysis\n"
+            "• Objective assessment of mental health metrics\n"
+            "• Evidence-based recommendations based on numerical patterns\n"
+            "• Identification of areas requiring attention or intervention\n\n"
+        )
+    else:
+        instruction += (
+            "ANALYSIS FOCUS (Personal Narrative):\n"
+            "• Emotional tone, language patterns, and psychological themes\n"
+            "• Cognitive patterns and thought processes\n"
+            "• Behavioral indicators and coping strategies\n"
+            "• Personal growth, resilience, and self-awareness\n"
+            "• Narrative structure and storytelling elements\n"
+            "• Subjective experience and internal world\n\n"
+        )
+
+    instruction += (
+        "CLINICAL ANALYSIS AREAS:\n"
+        "• Emotional Regulation: How well the user manages and expresses emotions\n"
+        "• Cognitive Patterns: Thought processes, beliefs, and mental frameworks\n"
+        "• Behavioral Indicators: Actions, habits, and coping strategies\n"
+        "• Social Connections: Relationships and interpersonal dynamics\n"
+        "• Stress Management: How the user handles challenges and pressure\n"
+        "• Self-Care: Attention to physical and mental well-being\n"
+        "• Growth Mindset: Learning, adaptation, and personal development\n\n"
+
+        "REQUIRED OUTPUT FORMAT (JSON only, no markdown):\n"
+        "{\n"
+        '  "summary": "Comprehensive 2-3 sentence analysis of the user\'s emotional state, psychological patterns, and overall well-being. Be specific about what you observe.",\n'
+        '  "mood_indicators": "Detailed identification of emotional indicators, mood patterns, and affective states present in the writing. Include both positive and concerning indicators.",\n'
+        '  "patterns": "Specific patterns, themes, and recurring elements identified in the writing. Include cognitive, emotional, and behavioral patterns.",\n'
+        '  "insights": "Clinical insights about the user\'s mental well-being, personal growth, and psychological state. Focus on both strengths and areas for development.",\n'
+        '  "suggestions": "3-4 specific, actionable suggestions for reflection, growth, or positive actions. Be practical, evidence-based, and tailored to the user\'s situation."\n'
+        "}\n\n"
+
+        "ANALYSIS GUIDELINES:\n"
+        "- Maintain clinical objectivity while being empathetic and supportive\n"
+        "- Identify both challenges and strengths/resilience factors\n"
+        "- Use evidence-based psychological principles\n"
+        "- Provide specific, actionable recommendations\n"
+        "- Consider the user's unique circumstances and context\n"
+        "- Focus on growth, healing, and positive development\n"
+        "- Be sensitive to potential mental health concerns\n\n"
+
+        "CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure."
+    )
+
+    return instruction
+
+def legacy_incremental_summary_prompt(diff, previous_analysis, user_gender=None):
+    """The incremental summary prompt as built before the registry."""
+    previous = {field: previous_analysis.get(field, "") for field in ANALYSIS_FIELDS}
+
+    instruction = (
+        "You are an expert clinical psychologist and mental health AI. "
+        "You previously analyzed a user's daily summary. The user has since edited it. "
+        "Update your previous analysis to reflect the edits only - keep everything that is still accurate.\n\n"
+    )
+    instruction += "USER DEMOGRAPHICS:\n"
+    instruction += f"• Gender: {user_gender if user_gender else 'Not specified'}\n\n"
+
+    if diff["changed_sentences"]:
+        instruction += "NEW OR CHANGED SENTENCES:\n"
+        instruction += "\n".join(f'- "{s}"' for s in diff["changed_sentences"]) + "\n\n"
+    if diff["removed_sentences"]:
+        instruction += "REMOVED SENTENCES:\n"
+        instruction += "\n".join(f'- "{s}"' for s in diff["removed_sentences"]) + "\n\n"
+
+    instruction += f"PREVIOUS ANALYSIS:\n{json.dumps(previous, ensure_ascii=False)}\n\n"
+    instruction += (
+        "REQUIRED OUTPUT FORMAT (JSON only, no markdown):\n"
+        "Return the updated analysis with exactly the same keys as the previous analysis "
+        "(summary, mood_indicators, patterns, insights, suggestions).\n\n"
+        "CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure."
+    )
+    return instruction
+
+def legacy_analytics_prompt(assessments, summaries, period, stats, trends, user_gender=None):
+    """The weekly/monthly prompt as built before the registry."""
+
+    period_name = "week" if period == "weekly" else "month"
+    period_plural = "weeks" if period == "weekly" else "months"
+
+    instruction = f"""You are an expert clinical psychologist and mental health AI with 20+ years of experience in longitudinal mental health assessment and trend analysis. Analyze the following {period} mental health data and provide comprehensive insights about patterns, trends, and recommendations.
+
+CLINICAL ANALYSIS FRAMEWORK:
+- Apply evidence-based psychological assessment principles for longitudinal analysis
+- Identify patterns, trends, and correlations across the {period}
+- Consider both individual daily variations and overall {period}ly patterns
+- Provide specific, actionable recommendations based on observed trends
+- Focus on protective factors, areas of concern, and intervention opportunities
+- Use clinical judgment to assess overall mental health trajectory
+- Consider gender-specific mental health patterns and considerations when relevant
+
+{period.upper()} MENTAL HEALTH DATA:
+
+USER DEMOGRAPHICS:
+• Gender: {user_gender if user_gender else 'Not specified'}
+
+
+ASSESSMENT STATISTICS:
+• Total Assessments: {stats.get('totalAssessments', 0)}
+• Average Mood Level: {stats.get('averageMood', 'N/A')}/10
+• Average Stress Level: {stats.get('averageStress', 'N/A')}/10
+• Average Sleep Hours: {stats.get('averageSleep', 'N/A')} hours
+• Mood Range: {stats.get('moodRange', 'N/A')}
+• Stress Range: {stats.get('stressRange', 'N/A')}
+• Sleep Range: {stats.get('sleepRange', 'N/A')} hours
+• Risk Level Distribution: {stats.get('riskDistribution', {})}
+
+TREND ANALYSIS:
+• Mood Trend: {trends.get('moodTrend', 'Unknown')}
+• Stress Trend: {trends.get('stressTrend', 'Unknown')}
+• Sleep Trend: {trends.get('sleepTrend', 'Unknown')}
+• Energy Trend: {trends.get('energyTrend', 'Unknown')}
+
+DAILY ASSESSMENT DETAILS:
+"""
+
+    # Add assessment details
+    for i, assessment in enumerate(islice(assessments, PROMPT_ASSESSMENT_LIMIT)):  # Limit for prompt length
+        date = assessment.get('createdAt', 'Unknown date')
+        answers = assessment.get('answers', {})
+        ai_analysis = assessment.get('aiAnalysis', {})
+
+        instruction += f"""
+Day {i+1} ({date.split('T')[0]}):
+• Mood: {answers.get('mood', 'N/A')} (Level: {answers.get('moodLevel', 'N/A')}/10)
+• Stress: {answers.get('stressLevel', 'N/A')}/10
+• Sleep: {answers.get('sleepHours', 'N/A')} hours ({answers.get('sleepQuality', 'N/A')})
+• Energy: {answers.get('energyLevel', 'N/A')}
+• Anxiety: {answers.get('anxietyFrequency', 'N/A')}
+• Overwhelm: {answers.get('overwhelmedFrequency', 'N/A')}
+• Social Connection: {answers.get('socialConnection', 'N/A')}
+• Daily Functioning: {answers.get('dailyFunctioning', 'N/A')}
+• Risk Level: {ai_analysis.get('riskLevel', 'Unknown')}
+"""
+
+    # Add daily summaries if available
+    if summaries:
+        instruction += f"\nDAILY SUMMARIES ({len(summaries)} entries):\n"
+        for summary in summaries[:PROMPT_SUMMARY_LIMIT]:
+            date = summary.get('date', 'Unknown date')
+            summary_text = summary.get('summary', 'No summary')
+            instruction += f"\n{date}: {summary_text}\n"
+
+    instruction += f"""
+
+CLINICAL TREND ANALYSIS CRITERIA:
+
+MOOD PATTERNS:
+- Improving: Consistent upward trend in mood levels
+- Declining: Consistent downward trend in mood levels  
+- Stable: Minimal variation in mood levels
+- Volatile: High variability with no clear trend
+
+STRESS PATTERNS:
+- Improving: Decreasing stress levels over time
+- Declining: Increasing stress levels over time
+- Stable: Consistent stress levels
+- Volatile: High variability in stress levels
+
+SLEEP PATTERNS:
+- Improving: Increasing sleep hours and quality
+- Declining: Decreasing sleep hours and quality
+- Stable: Consistent sleep patterns
+- Volatile: High variability in sleep duration
+
+ENERGY PATTERNS:
+- Improving: Increasing energy levels
+- Declining: Decreasing energy levels
+- Stable: Consistent energy levels
+- Volatile: High variability in energy
+
+RISK ASSESSMENT:
+- Low Risk: Predominantly low risk assessments, stable or improving trends
+- Medium Risk: Mixed risk levels, some concerning patterns
+- High Risk: Predominantly high risk assessments, declining trends
+
+REQUIRED OUTPUT FORMAT (JSON only, no markdown):
+{{
+  "summary": "Provide a comprehensive {period}ly mental health summary (4-5 sentences). Focus on overall patterns, key trends, and clinical significance. Example: 'Over the past {period}, your mental health shows [trend description]. Key patterns include [specific patterns]. The data suggests [clinical insights]. Overall, [assessment of progress/concerns].'",
+  "trends": "Detailed analysis of specific trends observed (3-4 sentences). Focus on mood, stress, sleep, and energy patterns. Identify any concerning or positive patterns.",
+  "insights": "Clinical insights and observations (3-4 sentences). Focus on what the data reveals about mental health patterns, triggers, and protective factors.",
+  "recommendations": "Specific, actionable recommendations for the next {period} (4-6 items). Include both immediate actions and longer-term strategies.",
+  "riskLevel": "Low/Medium/High - Overall risk assessment based on {period}ly patterns and trends",
+  "moodTrend": "{trends.get('moodTrend', 'Unknown')}",
+  "stressTrend": "{trends.get('stressTrend', 'Unknown')}",
+  "sleepTrend": "{trends.get('sleepTrend', 'Unknown')}",
+  "energyTrend": "{trends.get('energyTrend', 'Unknown')}"
+}}
+
+ANALYSIS GUIDELINES:
+- Focus on patterns and trends rather than individual daily scores
+- Identify both positive and concerning patterns
+- Provide specific, actionable recommendations
+- Consider the relationship between different metrics (mood, stress, sleep, energy)
+- Use clinical terminology appropriately
+- Focus on the overall trajectory and patterns
+- Consider both individual daily variations and overall {period}ly trends
+
+CRITICAL: Return ONLY valid JSON. No markdown formatting, no additional text, no explanations outside the JSON structure.
+"""
+
+    return instruction
+
+def legacy_risk_prompt(outs):
+    """The risk prompt as built before the registry."""
+    return f"""
+You are an expert clinical psychologist and mental health AI with 20+ years of experience in risk assessment and crisis intervention. 
+Using the following comprehensive data from one individual, provide a detailed clinical analysis and risk assessment that goes beyond simply restating the data.
+
+CLINICAL ANALYSIS FRAMEWORK:
+- Apply evidence-based risk assessment protocols and clinical judgment
+- Use validated mental health screening criteria (PHQ-9, GAD-7, PSS-10, C-SSRS)
+- Consider both immediate and long-term risk factors and protective factors
+- Provide specific, actionable recommendations based on clinical best practices
+- Maintain clinical objectivity while being empathetic and supportive
+- Identify patterns, correlations, and clinical significance in the data
+- Focus on meaningful insights rather than data restatement
+
+DATA TO ANALYZE:
+Output 1 (Daily Check-in): {outs.get('Output1')}
+Output 2 (Assessment Analysis): {outs.get('Output2')}
+Output 3 (Summary Analysis): {outs.get('Output3')}
+Output 4 (Additional Context): {outs.get('Output4')}
+
+REQUIRED ANALYSIS COMPONENTS:
+
+1. COMPREHENSIVE MENTAL HEALTH ASSESSMENT:
+   - Current psychological state and functioning
+   - Emotional regulation and coping strategies
+   - Cognitive patterns and thought processes
+   - Behavioral indicators and daily functioning
+   - Social and interpersonal functioning
+
+2. RISK FACTOR IDENTIFICATION:
+   - Immediate risk factors (suicidal ideation, self-harm, psychosis)
+   - Moderate risk factors (severe depression, anxiety, substance use)
+   - Protective factors (support systems, coping skills, treatment engagement)
+   - Environmental and situational stressors
+
+3. RISK LEVEL DETERMINATION:
+   - HIGH RISK: Immediate danger, crisis situation, requires urgent intervention
+   - MEDIUM RISK: Significant concerns, professional help recommended within days
+   - LOW RISK: Mild symptoms, self-care and monitoring sufficient
+
+4. EVIDENCE-BASED RECOMMENDATIONS:
+   - Immediate actions (crisis intervention, safety planning)
+   - Short-term interventions (therapy, medication evaluation)
+   - Long-term strategies (lifestyle changes, ongoing treatment)
+   - Specific resources and support systems
+
+5. CLINICAL INSIGHTS:
+   - Clinical presentation and diagnostic indicators
+   - Functional impairment assessment
+   - Risk factors and protective factors
+   - Treatment recommendations and prognosis
+   - Differential diagnosis considerations
+
+ANALYSIS GUIDELINES:
+- Be thorough, specific, and clinically accurate
+- Use evidence-based assessment criteria
+- Provide actionable, personalized recommendations
+- Consider the individual's unique circumstances
+- Balance concern with hope and empowerment
+- Emphasize professional help when appropriate
+
+CRITICAL: If you identify HIGH RISK indicators, immediately emphasize the need for crisis intervention and professional help.
+"""
+
+
+ANSWERS = {"mood": "Anxious", "moodLevel": 3, "stressLevel": 8, "sleepHours": 5, "sleepQuality": "Poor",
+           "anxietyFrequency": "Often", "energyLevel": "Low", "overwhelmedFrequency": "Sometimes",
+           "socialConnection": "Isolated", "dailyFunctioning": "Struggling"}
+STATS = {"totalAssessments": 2, "averageMood": 4.5, "averageStress": 7.0, "averageSleep": 6.0, "moodRange": "3-6",
+         "stressRange": "6-8", "sleepRange": "5-7", "riskDistribution": {"Medium": 2}}
+TRENDS = {"moodTrend": "Improving", "stressTrend": "Stable", "sleepTrend": "Declining", "energyTrend": "Stable"}
+ASSESSMENTS = [{"createdAt": "2024-05-06T08:00:00", "answers": ANSWERS, "aiAnalysis": {"riskLevel": "Medium"}},
+               {"createdAt": "2024-05-07T08:00:00", "answers": dict(ANSWERS, moodLevel=6), "aiAnalysis": {}}]
+SUMMARIES = [{"date": "2024-05-06", "summary": "Hard day at work."}, {"date": "2024-05-07", "summary": "Better."}]
+EDIT = {"similarity": 0.8, "changed_sentences": ["Then the meeting went badly.", "Skipped dinner."],
+        "removed_sentences": ["Felt fine after lunch."]}
+PREVIOUS_ANALYSIS = {"summary": "Calm day.", "mood_indicators": "Content", "patterns": "Routine",
+                     "insights": "Stable", "suggestions": "Keep walking – it helps"}
+
+def test_v1_matches_previous_builders():
+    """v1 renders the same text as the old f-strings, up to trailing and repeated blank lines"""
+    cases = [
+        (legacy_assessment_prompt(ANSWERS, "Couldn't focus today.", "Female"),
+         build_analysis_prompt(ANSWERS, "Couldn't focus today.", "Female", version="v1")),
+        (legacy_assessment_prompt({}, None, None), build_analysis_prompt({}, None, None, version="v1")),
+        (legacy_summary_prompt("Walked by the river.", None, "Male"),
+         build_summary_analysis_prompt("Walked by the river.", None, "Male", version="v1")),
+        (legacy_summary_prompt("Slept badly.", {"is_synthetic": True, "is_edit": True, "time_of_day": "evening"}),
+         build_summary_analysis_prompt("Slept badly.", {"is_synthetic": True, "is_edit": True, "time_of_day": "evening"},
+                                       version="v1")),
+        (legacy_analytics_prompt(ASSESSMENTS, SUMMARIES, "weekly", STATS, TRENDS, "Female"),
+         build_analytics_prompt(ASSESSMENTS, SUMMARIES, "weekly", STATS, TRENDS, "Female", version="v1")),
+        (legacy_analytics_prompt(ASSESSMENTS, [], "monthly", STATS, TRENDS),
+         build_analytics_prompt(ASSESSMENTS, [], "monthly", STATS, TRENDS, version="v1")),
+        (legacy_risk_prompt({"Output1": "a", "Output2": "b", "Output3": "c"}),
+         build_risk_prompt({"Output1": "a", "Output2": "b", "Output3": "c"}, version="v1")),
+        (legacy_incremental_summary_prompt(EDIT, PREVIOUS_ANALYSIS, "Female"),
+         build_incremental_summary_prompt(EDIT, PREVIOUS_ANALYSIS, "Female", version="v1")),
+        (legacy_incremental_summary_prompt(dict(EDIT, removed_sentences=[]), PREVIOUS_ANALYSIS),
+         build_incremental_summary_prompt(dict(EDIT, removed_sentences=[]), PREVIOUS_ANALYSIS, version="v1")),
+        (legacy_incremental_summary_prompt(dict(EDIT, changed_sentences=[]), PREVIOUS_ANALYSIS),
+         build_incremental_summary_prompt(dict(EDIT, changed_sentences=[]), PREVIOUS_ANALYSIS, version="v1")),
+    ]
+    for expected, rendered in cases:
+        assert rendered == minify(expected)
+        assert rendered.version.endswith("@v1")
+
+def test_newest_prompts_are_lint_clean_and_shorter():
+    for name in PROMPTS.names():
+        newest = PROMPTS.templates(name)[-1]
+        assert not lint(newest), name
+        assert newest.footprint <= PROMPTS.templates(name)[0].footprint
+    assert len(build_analysis_prompt(ANSWERS, None, None, version="v2")) < \
+        len(build_analysis_prompt(ANSWERS, None, None, version="v1"))
+
+    template = PromptTemplate("demo", "v1", "Always answer in valid JSON only please.\n\n\n"
+                                            "Always answer in valid JSON only please.  \n")
+    assert template.text == "Always answer in valid JSON only please.\n\nAlways answer in valid JSON only please."
+    assert [issue.kind for issue in lint(template)] == ["duplicate"]
+
+def test_shipped_splits_keep_v1_as_control():
+    """Leaner versions only get a small explicit share; v1 stays the default and the unattributed choice"""
+    for name in PROMPTS.names():
+        weights = PROMPTS.weights(name)
+        assert weights.get("v1", 0) >= 0.9 * sum(weights.values()), name
+        assert PROMPTS.select(name).version == "v1"
+    picks = [PROMPTS.select("assessment", f"user-{n}").version for n in range(1000)]
+    assert 50 < picks.count("v2") < 150
+
+def registry(splits):
+    templates = PromptRegistry()
+    for version in ("v1", "v2", "v3"):
+        templates.register(PromptTemplate("demo", version, f"{version} {{{{who}}}}"))
+    templates.splits = parse_splits(splits)
+    return templates
+
+def test_version_selection():
+    """First version by default, stable per key under a split, and roughly following the weights"""
+    assert registry("").render("demo", key="u1", who="x") == "v1 x"
+    assert registry("demo=v3").render("demo", key="u1", who="x").version == "demo@v3"
+    assert registry("demo=v1:1,v2:0").weights("demo") == {"v1": 1.0}
+    assert registry("demo=v9:1").select("demo").version == "v1"   # Unknown versions are ignored
+
+    split = registry("demo=v1:0.5,v2:0.5")
+    picks = {key: split.select("demo", key).version for key in map(str, range(400))}
+    assert all(split.select("demo", key).version == version for key, version in picks.items())
+    assert 150 < list(picks.values()).count("v1") < 250
+    assert split.select("demo").version == "v1"   # Ties without a key go to the older version
+    assert registry("demo=v1:0.2,v2:0.8").select("demo").version == "v2"
+    assert split.render("demo", key="u1", version="v3", who="x") == "v3 x"
+
+    with patched_env(PROMPT_VERSIONS="daily_summary=v2"):
+        reloaded = PromptRegistry().load_dir(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
+    assert reloaded.select("daily_summary", "u1").version == "v2"
+    assert reloaded.weights("daily_summary") == {"v2": 1.0}
+
+if __name__ == "__main__":
+    test_v1_matches_previous_builders()
+    test_newest_prompts_are_lint_clean_and_shorter()
+    test_shipped_splits_keep_v1_as_control()
+    test_version_selection()
+    print("Prompt registry tests passed")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test script for TF-IDF retrieval of daily summaries for the analytics prompt
+"""
+import sys
+import os
+import tempfile
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from summary_retrieval import SummaryIndex, select_summaries, load_summary_index, save_summary_index, terms
+from analyze_weekly_monthly import AssessmentAccumulator, build_analytics_prompt, summarize_assessments
+
+ROUTINE = "Went to the office, had lunch with colleagues and watched a film in the evening."
+SUMMARIES = [{"date": f"2024-03-{day:02d}", "summary": f"{ROUTINE} Day {day} notes."} for day in range(1, 9)]
+SUMMARIES[5]["summary"] = "Felt hopeless and overwhelmed, panic before the meeting and could not sleep."
+SUMMARIES[6]["summary"] = "Argued with my sister about the flat again, the same argument as last month."
+SUMMARIES[7]["summary"] = "Anxious all evening, worried about money and exhausted."
+
+def rebuilt_df(index):
+    """Document frequencies recomputed from scratch over the stored documents."""
+    df = np.zeros(len(index.vocab), dtype=np.int32)
+    for _, ids, _ in index.docs.values():
+        df[ids] += 1
+    return df
+
+def test_selects_risk_and_anomaly_summaries():
+    """Risky summaries and the anomalous day's summary win over the first ones in the period"""
+    anomalies = [("2024-03-07", "Conflict with family about the flat, argument left the user withdrawn.")]
+    chosen = select_summaries(SUMMARIES, anomalies, top_k=3)
+    assert [s["date"] for s in chosen] == ["2024-03-06", "2024-03-07", "2024-03-08"]
+
+    # The token budget is a hard cap; tiny budgets quote fewer summaries
+    assert len(select_summaries(SUMMARIES, anomalies, top_k=5, token_budget=30)) == 1
+    assert select_summaries([], anomalies) == []
+
+def test_incremental_updates_match_rebuild():
+    """Adding, replacing and re-adding documents keeps document frequencies exact"""
+    index = SummaryIndex()
+    for summary in SUMMARIES:
+        assert index.add_summary(summary)
+    assert not index.add_summary(SUMMARIES[0])  # Unchanged text is skipped
+    assert index.add_summary(dict(SUMMARIES[0], summary="Slept badly and felt anxious about exams."))
+    assert np.array_equal(index.df[:len(index.vocab)], rebuilt_df(index))
+    assert "anxious" in terms(SUMMARIES[7]["summary"]) and "the" not in terms(SUMMARIES[7]["summary"])
+
+def test_index_persists_per_user():
+    saved = os.environ.get("SUMMARY_INDEX_DIR")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["SUMMARY_INDEX_DIR"] = tmp
+        try:
+            index = load_summary_index("42")
+            accumulator = AssessmentAccumulator(index)
+            accumulator.add({"id": 1, "createdAt": "2024-03-07T09:00:00Z",
+                             "answers": {"moodLevel": 2, "stressLevel": 9, "sleepHours": 4},
+                             "aiAnalysis": {"riskLevel": "High", "summary": "Severe stress after family conflict."}})
+            select_summaries(SUMMARIES, accumulator.anomalies, index)
+            save_summary_index(index, "42")
+            restored = load_summary_index("42")
+            assert restored.vocab == index.vocab and set(restored.docs) == set(index.docs)
+            assert np.array_equal(restored.df[:len(restored.vocab)], rebuilt_df(restored))
+            assert accumulator.anomalies == [("2024-03-07", "Severe stress after family conflict.")]
+            # Anonymous runs never share an index
+            assert not load_summary_index("anonymous").docs
+        finally:
+            if saved is None:
+                os.environ.pop("SUMMARY_INDEX_DIR", None)
+            else:
+                os.environ["SUMMARY_INDEX_DIR"] = saved
+
+def test_prompt_quotes_selected_summaries():
+    stats, trends, sample = summarize_assessments([])
+    prompt = build_analytics_prompt(sample, SUMMARIES, "weekly", stats, trends)
+    assert "DAILY SUMMARIES (8 entries)" in prompt
+    assert SUMMARIES[5]["summary"] in prompt and SUMMARIES[7]["summary"] in prompt
+
+if __name__ == "__main__":
+    test_selects_risk_and_anomaly_summaries()
+    test_incremental_updates_match_rebuild()
+    test_index_persists_per_user()
+    test_prompt_quotes_selected_summaries()
+    print("Summary retrieval tests passed")
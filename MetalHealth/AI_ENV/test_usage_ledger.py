@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test script for the usage ledger's budget modes and their risk exemption
+"""
+import io
+import sys
+import os
+import tempfile
+from contextlib import redirect_stderr
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from gemini_client import MODEL, generate_content
+from usage_ledger import CHEAP_MODEL, MINIMAL_MAX_OUTPUT_TOKENS, UsageLedger, attribute, load_budgets
+from mock_gemini import MockGemini, patched_env, response_body
+
+def run_calls(calls):
+    """Make (endpoint, route_reason) calls as an over-budget user. Returns {endpoint: (model, mode)} and payloads."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.sqlite3")
+        # The user already spent their whole day's budget
+        UsageLedger(path, budgets={}).record("assessment", MODEL, {"total": 500}, 0.1, user="u1")
+        with MockGemini(lambda prompt, payload: response_body("ok", {"promptTokenCount": 5, "totalTokenCount": 5}),
+                        USAGE_LEDGER_DB=path, USAGE_BUDGET_USER_DAILY="100") as gemini, attribute(user="u1"):
+            for endpoint, reason in calls:
+                generate_content("test", "hello", MODEL, endpoint=endpoint, profile={}, route_reason=reason)
+            payloads = list(gemini.payloads)
+        rows = UsageLedger(path, budgets={}).report(by=("endpoint", "model", "mode"))
+    return {row["endpoint"]: (row["model"], row["mode"]) for row in rows if row["endpoint"] != "assessment"}, payloads
+
+def test_over_budget_calls_are_degraded():
+    modes, payloads = run_calls([("daily_summary", "long_input")])
+    assert modes == {"daily_summary": (CHEAP_MODEL, "minimal")}
+    assert payloads[0]["generationConfig"]["maxOutputTokens"] == MINIMAL_MAX_OUTPUT_TOKENS
+
+def test_risk_calls_keep_model_and_output():
+    """Risk-routed calls and the risk analysis keep the routed model and no output cap"""
+    modes, payloads = run_calls([("daily_summary", "risk_signal"), ("risk", None)])
+    assert modes == {"daily_summary": (MODEL, "normal"), "risk": (MODEL, "normal")}
+    assert all("generationConfig" not in payload for payload in payloads)
+
+def test_malformed_budget_is_ignored():
+    """A bad budget value is reported on stderr and neither breaks loading nor the calls"""
+    stderr = io.StringIO()
+    with patched_env(USAGE_BUDGET_GLOBAL_DAILY="10k", USAGE_BUDGET_USER_DAILY="200"), redirect_stderr(stderr):
+        assert load_budgets() == {"global": None, "user": 200, "users": {}}
+    assert "USAGE_BUDGET_GLOBAL_DAILY='10k'" in stderr.getvalue()
+
+    with tempfile.TemporaryDirectory() as tmp, redirect_stderr(io.StringIO()), \
+            MockGemini(lambda prompt, payload: "ok", USAGE_LEDGER_DB=os.path.join(tmp, "ledger.sqlite3"),
+                       USAGE_BUDGET_USER_DAILY="lots") as gemini:
+        generate_content("test", "hello", MODEL, endpoint="budget-test")
+        assert gemini.requests_seen == 1
+
+if __name__ == "__main__":
+    test_over_budget_calls_are_degraded()
+    test_risk_calls_keep_model_and_output()
+    test_malformed_budget_is_ignored()
+    print("Usage ledger tests passed")
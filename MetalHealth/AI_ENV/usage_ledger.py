@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Token Usage Ledger
+Every Gemini call's usageMetadata (prompt, output, thinking and cached tokens)
+is added to a SQLite ledger aggregated by day, endpoint, prompt version, user,
+model and mode, so it is visible which prompts dominate spend and latency.
+
+Daily token budgets, global and per user, never make a call fail. Once a
+budget is 80% spent calls run in "economy" mode (cheaper model, no thinking);
+once it is exhausted they run in "minimal" mode, which also caps the output.
+Calls the model router sent to the full model for a risk signal, and the risk
+analysis itself, are never degraded.
+
+Configuration:
+    USAGE_LEDGER_DB            ledger path, "off" disables the ledger
+    USAGE_BUDGET_GLOBAL_DAILY  tokens per day across all users
+    USAGE_BUDGET_USER_DAILY    tokens per day for each user
+    USAGE_BUDGETS_FILE         JSON {"global": N, "user": N, "users": {"<id>": N}}
+    AI_ENV_USER                user the process's calls are attributed to
+
+Usage:
+    python usage_ledger.py report [--by day,endpoint] [--days N]
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "usage_ledger.sqlite3")
+CHEAP_MODEL = "gemini-2.5-flash-lite"
+SOFT_BUDGET_RATIO = 0.8
+MINIMAL_MAX_OUTPUT_TOKENS = 1024
+MODES = ("normal", "economy", "minimal")
+TOKEN_COLUMNS = ("prompt", "output", "thinking", "cached", "total")
+GROUP_COLUMNS = ("day", "endpoint", "prompt_version", "user", "model", "mode")
+RISK_ROUTE_REASON = "risk_signal"  # model_router reason for high-risk inputs
+UNDEGRADED_ENDPOINTS = ("risk",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    user TEXT NOT NULL,
+    model TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    prompt INTEGER NOT NULL DEFAULT 0,
+    output INTEGER NOT NULL DEFAULT 0,
+    thinking INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, endpoint, prompt_version, user, model, mode)
+);
+CREATE INDEX IF NOT EXISTS usage_day_user ON usage (day, user);
+"""
+
+UPSERT = """
+INSERT INTO usage (day, endpoint, prompt_version, user, model, mode,
+                   calls, prompt, output, thinking, cached, total, latency)
+VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, endpoint, prompt_version, user, model, mode) DO UPDATE SET
+    calls = calls + 1,
+    prompt = prompt + excluded.prompt,
+    output = output + excluded.output,
+    thinking = thinking + excluded.thinking,
+    cached = cached + excluded.cached,
+    total = total + excluded.total,
+    latency = latency + excluded.latency
+"""
+
+_attribution = contextvars.ContextVar("usage_attribution", default={})
+
+@contextmanager
+def attribute(user=None, prompt_version=None):
+    """Attribute Gemini calls made inside the block to a user and/or prompt version."""
+    current = dict(_attribution.get())
+    if user is not None:
+        current["user"] = str(user)
+    if prompt_version is not None:
+        current["prompt_version"] = prompt_version
+    token = _attribution.set(current)
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+def current_user():
+    return _attribution.get().get("user") or os.getenv("AI_ENV_USER") or "anonymous"
+
+def current_prompt_version():
+    return _attribution.get().get("prompt_version") or "unversioned"
+
+def _budget_from_env(env):
+    value = os.getenv(env)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        # A bad budget must not break the Gemini calls themselves
+        print(f"Ignoring {env}={value!r}: not a whole number of tokens", file=sys.stderr)
+        return None
+
+def load_budgets():
+    """Daily token budgets from the environment and the optional budgets file."""
+    budgets = {"global": None, "user": None, "users": {}}
+    for key, env in (("global", "USAGE_BUDGET_GLOBAL_DAILY"), ("user", "USAGE_BUDGET_USER_DAILY")):
+        budgets[key] = _budget_from_env(env)
+    path = os.getenv("USAGE_BUDGETS_FILE")
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            configured = json.load(f)
+        budgets["global"] = configured.get("global", budgets["global"])
+        budgets["user"] = configured.get("user", budgets["user"])
+        budgets["users"] = {str(k): v for k, v in configured.get("users", {}).items()}
+    return budgets
+
+def _mode_for(spent, budget):
+    if not budget:
+        return "normal"
+    if spent >= budget:
+        return "minimal"
+    if spent >= budget * SOFT_BUDGET_RATIO:
+        return "economy"
+    return "normal"
+
+def is_budget_exempt(endpoint, route_reason=None):
+    """True for calls that keep their model and output cap whatever the budget."""
+    return route_reason == RISK_ROUTE_REASON or endpoint in UNDEGRADED_ENDPOINTS
+
+def apply_mode(mode, model, payload):
+    """Model and request payload for a budget mode; "normal" leaves both unchanged."""
+    if mode == "normal":
+        return model, payload
+    config = dict(payload.get("generationConfig", {}))
+    config["thinkingConfig"] = {"thinkingBudget": 0}
+    if mode == "minimal":
+        config["maxOutputTokens"] = min(config.get("maxOutputTokens", MINIMAL_MAX_OUTPUT_TOKENS),
+                                        MINIMAL_MAX_OUTPUT_TOKENS)
+    return CHEAP_MODEL, dict(payload, generationConfig=config)
+
+class UsageLedger:
+    def __init__(self, path=DEFAULT_DB, budgets=None):
+        self.path = path
+        self.budgets = budgets if budgets is not None else load_budgets()
+        self._local = threading.local()
+
+    def _connection(self):
+        # SQLite connections are per thread; the database itself serializes writers
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def record(self, endpoint, model, usage, latency, user=None, prompt_version=None, mode="normal", day=None):
+        total = usage.get("total", usage.get("prompt", 0) + usage.get("output", 0) + usage.get("thinking", 0))
+        conn = self._connection()
+        with conn:
+            conn.execute(UPSERT, (
+                (day or date.today()).isoformat(), endpoint, prompt_version or current_prompt_version(),
+                str(user or current_user()), model, mode,
+                usage.get("prompt", 0), usage.get("output", 0), usage.get("thinking", 0),
+                usage.get("cached", 0), total, latency))
+
+    def spent(self, user=None, day=None):
+        """Total tokens used on a day, for one user or everyone."""
+        query, params = "SELECT COALESCE(SUM(total), 0) FROM usage WHERE day = ?", [(day or date.today()).isoformat()]
+        if user is not None:
+            query += " AND user = ?"
+            params.append(str(user))
+        return self._connection().execute(query, params).fetchone()[0]
+
+    def budget_mode(self, user=None):
+        """The most restrictive mode implied by the global and the user's budget."""
+        user = str(user or current_user())
+        user_budget = self.budgets["users"].get(user, self.budgets["user"])
+        modes = [_mode_for(self.spent(), self.budgets["global"]) if self.budgets["global"] else "normal",
+                 _mode_for(self.spent(user), user_budget) if user_budget else "normal"]
+        return max(modes, key=MODES.index)
+
+    def report(self, by=("day", "endpoint"), since=None):
+        """Aggregated rows grouped by the given columns, heaviest total first."""
+        unknown = [c for c in by if c not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown report columns: {unknown}")
+        columns = ", ".join(by)
+        sums = ", ".join(f"SUM({c}) AS {c}" for c in ("calls",) + TOKEN_COLUMNS)
+        query = f"SELECT {columns}, {sums}, SUM(latency) AS latency FROM usage"
+        params = []
+        if since is not None:
+            query += " WHERE day >= ?"
+            params.append(since.isoformat())
+        query += f" GROUP BY {columns} ORDER BY total DESC"
+        cursor = self._connection().execute(query, params)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    """Process-wide ledger, or None when USAGE_LEDGER_DB is "off"."""
+    global _ledger
+    path = os.getenv("USAGE_LEDGER_DB", DEFAULT_DB)
+    if path == "off":
+        return None
+    with _ledger_lock:
+        if _ledger is None or _ledger.path != path:
+            _ledger = UsageLedger(path)
+        return _ledger
+
+def format_report(rows, by):
+    headers = list(by) + ["calls", "prompt", "output", "thinking", "cached", "total", "avg_latency"]
+    table = [[str(row[c]) for c in by] +
+             [str(row[c]) for c in ("calls",) + TOKEN_COLUMNS] +
+             [f"{row['latency'] / row['calls']:.2f}s" if row["calls"] else "-"]
+             for row in rows]
+    widths = [max(len(h), *(len(r[i]) for r in table)) if table else len(h) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths)).rstrip()]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(r, widths)).rstrip() for r in table]
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report Gemini token usage from the ledger.")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--by", default="day,endpoint",
+                        help=f"comma-separated grouping columns from {', '.join(GROUP_COLUMNS)}")
+    parser.add_argument("--days", type=int, help="only the last N days")
+    args = parser.parse_args(argv)
+
+    ledger = get_ledger()
+    if ledger is None or not os.path.exists(ledger.path):
+        print("No usage recorded.")
+        return 0
+    by = tuple(c.strip() for c in args.by.split(",") if c.strip())
+    since = date.today() - timedelta(days=args.days - 1) if args.days else None
+    print(format_report(ledger.report(by, since), by))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+const mongoose = require('mongoose');
+
+// Precomputed weekly/monthly AI analytics for one user and period
+const AnalyticsSnapshotSchema = new mongoose.Schema({
+  userId: {
+    type: Number,
+    required: true
+  },
+  period: {
+    type: String, // 'weekly' or 'monthly'
+    enum: ['weekly', 'monthly'],
+    required: true
+  },
+  periodKey: {
+    type: String, // Week start YYYY-MM-DD or month YYYY-MM
+    required: true
+  },
+  analysis: {
+    type: mongoose.Schema.Types.Mixed,
+    default: null
+  },
+  version: {
+    type: Number, // Incremented on every refresh
+    default: 0
+  },
+  generation: {
+    type: Number, // Incremented on every invalidation
+    default: 0
+  },
+  builtFromGeneration: {
+    type: Number, // Generation the stored analysis was computed from
+    default: -1
+  },
+  stale: {
+    type: Boolean,
+    default: true
+  },
+  assessmentCount: {
+    type: Number,
+    default: 0
+  },
+  invalidatedAt: {
+    type: Date,
+    default: null
+  },
+  generatedAt: {
+    type: Date,
+    default: null
+  }
+});
+
+AnalyticsSnapshotSchema.index({ userId: 1, period: 1, periodKey: 1 }, { unique: true });
+
+module.exports = mongoose.model('AnalyticsSnapshot', AnalyticsSnapshotSchema);
@@ -39,6 +39,12 @@ const DailySummarySchema = new mongoose.Schema({
       type: String,
       default: ''
     },
+    // How the analysis was produced (full, incremental, reused, partial, unparsed, failed, ...);
+    // partial, unparsed and failed ones are never reused for a later edit
+    analysis_mode: {
+      type: String,
+      default: ''
+    },
     timestamp: {
       type: Date,
       default: Date.now
@@ -2,6 +2,8 @@ const express = require('express');
 const router = express.Router();
 const DailySummary = require('../models/DailySummary');
 const { authenticateToken } = require('../middleware/auth');
+const { invalidateAnalytics } = require('../services/analyticsPrecompute');
+const { analysisDeadline, pythonEnv, superviseProcess } = require('../services/pythonDeadline');
 
 // Create or update a daily summary
 router.post('/', authenticateToken, async (req, res) => {
@@ -94,33 +96,39 @@ router.post('/', authenticateToken, async (req, res) => {
             minute: '2-digit',
             hour12: true 
           }),
-          has_previous_analysis: existingSummary && existingSummary.aiAnalysis
+          has_previous_analysis: existingSummary && existingSummary.aiAnalysis,
+          // Previous version lets the analyzer skip or shrink re-analysis of small edits
+          previous_summary: existingSummary ? existingSummary.summary : null,
+          previous_analysis: existingSummary ? existingSummary.aiAnalysis : null
         };
         
         console.log('Step 5.1: Analysis context:', context);
         
-        const process = spawn(pythonExecutable, [
+        const deadline = analysisDeadline();
+        const pythonProcess = spawn(pythonExecutable, [
           scriptPath, 
           summary.trim(), 
           JSON.stringify(context),
           userGender || ''
         ], {
-          cwd: path.dirname(scriptPath)
+          cwd: path.dirname(scriptPath),
+          env: pythonEnv(userId, deadline)
         });
+        superviseProcess(pythonProcess, deadline, res);
         
         let output = '';
         let errorOutput = '';
         
-        process.stdout.on('data', (data) => {
+        pythonProcess.stdout.on('data', (data) => {
           output += data.toString();
         });
         
-        process.stderr.on('data', (data) => {
+        pythonProcess.stderr.on('data', (data) => {
           errorOutput += data.toString();
           console.error('Python stderr:', data.toString());
         });
         
-        process.on('close', (code) => {
+        pythonProcess.on('close', (code) => {
           if (code === 0) {
             try {
               const analysis = JSON.parse(output);
@@ -129,6 +137,7 @@ router.post('/', authenticateToken, async (req, res) => {
               console.error('Error parsing analysis:', e);
               resolve({ 
                 summary: 'Analysis completed but format unclear',
+                analysis_mode: 'unparsed',
                 mood_indicators: 'Unable to parse',
                 patterns: 'Unable to parse',
                 insights: 'Please try again later',
@@ -139,6 +148,7 @@ router.post('/', authenticateToken, async (req, res) => {
             console.error('Python script error:', errorOutput);
             resolve({ 
               summary: 'Analysis failed',
+              analysis_mode: 'failed',
               mood_indicators: 'Not available',
               patterns: 'Not available',
               insights: 'Please try again later',
@@ -160,11 +170,13 @@ router.post('/', authenticateToken, async (req, res) => {
       patterns: analysis.patterns || 'Not available',
       insights: analysis.insights || 'Please try again later',
       suggestions: analysis.suggestions || 'Continue journaling',
+      analysis_mode: analysis.analysis_mode || '',
       timestamp: new Date()
     };
     
     await dailySummary.save();
     console.log('Step 7: Summary updated with AI analysis');
+    invalidateAnalytics(userId, dailySummary.date);
 
     console.log('Step 8: Sending response to client...');
     res.status(201).json({ 
@@ -241,6 +253,13 @@ router.put('/:id', authenticateToken, async (req, res) => {
       });
     }
 
+    // Keep the previous version so the analyzer can diff against it
+    const previousSummary = await DailySummary.findOne({ _id: summaryId, userId: userId });
+
+    if (!previousSummary) {
+      return res.status(404).json({ message: 'Daily summary not found' });
+    }
+
     const dailySummary = await DailySummary.findOneAndUpdate(
       { _id: summaryId, userId: userId },
       { 
@@ -278,31 +297,36 @@ router.put('/:id', authenticateToken, async (req, res) => {
             minute: '2-digit',
             hour12: true 
           }),
-          has_previous_analysis: !!dailySummary.aiAnalysis
+          has_previous_analysis: !!dailySummary.aiAnalysis,
+          previous_summary: previousSummary.summary,
+          previous_analysis: previousSummary.aiAnalysis
         };
         
-        const process = spawn(pythonExecutable, [
+        const deadline = analysisDeadline();
+        const pythonProcess = spawn(pythonExecutable, [
           scriptPath, 
           summary.trim(), 
           JSON.stringify(context),
           userGender || ''
         ], {
-          cwd: path.dirname(scriptPath)
+          cwd: path.dirname(scriptPath),
+          env: pythonEnv(userId, deadline)
         });
+        superviseProcess(pythonProcess, deadline, res);
         
         let output = '';
         let errorOutput = '';
         
-        process.stdout.on('data', (data) => {
+        pythonProcess.stdout.on('data', (data) => {
           output += data.toString();
         });
         
-        process.stderr.on('data', (data) => {
+        pythonProcess.stderr.on('data', (data) => {
           errorOutput += data.toString();
           console.error('Python stderr:', data.toString());
         });
         
-        process.on('close', (code) => {
+        pythonProcess.on('close', (code) => {
           if (code === 0) {
             try {
               const analysis = JSON.parse(output);
@@ -311,6 +335,7 @@ router.put('/:id', authenticateToken, async (req, res) => {
               console.error('Error parsing analysis:', e);
               resolve({ 
                 summary: 'Analysis completed but format unclear',
+                analysis_mode: 'unparsed',
                 mood_indicators: 'Unable to parse',
                 patterns: 'Unable to parse',
                 insights: 'Please try again later',
@@ -321,6 +346,7 @@ router.put('/:id', authenticateToken, async (req, res) => {
             console.error('Python script error:', errorOutput);
             resolve({ 
               summary: 'Analysis failed',
+              analysis_mode: 'failed',
               mood_indicators: 'Not available',
               patterns: 'Not available',
               insights: 'Please try again later',
@@ -340,10 +366,12 @@ router.put('/:id', authenticateToken, async (req, res) => {
       patterns: analysis.patterns || 'Not available',
       insights: analysis.insights || 'Please try again later',
       suggestions: analysis.suggestions || 'Continue journaling',
+      analysis_mode: analysis.analysis_mode || '',
       timestamp: new Date()
     };
     
     await dailySummary.save();
+    invalidateAnalytics(userId, dailySummary.date);
 
     res.json({ 
       message: 'Daily summary updated and re-analyzed successfully', 
@@ -370,6 +398,7 @@ router.delete('/:id', authenticateToken, async (req, res) => {
     if (!dailySummary) {
       return res.status(404).json({ message: 'Daily summary not found' });
     }
+    invalidateAnalytics(userId, dailySummary.date);
 
     res.json({ 
       message: 'Daily summary deleted successfully' 
@@ -2,8 +2,11 @@ const express = require('express');
 const { spawn } = require('child_process');
 const path = require('path');
 const MentalHealthAssessment = require('../models/MentalHealthAssessment');
+const DailySummary = require('../models/DailySummary');
 const { authenticateToken } = require('../middleware/auth');
 const { getDatabase } = require('../config/database');
+const { weeklyRange, monthlyRange, loadPeriodData, getPeriodAnalysis, invalidateAnalytics } = require('../services/analyticsPrecompute');
+const { analysisDeadline, pythonEnv, superviseProcess } = require('../services/pythonDeadline');
 
 const router = express.Router();
 
@@ -12,6 +15,9 @@ router.post('/assessment', authenticateToken, async (req, res) => {
   try {
     console.log('=== STARTING MENTAL HEALTH ASSESSMENT ===');
     const { answers } = req.body;
+    // A daily summary sent with the check-in is analyzed together with it in one call
+    const legacySummary = (answers.wantsSummary === true || answers.wantsSummary === 'yes') ? answers.todaySummary : null;
+    const submittedSummary = (req.body.dailySummary || legacySummary || '').trim();
     const userId = req.user.user_id; // Get authenticated user's ID
 
     console.log('Received assessment data:', { answers, userId });
@@ -77,16 +83,30 @@ router.post('/assessment', authenticateToken, async (req, res) => {
     console.log('Step 2: Fetching daily summary...');
     const today = new Date().toISOString().split('T')[0];
     let dailySummary = null;
+    let summaryRecord = null;
+    let summaryContext = null;
     
     try {
-      const DailySummary = require('../models/DailySummary');
       console.log('Step 2.1: Looking for daily summary for date:', today);
       const summary = await DailySummary.findOne({
         userId: userId,
         date: today
       });
       
-      if (summary) {
+      if (submittedSummary) {
+        // Save the submitted summary now; its analysis comes back with the assessment
+        summaryContext = {
+          is_synthetic: false,
+          is_edit: !!summary,
+          time_of_day: new Date().toLocaleTimeString('en-US', { hour: 'numeric', minute: '2-digit', hour12: true }),
+          has_previous_analysis: !!(summary && summary.aiAnalysis && summary.aiAnalysis.summary)
+        };
+        summaryRecord = summary || new DailySummary({ userId: userId, date: today, isSynthetic: false });
+        summaryRecord.summary = submittedSummary;
+        await summaryRecord.save();
+        dailySummary = submittedSummary;
+        console.log('Step 2.1: Saved daily summary submitted with the assessment');
+      } else if (summary) {
         dailySummary = summary.summary;
         console.log('Step 2.1: Found daily summary for analysis:', dailySummary);
       } else {
@@ -107,12 +127,19 @@ router.post('/assessment', authenticateToken, async (req, res) => {
 
     // Call Python AI analysis script with both answers and daily summary
     console.log('Step 4: Preparing AI analysis data...');
-    const pythonScriptPath = path.join(__dirname, '../../AI_ENV/analyze_mental_health.py');
+    // A freshly submitted summary is analyzed in the same Gemini call as the check-in
+    const fused = !!summaryRecord;
+    const pythonScriptPath = path.join(__dirname, fused
+      ? '../../AI_ENV/analyze_assessment_summary.py'
+      : '../../AI_ENV/analyze_mental_health.py');
     const analysisData = {
       answers: answers,
       dailySummary: dailySummary,
       userGender: userGender
     };
+    if (fused) {
+      analysisData.summaryContext = summaryContext;
+    }
     const analysisDataJson = JSON.stringify(analysisData);
     console.log('Step 4: Analysis data prepared:', { 
       hasAnswers: !!analysisData.answers, 
@@ -132,9 +159,12 @@ router.post('/assessment', authenticateToken, async (req, res) => {
     console.log('Step 5: Working directory:', path.dirname(pythonScriptPath));
     
     console.log('Step 6: Starting Python AI analysis process...');
+    const deadline = analysisDeadline();
     const pythonProcess = spawn(pythonExecutable, [pythonScriptPath, analysisDataJson], {
-      cwd: path.dirname(pythonScriptPath)
+      cwd: path.dirname(pythonScriptPath),
+      env: pythonEnv(userId, deadline)
     });
+    superviseProcess(pythonProcess, deadline, res);
 
     let aiResponse = '';
     let errorOutput = '';
@@ -170,6 +200,11 @@ router.post('/assessment', authenticateToken, async (req, res) => {
         } else {
           aiAnalysis = aiResponse;
         }
+        let summaryAnalysis = null;
+        if (fused) {
+          summaryAnalysis = aiAnalysis.summaryAnalysis;
+          aiAnalysis = aiAnalysis.assessment || {};
+        }
         console.log('Step 8: AI analysis parsed successfully:', {
           hasSummary: !!aiAnalysis.summary,
           riskLevel: aiAnalysis.riskLevel,
@@ -190,6 +225,22 @@ router.post('/assessment', authenticateToken, async (req, res) => {
         });
         console.log('Step 9: Assessment record created with ID:', assessmentId);
 
+        if (summaryAnalysis) {
+          console.log('Step 9.1: Storing daily summary analysis...');
+          summaryRecord.aiAnalysis = {
+            summary: summaryAnalysis.summary || 'Analysis completed',
+            mood_indicators: summaryAnalysis.mood_indicators || 'Not available',
+            patterns: summaryAnalysis.patterns || 'Not available',
+            insights: summaryAnalysis.insights || 'Please try again later',
+            suggestions: summaryAnalysis.suggestions || 'Continue journaling',
+            timestamp: new Date()
+          };
+          await summaryRecord.save();
+        }
+
+        // Refresh this week's and month's analytics in the background
+        invalidateAnalytics(userId, new Date());
+
         console.log('Step 10: Sending response to client...');
         res.json({
           message: 'Assessment completed successfully',
@@ -203,7 +254,8 @@ router.post('/assessment', authenticateToken, async (req, res) => {
               timestamp: new Date()
             },
             createdAt: new Date()
-          }
+          },
+          ...(fused && { dailySummary: summaryRecord, summaryAnalysis: summaryAnalysis })
         });
         console.log('=== MENTAL HEALTH ASSESSMENT COMPLETED SUCCESSFULLY ===');
 
@@ -384,55 +436,25 @@ router.get('/analytics/weekly', authenticateToken, async (req, res) => {
     const { weekStart } = req.query; // Format: YYYY-MM-DD
     
     // Calculate week start and end dates
-    const startDate = weekStart ? new Date(weekStart) : getWeekStart(new Date());
-    const endDate = new Date(startDate);
-    endDate.setDate(startDate.getDate() + 6);
-    endDate.setHours(23, 59, 59, 999);
+    const range = weeklyRange(new Date(), weekStart);
+    const { startDate, endDate } = range;
     
-    // Get assessments for the week
-    const db = await getDatabase();
-    const [rows] = await db.query(
-      `SELECT * FROM MentalHealthAssessments 
-       WHERE user_id = ${userId} 
-       AND created_at >= '${startDate.toISOString()}' 
-       AND created_at <= '${endDate.toISOString()}'
-       ORDER BY created_at ASC`
-    );
-    
-    const assessments = rows.map(row => ({
-      id: row.id,
-      userId: row.user_id,
-      answers: typeof row.answers === 'string' ? JSON.parse(row.answers) : row.answers,
-      aiAnalysis: typeof row.ai_analysis === 'string' ? JSON.parse(row.ai_analysis) : row.ai_analysis,
-      createdAt: row.created_at,
-      updatedAt: row.updated_at
-    }));
-    
-    // Get daily summaries for the week
-    const DailySummary = require('../models/DailySummary');
-    const summaries = await DailySummary.find({
-      userId: userId,
-      date: {
-        $gte: startDate.toISOString().split('T')[0],
-        $lte: endDate.toISOString().split('T')[0]
-      }
-    }).sort({ date: 1 });
-    
-    // Get user gender for AI analysis
-    const User = require('../models/User');
-    const user = await User.findById(userId);
-    const userGender = user ? user.gender : null;
+    // Get assessments, daily summaries and gender for the week
+    const data = await loadPeriodData(userId, startDate, endDate);
 
-    // Generate AI analysis for the week
-    const weeklyAnalysis = await generateWeeklyAnalysis(assessments, summaries, userGender);
+    // Serve the precomputed analysis, computing it only on first access
+    const weeklyAnalysis = await getPeriodAnalysis(userId, 'weekly', range, data);
     
     res.json({
       message: 'Weekly analytics retrieved successfully',
       weekStart: startDate.toISOString().split('T')[0],
       weekEnd: endDate.toISOString().split('T')[0],
-      assessments,
-      summaries,
-      analytics: weeklyAnalysis
+      assessments: data.assessments,
+      summaries: data.summaries,
+      analytics: weeklyAnalysis.analysis,
+      analyticsStatus: weeklyAnalysis.status,
+      analyticsVersion: weeklyAnalysis.version,
+      analyticsGeneratedAt: weeklyAnalysis.generatedAt
     });
     
   } catch (error) {
@@ -453,45 +475,14 @@ router.get('/analytics/monthly', authenticateToken, async (req, res) => {
     // Calculate month start and end dates
     const targetMonth = month ? parseInt(month) - 1 : new Date().getMonth(); // 0-based
     const targetYear = year ? parseInt(year) : new Date().getFullYear();
-    const startDate = new Date(targetYear, targetMonth, 1);
-    const endDate = new Date(targetYear, targetMonth + 1, 0, 23, 59, 59, 999);
-    
-    // Get assessments for the month
-    const db = await getDatabase();
-    const [rows] = await db.query(
-      `SELECT * FROM MentalHealthAssessments 
-       WHERE user_id = ${userId} 
-       AND created_at >= '${startDate.toISOString()}' 
-       AND created_at <= '${endDate.toISOString()}'
-       ORDER BY created_at ASC`
-    );
+    const range = monthlyRange(targetYear, targetMonth);
+    const { startDate, endDate } = range;
     
-    const assessments = rows.map(row => ({
-      id: row.id,
-      userId: row.user_id,
-      answers: typeof row.answers === 'string' ? JSON.parse(row.answers) : row.answers,
-      aiAnalysis: typeof row.ai_analysis === 'string' ? JSON.parse(row.ai_analysis) : row.ai_analysis,
-      createdAt: row.created_at,
-      updatedAt: row.updated_at
-    }));
-    
-    // Get daily summaries for the month
-    const DailySummary = require('../models/DailySummary');
-    const summaries = await DailySummary.find({
-      userId: userId,
-      date: {
-        $gte: startDate.toISOString().split('T')[0],
-        $lte: endDate.toISOString().split('T')[0]
-      }
-    }).sort({ date: 1 });
-    
-    // Get user gender for AI analysis
-    const User = require('../models/User');
-    const user = await User.findById(userId);
-    const userGender = user ? user.gender : null;
+    // Get assessments, daily summaries and gender for the month
+    const data = await loadPeriodData(userId, startDate, endDate);
 
-    // Generate AI analysis for the month
-    const monthlyAnalysis = await generateMonthlyAnalysis(assessments, summaries, userGender);
+    // Serve the precomputed analysis, computing it only on first access
+    const monthlyAnalysis = await getPeriodAnalysis(userId, 'monthly', range, data);
     
     res.json({
       message: 'Monthly analytics retrieved successfully',
@@ -499,9 +490,12 @@ router.get('/analytics/monthly', authenticateToken, async (req, res) => {
       year: targetYear,
       monthStart: startDate.toISOString().split('T')[0],
       monthEnd: endDate.toISOString().split('T')[0],
-      assessments,
-      summaries,
-      analytics: monthlyAnalysis
+      assessments: data.assessments,
+      summaries: data.summaries,
+      analytics: monthlyAnalysis.analysis,
+      analyticsStatus: monthlyAnalysis.status,
+      analyticsVersion: monthlyAnalysis.version,
+      analyticsGeneratedAt: monthlyAnalysis.generatedAt
     });
     
   } catch (error) {
@@ -513,216 +507,6 @@ router.get('/analytics/monthly', authenticateToken, async (req, res) => {
   }
 });
 
-// Helper function to get week start (Monday)
-function getWeekStart(date) {
-  const d = new Date(date);
-  const day = d.getDay();
-  const diff = d.getDate() - day + (day === 0 ? -6 : 1); // Adjust when day is Sunday
-  return new Date(d.setDate(diff));
-}
-
-// Generate weekly analysis using AI
-async function generateWeeklyAnalysis(assessments, summaries, userGender = null) {
-  if (assessments.length === 0) {
-    return {
-      summary: "No assessments available for this week.",
-      trends: "No data to analyze.",
-      insights: "Start taking daily assessments to see your weekly health trends.",
-      recommendations: "Consider taking daily mental health assessments to track your progress.",
-      riskLevel: "Unknown",
-      moodTrend: "No data",
-      stressTrend: "No data",
-      sleepTrend: "No data",
-      energyTrend: "No data"
-    };
-  }
-  
-  try {
-    const { spawn } = require('child_process');
-    const path = require('path');
-    
-    const analysisData = {
-      assessments: assessments,
-      summaries: summaries,
-      period: 'weekly',
-      userGender: userGender
-    };
-    
-    const pythonScriptPath = path.join(__dirname, '../../AI_ENV/analyze_weekly_monthly.py');
-    // Use virtual environment Python from 'Scripts' directory (Windows)
-    const pythonExecutable = path.join(__dirname, '../../AI_ENV/venv/Scripts/python.exe');
-    const analysisDataJson = JSON.stringify(analysisData);
-    
-    return new Promise((resolve, reject) => {
-      const pythonProcess = spawn(pythonExecutable, [pythonScriptPath, analysisDataJson], {
-        cwd: path.dirname(pythonScriptPath)
-      });
-      
-      let aiResponse = '';
-      let errorOutput = '';
-      
-      pythonProcess.stdout.on('data', (data) => {
-        aiResponse += data.toString();
-      });
-      
-      pythonProcess.stderr.on('data', (data) => {
-        errorOutput += data.toString();
-        console.error('Python stderr:', data.toString());
-      });
-      
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          console.error('Python script error:', errorOutput);
-          resolve({
-            summary: "Analysis completed with some issues.",
-            trends: "Unable to generate trends analysis.",
-            insights: "Please try again later.",
-            recommendations: "Continue taking daily assessments.",
-            riskLevel: "Unknown",
-            moodTrend: "No data",
-            stressTrend: "No data",
-            sleepTrend: "No data",
-            energyTrend: "No data"
-          });
-          return;
-        }
-        
-        try {
-          const analysis = JSON.parse(aiResponse);
-          resolve(analysis);
-        } catch (parseError) {
-          console.error('Error parsing weekly analysis:', parseError);
-          resolve({
-            summary: "Analysis completed but format unclear.",
-            trends: "Unable to parse trends data.",
-            insights: "Please try again later.",
-            recommendations: "Continue taking daily assessments.",
-            riskLevel: "Unknown",
-            moodTrend: "No data",
-            stressTrend: "No data",
-            sleepTrend: "No data",
-            energyTrend: "No data"
-          });
-        }
-      });
-    });
-  } catch (error) {
-    console.error('Error generating weekly analysis:', error);
-    return {
-      summary: "Unable to generate analysis at this time.",
-      trends: "Analysis unavailable.",
-      insights: "Please try again later.",
-      recommendations: "Continue taking daily assessments.",
-      riskLevel: "Unknown",
-      moodTrend: "No data",
-      stressTrend: "No data",
-      sleepTrend: "No data",
-      energyTrend: "No data"
-    };
-  }
-}
-
-// Generate monthly analysis using AI
-async function generateMonthlyAnalysis(assessments, summaries, userGender = null) {
-  if (assessments.length === 0) {
-    return {
-      summary: "No assessments available for this month.",
-      trends: "No data to analyze.",
-      insights: "Start taking daily assessments to see your monthly health trends.",
-      recommendations: "Consider taking daily mental health assessments to track your progress.",
-      riskLevel: "Unknown",
-      moodTrend: "No data",
-      stressTrend: "No data",
-      sleepTrend: "No data",
-      energyTrend: "No data"
-    };
-  }
-  
-  try {
-    const { spawn } = require('child_process');
-    const path = require('path');
-    
-    const analysisData = {
-      assessments: assessments,
-      summaries: summaries,
-      period: 'monthly',
-      userGender: userGender
-    };
-    
-    const pythonScriptPath = path.join(__dirname, '../../AI_ENV/analyze_weekly_monthly.py');
-    // Use virtual environment Python from 'Scripts' directory (Windows)
-    const pythonExecutable = path.join(__dirname, '../../AI_ENV/venv/Scripts/python.exe');
-    const analysisDataJson = JSON.stringify(analysisData);
-    
-    return new Promise((resolve, reject) => {
-      const pythonProcess = spawn(pythonExecutable, [pythonScriptPath, analysisDataJson], {
-        cwd: path.dirname(pythonScriptPath)
-      });
-      
-      let aiResponse = '';
-      let errorOutput = '';
-      
-      pythonProcess.stdout.on('data', (data) => {
-        aiResponse += data.toString();
-      });
-      
-      pythonProcess.stderr.on('data', (data) => {
-        errorOutput += data.toString();
-        console.error('Python stderr:', data.toString());
-      });
-      
-      pythonProcess.on('close', (code) => {
-        if (code !== 0) {
-          console.error('Python script error:', errorOutput);
-          resolve({
-            summary: "Analysis completed with some issues.",
-            trends: "Unable to generate trends analysis.",
-            insights: "Please try again later.",
-            recommendations: "Continue taking daily assessments.",
-            riskLevel: "Unknown",
-            moodTrend: "No data",
-            stressTrend: "No data",
-            sleepTrend: "No data",
-            energyTrend: "No data"
-          });
-          return;
-        }
-        
-        try {
-          const analysis = JSON.parse(aiResponse);
-          resolve(analysis);
-        } catch (parseError) {
-          console.error('Error parsing monthly analysis:', parseError);
-          resolve({
-            summary: "Analysis completed but format unclear.",
-            trends: "Unable to parse trends data.",
-            insights: "Please try again later.",
-            recommendations: "Continue taking daily assessments.",
-            riskLevel: "Unknown",
-            moodTrend: "No data",
-            stressTrend: "No data",
-            sleepTrend: "No data",
-            energyTrend: "No data"
-          });
-        }
-      });
-    });
-  } catch (error) {
-    console.error('Error generating monthly analysis:', error);
-    return {
-      summary: "Unable to generate analysis at this time.",
-      trends: "Analysis unavailable.",
-      insights: "Please try again later.",
-      recommendations: "Continue taking daily assessments.",
-      riskLevel: "Unknown",
-      moodTrend: "No data",
-      stressTrend: "No data",
-      sleepTrend: "No data",
-      energyTrend: "No data"
-    };
-  }
-}
-
 // Download comprehensive report
 router.get('/download-report', authenticateToken, async (req, res) => {
   try {
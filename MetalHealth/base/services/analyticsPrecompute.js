@@ -0,0 +1,658 @@
+const { getDatabase } = require('../config/database');
+const AnalyticsSnapshot = require('../models/AnalyticsSnapshot');
+const { BACKGROUND_TIMEOUT_MS, analysisDeadline, pythonEnv, superviseProcess } = require('./pythonDeadline');
+
+// Bursts of new assessments/summaries within this window trigger a single refresh
+const DEBOUNCE_MS = parseInt(process.env.ANALYTICS_DEBOUNCE_MS || '30000', 10);
+// Let combined refreshes read assessments and summaries in the Python script
+// (analytics_sources.py) instead of loading and serializing them here
+const DIRECT_READ = process.env.ANALYTICS_DIRECT_READ === 'true';
+
+const pendingRefreshes = new Map(); // snapshot key -> debounce timer
+const runningRefreshes = new Map(); // snapshot key -> refresh promise
+
+// Helper function to get week start (Monday)
+function getWeekStart(date) {
+  const d = new Date(date);
+  const day = d.getDay();
+  const diff = d.getDate() - day + (day === 0 ? -6 : 1); // Adjust when day is Sunday
+  return new Date(d.setDate(diff));
+}
+
+// Generate weekly analysis using AI
+async function generateWeeklyAnalysis(assessments, summaries, userGender = null) {
+  if (assessments.length === 0) {
+    return {
+      summary: "No assessments available for this week.",
+      trends: "No data to analyze.",
+      insights: "Start taking daily assessments to see your weekly health trends.",
+      recommendations: "Consider taking daily mental health assessments to track your progress.",
+      riskLevel: "Unknown",
+      moodTrend: "No data",
+      stressTrend: "No data",
+      sleepTrend: "No data",
+      energyTrend: "No data"
+    };
+  }
+  
+  try {
+    const { spawn } = require('child_process');
+    const path = require('path');
+    
+    const analysisData = {
+      assessments: assessments,
+      summaries: summaries,
+      period: 'weekly',
+      userGender: userGender
+    };
+    
+    const pythonScriptPath = path.join(__dirname, '../../AI_ENV/analyze_weekly_monthly.py');
+    // Use virtual environment Python from 'Scripts' directory (Windows)
+    const pythonExecutable = path.join(__dirname, '../../AI_ENV/venv/Scripts/python.exe');
+    const analysisDataJson = JSON.stringify(analysisData);
+    
+    return new Promise((resolve, reject) => {
+      const deadline = analysisDeadline(BACKGROUND_TIMEOUT_MS);
+      const pythonProcess = spawn(pythonExecutable, [pythonScriptPath, analysisDataJson], {
+        cwd: path.dirname(pythonScriptPath),
+        // Attributes token usage in the AI_ENV usage ledger
+        env: pythonEnv(assessments[0].userId, deadline)
+      });
+      superviseProcess(pythonProcess, deadline);
+      
+      let aiResponse = '';
+      let errorOutput = '';
+      
+      pythonProcess.stdout.on('data', (data) => {
+        aiResponse += data.toString();
+      });
+      
+      pythonProcess.stderr.on('data', (data) => {
+        errorOutput += data.toString();
+        console.error('Python stderr:', data.toString());
+      });
+      
+      pythonProcess.on('close', (code) => {
+        if (code !== 0) {
+          console.error('Python script error:', errorOutput);
+          resolve({
+            summary: "Analysis completed with some issues.",
+            trends: "Unable to generate trends analysis.",
+            insights: "Please try again later.",
+            recommendations: "Continue taking daily assessments.",
+            riskLevel: "Unknown",
+            moodTrend: "No data",
+            stressTrend: "No data",
+            sleepTrend: "No data",
+            energyTrend: "No data"
+          });
+          return;
+        }
+        
+        try {
+          const analysis = JSON.parse(aiResponse);
+          resolve(analysis);
+        } catch (parseError) {
+          console.error('Error parsing weekly analysis:', parseError);
+          resolve({
+            summary: "Analysis completed but format unclear.",
+            trends: "Unable to parse trends data.",
+            insights: "Please try again later.",
+            recommendations: "Continue taking daily assessments.",
+            riskLevel: "Unknown",
+            moodTrend: "No data",
+            stressTrend: "No data",
+            sleepTrend: "No data",
+            energyTrend: "No data"
+          });
+        }
+      });
+    });
+  } catch (error) {
+    console.error('Error generating weekly analysis:', error);
+    return {
+      summary: "Unable to generate analysis at this time.",
+      trends: "Analysis unavailable.",
+      insights: "Please try again later.",
+      recommendations: "Continue taking daily assessments.",
+      riskLevel: "Unknown",
+      moodTrend: "No data",
+      stressTrend: "No data",
+      sleepTrend: "No data",
+      energyTrend: "No data"
+    };
+  }
+}
+
+// Generate monthly analysis using AI
+async function generateMonthlyAnalysis(assessments, summaries, userGender = null) {
+  if (assessments.length === 0) {
+    return {
+      summary: "No assessments available for this month.",
+      trends: "No data to analyze.",
+      insights: "Start taking daily assessments to see your monthly health trends.",
+      recommendations: "Consider taking daily mental health assessments to track your progress.",
+      riskLevel: "Unknown",
+      moodTrend: "No data",
+      stressTrend: "No data",
+      sleepTrend: "No data",
+      energyTrend: "No data"
+    };
+  }
+  
+  try {
+    const { spawn } = require('child_process');
+    const path = require('path');
+    
+    const analysisData = {
+      assessments: assessments,
+      summaries: summaries,
+      period: 'monthly',
+      userGender: userGender
+    };
+    
+    const pythonScriptPath = path.join(__dirname, '../../AI_ENV/analyze_weekly_monthly.py');
+    // Use virtual environment Python from 'Scripts' directory (Windows)
+    const pythonExecutable = path.join(__dirname, '../../AI_ENV/venv/Scripts/python.exe');
+    const analysisDataJson = JSON.stringify(analysisData);
+    
+    return new Promise((resolve, reject) => {
+      const deadline = analysisDeadline(BACKGROUND_TIMEOUT_MS);
+      const pythonProcess = spawn(pythonExecutable, [pythonScriptPath, analysisDataJson], {
+        cwd: path.dirname(pythonScriptPath),
+        // Attributes token usage in the AI_ENV usage ledger
+        env: pythonEnv(assessments[0].userId, deadline)
+      });
+      superviseProcess(pythonProcess, deadline);
+      
+      let aiResponse = '';
+      let errorOutput = '';
+      
+      pythonProcess.stdout.on('data', (data) => {
+        aiResponse += data.toString();
+      });
+      
+      pythonProcess.stderr.on('data', (data) => {
+        errorOutput += data.toString();
+        console.error('Python stderr:', data.toString());
+      });
+      
+      pythonProcess.on('close', (code) => {
+        if (code !== 0) {
+          console.error('Python script error:', errorOutput);
+          resolve({
+            summary: "Analysis completed with some issues.",
+            trends: "Unable to generate trends analysis.",
+            insights: "Please try again later.",
+            recommendations: "Continue taking daily assessments.",
+            riskLevel: "Unknown",
+            moodTrend: "No data",
+            stressTrend: "No data",
+            sleepTrend: "No data",
+            energyTrend: "No data"
+          });
+          return;
+        }
+        
+        try {
+          const analysis = JSON.parse(aiResponse);
+          resolve(analysis);
+        } catch (parseError) {
+          console.error('Error parsing monthly analysis:', parseError);
+          resolve({
+            summary: "Analysis completed but format unclear.",
+            trends: "Unable to parse trends data.",
+            insights: "Please try again later.",
+            recommendations: "Continue taking daily assessments.",
+            riskLevel: "Unknown",
+            moodTrend: "No data",
+            stressTrend: "No data",
+            sleepTrend: "No data",
+            energyTrend: "No data"
+          });
+        }
+      });
+    });
+  } catch (error) {
+    console.error('Error generating monthly analysis:', error);
+    return {
+      summary: "Unable to generate analysis at this time.",
+      trends: "Analysis unavailable.",
+      insights: "Please try again later.",
+      recommendations: "Continue taking daily assessments.",
+      riskLevel: "Unknown",
+      moodTrend: "No data",
+      stressTrend: "No data",
+      sleepTrend: "No data",
+      energyTrend: "No data"
+    };
+  }
+}
+
+// Placeholder analysis when a run fails or its output cannot be read
+function unavailableAnalysis(summary, trends) {
+  return {
+    summary,
+    trends,
+    insights: "Please try again later.",
+    recommendations: "Continue taking daily assessments.",
+    riskLevel: "Unknown",
+    moodTrend: "No data",
+    stressTrend: "No data",
+    sleepTrend: "No data",
+    energyTrend: "No data"
+  };
+}
+
+// Generate the weekly and monthly analyses in one Python run. `assessments` and
+// `summaries` cover both ranges; the script splits them, computes both periods'
+// statistics in one pass and makes the two Gemini calls concurrently. With
+// `assessments` null the script reads the user's data over both ranges itself.
+// Resolves to { weekly, monthly, assessmentCounts }.
+async function generateCombinedAnalysis(userId, assessments, summaries, userGender, ranges) {
+  if (assessments && assessments.length === 0) {
+    return {
+      weekly: await generateWeeklyAnalysis(assessments, summaries, userGender),
+      monthly: await generateMonthlyAnalysis(assessments, summaries, userGender),
+      assessmentCounts: { weekly: 0, monthly: 0 }
+    };
+  }
+
+  const { spawn } = require('child_process');
+  const path = require('path');
+
+  const isoRange = ({ startDate, endDate }) => ({ start: startDate.toISOString(), end: endDate.toISOString() });
+  const analysisData = {
+    period: 'both',
+    ranges: { weekly: isoRange(ranges.weekly), monthly: isoRange(ranges.monthly) },
+    userGender: userGender
+  };
+  if (assessments) {
+    analysisData.assessments = assessments;
+    analysisData.summaries = summaries;
+  } else {
+    analysisData.source = { userId };
+  }
+  const failed = (summary, trends) => ({
+    weekly: unavailableAnalysis(summary, trends),
+    monthly: unavailableAnalysis(summary, trends),
+    assessmentCounts: null
+  });
+
+  const pythonScriptPath = path.join(__dirname, '../../AI_ENV/analyze_weekly_monthly.py');
+  // Use virtual environment Python from 'Scripts' directory (Windows)
+  const pythonExecutable = path.join(__dirname, '../../AI_ENV/venv/Scripts/python.exe');
+
+  return new Promise((resolve) => {
+    const deadline = analysisDeadline(BACKGROUND_TIMEOUT_MS);
+    const pythonProcess = spawn(pythonExecutable, [pythonScriptPath, JSON.stringify(analysisData)], {
+      cwd: path.dirname(pythonScriptPath),
+      // Attributes token usage in the AI_ENV usage ledger
+      env: pythonEnv(userId, deadline)
+    });
+    superviseProcess(pythonProcess, deadline);
+
+    let aiResponse = '';
+    let errorOutput = '';
+
+    pythonProcess.stdout.on('data', (data) => {
+      aiResponse += data.toString();
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      errorOutput += data.toString();
+      console.error('Python stderr:', data.toString());
+    });
+
+    pythonProcess.on('error', (error) => {
+      console.error('Error generating combined analysis:', error);
+      resolve(failed("Unable to generate analysis at this time.", "Analysis unavailable."));
+    });
+
+    pythonProcess.on('close', (code) => {
+      if (code !== 0) {
+        console.error('Python script error:', errorOutput);
+        resolve(failed("Analysis completed with some issues.", "Unable to generate trends analysis."));
+        return;
+      }
+
+      try {
+        const result = JSON.parse(aiResponse);
+        if (!result.weekly || !result.monthly) {
+          throw new Error(result.error || 'missing period analyses');
+        }
+        resolve(result);
+      } catch (parseError) {
+        console.error('Error parsing combined analysis:', parseError);
+        resolve(failed("Analysis completed but format unclear.", "Unable to parse trends data."));
+      }
+    });
+  });
+}
+
+// Query range and snapshot key of the week containing `date`, or starting at `weekStart`
+function weeklyRange(date, weekStart = null) {
+  const startDate = weekStart ? new Date(weekStart) : getWeekStart(date);
+  const endDate = new Date(startDate);
+  endDate.setDate(startDate.getDate() + 6);
+  endDate.setHours(23, 59, 59, 999);
+  return { startDate, endDate, periodKey: startDate.toISOString().split('T')[0] };
+}
+
+// Query range and snapshot key of a month (0-based month)
+function monthlyRange(targetYear, targetMonth) {
+  const startDate = new Date(targetYear, targetMonth, 1);
+  const endDate = new Date(targetYear, targetMonth + 1, 0, 23, 59, 59, 999);
+  const periodKey = `${targetYear}-${String(targetMonth + 1).padStart(2, '0')}`;
+  return { startDate, endDate, periodKey };
+}
+
+function periodRange(period, date) {
+  return period === 'weekly'
+    ? weeklyRange(date)
+    : monthlyRange(date.getFullYear(), date.getMonth());
+}
+
+// Load the assessments, summaries and gender an analysis is computed from
+async function loadPeriodData(userId, startDate, endDate) {
+  const db = await getDatabase();
+  const [rows] = await db.query(
+    `SELECT * FROM MentalHealthAssessments 
+     WHERE user_id = ${userId} 
+     AND created_at >= '${startDate.toISOString()}' 
+     AND created_at <= '${endDate.toISOString()}'
+     ORDER BY created_at ASC`
+  );
+
+  const assessments = rows.map(row => ({
+    id: row.id,
+    userId: row.user_id,
+    answers: typeof row.answers === 'string' ? JSON.parse(row.answers) : row.answers,
+    aiAnalysis: typeof row.ai_analysis === 'string' ? JSON.parse(row.ai_analysis) : row.ai_analysis,
+    createdAt: row.created_at,
+    updatedAt: row.updated_at
+  }));
+
+  const DailySummary = require('../models/DailySummary');
+  const summaries = await DailySummary.find({
+    userId: userId,
+    date: {
+      $gte: startDate.toISOString().split('T')[0],
+      $lte: endDate.toISOString().split('T')[0]
+    }
+  }).sort({ date: 1 });
+
+  const userGender = await loadUserGender(userId);
+
+  return { assessments, summaries, userGender };
+}
+
+async function loadUserGender(userId) {
+  const User = require('../models/User');
+  const user = await User.findById(userId);
+  return user ? user.gender : null;
+}
+
+function snapshotKey(userId, period, periodKey) {
+  return `${userId}:${period}:${periodKey}`;
+}
+
+async function getSnapshot(userId, period, periodKey) {
+  return AnalyticsSnapshot.findOne({ userId, period, periodKey }).lean();
+}
+
+// Claim a snapshot for recomputation; returns the generation the result will be built from
+async function beginSnapshot(userId, period, range) {
+  const current = await AnalyticsSnapshot.findOneAndUpdate(
+    { userId, period, periodKey: range.periodKey },
+    { $setOnInsert: { generation: 0 } },
+    { upsert: true, new: true }
+  ).lean();
+  return current.generation;
+}
+
+// Store a computed analysis. Returns the saved snapshot and whether it was
+// invalidated while computing (and so is still stale).
+async function storeSnapshot(userId, period, range, generation, analysis, assessmentCount) {
+  const filter = { userId, period, periodKey: range.periodKey };
+  // Only clear the stale flag if nothing was invalidated while computing
+  const update = {
+    $set: {
+      analysis,
+      assessmentCount,
+      generatedAt: new Date(),
+      builtFromGeneration: generation
+    },
+    $inc: { version: 1 }
+  };
+  const saved = await AnalyticsSnapshot.findOneAndUpdate(
+    { ...filter, generation },
+    { ...update, $set: { ...update.$set, stale: false } },
+    { new: true }
+  ).lean();
+  if (saved) {
+    return { snapshot: saved, stale: false };
+  }
+
+  const newer = await AnalyticsSnapshot.findOneAndUpdate(filter, update, { new: true }).lean();
+  return { snapshot: newer, stale: true };
+}
+
+// Recompute and store one snapshot. `data` may be passed when the caller already loaded it.
+async function refreshSnapshot(userId, period, range, data = null) {
+  const key = snapshotKey(userId, period, range.periodKey);
+  if (runningRefreshes.has(key)) {
+    const snapshot = await runningRefreshes.get(key);
+    if (!snapshot) {
+      throw new Error(`Analytics refresh failed for ${key}`);
+    }
+    return snapshot;
+  }
+
+  const refresh = (async () => {
+    const generation = await beginSnapshot(userId, period, range);
+
+    const { assessments, summaries, userGender } = data || await loadPeriodData(userId, range.startDate, range.endDate);
+    const analysis = period === 'weekly'
+      ? await generateWeeklyAnalysis(assessments, summaries, userGender)
+      : await generateMonthlyAnalysis(assessments, summaries, userGender);
+
+    const { snapshot, stale } = await storeSnapshot(userId, period, range, generation, analysis, assessments.length);
+    if (stale) {
+      scheduleRefresh(userId, period, range);
+    }
+    return snapshot;
+  })();
+
+  runningRefreshes.set(key, refresh);
+  try {
+    return await refresh;
+  } finally {
+    runningRefreshes.delete(key);
+  }
+}
+
+// Recompute the week and month snapshots from one data load and one Python run.
+// Single-period refreshes of either snapshot wait for this one while it runs.
+async function refreshCombinedSnapshots(userId, ranges) {
+  const keys = {
+    weekly: snapshotKey(userId, 'weekly', ranges.weekly.periodKey),
+    monthly: snapshotKey(userId, 'monthly', ranges.monthly.periodKey)
+  };
+  if (runningRefreshes.has(keys.weekly) || runningRefreshes.has(keys.monthly)) {
+    // A refresh already running may predate the invalidation, so come back after it
+    scheduleCombinedRefresh(userId, ranges);
+    return null;
+  }
+
+  const refresh = (async () => {
+    const generations = {
+      weekly: await beginSnapshot(userId, 'weekly', ranges.weekly),
+      monthly: await beginSnapshot(userId, 'monthly', ranges.monthly)
+    };
+
+    // The week may start in the previous month, so load the union of both ranges
+    const startDate = new Date(Math.min(ranges.weekly.startDate, ranges.monthly.startDate));
+    const endDate = new Date(Math.max(ranges.weekly.endDate, ranges.monthly.endDate));
+    const { assessments, summaries, userGender } = DIRECT_READ
+      ? { assessments: null, summaries: null, userGender: await loadUserGender(userId) }
+      : await loadPeriodData(userId, startDate, endDate);
+    const result = await generateCombinedAnalysis(userId, assessments, summaries, userGender, ranges);
+
+    const snapshots = {};
+    let stale = false;
+    for (const period of ['weekly', 'monthly']) {
+      const range = ranges[period];
+      const count = result.assessmentCounts
+        ? result.assessmentCounts[period]
+        : (assessments || []).filter(a => new Date(a.createdAt) >= range.startDate && new Date(a.createdAt) <= range.endDate).length;
+      const stored = await storeSnapshot(userId, period, range, generations[period], result[period], count);
+      snapshots[period] = stored.snapshot;
+      stale = stale || stored.stale;
+    }
+    if (stale) {
+      scheduleCombinedRefresh(userId, ranges);
+    }
+    return snapshots;
+  })();
+
+  // Failures reach the caller through `refresh`; waiters on a single key just get null
+  runningRefreshes.set(keys.weekly, refresh.then(snapshots => snapshots.weekly).catch(() => null));
+  runningRefreshes.set(keys.monthly, refresh.then(snapshots => snapshots.monthly).catch(() => null));
+  try {
+    return await refresh;
+  } finally {
+    runningRefreshes.delete(keys.weekly);
+    runningRefreshes.delete(keys.monthly);
+  }
+}
+
+// Debounced background refresh; repeated calls within DEBOUNCE_MS collapse into one
+function scheduleRefresh(userId, period, range) {
+  const key = snapshotKey(userId, period, range.periodKey);
+  clearTimeout(pendingRefreshes.get(key));
+
+  const timer = setTimeout(() => {
+    pendingRefreshes.delete(key);
+    refreshSnapshot(userId, period, range).catch(error => {
+      console.error(`Analytics precompute failed for ${key}:`, error);
+    });
+  }, DEBOUNCE_MS);
+  if (timer.unref) {
+    timer.unref();
+  }
+  pendingRefreshes.set(key, timer);
+}
+
+function combinedRefreshKey(userId, weekKey, monthKey) {
+  return `${snapshotKey(userId, 'weekly', weekKey)}+${monthKey}`;
+}
+
+// Whether a single-period or combined refresh covering this snapshot is already scheduled
+function hasPendingRefresh(userId, period, periodKey) {
+  if (pendingRefreshes.has(snapshotKey(userId, period, periodKey))) {
+    return true;
+  }
+  for (const key of pendingRefreshes.keys()) {
+    const [weekly, monthKey] = key.split('+');
+    if (monthKey === undefined) {
+      continue;
+    }
+    const covered = period === 'weekly'
+      ? weekly === snapshotKey(userId, 'weekly', periodKey)
+      : monthKey === periodKey && weekly.startsWith(`${userId}:weekly:`);
+    if (covered) {
+      return true;
+    }
+  }
+  return false;
+}
+
+// Debounced combined refresh of a week and month; it replaces pending single-period refreshes of both
+function scheduleCombinedRefresh(userId, ranges) {
+  const key = combinedRefreshKey(userId, ranges.weekly.periodKey, ranges.monthly.periodKey);
+  clearTimeout(pendingRefreshes.get(key));
+  for (const period of ['weekly', 'monthly']) {
+    const periodKey = snapshotKey(userId, period, ranges[period].periodKey);
+    clearTimeout(pendingRefreshes.get(periodKey));
+    pendingRefreshes.delete(periodKey);
+  }
+
+  const timer = setTimeout(() => {
+    pendingRefreshes.delete(key);
+    refreshCombinedSnapshots(userId, ranges).catch(error => {
+      console.error(`Analytics precompute failed for ${key}:`, error);
+    });
+  }, DEBOUNCE_MS);
+  if (timer.unref) {
+    timer.unref();
+  }
+  pendingRefreshes.set(key, timer);
+}
+
+// Mark the week and month containing `date` stale and refresh both in one background run
+async function invalidateAnalytics(userId, date = new Date()) {
+  // Read YYYY-MM-DD summary dates at local noon so the week/month does not shift with the timezone
+  const day = typeof date === 'string' ? new Date(date.length === 10 ? `${date}T12:00:00` : date) : date;
+  const ranges = {};
+  for (const period of ['weekly', 'monthly']) {
+    const range = periodRange(period, day);
+    try {
+      await AnalyticsSnapshot.updateOne(
+        { userId, period, periodKey: range.periodKey },
+        { $set: { stale: true, invalidatedAt: new Date() }, $inc: { generation: 1 } },
+        { upsert: true }
+      );
+      ranges[period] = range;
+    } catch (error) {
+      // Analytics are derived data, so never fail the write that triggered this
+      console.error(`Error invalidating ${period} analytics:`, error);
+    }
+  }
+  if (ranges.weekly && ranges.monthly) {
+    scheduleCombinedRefresh(userId, ranges);
+  } else {
+    for (const period of Object.keys(ranges)) {
+      scheduleRefresh(userId, period, ranges[period]);
+    }
+  }
+}
+
+// Serve the stored analysis when there is one, computing it on first access.
+// Stale results are served while a refresh runs in the background.
+async function getPeriodAnalysis(userId, period, range, data) {
+  const snapshot = await getSnapshot(userId, period, range.periodKey);
+  if (snapshot && snapshot.analysis) {
+    if (snapshot.stale && !hasPendingRefresh(userId, period, range.periodKey)) {
+      scheduleRefresh(userId, period, range);
+    }
+    return {
+      analysis: snapshot.analysis,
+      status: snapshot.stale ? 'stale' : 'ready',
+      version: snapshot.version,
+      generatedAt: snapshot.generatedAt
+    };
+  }
+
+  const refreshed = await refreshSnapshot(userId, period, range, data);
+  return {
+    analysis: refreshed.analysis,
+    status: refreshed.stale ? 'stale' : 'ready',
+    version: refreshed.version,
+    generatedAt: refreshed.generatedAt
+  };
+}
+
+module.exports = {
+  getWeekStart,
+  weeklyRange,
+  monthlyRange,
+  loadPeriodData,
+  getPeriodAnalysis,
+  refreshSnapshot,
+  refreshCombinedSnapshots,
+  invalidateAnalytics,
+  generateWeeklyAnalysis,
+  generateMonthlyAnalysis,
+  generateCombinedAnalysis
+};
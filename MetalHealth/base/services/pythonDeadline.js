@@ -0,0 +1,61 @@
+// Deadlines for the AI_ENV Python scripts. Each run gets an absolute deadline
+// (AI_ENV_DEADLINE, epoch ms) that bounds its Gemini calls and lets it answer
+// with a partial result in time. If it is still running shortly after the
+// deadline, or the client has gone away, it is sent SIGTERM, which aborts its
+// in-flight HTTP calls.
+
+// Time a user-facing request waits for its analysis
+const ANALYSIS_TIMEOUT_MS = parseInt(process.env.ANALYSIS_TIMEOUT_MS || '45000', 10);
+// Background analytics refreshes have no one waiting but should not pile up
+const BACKGROUND_TIMEOUT_MS = parseInt(process.env.BACKGROUND_ANALYSIS_TIMEOUT_MS || '120000', 10);
+// Time after the deadline for the script to print its partial result
+const KILL_GRACE_MS = 2000;
+
+function analysisDeadline(timeoutMs = ANALYSIS_TIMEOUT_MS) {
+  return Date.now() + timeoutMs;
+}
+
+// Environment for a Python run: usage attribution, the result store session
+// plus the deadline
+function pythonEnv(userId, deadline) {
+  return {
+    ...process.env,
+    AI_ENV_USER: String(userId),
+    AI_ENV_SESSION: String(userId),
+    AI_ENV_DEADLINE: String(deadline)
+  };
+}
+
+// Terminate `child` after `deadline` plus a grace period, or as soon as `res`
+// closes without a response having been sent
+function superviseProcess(child, deadline, res = null) {
+  const terminate = (reason) => {
+    if (child.exitCode === null && child.signalCode === null) {
+      console.warn(`Stopping Python process ${child.pid}: ${reason}`);
+      child.kill('SIGTERM');
+    }
+  };
+  const timer = setTimeout(() => terminate('deadline passed'), Math.max(0, deadline - Date.now()) + KILL_GRACE_MS);
+  const onClientGone = () => {
+    if (!res.writableEnded) {
+      terminate('client disconnected');
+    }
+  };
+  if (res) {
+    res.on('close', onClientGone);
+  }
+  child.on('exit', () => {
+    clearTimeout(timer);
+    if (res) {
+      res.off('close', onClientGone);
+    }
+  });
+}
+
+module.exports = {
+  ANALYSIS_TIMEOUT_MS,
+  BACKGROUND_TIMEOUT_MS,
+  analysisDeadline,
+  pythonEnv,
+  superviseProcess
+};
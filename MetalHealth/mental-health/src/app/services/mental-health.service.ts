@@ -42,6 +42,9 @@ export interface Assessment {
 export interface AssessmentResponse {
   message: string;
   assessment: Assessment;
+  // Present when a daily summary was submitted with the assessment
+  dailySummary?: DailySummary;
+  summaryAnalysis?: SummaryAnalysis;
 }
 
 export interface HistoryResponse {
@@ -57,6 +60,15 @@ export interface DailySummary {
   updatedAt?: string;
 }
 
+export interface SummaryAnalysis {
+  summary: string;
+  mood_indicators: string;
+  patterns: string;
+  insights: string;
+  suggestions: string;
+  timestamp: string;
+}
+
 export interface DailySummaryResponse {
   message: string;
   summary?: DailySummary;
@@ -115,10 +127,11 @@ export class MentalHealthService {
     });
   }
 
-  submitAssessment(answers: MentalHealthAnswers): Observable<AssessmentResponse> {
+  // Passing today's summary analyzes it together with the check-in in one request
+  submitAssessment(answers: MentalHealthAnswers, dailySummary?: string): Observable<AssessmentResponse> {
     return this.http.post<AssessmentResponse>(
       `${this.apiUrl}/assessment`,
-      { answers },
+      dailySummary ? { answers, dailySummary } : { answers },
       { headers: this.getHeaders() }
     );
   }